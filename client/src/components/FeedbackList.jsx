@@ -1,8 +1,9 @@
-import React, { useState, useMemo } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { useFeedback } from "../context/FeedbackContext";
+import { feedbackAPI } from "../utils/api";
 
 export default function FeedbackList() {
-  const { feedback, loading, error, fetchFeedback } = useFeedback();
+  const { feedback, hasMoreFeedback, loading, error, fetchFeedback, fetchMoreFeedback } = useFeedback();
   
   // State for sorting
   const [sortField, setSortField] = useState('sentiment'); // 'sentiment', 'priority_score', 'priority_level'
@@ -10,6 +11,10 @@ export default function FeedbackList() {
   
   // State for theme search
   const [themeSearch, setThemeSearch] = useState('');
+  
+  // State for full-text message search
+  const [messageSearch, setMessageSearch] = useState('');
+  const isSearching = messageSearch.trim() !== '' || themeSearch.trim() !== '';
 
   // Format date for display in IST
   const formatDate = (timestamp) => {
@@ -62,50 +67,35 @@ export default function FeedbackList() {
     }
   };
 
-  // Filter and sort feedback
-  const processedFeedback = useMemo(() => {
-    let result = [...feedback];
+  // Map table sort fields to server-side sort columns
+  const sortColumns = {
+    sentiment: 'sentiment_score',
+    priority_score: 'priority_score',
+    priority_level: 'priority_score'
+  };
+
+  // Sorting, filtering and search happen on the server; refetch the first page
+  // whenever they change (searches are debounced while typing)
+  const isFirstQuery = useRef(true);
+  useEffect(() => {
+    const query = {
+      sort: sortColumns[sortField],
+      order: sortOrder,
+      ...(themeSearch.trim() ? { theme: themeSearch.trim() } : {}),
+      ...(messageSearch.trim() ? { q: messageSearch.trim() } : {})
+    };
     
-    // Filter by theme search
-    if (themeSearch.trim()) {
-      const searchLower = themeSearch.toLowerCase();
-      result = result.filter(item => {
-        if (!item.themes || item.themes.length === 0) return false;
-        return item.themes.some(theme => 
-          theme.toLowerCase().includes(searchLower)
-        );
-      });
+    if (isFirstQuery.current) {
+      isFirstQuery.current = false;
+      fetchFeedback(query);
+      return;
     }
     
-    // Sort by selected field
-    result.sort((a, b) => {
-      let valueA, valueB;
-      
-      if (sortField === 'sentiment') {
-        valueA = a.sentiment_score ?? -999; // Put null values at end
-        valueB = b.sentiment_score ?? -999;
-      } else if (sortField === 'priority_score') {
-        valueA = a.priority_score ?? -999;
-        valueB = b.priority_score ?? -999;
-      } else if (sortField === 'priority_level') {
-        // Convert priority level to numeric for sorting
-        const priorityMap = { 'HIGH': 3, 'MEDIUM': 2, 'LOW': 1, null: 0, undefined: 0 };
-        valueA = priorityMap[a.priority_level] ?? 0;
-        valueB = priorityMap[b.priority_level] ?? 0;
-      }
-      
-      if (sortOrder === 'asc') {
-        return valueA - valueB;
-      } else {
-        return valueB - valueA;
-      }
-    });
-    
-    return result;
-  }, [feedback, themeSearch, sortField, sortOrder]);
+    const timer = setTimeout(() => fetchFeedback(query), 300);
+    return () => clearTimeout(timer);
+  }, [sortField, sortOrder, themeSearch, messageSearch]);
 
-  // Limit to 10 items by default
-  const displayedFeedback = processedFeedback.slice(0, 10);
+  const displayedFeedback = feedback;
 
   return (
     <div style={{
@@ -136,6 +126,21 @@ export default function FeedbackList() {
         </h3>
         
         <div style={{ display: 'flex', gap: '12px', alignItems: 'center' }}>
+          {/* Message Search: ranked full-text search on the server */}
+          <input
+            type="search"
+            placeholder='Search messages, "exact phrase"...'
+            value={messageSearch}
+            onChange={(e) => setMessageSearch(e.target.value)}
+            style={{
+              padding: '6px 12px',
+              border: '1px solid #ced4da',
+              borderRadius: '4px',
+              fontSize: '12px',
+              width: '200px'
+            }}
+          />
+          
           {/* Theme Search */}
           <input
             type="text"
@@ -153,7 +158,7 @@ export default function FeedbackList() {
           
           {/* Refresh Button */}
           <button
-            onClick={fetchFeedback}
+            onClick={() => fetchFeedback()}
             disabled={loading.feedback}
             style={{
               backgroundColor: 'transparent',
@@ -168,6 +173,22 @@ export default function FeedbackList() {
           >
             {loading.feedback ? 'Refreshing...' : 'Refresh'}
           </button>
+          
+          {/* Export Link: streams every matching row as CSV */}
+          <a
+            href={feedbackAPI.getExportUrl({ format: 'csv', theme: themeSearch.trim() })}
+            download
+            style={{
+              color: '#007bff',
+              border: '1px solid #007bff',
+              padding: '6px 12px',
+              borderRadius: '4px',
+              fontSize: '12px',
+              textDecoration: 'none'
+            }}
+          >
+            Export CSV
+          </a>
         </div>
       </div>
 
@@ -199,7 +220,7 @@ export default function FeedbackList() {
         )}
 
         {/* Empty State */}
-        {!loading.feedback && !error.feedback && feedback.length === 0 && (
+        {!loading.feedback && !error.feedback && feedback.length === 0 && !isSearching && (
           <div style={{
             padding: '40px 20px',
             textAlign: 'center',
@@ -211,7 +232,7 @@ export default function FeedbackList() {
         )}
 
         {/* No Results from Search */}
-        {!loading.feedback && !error.feedback && feedback.length > 0 && displayedFeedback.length === 0 && (
+        {!loading.feedback && !error.feedback && feedback.length === 0 && isSearching && (
           <div style={{
             padding: '40px 20px',
             textAlign: 'center',
@@ -219,7 +240,7 @@ export default function FeedbackList() {
           }}>
             <div style={{ fontSize: '16px', marginBottom: '8px' }}>No feedback matches your search</div>
             <button
-              onClick={() => setThemeSearch('')}
+              onClick={() => { setThemeSearch(''); setMessageSearch(''); }}
               style={{
                 backgroundColor: '#007bff',
                 color: 'white',
@@ -502,9 +523,27 @@ export default function FeedbackList() {
           alignItems: 'center'
         }}>
           <span>
-            Showing {displayedFeedback.length} of {processedFeedback.length} feedback items
+            Showing {displayedFeedback.length} feedback items
+            {messageSearch.trim() && ` matching "${messageSearch.trim()}", best match first`}
             {themeSearch && ` (filtered by "${themeSearch}")`}
           </span>
+          {hasMoreFeedback && (
+            <button
+              onClick={fetchMoreFeedback}
+              disabled={loading.feedback}
+              style={{
+                backgroundColor: 'transparent',
+                color: '#007bff',
+                border: '1px solid #007bff',
+                padding: '4px 12px',
+                borderRadius: '4px',
+                fontSize: '11px',
+                cursor: loading.feedback ? 'not-allowed' : 'pointer'
+              }}
+            >
+              {loading.feedback ? 'Loading...' : 'Load more'}
+            </button>
+          )}
           {themeSearch && (
             <button
               onClick={() => setThemeSearch('')}
@@ -1,11 +1,16 @@
-import React, { createContext, useContext, useState, useEffect } from "react";
+import React, { createContext, useContext, useState, useEffect, useRef } from "react";
 import { feedbackAPI } from "../utils/api";
 
 export const FeedbackContext = createContext(null);
 
+// Number of feedback rows fetched per page
+const FEEDBACK_PAGE_SIZE = 20;
+
 export const FeedbackProvider = ({ children }) => {
   // State for feedback data
   const [feedback, setFeedback] = useState([]);
+  const [feedbackQuery, setFeedbackQuery] = useState({ sort: 'created_at', order: 'desc' });
+  const [nextCursor, setNextCursor] = useState(null);
   const [insights, setInsights] = useState({
     top_positive: [],
     top_negative: [],
@@ -25,14 +30,43 @@ export const FeedbackProvider = ({ children }) => {
     submit: null
   });
 
-  // Fetch all feedback
-  const fetchFeedback = async () => {
+  // A query with search text goes to the ranked search endpoint, which ignores sort and order
+  const getPage = ({ q, sort, order, ...params }) => (
+    q ? feedbackAPI.searchFeedback({ q, ...params }) : feedbackAPI.getFeedbackPage({ sort, order, ...params })
+  );
+
+  // Fetch the first page of feedback for a query (search text, sort, order and filters)
+  const fetchFeedback = async (query = feedbackQuery) => {
     setLoading(prev => ({ ...prev, feedback: true }));
     setError(prev => ({ ...prev, feedback: null }));
     
     try {
-      const data = await feedbackAPI.getAllFeedback();
-      setFeedback(data);
+      const page = await getPage({ ...query, limit: FEEDBACK_PAGE_SIZE });
+      setFeedbackQuery(query);
+      setFeedback(page.items);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      setError(prev => ({ ...prev, feedback: err.message }));
+    } finally {
+      setLoading(prev => ({ ...prev, feedback: false }));
+    }
+  };
+
+  // Fetch the next page of feedback for the current query
+  const fetchMoreFeedback = async () => {
+    if (!nextCursor) return;
+    
+    setLoading(prev => ({ ...prev, feedback: true }));
+    setError(prev => ({ ...prev, feedback: null }));
+    
+    try {
+      const page = await getPage({
+        ...feedbackQuery,
+        limit: FEEDBACK_PAGE_SIZE,
+        cursor: nextCursor
+      });
+      setFeedback(prev => [...prev, ...page.items]);
+      setNextCursor(page.nextCursor);
     } catch (err) {
       setError(prev => ({ ...prev, feedback: err.message }));
     } finally {
@@ -63,14 +97,9 @@ export const FeedbackProvider = ({ children }) => {
     try {
       const newFeedback = await feedbackAPI.submitFeedback(message);
       
-      // Add new feedback to the list
+      // Add new feedback to the list; its insight arrives as a server event
       setFeedback(prev => [newFeedback, ...prev]);
       
-      // Refresh insights after a short delay to allow processing
-      setTimeout(() => {
-        fetchInsights();
-      }, 2000);
-      
       return newFeedback;
     } catch (err) {
       setError(prev => ({ ...prev, submit: err.message }));
@@ -80,15 +109,43 @@ export const FeedbackProvider = ({ children }) => {
     }
   };
 
-  // Load initial data on mount
+  // Load initial insights on mount; FeedbackList requests the first
+  // feedback page with its own sort and filter settings
   useEffect(() => {
-    fetchFeedback();
     fetchInsights();
   }, []);
 
+  // The event stream outlives renders, so its handlers call the latest fetchers through a ref
+  const refetchRef = useRef(null);
+  refetchRef.current = {
+    feedback: () => fetchFeedback(feedbackQuery),
+    insights: fetchInsights
+  };
+
+  // Apply pushed insights to the loaded feedback rows in place, and refresh
+  // insights analytics when the server reports that the aggregates changed
+  useEffect(() => {
+    const unsubscribe = feedbackAPI.subscribeToEvents({
+      insight: (insight) => {
+        setFeedback(prev => prev.map(item => (
+          item.id === insight.feedback_id ? { ...item, ...insight } : item
+        )));
+      },
+      aggregates: () => refetchRef.current.insights(),
+      // Too many events were missed to replay, so reload what is shown
+      resync: () => {
+        refetchRef.current.feedback();
+        refetchRef.current.insights();
+      }
+    });
+    return unsubscribe;
+  }, []);
+
   const contextValue = {
     // Data
     feedback,
+    feedbackQuery,
+    hasMoreFeedback: nextCursor !== null,
     insights,
     
     // Loading states
@@ -100,6 +157,7 @@ export const FeedbackProvider = ({ children }) => {
     // Actions
     submitFeedback,
     fetchFeedback,
+    fetchMoreFeedback,
     fetchInsights,
     
     // Utility functions
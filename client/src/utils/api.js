@@ -12,6 +12,38 @@ const api = axios.create({
   timeout: 10000, // 10 second timeout
 });
 
+// Last response and ETag per GET request. Read endpoints tag responses with the
+// server's data version, so a repeated request sends If-None-Match and an
+// unchanged result comes back as an empty 304 that is answered from here.
+const responseCache = new Map();
+const RESPONSE_CACHE_SIZE = 50;
+
+const cachedGet = async (url, params = {}) => {
+  const key = `${url}?${new URLSearchParams(
+    Object.entries(params).filter(([, value]) => value !== undefined && value !== null)
+  ).toString()}`;
+  const cached = responseCache.get(key);
+
+  const response = await api.get(url, {
+    params,
+    headers: cached ? { 'If-None-Match': cached.etag } : {},
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+
+  if (response.status === 304 && cached) {
+    return cached.response;
+  }
+  if (response.headers.etag) {
+    responseCache.delete(key);
+    responseCache.set(key, { etag: response.headers.etag, response });
+    if (responseCache.size > RESPONSE_CACHE_SIZE) {
+      // Maps iterate in insertion order, so the first key is the least recently stored
+      responseCache.delete(responseCache.keys().next().value);
+    }
+  }
+  return response;
+};
+
 // API functions
 export const feedbackAPI = {
   // Submit new feedback
@@ -25,27 +57,67 @@ export const feedbackAPI = {
     }
   },
 
-  // Get all feedback
-  getAllFeedback: async () => {
+  // Get one page of feedback
+  // params: { limit, cursor, sort, order, sentiment_label, priority_level, theme, date_from, date_to }
+  getFeedbackPage: async (params = {}) => {
     try {
-      const response = await api.get('/api/feedback');
-      return response.data;
+      const response = await cachedGet('/api/feedback', params);
+      return {
+        items: response.data,
+        nextCursor: response.headers['x-next-cursor'] || null,
+      };
     } catch (error) {
       console.error('Error fetching feedback:', error);
       throw new Error(error.response?.data?.detail || 'Failed to fetch feedback');
     }
   },
 
+  // Get one page of feedback matching a full-text search, best match first
+  // params: { q, limit, cursor, sentiment_label, priority_level, theme, date_from, date_to }
+  searchFeedback: async (params = {}) => {
+    try {
+      const response = await cachedGet('/api/feedback/search', params);
+      return {
+        items: response.data,
+        nextCursor: response.headers['x-next-cursor'] || null,
+      };
+    } catch (error) {
+      console.error('Error searching feedback:', error);
+      throw new Error(error.response?.data?.detail || 'Failed to search feedback');
+    }
+  },
+
+  // URL of a streamed export, opened as a download rather than fetched through
+  // axios so large exports are not cut off by the request timeout
+  // params: { format: 'ndjson' | 'csv', gzip, sentiment_label, priority_level, theme, date_from, date_to }
+  getExportUrl: (params = {}) => {
+    const query = new URLSearchParams(
+      Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== '')
+    );
+    return `${API_BASE_URL}/api/feedback/export?${query.toString()}`;
+  },
+
   // Get insights analytics
   getInsights: async () => {
     try {
-      const response = await api.get('/api/insights');
+      const response = await cachedGet('/api/insights');
       return response.data;
     } catch (error) {
       console.error('Error fetching insights:', error);
       throw new Error(error.response?.data?.detail || 'Failed to fetch insights');
     }
   },
+
+  // Subscribe to server-sent events; handlers: { insight, aggregates, resync },
+  // each called with the parsed event data. EventSource reconnects on its own
+  // and resumes from the last event id it saw. Returns a function that closes the stream.
+  subscribeToEvents: (handlers = {}) => {
+    const source = new EventSource(`${API_BASE_URL}/api/events`);
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, (event) => handler(JSON.parse(event.data)));
+    });
+    return () => source.close();
+  },
 };
 
 export default api;
\ No newline at end of file
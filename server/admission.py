@@ -0,0 +1,195 @@
+"""
+Admission control for feedback submission
+
+Submitted feedback is stored with an insight job (see insight_jobs) and the
+workers analyze jobs at their own pace. During a traffic spike jobs arrive
+faster than they are finished, so the queue and the processing lag grow
+without bound. Admission control bounds the queue of pending and running
+jobs with two watermarks. The queue becomes saturated when it reaches
+ADMISSION_HIGH_WATERMARK jobs and stays saturated until it has drained to
+ADMISSION_LOW_WATERMARK, so submissions do not flip between modes on every
+job. A batch admitted just below the high watermark can overshoot it by
+its own size.
+
+While the queue is saturated, submissions are handled according to
+ADMISSION_MODE:
+
+- defer: the feedback is stored and answered as usual, but its job is
+  stored as deferred, and workers do not claim deferred jobs. Once the
+  queue has drained to the low watermark, workers move the oldest
+  deferred jobs back to pending, up to the high watermark. Deferred jobs
+  are rows like any other job, so a restart loses nothing.
+- reject: nothing is stored and the request is answered with 429 Too Many
+  Requests and a Retry-After header.
+
+Each process reads the queue depth from the database at most every
+ADMISSION_DEPTH_TTL_SECONDS and adds the jobs it admitted since then.
+Decisions, the last depth seen and the saturation flag are exported on
+/metrics. GET /api/admission reports the current state.
+
+Configuration comes from the environment:
+
+- ADMISSION_MODE: defer or reject (default defer)
+- ADMISSION_HIGH_WATERMARK: queue depth that saturates the queue (default 10000)
+- ADMISSION_LOW_WATERMARK: queue depth that ends saturation (default 5000)
+- ADMISSION_RETRY_AFTER_SECONDS: Retry-After of rejected submissions (default 30)
+- ADMISSION_DEPTH_TTL_SECONDS: how long a queue depth read is reused (default 1)
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict
+
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.orm import Session
+
+from database import InsightJob
+from insight_jobs import DEFERRED, PENDING, queue_depth, queue_depth_query
+from metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_SATURATED, FEEDBACK_ADMISSIONS, INSIGHT_JOBS_RELEASED
+
+ADMISSION_MODE = os.getenv("ADMISSION_MODE", "defer")
+ADMISSION_HIGH_WATERMARK = int(os.getenv("ADMISSION_HIGH_WATERMARK", 10000))
+ADMISSION_LOW_WATERMARK = int(os.getenv("ADMISSION_LOW_WATERMARK", 5000))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 30))
+ADMISSION_DEPTH_TTL_SECONDS = float(os.getenv("ADMISSION_DEPTH_TTL_SECONDS", 1))
+
+ADMISSION_MODES = ("defer", "reject")
+
+# Admission decisions, as counted by feedback_admissions_total
+ACCEPTED = "accepted"
+DEFERRED_DECISION = "deferred"
+REJECTED = "rejected"
+
+class QueueSaturated(Exception):
+    """Raised when a submission is rejected because the analysis queue is saturated"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__("Feedback analysis queue is full, retry later")
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Watermark-based admission of new insight jobs into the queue
+    """
+    
+    def __init__(self, mode: str = ADMISSION_MODE, high_watermark: int = ADMISSION_HIGH_WATERMARK,
+                 low_watermark: int = ADMISSION_LOW_WATERMARK, retry_after: int = ADMISSION_RETRY_AFTER_SECONDS,
+                 depth_ttl: float = ADMISSION_DEPTH_TTL_SECONDS, clock: Callable[[], float] = time.monotonic):
+        if mode not in ADMISSION_MODES:
+            raise ValueError(f"Unknown admission mode: {mode} (expected one of {', '.join(ADMISSION_MODES)})")
+        if not 0 <= low_watermark <= high_watermark:
+            raise ValueError("Admission watermarks need 0 <= low <= high")
+        self.mode = mode
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.retry_after = retry_after
+        self.depth_ttl = depth_ttl
+        self.clock = clock
+        self.saturated = False
+        self._lock = threading.Lock()
+        self._depth = None
+        self._read_at = 0.0
+    
+    def _refresh_depth(self, db: Session):
+        # The query runs outside the lock: under run_sync an async session
+        # yields to the event loop while it waits for the database
+        with self._lock:
+            if self._depth is not None and self.clock() - self._read_at < self.depth_ttl:
+                return
+        depth = queue_depth(db)
+        with self._lock:
+            self._depth = depth
+            self._read_at = self.clock()
+    
+    def admit(self, db: Session, count: int = 1) -> bool:
+        """
+        Decide how count new feedback messages are queued for analysis
+        Returns: True to queue their jobs as pending, False to store them deferred
+        Raises: QueueSaturated when the queue is saturated in reject mode
+        """
+        self._refresh_depth(db)
+        with self._lock:
+            depth = self._depth
+            if self.saturated and depth <= self.low_watermark:
+                self.saturated = False
+            elif not self.saturated and depth >= self.high_watermark:
+                self.saturated = True
+            if not self.saturated:
+                self._depth += count
+            saturated = self.saturated
+        
+        ADMISSION_QUEUE_DEPTH.set(depth)
+        ADMISSION_SATURATED.set(1 if saturated else 0)
+        if not saturated:
+            FEEDBACK_ADMISSIONS.inc(ACCEPTED)
+            return True
+        if self.mode == "reject":
+            FEEDBACK_ADMISSIONS.inc(REJECTED)
+            raise QueueSaturated(self.retry_after)
+        FEEDBACK_ADMISSIONS.inc(DEFERRED_DECISION)
+        return False
+    
+    def release_deferred(self, db: Session) -> int:
+        """
+        Move the oldest deferred jobs back to pending once the queue has drained to the low watermark
+        Returns: number of jobs released
+        """
+        waiting = db.execute(select(InsightJob.id).where(InsightJob.state == DEFERRED).limit(1)).first()
+        # End the read, so the update below starts its own write transaction
+        db.rollback()
+        if waiting is None:
+            return 0
+        
+        # One statement, so the depth cannot change between the check and the update
+        depth = queue_depth_query().scalar_subquery()
+        oldest = (
+            select(InsightJob.id)
+            .where(InsightJob.state == DEFERRED)
+            .order_by(InsightJob.id)
+            .limit(literal(self.high_watermark) - depth)
+        )
+        released = db.execute(
+            update(InsightJob)
+            .where(InsightJob.id.in_(oldest.scalar_subquery()), depth <= self.low_watermark)
+            .values(state=PENDING, updated_at=datetime.utcnow())
+        ).rowcount or 0
+        db.commit()
+        INSIGHT_JOBS_RELEASED.inc(amount=released)
+        return released
+    
+    def status(self, db: Session) -> Dict:
+        """
+        Configuration, current queue depth and decision counts, for GET /api/admission
+        """
+        deferred = db.execute(select(func.count()).select_from(InsightJob).where(InsightJob.state == DEFERRED)).scalar_one()
+        return {
+            "mode": self.mode,
+            "high_watermark": self.high_watermark,
+            "low_watermark": self.low_watermark,
+            "queue_depth": queue_depth(db),
+            "deferred": deferred,
+            "saturated": self.saturated,
+            "decisions": {decision: int(FEEDBACK_ADMISSIONS.value(decision))
+                          for decision in (ACCEPTED, DEFERRED_DECISION, REJECTED)},
+        }
+
+controller = AdmissionController()
+
+def admit_feedback(db: Session, count: int = 1) -> bool:
+    """
+    Admission decision for count messages by the process's controller (see AdmissionController.admit)
+    """
+    return controller.admit(db, count)
+
+def admission_status(db: Session) -> Dict:
+    """
+    State of the process's controller (see AdmissionController.status)
+    """
+    return controller.status(db)
+
+def release_deferred(db: Session) -> int:
+    """
+    Release deferred jobs as the process's controller allows (see AdmissionController.release_deferred)
+    """
+    return controller.release_deferred(db)
@@ -0,0 +1,297 @@
+"""
+Content-addressed analysis cache
+
+Analyses are cached under a hash of the exact message text, the pipeline
+version and the keyword rules fingerprint, so repeated feedback,
+copy-pasted messages and client retries reuse the first analysis instead of
+running the NLP pipeline again. The text is not normalized: keyword rules
+match substrings such as "not working", so a message that differs only in
+whitespace can be scored differently. Changing the pipeline or the rules changes
+every key, which retires old entries without an explicit flush.
+
+There are two tiers: an in-process LRU with size and TTL limits, and an
+optional SQLite file shared by every server process. Failed analyses are
+never cached. Configuration comes from the environment:
+
+- ANALYSIS_CACHE_SIZE: entries kept in memory (default 10000, 0 disables)
+- ANALYSIS_CACHE_TTL_SECONDS: lifetime of an entry in both tiers (default 86400)
+- ANALYSIS_CACHE_DB: path of the shared SQLite cache file (default: disabled)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, create_engine, delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from feedback_pipeline import PIPELINE_VERSION, is_failed_analysis
+from keyword_rules import get_keyword_rules
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", 10000))
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", 86400))
+ANALYSIS_CACHE_DB = os.getenv("ANALYSIS_CACHE_DB", "")
+
+# Keys looked up per query against the persistent tier
+_LOOKUP_CHUNK_SIZE = 500
+
+_metadata = MetaData()
+
+analysis_cache_table = Table(
+    "analysis_cache",
+    _metadata,
+    Column("key", String(64), primary_key=True),
+    Column("analysis", Text, nullable=False),
+    Column("expires_at", Float, nullable=False, index=True),
+)
+
+def cache_key(message: str, version: Optional[str] = None) -> str:
+    """
+    Content address of a message's analysis
+    """
+    if version is None:
+        version = f"{PIPELINE_VERSION}:{get_keyword_rules().fingerprint}"
+    payload = f"{version}\0{message}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    """
+    Two-tier cache of analysis dicts keyed by message content
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400, db_path: str = "",
+                 version: Optional[str] = None):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.version = version
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "persistent_errors": 0,
+        }
+        
+        self._engine = None
+        if db_path:
+            self._engine = create_engine(
+                f"sqlite:///{db_path}",
+                # Several processes share the file; wait for their writes instead of failing
+                connect_args={"check_same_thread": False, "timeout": 5},
+            )
+            _metadata.create_all(self._engine)
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether any tier can hold entries"""
+        return self.max_entries > 0 or self._engine is not None
+    
+    @property
+    def persistent(self) -> bool:
+        """Whether the shared SQLite tier is enabled"""
+        return self._engine is not None
+    
+    def key(self, message: str) -> str:
+        return cache_key(message, self.version)
+    
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+    
+    def _memory_get(self, key: str, now: float) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, analysis = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return analysis
+    
+    def _memory_put(self, key: str, analysis: Dict, expires_at: float):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, analysis)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+    
+    def _persistent_get(self, keys: List[str], now: float) -> Dict[str, tuple]:
+        found = {}
+        try:
+            with self._engine.connect() as connection:
+                for start in range(0, len(keys), _LOOKUP_CHUNK_SIZE):
+                    rows = connection.execute(
+                        select(analysis_cache_table.c.key, analysis_cache_table.c.analysis,
+                               analysis_cache_table.c.expires_at)
+                        .where(analysis_cache_table.c.key.in_(keys[start:start + _LOOKUP_CHUNK_SIZE]))
+                        .where(analysis_cache_table.c.expires_at > now)
+                    )
+                    for key, analysis, expires_at in rows:
+                        found[key] = (expires_at, json.loads(analysis))
+        except (SQLAlchemyError, ValueError) as e:
+            # The persistent tier is an optimization; analysis goes ahead without it
+            print(f"Analysis cache lookup failed: {str(e)}")
+            self._count("persistent_errors")
+        return found
+    
+    def _persistent_put(self, rows: List[Dict]):
+        try:
+            with self._engine.begin() as connection:
+                statement = sqlite_insert(analysis_cache_table)
+                connection.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[analysis_cache_table.c.key],
+                        set_={"analysis": statement.excluded.analysis, "expires_at": statement.excluded.expires_at},
+                    ),
+                    rows,
+                )
+        except SQLAlchemyError as e:
+            print(f"Analysis cache store failed: {str(e)}")
+            self._count("persistent_errors")
+    
+    def get_many(self, messages: Sequence[str]) -> List[Optional[Dict]]:
+        """
+        Cached analyses for the messages, None where there is no live entry
+        """
+        now = time.time()
+        keys = [self.key(message) for message in messages]
+        found: Dict[str, Dict] = {}
+        
+        for key in set(keys):
+            analysis = self._memory_get(key, now)
+            if analysis is not None:
+                found[key] = analysis
+        memory_keys = set(found)
+        
+        missing = [key for key in set(keys) if key not in found]
+        if missing and self._engine is not None:
+            for key, (expires_at, analysis) in self._persistent_get(missing, now).items():
+                # Promote so the next lookup is served from memory
+                self._memory_put(key, analysis, expires_at)
+                found[key] = analysis
+        
+        results = []
+        refreshed_at = datetime.utcnow().isoformat()
+        for key in keys:
+            analysis = found.get(key)
+            if analysis is None:
+                self._count("misses")
+                results.append(None)
+            else:
+                self._count("memory_hits" if key in memory_keys else "persistent_hits")
+                results.append({**analysis, "processed_at": refreshed_at})
+        return results
+    
+    def get(self, message: str) -> Optional[Dict]:
+        """
+        Cached analysis of one message, or None
+        """
+        return self.get_many([message])[0]
+    
+    def put_many(self, messages: Sequence[str], analyses: Sequence[Dict]):
+        """
+        Store analyses for the messages; failed analyses are skipped
+        """
+        expires_at = time.time() + self.ttl_seconds
+        entries = {
+            self.key(message): analysis
+            for message, analysis in zip(messages, analyses)
+            if analysis is not None and not is_failed_analysis(analysis)
+        }
+        if not entries:
+            return
+        
+        for key, analysis in entries.items():
+            self._memory_put(key, analysis, expires_at)
+        if self._engine is not None:
+            self._persistent_put([
+                {"key": key, "analysis": json.dumps(analysis), "expires_at": expires_at}
+                for key, analysis in entries.items()
+            ])
+        self._count("stores", len(entries))
+    
+    def put(self, message: str, analysis: Dict):
+        """
+        Store the analysis of one message
+        """
+        self.put_many([message], [analysis])
+    
+    def purge_expired(self) -> int:
+        """
+        Drop expired entries from both tiers
+        Returns: number of persistent entries removed
+        """
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+        
+        if self._engine is None:
+            return 0
+        with self._engine.begin() as connection:
+            result = connection.execute(delete(analysis_cache_table).where(analysis_cache_table.c.expires_at <= now))
+        return result.rowcount or 0
+    
+    def clear(self):
+        """
+        Empty both tiers and reset the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+        if self._engine is not None:
+            with self._engine.begin() as connection:
+                connection.execute(delete(analysis_cache_table))
+    
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters and tier sizes
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._entries)
+        
+        hits = stats["memory_hits"] + stats["persistent_hits"]
+        lookups = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["persistent"] = self.persistent
+        return stats
+    
+    def close(self):
+        if self._engine is not None:
+            self._engine.dispose()
+
+_cache: Optional[AnalysisCache] = None
+_cache_lock = threading.Lock()
+
+def get_analysis_cache() -> AnalysisCache:
+    """
+    Return the shared cache, creating it from the environment settings
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnalysisCache(
+                    max_entries=ANALYSIS_CACHE_SIZE,
+                    ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS,
+                    db_path=ANALYSIS_CACHE_DB,
+                )
+    return _cache
@@ -0,0 +1,263 @@
+"""
+Analysis executor
+
+Runs the CPU-bound feedback analysis in a pool of worker processes so it
+does not compete with request handling for the GIL. Each worker loads the
+NLP models once when it starts. Messages already in the analysis cache are
+answered without reaching the pool. Configuration comes from the environment:
+
+- ANALYSIS_EXECUTOR: "process" (default) or "inline" to analyze in the
+  calling thread
+- ANALYSIS_POOL_SIZE: number of worker processes (default: CPU count)
+- ANALYSIS_MAX_IN_FLIGHT: maximum tasks submitted but not finished; further
+  submissions wait for a slot (default: 4 per worker)
+- ANALYSIS_BATCH_CHUNK_SIZE: messages per task when analyzing a batch
+
+start_warmup loads the models wherever analysis runs (the worker
+processes, or this process in inline mode) in a background thread, and
+warmup_status reports its progress for the readiness probe.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from analysis_cache import AnalysisCache, get_analysis_cache
+from feedback_pipeline import analyze_feedback_batch, warm_models
+from metrics import ANALYSIS_IN_FLIGHT, drain_samples, merge_samples
+from model_registry import FAILED, LOADING, MODEL_WARMUP, NOT_LOADED, READY, get_model_registry
+
+ANALYSIS_EXECUTOR = os.getenv("ANALYSIS_EXECUTOR", "process")
+ANALYSIS_POOL_SIZE = int(os.getenv("ANALYSIS_POOL_SIZE", os.cpu_count() or 1))
+ANALYSIS_MAX_IN_FLIGHT = int(os.getenv("ANALYSIS_MAX_IN_FLIGHT", ANALYSIS_POOL_SIZE * 4))
+ANALYSIS_BATCH_CHUNK_SIZE = int(os.getenv("ANALYSIS_BATCH_CHUNK_SIZE", 256))
+
+def _init_worker():
+    """
+    Preload NLP models in a freshly started worker process
+    """
+    try:
+        warm_models()
+    except Exception as e:
+        # A failed warmup must not break the pool; analysis falls back per message
+        print(f"Analysis worker {os.getpid()} could not preload models: {str(e)}")
+
+def _run_task(fn, *args):
+    """
+    Run a task in a worker process and return its result with the metric
+    samples it recorded, for the API process to merge
+    """
+    result = fn(*args)
+    return result, drain_samples()
+
+def _warm_worker() -> Dict:
+    """
+    Load the models in the current process and report the registry state
+    """
+    registry = get_model_registry()
+    registry.load()
+    return dict(registry.status(), pid=os.getpid())
+
+class AnalysisExecutor:
+    """
+    Bounded front end to a process pool running analyze_feedback_batch
+    """
+    
+    def __init__(self, mode: str = "process", pool_size: int = 1, max_in_flight: int = 4,
+                 batch_chunk_size: int = 256, cache: Optional[AnalysisCache] = None):
+        if mode not in ("process", "inline"):
+            raise ValueError(f"Unknown analysis executor mode: {mode}")
+        
+        self.mode = mode
+        self.pool_size = max(1, pool_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.batch_chunk_size = max(1, batch_chunk_size)
+        self.cache = cache if cache is not None and cache.enabled else None
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        
+        if mode == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+    
+    @property
+    def in_flight(self) -> int:
+        """Number of tasks submitted and not yet finished"""
+        return self._in_flight
+    
+    def _acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            self._in_flight += 1
+    
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+    
+    def _submit(self, fn, *args) -> Future:
+        """
+        Submit a call, waiting for a free in-flight slot first
+        """
+        self._acquire()
+        
+        if self._pool is None:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._release()
+            return future
+        
+        try:
+            task = self._pool.submit(_run_task, fn, *args)
+        except Exception:
+            self._release()
+            raise
+        
+        future = Future()
+        
+        def resolve(done: Future):
+            self._release()
+            if done.cancelled():
+                future.cancel()
+            elif done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                result, samples = done.result()
+                merge_samples(samples)
+                future.set_result(result)
+        
+        task.add_done_callback(resolve)
+        return future
+    
+    def _analyze_chunks(self, messages: List[str]) -> List[Dict]:
+        """
+        Analyze messages in chunks spread over the worker processes
+        """
+        chunks = [
+            messages[start:start + self.batch_chunk_size]
+            for start in range(0, len(messages), self.batch_chunk_size)
+        ]
+        futures = [self._submit(analyze_feedback_batch, chunk) for chunk in chunks]
+        
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+    
+    def analyze_batch(self, messages: List[str]) -> List[Dict]:
+        """
+        Analyze a batch; cached messages are answered from the cache and
+        each distinct uncached message is analyzed once
+        """
+        if self.cache is None:
+            return self._analyze_chunks(messages)
+        
+        results = self.cache.get_many(messages)
+        pending: Dict[str, str] = {}
+        for message, analysis in zip(messages, results):
+            if analysis is None:
+                pending.setdefault(self.cache.key(message), message)
+        
+        if pending:
+            fresh = self._analyze_chunks(list(pending.values()))
+            self.cache.put_many(list(pending.values()), fresh)
+            analyses = dict(zip(pending, fresh))
+            results = [
+                analysis if analysis is not None else analyses[self.cache.key(message)]
+                for message, analysis in zip(messages, results)
+            ]
+        
+        return results
+    
+    def warm_up(self) -> List[Dict]:
+        """
+        Load the models in every worker process (or here in inline mode)
+        Returns: registry status of each process warmed
+        """
+        if self._pool is None:
+            return [_warm_worker()]
+        
+        # Workers are started on demand; one task per worker makes the pool start them all
+        futures = [self._submit(_warm_worker) for _ in range(self.pool_size)]
+        return [future.result() for future in futures]
+    
+    def shutdown(self, wait: bool = True):
+        """
+        Stop the worker processes, optionally cancelling queued tasks
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=not wait)
+            self._pool = None
+
+_executor: Optional[AnalysisExecutor] = None
+_executor_lock = threading.Lock()
+
+ANALYSIS_IN_FLIGHT.callback = lambda: {(): _executor.in_flight if _executor is not None else 0}
+
+def get_analysis_executor() -> AnalysisExecutor:
+    """
+    Return the shared executor, creating it from the environment settings
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = AnalysisExecutor(
+                    mode=ANALYSIS_EXECUTOR,
+                    pool_size=ANALYSIS_POOL_SIZE,
+                    max_in_flight=ANALYSIS_MAX_IN_FLIGHT,
+                    batch_chunk_size=ANALYSIS_BATCH_CHUNK_SIZE,
+                    cache=get_analysis_cache(),
+                )
+    return _executor
+
+def shutdown_analysis_executor(wait: bool = True):
+    """
+    Stop the shared executor's worker processes
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+_warmup_status: Dict = {"state": NOT_LOADED, "error": None, "seconds": None}
+
+def _run_warmup():
+    started = time.perf_counter()
+    _warmup_status.update(state=LOADING, error=None)
+    try:
+        get_analysis_executor().warm_up()
+    except Exception as e:
+        print(f"Model warmup failed: {str(e)}")
+        _warmup_status.update(state=FAILED, error=str(e))
+    else:
+        _warmup_status.update(state=READY, seconds=round(time.perf_counter() - started, 3))
+
+def start_warmup() -> threading.Thread:
+    """
+    Load the analysis models in a background thread
+    """
+    _warmup_status.update(state=LOADING, error=None)
+    thread = threading.Thread(target=_run_warmup, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def warmup_status() -> Dict:
+    """
+    Progress of the startup warmup; "lazy" when warmup is disabled
+    """
+    if not MODEL_WARMUP and _warmup_status["state"] == NOT_LOADED:
+        return {"state": "lazy", "error": None, "seconds": None}
+    return dict(_warmup_status)
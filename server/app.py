@@ -1,14 +1,29 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from database import create_tables, get_db, Feedback, Insight
-from models import FeedbackCreate, FeedbackResponse, FeedbackWithInsights, InsightsAnalytics, TopSentimentFeedback, ThemeCount, Recommendation
-from feedback_pipeline import process_feedback_async
-from typing import List
-import asyncio
-import json
-from collections import Counter
+from database import create_tables, get_db, get_read_db, DATABASE_ASYNC
+from models import FeedbackCreate, FeedbackBatchCreate, FeedbackResponse, FeedbackWithInsights, InsightDistribution, InsightsAnalytics, InsightTrends
+from admission import admission_status, admit_feedback, QueueSaturated
+from analysis_cache import get_analysis_cache
+from analysis_executor import shutdown_analysis_executor, start_warmup, warmup_status
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS_REGISTRY, MetricsMiddleware
+from model_registry import MODEL_WARMUP
+from insight_jobs import collect_queue_metrics, start_workers, stop_workers, wake_workers
+from insight_aggregates import analytics_queries, build_insights_analytics
+from insight_trends import build_insight_trends, to_naive_utc, trend_queries
+from insight_snapshot import insight_distribution, refresh_snapshot
+from theme_sketch import approximate_themes, start_flusher, stop_flusher
+from feedback_store import clean_batch, clean_message, store_feedback, InvalidFeedback
+from feedback_export import EXPORT_FORMATS, gzip_chunks, iter_export
+from feedback_archive import ArchiveError, check_segments, close_segments, feedback_segments_query, fill_representatives, merge_feedback_page, representative_segments_query
+from feedback_json import feedback_json_response
+from feedback_search import build_feedback_search_query, InvalidSearchQuery
+from data_version import etag_guard
+from event_stream import broker, read_data_version, TooManySubscribers
+from feedback_query import build_feedback_export_query, build_feedback_page_query, paginate, InvalidCursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from typing import List, Literal, Optional
+from datetime import datetime
 
 app = FastAPI(title="Feedback Insights Platform", version="1.0.0")
 
@@ -19,14 +34,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Content-Disposition", "ETag"],
 )
 
+# Request latency per route template, exported by /metrics (event streams stay open, so they are left out)
+app.add_middleware(MetricsMiddleware, skip_paths=("/metrics", "/api/events"))
+
 # Create database tables on startup
 @app.on_event("startup")
 def startup_event():
     print("Creating database tables...")
     create_tables()
     print("Database tables created successfully!")
+    
+    # Load the NLP models in the background; /ready reports when they are loaded
+    if MODEL_WARMUP:
+        start_warmup()
+    
+    # Re-queue feedback left without insights and start draining the job queue
+    start_workers()
+    
+    # Event streams announce aggregate changes by watching the data version
+    broker.version_reader = read_data_version
+    
+    # Merge this process's approximate theme counts into the database periodically
+    start_flusher()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    broker.close()
+    stop_workers()
+    stop_flusher()
+    close_segments()
+    shutdown_analysis_executor()
 
 @app.get("/")
 def root():
@@ -36,205 +76,345 @@ def root():
 def health_check():
     return {"status": "healthy", "service": "feedback-insights-platform"}
 
+@app.get("/ready")
+def readiness_check(response: Response):
+    """
+    Readiness probe: 503 until the analysis models have been loaded
+    """
+    status = warmup_status()
+    if status["state"] not in ("ready", "lazy"):
+        response.status_code = 503
+    return {"status": status["state"], "error": status["error"], "warmup_seconds": status["seconds"]}
+
+@app.get("/metrics")
+def get_metrics(db: Session = Depends(get_read_db)):
+    """
+    Prometheus metrics: stage and route latency, processing lag, backlog and failures
+    """
+    collect_queue_metrics(db)
+    return Response(METRICS_REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/analysis/cache")
+def get_analysis_cache_stats():
+    """
+    Hit/miss counters and sizes of the analysis cache
+    """
+    return get_analysis_cache().stats()
+
+@app.get("/api/admission")
+def get_admission_status(db: Session = Depends(get_read_db)):
+    """
+    Admission control mode, watermarks, queue depth and decision counts
+    """
+    return admission_status(db)
+
 # Feedback API Endpoints
 @app.post("/api/feedback", response_model=FeedbackResponse, status_code=201)
-def submit_feedback(feedback: FeedbackCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def submit_feedback(feedback: FeedbackCreate, db: Session = Depends(get_db)):
     """
-    Submit new feedback message and trigger async insight processing
+    Submit new feedback message and queue it for insight processing
+    
+    While the analysis queue is saturated the job is deferred, or the
+    request is answered with 429 (see admission)
     """
     try:
-        # Validate input
-        if not feedback.message or not feedback.message.strip():
-            raise HTTPException(status_code=400, detail="Feedback message cannot be empty")
+        messages = [clean_message(feedback.message)]
+        queued = admit_feedback(db, len(messages))
         
-        # Create new feedback record
-        db_feedback = Feedback(message=feedback.message.strip())
-        db.add(db_feedback)
+        # Create new feedback record and its insight job in one transaction
+        created = store_feedback(db, messages, deferred=not queued)
         db.commit()
-        db.refresh(db_feedback)
         
-        # Trigger async insight processing with a new database session
-        background_tasks.add_task(
-            trigger_insight_processing, 
-            db_feedback.id, 
-            db_feedback.message
-        )
+        # Let an idle insight worker pick the job up immediately
+        if queued:
+            wake_workers()
         
-        return db_feedback
+        return created[0]
         
-    except HTTPException:
-        raise
+    except InvalidFeedback as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to submit feedback: {str(e)}")
 
-def trigger_insight_processing(feedback_id: int, message: str):
+@app.post("/api/feedback/batch", response_model=List[FeedbackResponse], status_code=201)
+def submit_feedback_batch(batch: FeedbackBatchCreate, db: Session = Depends(get_db)):
     """
-    Trigger insight processing with a new database session
+    Submit many feedback messages in one transaction and analyze them as a batch
     """
-    from database import SessionLocal, Insight
-    from feedback_pipeline import analyze_feedback
-    import json
-    
-    db = SessionLocal()
     try:
-        # Analyze feedback
-        analysis = analyze_feedback(message)
-        
-        # Create insight record
-        insight = Insight(
-            feedback_id=feedback_id,
-            sentiment_score=analysis["sentiment_score"],
-            sentiment_label=analysis["sentiment_label"],
-            themes=json.dumps(analysis["themes"]),
-            recommendations=json.dumps(analysis["recommendations"]),
-            priority_score=analysis["priority_score"],
-            priority_level=analysis["priority_level"]
-        )
+        messages = clean_batch(batch.messages)
+        queued = admit_feedback(db, len(messages))
         
-        # Save to database
-        db.add(insight)
+        # Create all feedback records in a single transaction
+        created = store_feedback(db, messages, deferred=not queued)
         db.commit()
         
-        print(f"Insight processing completed for feedback {feedback_id}")
+        # Insight workers claim the queued jobs in batches
+        if queued:
+            wake_workers()
+        
+        return created
         
+    except InvalidFeedback as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
-        print(f"Error in insight processing for feedback {feedback_id}: {str(e)}")
         db.rollback()
-    finally:
-        db.close()
+        raise HTTPException(status_code=500, detail=f"Failed to submit feedback batch: {str(e)}")
 
-@app.get("/api/feedback", response_model=List[FeedbackWithInsights])
-def get_all_feedback(db: Session = Depends(get_db)):
+@app.get("/api/feedback", response_model=List[FeedbackWithInsights], dependencies=[Depends(etag_guard)])
+def get_all_feedback(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["created_at", "sentiment_score", "priority_score"] = "created_at",
+    order: Literal["asc", "desc"] = "desc",
+    sentiment_label: Optional[str] = None,
+    priority_level: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
     """
-    Retrieve all feedback messages with their insights
+    Retrieve one page of feedback messages with their insights
+    
+    Pages are keyset-paginated: when more rows exist, the X-Next-Cursor
+    response header holds the cursor for the next page.
     """
     try:
-        # Query feedback with left join to insights
-        feedback_query = db.query(Feedback, Insight).outerjoin(
-            Insight, Feedback.id == Insight.feedback_id
-        ).order_by(Feedback.created_at.desc()).all()
-        
-        # Transform to FeedbackWithInsights model
-        result = []
-        for feedback, insight in feedback_query:
-            feedback_data = {
-                "id": feedback.id,
-                "message": feedback.message,
-                "timestamp": feedback.timestamp,
-                "created_at": feedback.created_at,
-                "sentiment_score": None,
-                "sentiment_label": None,
-                "themes": None,
-                "recommendations": None,
-                "priority_score": None,
-                "priority_level": None,
-                "insight_processed_at": None
-            }
-            
-            # Add insight data if available
-            if insight:
-                feedback_data["sentiment_score"] = insight.sentiment_score
-                feedback_data["sentiment_label"] = insight.sentiment_label
-                feedback_data["priority_score"] = insight.priority_score
-                feedback_data["priority_level"] = insight.priority_level
-                feedback_data["insight_processed_at"] = insight.processed_at
-                
-                # Parse JSON fields
-                if insight.themes:
-                    try:
-                        feedback_data["themes"] = json.loads(insight.themes)
-                    except json.JSONDecodeError:
-                        feedback_data["themes"] = []
-                
-                if insight.recommendations:
-                    try:
-                        feedback_data["recommendations"] = json.loads(insight.recommendations)
-                    except json.JSONDecodeError:
-                        feedback_data["recommendations"] = []
-            
-            result.append(FeedbackWithInsights(**feedback_data))
-        
-        return result
+        query = build_feedback_page_query(
+            sort=sort,
+            order=order,
+            cursor=cursor,
+            limit=limit,
+            sentiment_label=sentiment_label,
+            priority_level=priority_level,
+            theme=theme,
+            date_from=date_from,
+            date_to=date_to
+        )
+        rows = db.execute(query).all()
+        
+        # Months moved to cold storage are read from their segments and merged in (see feedback_archive)
+        segments = db.execute(feedback_segments_query(sort, order, cursor, date_from, date_to)).all()
+        if segments:
+            rows = merge_feedback_page(rows, segments, query, sort, order, limit)
+        rows, next_cursor = paginate(rows, sort, order, limit)
+        
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
+        # JSON built straight from the row tuples, skipping per-row models (see feedback_json)
+        return feedback_json_response(rows, response)
+        
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ArchiveError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve feedback: {str(e)}")
 
+@app.get("/api/feedback/search", response_model=List[FeedbackWithInsights], dependencies=[Depends(etag_guard)])
+def search_feedback(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sentiment_label: Optional[str] = None,
+    priority_level: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Full-text search over feedback messages, best match first
+    
+    Accepts the same filters as GET /api/feedback and pages with the same
+    X-Next-Cursor header.
+    """
+    try:
+        query = build_feedback_search_query(
+            q,
+            cursor=cursor,
+            limit=limit,
+            sentiment_label=sentiment_label,
+            priority_level=priority_level,
+            theme=theme,
+            date_from=date_from,
+            date_to=date_to
+        )
+        rows, next_cursor = paginate(db.execute(query).all(), "rank", "asc", limit)
+        
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        
+        return feedback_json_response(rows, response)
+        
+    except (InvalidCursor, InvalidSearchQuery) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to search feedback: {str(e)}")
+
+@app.get("/api/feedback/export")
+def export_feedback(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    order: Literal["asc", "desc"] = "asc",
+    sentiment_label: Optional[str] = None,
+    priority_level: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Stream all matching feedback with insights as NDJSON or CSV
+    
+    Rows are streamed from a server-side cursor, so memory use does not grow
+    with the export size. get_read_db is request scoped, so its session stays open
+    until the whole body has been sent.
+    """
+    query = build_feedback_export_query(
+        order=order,
+        sentiment_label=sentiment_label,
+        priority_level=priority_level,
+        theme=theme,
+        date_from=date_from,
+        date_to=date_to
+    )
+    segments = db.execute(feedback_segments_query(order=order, date_from=date_from, date_to=date_to)).all()
+    try:
+        # Once streaming starts the status can no longer change, so missing segments are reported here
+        check_segments(segments)
+    except ArchiveError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    media_type, extension = EXPORT_FORMATS[format]
+    body = iter_export(db, query, format, segments, descending=(order == "desc"))
+    filename = f"feedback-export.{extension}"
+    if gzip:
+        body = gzip_chunks(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # Insights API Endpoint
-@app.get("/api/insights", response_model=InsightsAnalytics)
-def get_insights_analytics(db: Session = Depends(get_db)):
+@app.get("/api/insights", response_model=InsightsAnalytics, dependencies=[Depends(etag_guard)])
+def get_insights_analytics(
+    themes: Literal["exact", "approx"] = "exact",
+    window: Literal["24h", "7d"] = "24h",
+    db: Session = Depends(get_read_db)
+):
     """
     Retrieve processed insights and analytics
+    
+    Reads only the aggregate tables maintained by insight_aggregates, so the
+    cost does not grow with the number of stored insights. themes=approx
+    returns the top themes of the last `window` from the fixed-size theme
+    sketches (see theme_sketch) with their error bound.
     """
     try:
-        # Get all insights with their associated feedback
-        insights_query = db.query(Insight, Feedback).join(Feedback, Insight.feedback_id == Feedback.id).all()
-        
-        if not insights_query:
-            # Return empty analytics if no insights available
-            return InsightsAnalytics(
-                top_positive=[],
-                top_negative=[],
-                themes=[],
-                recommendations=[]
-            )
-        
-        # Separate positive and negative sentiments
-        positive_feedback = []
-        negative_feedback = []
-        all_themes = []
-        all_recommendations = []
-        
-        for insight, feedback in insights_query:
-            if insight.sentiment_score is not None:
-                sentiment_item = TopSentimentFeedback(
-                    feedback=feedback.message,
-                    sentiment_score=insight.sentiment_score,
-                    timestamp=feedback.timestamp
-                )
-                
-                if insight.sentiment_score > 0:
-                    positive_feedback.append(sentiment_item)
-                elif insight.sentiment_score < 0:
-                    negative_feedback.append(sentiment_item)
-            
-            # Collect themes
-            if insight.themes:
-                try:
-                    themes = json.loads(insight.themes)
-                    all_themes.extend(themes)
-                except json.JSONDecodeError:
-                    pass
-            
-            # Collect recommendations
-            if insight.recommendations:
-                try:
-                    recommendations = json.loads(insight.recommendations)
-                    all_recommendations.extend(recommendations)
-                except json.JSONDecodeError:
-                    pass
-        
-        # Sort and get top 5 positive and negative
-        top_positive = sorted(positive_feedback, key=lambda x: x.sentiment_score, reverse=True)[:5]
-        top_negative = sorted(negative_feedback, key=lambda x: x.sentiment_score)[:5]
-        
-        # Count themes and get top themes
-        theme_counts = Counter(all_themes)
-        themes = [ThemeCount(theme=theme, count=count) for theme, count in theme_counts.most_common(10)]
-        
-        # Get unique recommendations with priority
-        unique_recommendations = list(set(all_recommendations))
-        recommendations = [
-            Recommendation(recommendation=rec, priority="high" if "urgent" in rec.lower() or "critical" in rec.lower() else "medium")
-            for rec in unique_recommendations[:10]
-        ]
-        
-        return InsightsAnalytics(
-            top_positive=top_positive,
-            top_negative=top_negative,
-            themes=themes,
-            recommendations=recommendations
-        )
+        queries = analytics_queries()
+        if themes == "approx":
+            del queries["themes"]
+        rows = {name: db.execute(query).all() for name, query in queries.items()}
+        
+        segments_query = representative_segments_query(rows["clusters"])
+        if segments_query is not None:
+            rows["clusters"] = fill_representatives(rows["clusters"], db.execute(segments_query).all())
+        
+        theme_sketch = None
+        if themes == "approx":
+            rows["themes"], theme_sketch = approximate_themes(db, window)
+        return build_insights_analytics(rows, theme_sketch)
         
+    except ArchiveError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve insights: {str(e)}")
+
+@app.get("/api/insights/trends", response_model=InsightTrends, dependencies=[Depends(etag_guard)])
+def get_insight_trends(
+    bucket: Literal["hour", "day"] = "day",
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    themes: int = Query(3, ge=0, le=20),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Sentiment, priority and theme trends per hour or day
+    
+    Returns the buckets overlapping [from, to] from the rollup tables
+    maintained by insight_trends, with the top `themes` themes of each.
+    """
+    date_from, date_to = to_naive_utc(date_from), to_naive_utc(date_to)
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    try:
+        queries = trend_queries(bucket, date_from, date_to, themes)
+        return build_insight_trends(bucket, {name: db.execute(query).all() for name, query in queries.items()})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve insight trends: {str(e)}")
+
+@app.get("/api/insights/distribution", response_model=InsightDistribution, dependencies=[Depends(etag_guard)])
+def get_insight_distribution(
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    bins: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Sentiment and priority score distributions, overall and per sentiment label
+    
+    Computed with NumPy over the columnar insight snapshot maintained by
+    insight_snapshot, for insights whose feedback timestamp is in [from, to].
+    """
+    date_from, date_to = to_naive_utc(date_from), to_naive_utc(date_to)
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    try:
+        return insight_distribution(refresh_snapshot(db), date_from, date_to, bins)
+    except ArchiveError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve insight distribution: {str(e)}")
+
+@app.get("/api/events")
+async def stream_events(last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events: completed insights and aggregate changes
+    
+    See event_stream for the event types. Reconnecting clients send
+    Last-Event-ID and get the events they missed replayed.
+    """
+    try:
+        queue = broker.subscribe(last_event_id)
+    except TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many open event streams", headers={"Retry-After": "30"})
+    
+    return StreamingResponse(
+        broker.stream(queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Async mode: the feedback and insights routes run as async handlers on async sessions
+if DATABASE_ASYNC:
+    from async_api import use_async_routes
+    from async_database import dispose_async_engines
+    
+    use_async_routes(app)
+    
+    @app.on_event("shutdown")
+    async def async_shutdown_event():
+        await dispose_async_engines()
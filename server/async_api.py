@@ -0,0 +1,274 @@
+"""
+Async feedback and insights routes
+
+With DATABASE_ASYNC set, use_async_routes swaps these handlers in for the
+sync ones in app.py with the same path and method. They build the same
+select statements (feedback_query, insight_aggregates, insight_trends)
+and share the submission code (feedback_store), but await an AsyncSession
+instead of blocking a threadpool worker, so one process can keep many
+more requests in flight. Analysis never runs in the request: submissions
+only queue insight jobs and wake the workers, which analyze on the
+analysis executor.
+
+Reads of archived segments (see feedback_archive) are blocking file I/O,
+so they run in the threadpool.
+
+The export route stays sync: it streams from a server-side cursor that
+already does its blocking reads in the threadpool.
+"""
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admission import QueueSaturated, admit_feedback
+from async_database import get_async_db, get_async_read_db
+from data_version import check_etag, data_version_query, format_etag
+from feedback_archive import ArchiveError, feedback_segments_query, fill_representatives, merge_feedback_page, representative_segments_query
+from feedback_json import feedback_json_response
+from feedback_query import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    InvalidCursor,
+    build_feedback_page_query,
+    paginate,
+)
+from feedback_search import InvalidSearchQuery, build_feedback_search_query
+from feedback_store import InvalidFeedback, clean_batch, clean_message, store_feedback
+from insight_aggregates import analytics_queries, build_insights_analytics
+from insight_snapshot import insight_distribution, refresh_snapshot
+from insight_trends import build_insight_trends, to_naive_utc, trend_queries
+from insight_jobs import wake_workers
+from models import (
+    FeedbackBatchCreate,
+    FeedbackCreate,
+    FeedbackResponse,
+    FeedbackWithInsights,
+    InsightDistribution,
+    InsightsAnalytics,
+    InsightTrends,
+)
+from theme_sketch import approximate_themes
+
+router = APIRouter()
+
+async def async_etag_guard(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Dependency answering conditional GETs from the data version alone (see data_version.etag_guard)
+    """
+    check_etag(request, response, format_etag((await db.execute(data_version_query())).first()))
+
+@router.post("/api/feedback", response_model=FeedbackResponse, status_code=201)
+async def submit_feedback(feedback: FeedbackCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Submit new feedback message and queue it for insight processing
+    """
+    try:
+        messages = [clean_message(feedback.message)]
+        queued = await db.run_sync(admit_feedback, len(messages))
+        created = await db.run_sync(store_feedback, messages, not queued)
+        await db.commit()
+        if queued:
+            wake_workers()
+        return created[0]
+    except InvalidFeedback as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to submit feedback: {str(e)}")
+
+@router.post("/api/feedback/batch", response_model=List[FeedbackResponse], status_code=201)
+async def submit_feedback_batch(batch: FeedbackBatchCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Submit many feedback messages in one transaction and queue them for analysis
+    """
+    try:
+        messages = clean_batch(batch.messages)
+        queued = await db.run_sync(admit_feedback, len(messages))
+        created = await db.run_sync(store_feedback, messages, not queued)
+        await db.commit()
+        if queued:
+            wake_workers()
+        return created
+    except InvalidFeedback as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to submit feedback batch: {str(e)}")
+
+@router.get("/api/feedback", response_model=List[FeedbackWithInsights], dependencies=[Depends(async_etag_guard)])
+async def get_all_feedback(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["created_at", "sentiment_score", "priority_score"] = "created_at",
+    order: Literal["asc", "desc"] = "desc",
+    sentiment_label: Optional[str] = None,
+    priority_level: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Retrieve one page of feedback messages with their insights
+    """
+    try:
+        query = build_feedback_page_query(
+            sort=sort,
+            order=order,
+            cursor=cursor,
+            limit=limit,
+            sentiment_label=sentiment_label,
+            priority_level=priority_level,
+            theme=theme,
+            date_from=date_from,
+            date_to=date_to
+        )
+        rows = (await db.execute(query)).all()
+        segments = (await db.execute(feedback_segments_query(sort, order, cursor, date_from, date_to))).all()
+        if segments:
+            rows = await run_in_threadpool(merge_feedback_page, rows, segments, query, sort, order, limit)
+        rows, next_cursor = paginate(rows, sort, order, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return feedback_json_response(rows, response)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ArchiveError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve feedback: {str(e)}")
+
+@router.get("/api/feedback/search", response_model=List[FeedbackWithInsights], dependencies=[Depends(async_etag_guard)])
+async def search_feedback(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sentiment_label: Optional[str] = None,
+    priority_level: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Full-text search over feedback messages, best match first
+    """
+    try:
+        query = build_feedback_search_query(
+            q,
+            cursor=cursor,
+            limit=limit,
+            sentiment_label=sentiment_label,
+            priority_level=priority_level,
+            theme=theme,
+            date_from=date_from,
+            date_to=date_to
+        )
+        rows, next_cursor = paginate((await db.execute(query)).all(), "rank", "asc", limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return feedback_json_response(rows, response)
+    except (InvalidCursor, InvalidSearchQuery) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to search feedback: {str(e)}")
+
+@router.get("/api/insights", response_model=InsightsAnalytics, dependencies=[Depends(async_etag_guard)])
+async def get_insights_analytics(
+    themes: Literal["exact", "approx"] = "exact",
+    window: Literal["24h", "7d"] = "24h",
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Retrieve processed insights and analytics from the aggregate tables, or approximate themes from the theme sketches
+    """
+    try:
+        queries = analytics_queries()
+        if themes == "approx":
+            del queries["themes"]
+        rows = {name: (await db.execute(query)).all() for name, query in queries.items()}
+        
+        segments_query = representative_segments_query(rows["clusters"])
+        if segments_query is not None:
+            segments = (await db.execute(segments_query)).all()
+            rows["clusters"] = await run_in_threadpool(fill_representatives, rows["clusters"], segments)
+        
+        theme_sketch = None
+        if themes == "approx":
+            rows["themes"], theme_sketch = await db.run_sync(approximate_themes, window)
+        return build_insights_analytics(rows, theme_sketch)
+    except ArchiveError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve insights: {str(e)}")
+
+@router.get("/api/insights/trends", response_model=InsightTrends, dependencies=[Depends(async_etag_guard)])
+async def get_insight_trends(
+    bucket: Literal["hour", "day"] = "day",
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    themes: int = Query(3, ge=0, le=20),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Sentiment, priority and theme trends per hour or day from the rollup tables
+    """
+    date_from, date_to = to_naive_utc(date_from), to_naive_utc(date_to)
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    try:
+        queries = trend_queries(bucket, date_from, date_to, themes)
+        return build_insight_trends(bucket, {name: (await db.execute(query)).all() for name, query in queries.items()})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve insight trends: {str(e)}")
+
+@router.get("/api/insights/distribution", response_model=InsightDistribution, dependencies=[Depends(async_etag_guard)])
+async def get_insight_distribution(
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    bins: int = Query(20, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Sentiment and priority score distributions from the columnar insight snapshot
+    """
+    date_from, date_to = to_naive_utc(date_from), to_naive_utc(date_to)
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    try:
+        parts = await db.run_sync(refresh_snapshot)
+        return await run_in_threadpool(insight_distribution, parts, date_from, date_to, bins)
+    except ArchiveError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve insight distribution: {str(e)}")
+
+def use_async_routes(app):
+    """
+    Replace the app's routes that have an async counterpart in this module
+    """
+    replaced = {(route.path, method) for route in router.routes for method in route.methods}
+    app.router.routes = [
+        route for route in app.router.routes
+        if not (isinstance(route, APIRoute) and any((route.path, method) in replaced for method in route.methods))
+    ]
+    # Registered on the app itself so app.dependency_overrides apply to them
+    for route in router.routes:
+        app.add_api_route(
+            route.path,
+            route.endpoint,
+            methods=list(route.methods),
+            response_model=route.response_model,
+            status_code=route.status_code,
+            dependencies=route.dependencies,
+        )
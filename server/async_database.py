@@ -0,0 +1,72 @@
+"""
+Async database engines and sessions
+
+Used when DATABASE_ASYNC is set: the feedback and insights routes (see
+async_api.py) then run as async handlers on the event loop instead of
+occupying a threadpool worker per request. The engines use the same URLs,
+pool sizes and SQLite pragmas as the sync engines in database.py, with
+SQLite reached through the aiosqlite driver.
+"""
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import (
+    DB_POOL_SIZE,
+    DB_READ_POOL_SIZE,
+    SQLALCHEMY_DATABASE_URL,
+    SQLALCHEMY_READ_DATABASE_URL,
+    is_memory_database,
+    engine_options,
+    install_sqlite_pragmas,
+)
+
+# Async drivers for the sync URLs configured in database.py
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    """
+    The async driver URL for a database URL; URLs naming an async driver are kept
+    """
+    scheme, separator, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+def create_async_database_engine(url: str, pool_size: int = DB_POOL_SIZE, read_only: bool = False):
+    """
+    Create an async engine with the pool settings and, on SQLite, the connection pragmas
+    """
+    engine = create_async_engine(to_async_url(url), **engine_options(url, pool_size))
+    if url.startswith("sqlite"):
+        install_sqlite_pragmas(engine.sync_engine, url, read_only=read_only)
+    return engine
+
+async_engine = create_async_database_engine(SQLALCHEMY_DATABASE_URL, pool_size=DB_POOL_SIZE)
+
+# An in-memory database exists once per connection, so it cannot have a separate read engine
+if is_memory_database(SQLALCHEMY_DATABASE_URL):
+    async_read_engine = async_engine
+else:
+    async_read_engine = create_async_database_engine(SQLALCHEMY_READ_DATABASE_URL, pool_size=DB_READ_POOL_SIZE, read_only=True)
+
+# Objects stay readable after commit without a reload, which would need an await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+# Async database dependency
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Async read-only database dependency for endpoints that do not write
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+async def dispose_async_engines():
+    """
+    Close the pooled async connections (on shutdown)
+    """
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
@@ -0,0 +1,11 @@
+"""
+Performance benchmarks for the feedback server
+
+Run from the server directory:
+
+    python -m benchmarks                  # pipeline micro-benchmarks and API at 1k rows
+    python -m benchmarks --sizes 1k,100k  # API benchmarks at several dataset sizes
+    python -m benchmarks.keyword_matcher  # keyword rule matcher comparison
+
+See benchmarks/__main__.py for baseline comparison options.
+"""
@@ -0,0 +1,70 @@
+"""
+Benchmark runner
+
+Usage:
+    python -m benchmarks [--suite micro|api|all] [--sizes 1k,100k,1m]
+                         [--baseline PATH] [--save-baseline] [--threshold 0.25]
+
+Results are written to --output. When a baseline file exists the run is
+compared against it, and the exit status is 1 if any benchmark is slower
+than its baseline by more than --threshold. --save-baseline stores this
+run as the new baseline instead.
+"""
+import argparse
+import os
+import sys
+
+from benchmarks.harness import DEFAULT_THRESHOLD, compare, format_report, load_results, save_results
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run the feedback server benchmarks")
+    parser.add_argument("--suite", choices=["micro", "api", "all"], default="all")
+    parser.add_argument("--sizes", default="1k", help="comma separated dataset sizes for the API suite: 1k, 100k, 1m")
+    parser.add_argument("--repeat", type=int, default=10, help="timed samples per benchmark")
+    parser.add_argument("--data-dir", default=os.path.join(BENCHMARKS_DIR, "data"),
+                        help="where generated benchmark databases are cached")
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "latest.json"))
+    parser.add_argument("--baseline", default=os.path.join(BENCHMARKS_DIR, "results", "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown fraction reported as a regression")
+    args = parser.parse_args(argv)
+    
+    results = {}
+    if args.suite in ("micro", "all"):
+        from benchmarks import pipeline
+        
+        results.update(pipeline.run(repeat=args.repeat))
+    if args.suite in ("api", "all"):
+        from benchmarks import api
+        
+        sizes = [size.strip().lower() for size in args.sizes.split(",") if size.strip()]
+        results.update(api.run(sizes, args.data_dir, repeat=args.repeat))
+    
+    save_results(args.output, results)
+    print(f"Results written to {args.output}")
+    
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    
+    baseline = load_results(args.baseline)
+    if baseline is None:
+        print(format_report(compare(results, {}, args.threshold)))
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+    
+    # Only compare benchmarks that ran, so a partial run does not report everything else as skipped
+    rows = [row for row in compare(results, baseline, args.threshold) if row[0] in results]
+    print(format_report(rows))
+    regressions = [row[0] for row in rows if row[3] == "regression"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
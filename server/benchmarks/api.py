@@ -0,0 +1,93 @@
+"""
+Macro-benchmarks for the read endpoints
+
+Each dataset size gets its own cached SQLite database (see corpus.py). The
+app is driven in-process through the FastAPI test client with its database
+dependency pointed at that file, so the timings cover routing, the queries
+and serialization, but not the network.
+"""
+import os
+from typing import Dict, List
+
+# The benchmark drives the app directly: no worker threads or model warmup
+os.environ.setdefault("INSIGHT_WORKERS", "0")
+os.environ.setdefault("MODEL_WARMUP", "0")
+
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.corpus import open_database
+from benchmarks.harness import measure
+
+# Pages followed before timing a deep page
+DEEP_PAGE = 20
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.url} returned {response.status_code}: {response.text[:200]}")
+    return response
+
+def run_size(size: str, data_dir: str, repeat: int = 20) -> Dict[str, Dict]:
+    """
+    Benchmark the endpoints against one dataset size
+    Returns: {benchmark name: timing dict}
+    """
+    from fastapi.testclient import TestClient
+    
+    from app import app
+    from database import get_db, get_read_db
+    
+    engine = open_database(data_dir, size)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    # No context manager: startup events would create tables and workers for the real database
+    client = TestClient(app)
+    try:
+        # Walk to a deep page once so its cursor can be replayed
+        cursor = None
+        for _ in range(DEEP_PAGE):
+            response = _check(client.get("/api/feedback", params={"limit": 100, **({"cursor": cursor} if cursor else {})}))
+            next_cursor = response.headers.get("x-next-cursor")
+            if not next_cursor:
+                break
+            cursor = next_cursor
+        
+        requests = {
+            "feedback.first_page": ("/api/feedback", {"limit": 100}),
+            "feedback.deep_page": ("/api/feedback", {"limit": 100, **({"cursor": cursor} if cursor else {})}),
+            "feedback.sort_priority": ("/api/feedback", {"limit": 100, "sort": "priority_score"}),
+            "feedback.filter_negative": ("/api/feedback", {"limit": 100, "sentiment_label": "negative"}),
+            "feedback.filter_theme": ("/api/feedback", {"limit": 100, "theme": "checkout"}),
+            "feedback.search": ("/api/feedback/search", {"limit": 100, "q": "checkout"}),
+            "feedback.search_phrase": ("/api/feedback/search", {"limit": 100, "q": '"checkout page"', "sentiment_label": "negative"}),
+            "insights": ("/api/insights", {}),
+            "insights.trends_day": ("/api/insights/trends", {}),
+            "insights.trends_hour": ("/api/insights/trends", {"bucket": "hour"}),
+        }
+        
+        results = {}
+        for name, (path, params) in requests.items():
+            results[f"api.{size}.{name}"] = measure(lambda: _check(client.get(path, params=params)), repeat=repeat)
+        return results
+    finally:
+        client.close()
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_read_db, None)
+        engine.dispose()
+
+def run(sizes: List[str], data_dir: str, repeat: int = 20) -> Dict[str, Dict]:
+    """
+    Run the macro-benchmarks for every requested size
+    """
+    results = {}
+    for size in sizes:
+        results.update(run_size(size, data_dir, repeat))
+    return results
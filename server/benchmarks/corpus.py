@@ -0,0 +1,220 @@
+"""
+Deterministic synthetic feedback corpus
+
+generate_feedback yields the same messages for the same seed on every
+machine: a mix of short, medium and long messages with positive, negative
+and neutral wording, product topics, and the revenue/blocker/usability/
+first-time-user keywords the priority rules look for.
+
+build_database loads a corpus into a SQLite file with synthetic insights
+derived from the generator's metadata (no NLP models needed), then runs
+the migrations so the theme index and aggregate tables are filled the same
+way as on a real deployment. Databases are cached by size and seed.
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+from sqlalchemy import create_engine, func, insert, select
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+# Bump when the generator output changes so cached databases are rebuilt
+CORPUS_VERSION = 1
+
+DEFAULT_SEED = 42
+
+# Share of messages that repeat a recent message
+DUPLICATE_RATE = 0.2
+
+# Rows inserted per executemany call when building a database
+INSERT_CHUNK_SIZE = 5000
+
+TOPICS = [
+    "checkout", "dashboard", "search", "login", "notifications", "reports", "profile",
+    "payment", "onboarding", "export", "settings", "mobile app", "billing", "invoice",
+    "navigation", "performance", "sync", "filters", "integration", "support",
+]
+
+POSITIVE_TEMPLATES = [
+    "I love the new {topic}, it is amazing.",
+    "The {topic} works great and looks beautiful.",
+    "Really happy with how fast the {topic} is now.",
+    "Excellent {topic}, thank you for the update!",
+    "The {topic} feature is very useful and easy to use.",
+]
+
+NEGATIVE_TEMPLATES = [
+    "The {topic} is broken and I am unable to finish my work.",
+    "{topic} keeps failing with an error every time.",
+    "Terrible experience with the {topic}, it is so slow.",
+    "The {topic} is confusing and too many steps are needed.",
+    "I can't use the {topic} since the last release, it sucks.",
+    "Payment fails on the {topic} page and checkout is not working.",
+]
+
+NEUTRAL_TEMPLATES = [
+    "I used the {topic} today.",
+    "Is there an option to change the {topic} layout?",
+    "The {topic} shows the same data as before.",
+    "Please add a tool to export the {topic}.",
+    "It would be nice to have more functionality in the {topic}.",
+]
+
+DETAIL_SENTENCES = [
+    "This was my first time using it.",
+    "I am a new user and getting started took a while.",
+    "We use it every day across the team.",
+    "The billing page also looked different.",
+    "Support answered quickly.",
+    "It happens on both desktop and mobile.",
+    "Our transaction history was missing a few entries.",
+    "The user experience could be smoother overall.",
+    "Everything else works as expected.",
+    "I have attached a screenshot to the ticket.",
+]
+
+SENTIMENTS = (
+    ("positive", POSITIVE_TEMPLATES, 0.35, (0.2, 0.9)),
+    ("negative", NEGATIVE_TEMPLATES, 0.40, (-0.9, -0.2)),
+    ("neutral", NEUTRAL_TEMPLATES, 0.25, (-0.1, 0.1)),
+)
+
+def _length_class(rng: random.Random) -> int:
+    """
+    Number of extra detail sentences: mostly short messages, a long tail
+    """
+    roll = rng.random()
+    if roll < 0.6:
+        return 0
+    if roll < 0.9:
+        return rng.randint(1, 4)
+    return rng.randint(10, 40)
+
+def generate_feedback(count: int, seed: int = DEFAULT_SEED) -> Iterator[Dict]:
+    """
+    Yield count synthetic feedback records
+    Each record has: message, sentiment_label, sentiment_score, themes, created_at
+    """
+    rng = random.Random(seed)
+    weights = [weight for _, _, weight, _ in SENTIMENTS]
+    end = datetime(2024, 6, 1)
+    recent: List[Dict] = []
+    
+    for index in range(count):
+        created_at = end - timedelta(seconds=(count - index) * 90 + rng.randint(0, 60))
+        
+        # About a fifth of the feedback repeats a recent message (retries, copy-paste)
+        if recent and rng.random() < DUPLICATE_RATE:
+            yield dict(rng.choice(recent), created_at=created_at)
+            continue
+        
+        label, templates, _, (low, high) = rng.choices(SENTIMENTS, weights)[0]
+        topic = rng.choice(TOPICS)
+        opening = rng.choice(templates).format(topic=topic)
+        sentences = [opening[0].upper() + opening[1:]]
+        sentences.extend(rng.choice(DETAIL_SENTENCES) for _ in range(_length_class(rng)))
+        
+        record = {
+            "message": " ".join(sentences),
+            "sentiment_label": label,
+            "sentiment_score": round(rng.uniform(low, high), 3),
+            "themes": [topic] + rng.sample(["app", "update", "experience", "team", "page"], rng.randint(0, 2)),
+            "created_at": created_at,
+        }
+        recent.append(record)
+        if len(recent) > 1000:
+            recent.pop(0)
+        yield record
+
+def sample_messages(count: int = 200, seed: int = DEFAULT_SEED) -> List[str]:
+    """
+    First count messages of the corpus, used by the micro-benchmarks
+    """
+    return [record["message"] for record in generate_feedback(count, seed)]
+
+def database_path(data_dir: str, size: str, seed: int = DEFAULT_SEED) -> str:
+    return os.path.join(data_dir, f"feedback_{size}_s{seed}_v{CORPUS_VERSION}.db")
+
+def build_database(path: str, count: int, seed: int = DEFAULT_SEED, verbose: bool = True):
+    """
+    Create a SQLite database at path holding count feedback rows with insights
+    Returns: the SQLAlchemy engine
+    """
+    import json
+    
+    from database import Base, Feedback, Insight
+    from feedback_pipeline import calculate_priority_score, classify_priority_level, generate_recommendations
+    from migrations import run_migrations
+    
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if os.path.exists(path):
+        with engine.connect() as connection:
+            existing = connection.execute(select(func.count()).select_from(Insight)).scalar_one()
+        if existing == count:
+            # Derived tables added since the database was cached are filled by their migrations
+            Base.metadata.create_all(engine)
+            run_migrations(engine)
+            return engine
+        engine.dispose()
+        os.remove(path)
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    
+    started = time.perf_counter()
+    Base.metadata.create_all(engine)
+    
+    feedback_rows = []
+    insight_rows = []
+    
+    def flush(connection):
+        connection.execute(insert(Feedback), feedback_rows)
+        connection.execute(insert(Insight), insight_rows)
+        feedback_rows.clear()
+        insight_rows.clear()
+    
+    with engine.begin() as connection:
+        # Bulk-load settings; the file is a disposable benchmark fixture
+        connection.exec_driver_sql("PRAGMA synchronous = OFF")
+        connection.exec_driver_sql("PRAGMA journal_mode = MEMORY")
+        
+        for feedback_id, record in enumerate(generate_feedback(count, seed), start=1):
+            score = record["sentiment_score"]
+            priority_score = calculate_priority_score(record["message"], score)
+            feedback_rows.append({
+                "id": feedback_id,
+                "message": record["message"],
+                "timestamp": record["created_at"],
+                "created_at": record["created_at"],
+            })
+            insight_rows.append({
+                "feedback_id": feedback_id,
+                "sentiment_score": score,
+                "sentiment_label": record["sentiment_label"],
+                "themes": json.dumps(record["themes"]),
+                "recommendations": json.dumps(generate_recommendations(record["message"], score, record["themes"])),
+                "priority_score": priority_score,
+                "priority_level": classify_priority_level(priority_score),
+                "processed_at": record["created_at"],
+            })
+            if len(feedback_rows) >= INSERT_CHUNK_SIZE:
+                flush(connection)
+        if feedback_rows:
+            flush(connection)
+    
+    # Fill the theme index and aggregates exactly as a migrated deployment would
+    run_migrations(engine)
+    
+    if verbose:
+        print(f"Built {count} row benchmark database in {time.perf_counter() - started:.1f}s: {path}")
+    return engine
+
+def open_database(data_dir: str, size: str, seed: int = DEFAULT_SEED, verbose: bool = True):
+    """
+    Engine for the cached database of a named size, building it if needed
+    """
+    if size not in SIZES:
+        raise ValueError(f"Unknown dataset size: {size} (expected one of {', '.join(SIZES)})")
+    os.makedirs(data_dir, exist_ok=True)
+    return build_database(database_path(data_dir, size, seed), SIZES[size], seed, verbose)
@@ -0,0 +1,105 @@
+"""
+Insight distribution benchmark
+
+Compares computing GET /api/insights/distribution row by row over ORM
+Insight objects with the columnar snapshot in insight_snapshot, on the
+100k benchmark database. The snapshot is timed three ways: the first build
+from the database, a request whose data version did not change, and a
+request with a date range. The benchmark checks that both paths report the
+same counts, means and percentiles.
+
+Usage: python -m benchmarks.distribution [--repeat N] [--data-dir PATH]
+"""
+import argparse
+import math
+import os
+import timeit
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from database import Feedback, Insight
+from insight_snapshot import LABELS, PERCENTILES, InsightSnapshot, insight_distribution
+
+def _percentile(values: List[float], percentile: float) -> float:
+    """
+    Linearly interpolated percentile of sorted values, as numpy.percentile computes it
+    """
+    position = (len(values) - 1) * percentile / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def _summary(values: List[float]) -> Dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        **{f"p{p}": _percentile(values, p) if values else None for p in PERCENTILES},
+    }
+
+def row_distribution(db: Session) -> Dict:
+    """
+    Sentiment and per-label priority statistics computed one ORM row at a time
+    """
+    sentiment, priority = [], {label: [] for label in LABELS}
+    for insight, _ in db.query(Insight, Feedback.timestamp).join(Feedback, Feedback.id == Insight.feedback_id):
+        if insight.sentiment_score is not None:
+            sentiment.append(insight.sentiment_score)
+        if insight.sentiment_label in priority and insight.priority_score is not None:
+            priority[insight.sentiment_label].append(insight.priority_score)
+    return {"sentiment": _summary(sentiment), "labels": {label: _summary(values) for label, values in priority.items()}}
+
+def _comparable(data: Dict) -> Dict:
+    keys = ("count", "mean", *(f"p{p}" for p in PERCENTILES))
+    return {
+        "sentiment": {key: data["sentiment"][key] for key in keys},
+        "labels": {entry["label"]: {key: entry["priority"][key] for key in keys} for entry in data["labels"]},
+    }
+
+def run(engine, repeat: int = 5) -> Dict[str, float]:
+    """
+    Time both paths
+    Returns: {path: milliseconds per request}
+    """
+    with Session(engine) as db:
+        snapshot = InsightSnapshot()
+        expected = row_distribution(db)
+        actual = _comparable(insight_distribution(snapshot.refresh(db.connection())))
+        for name, summary in [("sentiment", expected["sentiment"]), *expected["labels"].items()]:
+            other = actual["sentiment"] if name == "sentiment" else actual["labels"][name]
+            if any(not math.isclose(summary[key] or 0, other[key] or 0, rel_tol=1e-9, abs_tol=1e-9) for key in summary):
+                raise AssertionError(f"snapshot statistics differ from the row path for {name}")
+        
+        timestamps = sorted(timestamp for (timestamp,) in db.query(Feedback.timestamp).filter(Feedback.timestamp.isnot(None)))
+        start, end = timestamps[len(timestamps) // 4], timestamps[len(timestamps) // 2]
+        
+        timings = {
+            "rows": lambda: row_distribution(db),
+            "snapshot build": lambda: InsightSnapshot().refresh(db.connection()),
+            "snapshot": lambda: insight_distribution(snapshot.refresh(db.connection())),
+            "snapshot range": lambda: insight_distribution(snapshot.refresh(db.connection()), start, end),
+        }
+        return {name: min(timeit.repeat(function, number=1, repeat=repeat)) * 1000 for name, function in timings.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark insight distribution analytics")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions, best is reported")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+                        help="where generated benchmark databases are cached")
+    args = parser.parse_args()
+    
+    from benchmarks.corpus import open_database
+    
+    engine = open_database(args.data_dir, "100k")
+    try:
+        timings = run(engine, args.repeat)
+    finally:
+        engine.dispose()
+    rows = timings["rows"]
+    print("100k rows")
+    for name, millis in timings.items():
+        print(f"  {name:<16}{millis:10.1f} ms  {rows / millis:6.2f}x")
+
+if __name__ == "__main__":
+    main()
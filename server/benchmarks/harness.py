@@ -0,0 +1,108 @@
+"""
+Timing, result files and baseline comparison shared by the benchmark suites
+"""
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# A benchmark slower than its baseline by more than this fraction is a regression
+DEFAULT_THRESHOLD = 0.25
+
+def measure(fn: Callable[[], object], repeat: int = 10, number: int = 1, per: int = 1, warmup: int = 1) -> Dict:
+    """
+    Time fn: repeat samples of number calls each, reported per call / per item
+    per: items processed by one call (e.g. messages in a batch), so results are per item
+    Returns: {"median_ms", "p95_ms", "min_ms", "samples"}
+    """
+    for _ in range(warmup):
+        fn()
+    
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) * 1000 / (number * per))
+    
+    samples.sort()
+    p95_index = min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))
+    return {
+        "median_ms": round(statistics.median(samples), 6),
+        "p95_ms": round(samples[p95_index], 6),
+        "min_ms": round(samples[0], 6),
+        "samples": len(samples),
+    }
+
+def environment() -> Dict:
+    """
+    Machine description stored with every result file
+    """
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "recorded_at": datetime.utcnow().isoformat(),
+    }
+
+def save_results(path: str, results: Dict[str, Dict]):
+    """
+    Write results with the environment they were recorded in
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as results_file:
+        json.dump({"environment": environment(), "results": results}, results_file, indent=2, sort_keys=True)
+        results_file.write("\n")
+
+def load_results(path: str) -> Optional[Dict[str, Dict]]:
+    """
+    Results stored by save_results, or None if the file does not exist
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as results_file:
+        return json.load(results_file)["results"]
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, Optional[float], Optional[float], str]]:
+    """
+    Compare median timings against a baseline
+    Returns: (name, baseline ms, current ms, status) per benchmark, where status is
+    "regression", "improved", "ok", "new", or "skipped" (no timing in this run)
+    """
+    rows = []
+    for name in sorted(set(results) | set(baseline)):
+        current = results.get(name, {}).get("median_ms")
+        previous = baseline.get(name, {}).get("median_ms")
+        if current is None:
+            status = "skipped"
+        elif previous is None:
+            status = "new"
+        elif current > previous * (1 + threshold):
+            status = "regression"
+        elif current < previous * (1 - threshold):
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, previous, current, status))
+    return rows
+
+def format_report(rows: List[Tuple[str, Optional[float], Optional[float], str]]) -> str:
+    """
+    Plain-text table of a comparison
+    """
+    def cell(value: Optional[float]) -> str:
+        return f"{value:12.4f}" if value is not None else f"{'-':>12}"
+    
+    lines = [f"{'benchmark':<48}{'baseline ms':>12}{'current ms':>12}  {'change':>8}  status"]
+    for name, previous, current, status in rows:
+        change = f"{(current / previous - 1) * 100:+7.1f}%" if previous and current is not None else f"{'':>8}"
+        lines.append(f"{name:<48}{cell(previous)}{cell(current)}  {change:>8}  {status}")
+    return "\n".join(lines)
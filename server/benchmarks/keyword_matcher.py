@@ -0,0 +1,94 @@
+"""
+Keyword matcher benchmark
+
+Compares the original per-keyword substring scans with the compiled
+single-pass matcher on short and long messages, and checks that both give
+the same priority points for every message.
+
+Usage: python -m benchmarks.keyword_matcher [--repeat N]
+"""
+import argparse
+import random
+import timeit
+from typing import Callable, Dict, List
+
+from keyword_rules import KeywordMatcher, KeywordRules, ahocorasick
+
+FILLER_WORDS = (
+    "the app is nice and the interface looks clean with good colors overall quite happy "
+    "about everything here although the dashboard could load reports a little faster"
+).split()
+
+def _legacy_points(rules: KeywordRules) -> Callable[[str], int]:
+    """
+    The scoring loop as it was before the rule table was compiled
+    """
+    def points(message: str) -> int:
+        message_lower = message.lower()
+        return sum(
+            rule.points for rule in rules.priority_rules
+            if any(keyword in message_lower for keyword in rule.keywords)
+        )
+    return points
+
+def _compiled_points(rules: KeywordRules, backend: str) -> Callable[[str], int]:
+    matcher = KeywordMatcher({rule.name: rule.keywords for rule in rules.priority_rules}, backend=backend)
+    
+    def points(message: str) -> int:
+        hits = matcher.matching_groups(message)
+        return sum(rule.points for rule in rules.priority_rules if rule.name in hits)
+    return points
+
+def build_messages(word_count: int, count: int = 20, seed: int = 7) -> List[str]:
+    """
+    Deterministic messages of filler words; half end with a keyword so both
+    the early-exit and full-scan paths are measured
+    """
+    rng = random.Random(seed)
+    messages = []
+    for index in range(count):
+        words = [rng.choice(FILLER_WORDS) for _ in range(word_count)]
+        if index % 2:
+            words.append("but checkout is broken")
+        messages.append(" ".join(words))
+    return messages
+
+def run(repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Time every implementation per message size
+    Returns: {size label: {implementation: microseconds per message}}
+    """
+    rules = KeywordRules.load()
+    implementations = {"legacy": _legacy_points(rules), "regex": _compiled_points(rules, "regex")}
+    if ahocorasick is not None:
+        implementations["aho-corasick"] = _compiled_points(rules, "aho-corasick")
+    
+    results = {}
+    for label, word_count in (("short (12 words)", 12), ("medium (200 words)", 200), ("long (2000 words)", 2000)):
+        messages = build_messages(word_count)
+        expected = [implementations["legacy"](message) for message in messages]
+        
+        results[label] = {}
+        for name, points in implementations.items():
+            if [points(message) for message in messages] != expected:
+                raise AssertionError(f"{name} disagrees with the legacy rules on {label} messages")
+            
+            number = max(1, 20000 // word_count)
+            elapsed = min(timeit.repeat(lambda: [points(message) for message in messages], number=number, repeat=repeat))
+            results[label][name] = elapsed / (number * len(messages)) * 1e6
+    
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the keyword rule matcher")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions, best is reported")
+    args = parser.parse_args()
+    
+    for label, timings in run(args.repeat).items():
+        legacy = timings["legacy"]
+        print(label)
+        for name, micros in timings.items():
+            print(f"  {name:<14}{micros:10.2f} us/message  {legacy / micros:5.2f}x")
+
+if __name__ == "__main__":
+    main()
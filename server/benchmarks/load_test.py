@@ -0,0 +1,225 @@
+"""
+Read latency under concurrent writes
+
+Usage:
+    python -m benchmarks.load_test [--size 1k|100k|1m] [--duration 5]
+                                   [--readers 4] [--writers 1] [--write-batch 32]
+
+Runs reader threads issuing feedback list and insights queries, first alone
+and then while writer processes store feedback with insights the way the
+insight workers do, against two copies of a benchmark database:
+
+- legacy: one engine, default rollback journal, as before the database layer
+  was tuned
+- tuned: the engines from database.create_database_engine (WAL, busy
+  timeout, separate read-only engine)
+
+With the rollback journal a commit locks readers out, so read latency
+climbs (or reads fail with "database is locked") while writes are in
+progress. In WAL mode it should stay flat.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.corpus import SIZES, database_path, open_database
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def _engines(mode: str, path: str):
+    """
+    (write engine, read engine) for a load test mode
+    """
+    from database import create_database_engine
+    
+    url = f"sqlite:///{path}"
+    if mode == "legacy":
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA journal_mode = DELETE")
+        return engine, engine
+    return create_database_engine(url), create_database_engine(url, read_only=True)
+
+def _reader(session_factory, stop: threading.Event, latencies: List[float], errors: List[str]):
+    from feedback_query import build_feedback_page_query
+    from database import ThemeAggregate
+    
+    while not stop.is_set():
+        started = time.perf_counter()
+        db = session_factory()
+        try:
+            db.execute(build_feedback_page_query(limit=100)).all()
+            db.query(ThemeAggregate).order_by(ThemeAggregate.count.desc()).limit(10).all()
+        except Exception as e:
+            errors.append(str(e).splitlines()[0])
+            continue
+        finally:
+            db.close()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+def _writer(mode: str, path: str, stop, batch_size: int, written, errors):
+    """
+    Writer process: store feedback with insights in batches until stopped
+    Runs in its own process so it competes with the readers for the database, not the GIL
+    """
+    import insight_aggregates  # noqa: F401 - registers the derived table hooks insight writes run
+    import insight_trends  # noqa: F401
+    import theme_index  # noqa: F401
+    from database import Feedback, Insight
+    
+    write_engine, read_engine = _engines(mode, path)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=write_engine)
+    counter = 0
+    while not stop.is_set():
+        db = session_factory()
+        try:
+            for _ in range(batch_size):
+                counter += 1
+                feedback = Feedback(message=f"Load test feedback {os.getpid()} {counter}")
+                db.add(feedback)
+                db.add(Insight(
+                    feedback=feedback,
+                    sentiment_score=0.4,
+                    sentiment_label="positive",
+                    themes='["load test"]',
+                    recommendations='["Follow up with user to gather more specific feedback"]',
+                    priority_score=5,
+                    priority_level="LOW",
+                ))
+            db.commit()
+            with written.get_lock():
+                written.value += batch_size
+        except Exception as e:
+            db.rollback()
+            errors.put(str(e).splitlines()[0])
+        finally:
+            db.close()
+    write_engine.dispose()
+    read_engine.dispose()
+
+def run_phase(mode: str, path: str, read_engine, readers: int, writers: int, duration: float, write_batch: int) -> Dict:
+    """
+    Run reader threads (and writer processes) for duration seconds
+    Returns: read latency percentiles, read/write errors and rows written
+    """
+    context = multiprocessing.get_context("spawn")
+    read_sessions = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    stop = threading.Event()
+    write_stop = context.Event()
+    written = context.Value("i", 0)
+    write_errors = context.Queue()
+    latencies: List[float] = []
+    read_errors: List[str] = []
+    
+    processes = [
+        context.Process(target=_writer, args=(mode, path, write_stop, write_batch, written, write_errors), daemon=True)
+        for _ in range(writers)
+    ]
+    for process in processes:
+        process.start()
+    # Give the writers time to start before reads are measured
+    time.sleep(1 if writers else 0)
+    
+    threads = [
+        threading.Thread(target=_reader, args=(read_sessions, stop, latencies, read_errors), daemon=True)
+        for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    write_stop.set()
+    for process in processes:
+        process.join()
+    
+    errors = list(read_errors)
+    write_error_count = 0
+    while not write_errors.empty():
+        errors.append(write_errors.get())
+        write_error_count += 1
+    return {
+        "reads": len(latencies),
+        "read_p50_ms": round(_percentile(latencies, 0.5), 3),
+        "read_p95_ms": round(_percentile(latencies, 0.95), 3),
+        "read_p99_ms": round(_percentile(latencies, 0.99), 3),
+        "read_max_ms": round(max(latencies), 3) if latencies else 0.0,
+        "read_errors": len(read_errors),
+        "rows_written": written.value,
+        "write_errors": write_error_count,
+        "first_error": errors[0] if errors else None,
+    }
+
+def run(size: str = "1k", data_dir: str = os.path.join(BENCHMARKS_DIR, "data"), duration: float = 5,
+        readers: int = 4, writers: int = 1, write_batch: int = 32) -> Dict[str, Dict]:
+    """
+    Run the idle and under-writes phases for the legacy and tuned database setups
+    Returns: {"<mode>.<phase>": phase results}
+    """
+    open_database(data_dir, size).dispose()
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for mode in ("legacy", "tuned"):
+            path = os.path.join(scratch, f"{mode}.db")
+            shutil.copyfile(database_path(data_dir, size), path)
+            write_engine, read_engine = _engines(mode, path)
+            try:
+                results[f"{mode}.idle"] = run_phase(mode, path, read_engine, readers, 0, duration, write_batch)
+                results[f"{mode}.under_writes"] = run_phase(mode, path, read_engine, readers, writers, duration, write_batch)
+            finally:
+                write_engine.dispose()
+                read_engine.dispose()
+    return results
+
+def format_results(results: Dict[str, Dict]) -> str:
+    """
+    Plain-text table of load test results
+    """
+    lines = [f"{'run':<22}{'reads':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+             f"{'read err':>10}{'written':>10}{'write err':>10}"]
+    for name, result in results.items():
+        lines.append(
+            f"{name:<22}{result['reads']:>8}{result['read_p50_ms']:>10.2f}{result['read_p95_ms']:>10.2f}"
+            f"{result['read_p99_ms']:>10.2f}{result['read_max_ms']:>10.2f}{result['read_errors']:>10}"
+            f"{result['rows_written']:>10}{result['write_errors']:>10}"
+        )
+    errors = [f"{name}: {result['first_error']}" for name, result in results.items() if result["first_error"]]
+    if errors:
+        lines.append("First errors:")
+        lines.extend(f"  {error}" for error in errors)
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_test",
+                                     description="Compare read latency with and without concurrent writes")
+    parser.add_argument("--size", choices=list(SIZES), default="1k", help="benchmark dataset size")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per phase")
+    parser.add_argument("--readers", type=int, default=4, help="reader threads")
+    parser.add_argument("--writers", type=int, default=1, help="writer threads in the under_writes phase")
+    parser.add_argument("--write-batch", type=int, default=32, help="feedback rows per write transaction")
+    parser.add_argument("--data-dir", default=os.path.join(BENCHMARKS_DIR, "data"),
+                        help="where generated benchmark databases are cached")
+    args = parser.parse_args(argv)
+    
+    results = run(args.size, args.data_dir, args.duration, args.readers, args.writers, args.write_batch)
+    print(format_results(results))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
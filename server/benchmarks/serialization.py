@@ -0,0 +1,85 @@
+"""
+Feedback list serialization benchmark
+
+Compares the model path GET /api/feedback used to take with the direct
+encoding in feedback_json. The model path builds a dict, then a
+FeedbackWithInsights, per row, and then validates and serializes the list
+against response_model the way FastAPI does. Both run on the first 10k and
+100k rows of the 100k benchmark database, and the benchmark checks that
+they produce the same bytes.
+
+Usage: python -m benchmarks.serialization [--repeat N] [--data-dir PATH]
+"""
+import argparse
+import os
+import timeit
+from typing import Callable, Dict, List
+
+from pydantic import TypeAdapter
+
+from feedback_json import encode_feedback_rows, orjson
+from feedback_query import build_feedback_export_query, row_to_feedback
+from models import FeedbackWithInsights
+
+ROW_COUNTS = {"10k": 10_000, "100k": 100_000}
+
+def _model_path() -> Callable[[List], bytes]:
+    """
+    Per-row models, then response_model validation and JSON serialization
+    """
+    response_model = TypeAdapter(List[FeedbackWithInsights])
+    
+    def encode(rows: List) -> bytes:
+        content = [FeedbackWithInsights(**row_to_feedback(row)) for row in rows]
+        return response_model.dump_json(response_model.validate_python(content))
+    return encode
+
+def load_rows(data_dir: str) -> List:
+    """
+    Feedback list rows of the 100k benchmark database, oldest first
+    """
+    from benchmarks.corpus import open_database
+    
+    engine = open_database(data_dir, "100k")
+    try:
+        with engine.connect() as connection:
+            return connection.execute(build_feedback_export_query()).all()
+    finally:
+        engine.dispose()
+
+def run(rows: List, repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Time both paths per row count
+    Returns: {row count label: {path: milliseconds per response}}
+    """
+    implementations = {"models": _model_path(), "direct": encode_feedback_rows}
+    
+    results = {}
+    for label, count in ROW_COUNTS.items():
+        page = rows[:count]
+        if implementations["direct"](page) != implementations["models"](page):
+            raise AssertionError(f"direct encoding differs from the model path on {label} rows")
+        
+        results[label] = {}
+        for name, encode in implementations.items():
+            elapsed = min(timeit.repeat(lambda: encode(page), number=1, repeat=repeat))
+            results[label][name] = elapsed * 1000
+    
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feedback list serialization")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions, best is reported")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+                        help="where generated benchmark databases are cached")
+    args = parser.parse_args()
+    
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'json (orjson not installed)'}")
+    for label, timings in run(load_rows(args.data_dir), args.repeat).items():
+        models = timings["models"]
+        print(f"{label} rows")
+        for name, millis in timings.items():
+            print(f"  {name:<8}{millis:10.1f} ms  {models / millis:5.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+Offline bulk import of historical feedback
+
+Usage:
+    python -m bulk_import FILE [FILE ...] [--format csv|jsonl] [--batch-size 5000]
+                          [--workers N] [--database URL] [--restart] [--no-pragmas]
+
+Files are CSV with a header row or JSON Lines (optionally gzip compressed,
+*.gz), read as a stream. Each record needs a "message"; its "timestamp"
+(ISO 8601 or Unix seconds) is kept as the feedback's timestamp and
+created_at, so imported history sorts by when it was originally submitted.
+A separate "created_at" field is used when present.
+
+Records are analyzed on a pool of worker processes one batch ahead of the
+database writes, and each batch is inserted with executemany together with
+its theme index and aggregate updates. The import's own connections run
+with the BULK_LOAD_PRAGMAS; other connections to the database are not
+affected.
+
+Progress is checkpointed per file in import_checkpoints in the same
+transaction as each batch, so an interrupted import resumes after the last
+committed batch when run again, without duplicating rows.
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, String, create_engine, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from database import Base, Feedback, Insight
+
+# Records per executemany batch and checkpoint
+DEFAULT_BATCH_SIZE = 5000
+
+# Applied to every connection of the import engine. synchronous=OFF skips the
+# fsync per commit: an application crash is safe, but an OS crash or power
+# loss during the import can damage the database (use --no-pragmas to avoid)
+BULK_LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": "-262144",  # 256 MB
+}
+
+FORMATS = ("csv", "jsonl")
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+    
+    source = Column(String(1000), primary_key=True)  # Absolute path of the imported file
+    records_read = Column(Integer, nullable=False, default=0)  # Source records consumed, incl. skipped
+    rows_imported = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+def detect_format(path: str) -> str:
+    """
+    Source format from the file extension (csv or jsonl, optionally .gz)
+    """
+    name = path[:-3] if path.endswith(".gz") else path
+    extension = os.path.splitext(name)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Cannot tell the format of {path}; pass --format csv or --format jsonl")
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """
+    Parse a source timestamp into naive UTC
+    Accepts ISO 8601 strings (with or without offset) and Unix seconds
+    Returns: None for a missing value; raises ValueError for an invalid one
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+    
+    text = value.strip()
+    try:
+        return datetime.fromtimestamp(float(text), timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith("Z") else text)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+def read_records(path: str, format: str) -> Iterator[Dict]:
+    """
+    Stream raw records from a CSV or JSON Lines file
+    Yields: one dict per record; a JSONL line that is not an object yields {}
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported import format: {format}")
+    
+    with _open_text(path) as source:
+        if format == "csv":
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = {}
+            yield record if isinstance(record, dict) else {}
+
+def to_feedback_row(record: Dict) -> Optional[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """
+    (message, timestamp, created_at) of a source record, or None when it is unusable
+    """
+    message = record.get("message")
+    if not isinstance(message, str) or not message.strip():
+        return None
+    try:
+        timestamp = parse_timestamp(record.get("timestamp"))
+        created_at = parse_timestamp(record.get("created_at"))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    return message.strip(), timestamp or created_at, created_at or timestamp
+
+def _batches(records: Iterator[Dict], batch_size: int, skip: int) -> Iterator[Tuple[List, int, int]]:
+    """
+    Group usable records into batches after skipping the first skip records
+    Yields: (rows, source records consumed so far, records skipped in this batch)
+    """
+    position = 0
+    rows = []
+    skipped = 0
+    for record in records:
+        position += 1
+        if position <= skip:
+            continue
+        row = to_feedback_row(record)
+        if row is None:
+            skipped += 1
+        else:
+            rows.append(row)
+        if len(rows) >= batch_size:
+            yield rows, position, skipped
+            rows = []
+            skipped = 0
+    if rows or skipped:
+        yield rows, position, skipped
+
+def bulk_load_engine(url: str, pragmas: bool = True):
+    """
+    Engine for the import, with the bulk-load pragmas set on each connection
+    """
+    engine = create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {})
+    if pragmas and engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in BULK_LOAD_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+    return engine
+
+def prepare_database(engine):
+    """
+    Create missing tables and apply pending migrations on the target database
+    """
+    from migrations import run_migrations
+    
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+class _ImportedInsight(NamedTuple):
+    """
+    The insight fields index_insights, apply_insights and apply_trends read
+    """
+    id: int
+    feedback_id: int
+    sentiment_score: Optional[float]
+    sentiment_label: Optional[str]
+    priority_level: Optional[str]
+    themes: str
+    recommendations: str
+
+def _next_id(connection, table) -> int:
+    """
+    First free id of an AUTOINCREMENT table
+    
+    Explicit ids bypass the AUTOINCREMENT sequence, so the sequence is read
+    as well as the current maximum: archiving deletes the newest rows from
+    the hot table, and their ids must not be handed out again.
+    Returns: one above the larger of max(id) and the table's sqlite_sequence
+    """
+    highest = connection.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar_one()
+    sequence = connection.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = ?", (table.name,)).scalar()
+    return max(highest, sequence or 0) + 1
+
+def write_batch(connection, rows: List[Tuple[str, Optional[datetime], Optional[datetime]]], analyses: List[Dict]) -> int:
+    """
+    Insert a batch of feedback with its insights, theme index and aggregate updates
+    
+    Ids are assigned here above every id ever used (see _next_id), so both
+    inserts are plain executemany calls. The connection must already hold the
+    write lock (have written in this transaction) so no other writer can take
+    the same ids.
+    Returns: number of feedback rows inserted
+    """
+    from data_version import bump_data_version
+    from insight_aggregates import apply_insights
+    from insight_trends import apply_trends
+    from near_duplicates import assign_clusters
+    from theme_index import index_insights
+    from theme_sketch import sketch_themes, tracker
+    
+    if not rows:
+        return 0
+    
+    now = datetime.utcnow()
+    next_feedback_id = _next_id(connection, Feedback.__table__)
+    next_insight_id = _next_id(connection, Insight.__table__)
+    
+    connection.execute(insert(Feedback), [
+        {"id": next_feedback_id + offset, "message": message, "timestamp": timestamp or now, "created_at": created_at or now}
+        for offset, (message, timestamp, created_at) in enumerate(rows)
+    ])
+    
+    insights = [
+        _ImportedInsight(
+            next_insight_id + offset,
+            next_feedback_id + offset,
+            analysis["sentiment_score"],
+            analysis["sentiment_label"],
+            analysis["priority_level"],
+            json.dumps(analysis["themes"]),
+            json.dumps(analysis["recommendations"]),
+        )
+        for offset, analysis in enumerate(analyses)
+    ]
+    connection.execute(insert(Insight), [
+        {
+            "id": insight.id,
+            "feedback_id": insight.feedback_id,
+            "sentiment_score": insight.sentiment_score,
+            "sentiment_label": insight.sentiment_label,
+            "themes": insight.themes,
+            "recommendations": insight.recommendations,
+            "priority_score": analysis["priority_score"],
+            "priority_level": insight.priority_level,
+            "processed_at": now,
+        }
+        for insight, analysis in zip(insights, analyses)
+    ])
+    
+    # Core inserts bypass the ORM after_flush hooks, so maintain the derived tables here
+    index_insights(connection, insights)
+    apply_insights(connection, insights)
+    apply_trends(connection, insights)
+    assign_clusters(connection, [(next_feedback_id + offset, message) for offset, (message, _, _) in enumerate(rows)])
+    tracker.record((now, sketch_themes(insight.themes)) for insight in insights)
+    tracker.flush(connection, now)
+    bump_data_version(connection)
+    return len(rows)
+
+def import_file(engine, path: str, analyze: Callable[[List[str]], List[Dict]], format: Optional[str] = None,
+                batch_size: int = DEFAULT_BATCH_SIZE, restart: bool = False,
+                report: Optional[Callable[[str], None]] = print) -> Dict:
+    """
+    Import one file, resuming from its checkpoint
+    analyze: analyzes a list of messages (e.g. AnalysisExecutor.analyze_batch)
+    Returns: {"source", "imported", "skipped", "records_read", "seconds", "rows_per_second", "resumed_from"}
+    """
+    format = format or detect_format(path)
+    source = os.path.abspath(path)
+    ImportCheckpoint.__table__.create(bind=engine, checkfirst=True)
+    
+    with Session(bind=engine) as db:
+        checkpoint = db.get(ImportCheckpoint, source)
+        if checkpoint is None:
+            checkpoint = ImportCheckpoint(source=source)
+            db.add(checkpoint)
+        elif restart:
+            checkpoint.records_read = checkpoint.rows_imported = checkpoint.rows_skipped = 0
+            checkpoint.started_at = checkpoint.updated_at = datetime.utcnow()
+            checkpoint.completed_at = None
+        db.commit()
+        resumed_from = checkpoint.records_read
+        completed = checkpoint.completed_at is not None
+    
+    summary = {"source": source, "imported": 0, "skipped": 0, "records_read": resumed_from,
+               "seconds": 0.0, "rows_per_second": 0.0, "resumed_from": resumed_from}
+    if completed:
+        if report:
+            report(f"{source}: already imported; pass --restart to import it again")
+        return summary
+    if resumed_from and report:
+        report(f"{source}: resuming after {resumed_from} records")
+    
+    checkpoints = ImportCheckpoint.__table__
+    started = time.perf_counter()
+    
+    def commit(rows, position, skipped, analyses):
+        with engine.begin() as connection:
+            # Update the checkpoint first: the write takes the database lock before ids are allocated
+            connection.execute(
+                checkpoints.update()
+                .where(checkpoints.c.source == source)
+                .values(
+                    records_read=position,
+                    rows_imported=checkpoints.c.rows_imported + len(rows),
+                    rows_skipped=checkpoints.c.rows_skipped + skipped,
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            imported = write_batch(connection, rows, analyses)
+        summary["imported"] += imported
+        summary["skipped"] += skipped
+        summary["records_read"] = position
+        elapsed = time.perf_counter() - started
+        summary["seconds"] = round(elapsed, 3)
+        summary["rows_per_second"] = round(summary["imported"] / elapsed, 1) if elapsed > 0 else 0.0
+        if report:
+            report(f"{source}: {summary['imported']} rows imported, {summary['skipped']} skipped "
+                   f"({summary['rows_per_second']:.0f} rows/s)")
+    
+    # Analyze the next batch while the previous one is written
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-import-analysis") as analysis_thread:
+        pending = None
+        for rows, position, skipped in _batches(read_records(path, format), batch_size, resumed_from):
+            future = analysis_thread.submit(analyze, [message for message, _, _ in rows])
+            if pending is not None:
+                previous_rows, previous_position, previous_skipped, previous_future = pending
+                commit(previous_rows, previous_position, previous_skipped, previous_future.result())
+            pending = (rows, position, skipped, future)
+        if pending is not None:
+            rows, position, skipped, future = pending
+            commit(rows, position, skipped, future.result())
+    
+    with engine.begin() as connection:
+        connection.execute(
+            checkpoints.update().where(checkpoints.c.source == source).values(completed_at=datetime.utcnow())
+        )
+    return summary
+
+def main(argv=None) -> int:
+    """
+    Command line entry point
+    """
+    from analysis_cache import get_analysis_cache
+    from analysis_executor import ANALYSIS_BATCH_CHUNK_SIZE, ANALYSIS_POOL_SIZE, AnalysisExecutor
+    from database import SQLALCHEMY_DATABASE_URL
+    
+    parser = argparse.ArgumentParser(prog="python -m bulk_import", description="Import historical feedback archives")
+    parser.add_argument("files", nargs="+", help="CSV or JSON Lines files, optionally .gz")
+    parser.add_argument("--format", choices=FORMATS, help="source format (default: from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="records per insert batch and checkpoint")
+    parser.add_argument("--workers", type=int, default=ANALYSIS_POOL_SIZE,
+                        help="analysis worker processes; 0 analyzes in this process")
+    parser.add_argument("--database", default=SQLALCHEMY_DATABASE_URL, help="target database URL")
+    parser.add_argument("--restart", action="store_true", help="ignore existing checkpoints and import from the start")
+    parser.add_argument("--no-pragmas", action="store_true", help="keep the default SQLite durability settings")
+    args = parser.parse_args(argv)
+    
+    engine = bulk_load_engine(args.database, pragmas=not args.no_pragmas)
+    prepare_database(engine)
+    executor = AnalysisExecutor(
+        mode="process" if args.workers > 0 else "inline",
+        pool_size=args.workers,
+        max_in_flight=max(1, args.workers) * 2,
+        batch_chunk_size=ANALYSIS_BATCH_CHUNK_SIZE,
+        cache=get_analysis_cache(),
+    )
+    
+    total = 0
+    started = time.perf_counter()
+    try:
+        for path in args.files:
+            total += import_file(engine, path, executor.analyze_batch, format=args.format,
+                                 batch_size=max(1, args.batch_size), restart=args.restart)["imported"]
+    except KeyboardInterrupt:
+        print("Import interrupted; run the same command again to resume")
+        return 130
+    finally:
+        executor.shutdown(wait=False)
+        engine.dispose()
+    
+    elapsed = time.perf_counter() - started
+    print(f"Imported {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed > 0 else 0:.0f} rows/s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
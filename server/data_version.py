@@ -0,0 +1,86 @@
+"""
+Data version and conditional GET support
+
+data_versions holds one monotonically increasing counter for the feedback
+and insight data. Every flush that inserts, changes or deletes Feedback or
+Insight rows bumps it in the same transaction (the bulk importer bumps it
+once per batch), so it changes exactly when GET /api/feedback and GET
+/api/insights could return something new.
+
+Read endpoints take the etag_guard dependency: it reads the counter (one
+primary key lookup), returns 304 Not Modified when the request's
+If-None-Match already names it, and otherwise sets the ETag header. The
+guard runs before the endpoint, so a 304 never runs the endpoint's
+queries. Reading the counter and the data in the same read transaction
+means a body is never older than its ETag.
+"""
+import uuid
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import DataVersion, Feedback, Insight, get_read_db
+
+# Name of the counter covering feedback and insights
+FEEDBACK_DATA = "feedback"
+
+def bump_data_version(connection, name: str = FEEDBACK_DATA):
+    """
+    Increment a data version, creating it (with a new epoch) on first use
+    """
+    statement = sqlite_insert(DataVersion).values(name=name, version=1, epoch=uuid.uuid4().hex)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"version": DataVersion.version + 1},
+    ))
+
+@event.listens_for(Session, "after_flush")
+def _bump_data_version_after_flush(session, flush_context):
+    """
+    Bump the version in the same transaction as any feedback or insight change
+    """
+    changed = (session.new, session.dirty, session.deleted)
+    if any(isinstance(obj, (Feedback, Insight)) for objects in changed for obj in objects):
+        bump_data_version(session.connection())
+
+def data_version_query(name: str = FEEDBACK_DATA):
+    """
+    Select statement for the (epoch, version) of a data version
+    """
+    return select(DataVersion.epoch, DataVersion.version).where(DataVersion.name == name)
+
+def format_etag(row) -> str:
+    """
+    Strong ETag for a data_version_query row; a database with no writes yet is version 0
+    """
+    if row is None:
+        return '"0"'
+    return f'"{row.epoch}-{row.version}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header names the current ETag (weak comparison, as RFC 9110 specifies)
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def check_etag(request: Request, response: Response, etag: str):
+    """
+    Raise 304 Not Modified if the client has the current version, else set the ETag header
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+def etag_guard(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    """
+    Dependency answering conditional GETs from the data version alone
+    """
+    check_etag(request, response, format_etag(db.execute(data_version_query()).first()))
@@ -1,18 +1,103 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text
+"""
+Database engines, sessions and models
+
+Writes and reads use separate engines. On SQLite the database runs in WAL
+mode, so readers see the last committed data while a writer is active
+instead of waiting for it, and read connections are opened with
+query_only. Every connection waits up to DB_BUSY_TIMEOUT_MS for a lock
+instead of failing with "database is locked". Configuration comes from the
+environment:
+
+- DATABASE_URL: database for writes (default sqlite:///./feedback.db)
+- DATABASE_READ_URL: database for reads, e.g. a replica (default: DATABASE_URL)
+- DB_POOL_SIZE: connections kept by the write engine (default 5)
+- DB_READ_POOL_SIZE: connections kept by the read engine (default 10)
+- DB_MAX_OVERFLOW: extra connections each engine may open under load (default 10)
+- DB_POOL_TIMEOUT: seconds to wait for a free pooled connection (default 30)
+- DB_BUSY_TIMEOUT_MS: SQLite lock wait before "database is locked" (default 5000)
+- SQLITE_SYNCHRONOUS: synchronous pragma; NORMAL is durable across
+  application crashes in WAL mode (default NORMAL)
+- SQLITE_CACHE_SIZE_KB: page cache per connection (default 65536)
+- DATABASE_ASYNC: serve the feedback and insights routes from async
+  handlers on async sessions (see async_database.py; default 0)
+"""
+import os
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, ForeignKey, Text, Index, BigInteger, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 
 # SQLite file-based database for POC (more reliable than in-memory)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./feedback.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./feedback.db")
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("DATABASE_READ_URL", SQLALCHEMY_DATABASE_URL)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 65536))
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "0").lower() not in ("0", "false", "no")
+
+def is_memory_database(url: str) -> bool:
+    return url.startswith("sqlite") and (url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url)
+
+def engine_options(url: str, pool_size: int = DB_POOL_SIZE) -> dict:
+    """
+    create_engine keyword arguments for a database URL: pool settings and driver options
+    """
+    if not url.startswith("sqlite"):
+        return {"pool_size": pool_size, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT,
+                "pool_pre_ping": True, "echo": False}
+    
+    options = {
+        "connect_args": {"check_same_thread": False},
+        "echo": False,  # Disable SQL logging for cleaner output
+    }
+    if not is_memory_database(url):
+        options.update(pool_size=pool_size, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+def install_sqlite_pragmas(engine, url: str, read_only: bool = False, wal: bool = True):
+    """
+    Set the connection pragmas on every new connection of a (sync) SQLite engine
+    read_only: reject writes on this engine's connections (PRAGMA query_only)
+    wal: switch the database to WAL journaling (persistent, set by write engines)
+    """
+    memory = is_memory_database(url)
+    
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        if wal and not read_only and not memory:
+            cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False},
-    echo=False  # Disable SQL logging for cleaner output
-)
+def create_database_engine(url: str, pool_size: int = DB_POOL_SIZE, read_only: bool = False, wal: bool = True):
+    """
+    Create an engine with the pool settings and, on SQLite, the connection pragmas
+    """
+    engine = create_engine(url, **engine_options(url, pool_size))
+    if url.startswith("sqlite"):
+        install_sqlite_pragmas(engine, url, read_only=read_only, wal=wal)
+    return engine
+
+engine = create_database_engine(SQLALCHEMY_DATABASE_URL, pool_size=DB_POOL_SIZE)
+
+# An in-memory database exists once per connection, so it cannot have a separate read engine
+if is_memory_database(SQLALCHEMY_DATABASE_URL):
+    read_engine = engine
+else:
+    read_engine = create_database_engine(SQLALCHEMY_READ_DATABASE_URL, pool_size=DB_READ_POOL_SIZE, read_only=True)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
 class Feedback(Base):
@@ -25,6 +110,13 @@ class Feedback(Base):
     
     # Relationship to insights
     insights = relationship("Insight", back_populates="feedback")
+    
+    __table_args__ = (
+        # Keyset pagination and date range filters on the feedback list
+        Index("ix_feedback_created_at_id", "created_at", "id"),
+        # Archiving deletes the newest rows too; AUTOINCREMENT never hands their ids out again
+        {"sqlite_autoincrement": True},
+    )
 
 class Insight(Base):
     __tablename__ = "insights"
@@ -41,6 +133,200 @@ class Insight(Base):
     
     # Relationship to feedback
     feedback = relationship("Feedback", back_populates="insights")
+    
+    __table_args__ = (
+        Index("ix_insights_feedback_id", "feedback_id"),
+        # Keyset pagination when sorting the feedback list by score
+        Index("ix_insights_sentiment_score_feedback_id", "sentiment_score", "feedback_id"),
+        Index("ix_insights_priority_score_feedback_id", "priority_score", "feedback_id"),
+        # Feedback list filters
+        Index("ix_insights_sentiment_label", "sentiment_label"),
+        Index("ix_insights_priority_level", "priority_level"),
+        # Ids stay unique across hot rows and archive segments (see Feedback)
+        {"sqlite_autoincrement": True},
+    )
+
+# Durable queue of pending insight analysis (see insight_jobs.py)
+class InsightJob(Base):
+    __tablename__ = "insight_jobs"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    feedback_id = Column(Integer, ForeignKey("feedback.id"), nullable=False, unique=True)
+    state = Column(String(10), nullable=False, default="pending")  # pending/running/deferred/done/failed
+    attempts = Column(Integer, nullable=False, default=0)
+    lease_owner = Column(String(100), nullable=True)  # Worker holding the job while running
+    leased_until = Column(DateTime, nullable=True)  # Lease expiry, or retry time when pending
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_insight_jobs_state_leased_until", "state", "leased_until"),
+    )
+
+# Normalized theme and recommendation storage derived from the JSON columns
+# on every insight write (see theme_index.py) so theme queries hit indexes
+class InsightTheme(Base):
+    __tablename__ = "insight_themes"
+    
+    insight_id = Column(Integer, ForeignKey("insights.id"), primary_key=True)
+    theme = Column(String(100), primary_key=True)
+    position = Column(Integer, nullable=False)  # Rank within the insight's themes
+    
+    __table_args__ = (
+        Index("ix_insight_themes_theme_insight_id", "theme", "insight_id"),
+    )
+
+class RecommendationText(Base):
+    __tablename__ = "recommendation_texts"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    text = Column(Text, nullable=False, unique=True)
+
+class InsightRecommendation(Base):
+    __tablename__ = "insight_recommendations"
+    
+    insight_id = Column(Integer, ForeignKey("insights.id"), primary_key=True)
+    recommendation_id = Column(Integer, ForeignKey("recommendation_texts.id"), primary_key=True)
+    position = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_insight_recommendations_recommendation_id_insight_id", "recommendation_id", "insight_id"),
+    )
+
+# Aggregate tables maintained incrementally on every insight write
+# (see insight_aggregates.py) so analytics never rescan the insights table
+class ThemeAggregate(Base):
+    __tablename__ = "theme_aggregates"
+    
+    theme = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0, index=True)
+
+class RecommendationAggregate(Base):
+    __tablename__ = "recommendation_aggregates"
+    
+    recommendation = Column(Text, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, index=True)
+
+class SentimentExtreme(Base):
+    __tablename__ = "sentiment_extremes"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    polarity = Column(String(10), nullable=False)  # positive/negative
+    insight_id = Column(Integer, nullable=False)
+    feedback_id = Column(Integer, nullable=False)
+    sentiment_score = Column(Float, nullable=False)
+    message = Column(Text, nullable=False)  # Copied so reads need no join
+    timestamp = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_sentiment_extremes_polarity_score", "polarity", "sentiment_score"),
+    )
+
+# Hourly and daily rollups of insights by feedback timestamp, maintained on
+# every insight write (see insight_trends.py) so trends never rescan insights
+class TrendBucket(Base):
+    __tablename__ = "trend_buckets"
+    
+    granularity = Column(String(4), primary_key=True)  # hour/day
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sentiment_total = Column(Float, nullable=False, default=0.0)  # Sum of non-null scores
+    sentiment_count = Column(Integer, nullable=False, default=0)  # Insights with a score
+    positive_count = Column(Integer, nullable=False, default=0)
+    negative_count = Column(Integer, nullable=False, default=0)
+    neutral_count = Column(Integer, nullable=False, default=0)
+    high_count = Column(Integer, nullable=False, default=0)
+    medium_count = Column(Integer, nullable=False, default=0)
+    low_count = Column(Integer, nullable=False, default=0)
+
+class TrendTheme(Base):
+    __tablename__ = "trend_themes"
+    
+    granularity = Column(String(4), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    theme = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+# MinHash signature and near-duplicate cluster of every feedback message,
+# assigned at ingest (see near_duplicates.py)
+class FeedbackSignature(Base):
+    __tablename__ = "feedback_signatures"
+    
+    feedback_id = Column(Integer, ForeignKey("feedback.id"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)  # Packed MinHash values
+    cluster_id = Column(Integer, nullable=False)  # Feedback id of the cluster representative
+    
+    __table_args__ = (
+        Index("ix_feedback_signatures_cluster_id", "cluster_id"),
+    )
+
+class FeedbackCluster(Base):
+    __tablename__ = "feedback_clusters"
+    
+    id = Column(Integer, primary_key=True)  # Feedback id of the representative
+    size = Column(Integer, nullable=False, default=1)
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_feedback_clusters_size_id", "size", "id"),
+    )
+
+# LSH banding index over cluster representatives: one row per band bucket
+class LshBucket(Base):
+    __tablename__ = "lsh_buckets"
+    
+    bucket = Column(BigInteger, primary_key=True)  # Hash of the band number and its MinHash values
+    cluster_id = Column(Integer, primary_key=True)
+
+# Hourly Count-Min Sketch and Space-Saving summary of theme occurrences,
+# merged from each process's pending updates (see theme_sketch.py)
+class ThemeSketchPane(Base):
+    __tablename__ = "theme_sketch_panes"
+    
+    pane_start = Column(DateTime, primary_key=True)  # Hour of the insight writes
+    version = Column(Integer, nullable=False, default=1)  # Bumped by every merge, for reader caches
+    width = Column(Integer, nullable=False)
+    depth = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False, default=0)  # Theme occurrences counted
+    counters = Column(LargeBinary, nullable=False)  # depth x width signed 64-bit counters
+    top_themes = Column(Text, nullable=False)  # JSON {theme: [count, error]} Space-Saving summary
+
+# Monotonic version of the feedback and insight data, bumped by every write
+# that changes them (see data_version.py) and served as the ETag of reads
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    epoch = Column(String(32), nullable=False)  # Random per database, so a recreated database never reuses ETags
+
+# Compressed per-month segments holding archived feedback and insights,
+# registered in the transaction that removes their rows (see feedback_archive.py)
+class ArchiveSegment(Base):
+    __tablename__ = "archive_segments"
+    
+    name = Column(String(50), primary_key=True)  # e.g. feedback-2024-01
+    month = Column(String(7), nullable=False)  # YYYY-MM of the rows' created_at
+    file_name = Column(String(1000), nullable=False)  # Absolute path of the compressed segment (older rows: relative to ARCHIVE_DIR)
+    checksum = Column(String(64), nullable=False)  # SHA-256 of the compressed file
+    feedback_count = Column(Integer, nullable=False)
+    insight_count = Column(Integer, nullable=False)
+    created_from = Column(DateTime, nullable=False)  # Earliest and latest created_at in the segment
+    created_to = Column(DateTime, nullable=False)
+    min_id = Column(Integer, nullable=False)  # Feedback id range in the segment
+    max_id = Column(Integer, nullable=False)
+    # Score ranges of the segment's insights, for pruning score-sorted pages; null when unknown or unscored
+    sentiment_min = Column(Float, nullable=True)
+    sentiment_max = Column(Float, nullable=True)
+    priority_min = Column(Integer, nullable=True)
+    priority_max = Column(Integer, nullable=True)
+    manifest = Column(Text, nullable=False)  # JSON manifest, also written next to the segment
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_archive_segments_created_from_created_to", "created_from", "created_to"),
+    )
 
 # Database dependency
 def get_db():
@@ -50,6 +336,23 @@ def get_db():
     finally:
         db.close()
 
-# Create tables
+# Read-only database dependency for endpoints that do not write
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Create tables and apply pending data migrations
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from migrations import run_migrations
+    
+    Base.metadata.create_all(bind=engine)
+    
+    # create_all skips existing tables, so add indexes introduced later
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    
+    run_migrations(engine)
@@ -0,0 +1,251 @@
+"""
+Server-Sent Events for completed insights
+
+GET /api/events streams, per open dashboard:
+
+- insight: one small event per stored insight (feedback id, sentiment,
+  priority, themes, recommendations), published after the transaction
+  that wrote it commits
+- aggregates: the data version changed (see data_version.py), so insights
+  analytics are stale; at most one per EVENTS_VERSION_POLL_SECONDS
+- resync: the client fell too far behind to replay what it missed and
+  should refetch
+
+Fan-out is in memory: each event is serialized once and the same string is
+queued to every subscriber, so the cost per dashboard is a queue put and
+never a database query. The data version is polled by one task per process
+while anyone is subscribed, which also picks up writes made by other
+processes (other API workers, the bulk importer). Insight events only come
+from this process's insight workers.
+
+Event ids carry a per-process epoch and a sequence number. A reconnecting
+EventSource sends Last-Event-ID and gets the missed events replayed from a
+bounded buffer, or a resync when they are gone.
+
+Configuration comes from the environment:
+
+- EVENTS_QUEUE_SIZE: undelivered events kept per subscriber before it is
+  told to resync (default 256)
+- EVENTS_REPLAY_SIZE: recent events kept for reconnecting clients (default 1000)
+- EVENTS_MAX_SUBSCRIBERS: open streams per process; more get 503 (default 1000)
+- EVENTS_KEEPALIVE_SECONDS: idle time before a keepalive comment (default 15)
+- EVENTS_VERSION_POLL_SECONDS: data version check interval (default 2)
+"""
+import asyncio
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from data_version import data_version_query, format_etag
+from database import Insight, ReadSessionLocal
+from theme_index import decode_json_list
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 256))
+EVENTS_REPLAY_SIZE = int(os.getenv("EVENTS_REPLAY_SIZE", 1000))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", 1000))
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", 15))
+EVENTS_VERSION_POLL_SECONDS = float(os.getenv("EVENTS_VERSION_POLL_SECONDS", 2))
+
+# Reconnect delay suggested to EventSource clients
+EVENTS_RETRY_MS = 3000
+
+# session.info key holding insight events until the transaction commits
+_PENDING_EVENTS = "pending_insight_events"
+
+RESYNC = "event: resync\ndata: {}\n\n"
+KEEPALIVE = ": keepalive\n\n"
+
+class TooManySubscribers(Exception):
+    """Raised when EVENTS_MAX_SUBSCRIBERS streams are already open"""
+
+def format_event(event_id: str, event_type: str, data: Dict) -> str:
+    """
+    One SSE message
+    """
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+class EventBroker:
+    """
+    In-process fan-out of events to SSE subscribers
+    
+    publish may be called from any thread; subscribers live on the event
+    loop that serves the streams.
+    """
+    
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, replay_size: int = EVENTS_REPLAY_SIZE,
+                 max_subscribers: int = EVENTS_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.epoch = uuid.uuid4().hex[:8]
+        # Returns the current data version ETag; set by the app (see data_version.py)
+        self.version_reader: Optional[Callable[[], str]] = None
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._recent = deque(maxlen=replay_size)
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watcher: Optional[asyncio.Task] = None
+    
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+    
+    def publish(self, event_type: str, data: Dict):
+        """
+        Serialize an event once and queue it for every subscriber
+        """
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            message = format_event(f"{self.epoch}:{sequence}", event_type, data)
+            self._recent.append((sequence, message))
+            loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._fan_out, sequence, message)
+    
+    def _fan_out(self, sequence: int, message: str):
+        """
+        Queue a message to every subscriber; one that is full is told to resync instead
+        """
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait((sequence, message))
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((sequence, RESYNC))
+    
+    def _replay(self, last_event_id: Optional[str]):
+        """
+        Messages a client reconnecting after last_event_id missed, or a resync
+        """
+        if not last_event_id:
+            return []
+        epoch, _, sequence = last_event_id.partition(":")
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) > self._sequence:
+            return [(self._sequence, RESYNC)]
+        
+        last = int(sequence)
+        missed = [(seq, message) for seq, message in self._recent if seq > last]
+        oldest = self._recent[0][0] if self._recent else self._sequence + 1
+        if last + 1 < oldest or len(missed) > self.queue_size:
+            return [(self._sequence, RESYNC)]
+        return missed
+    
+    def subscribe(self, last_event_id: Optional[str] = None) -> asyncio.Queue:
+        """
+        Register a subscriber queue on the running loop, pre-filled with replayed events
+        """
+        if len(self._subscribers) >= self.max_subscribers:
+            raise TooManySubscribers()
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            for item in self._replay(last_event_id):
+                queue.put_nowait(item)
+            self._subscribers.add(queue)
+        
+        if self.version_reader is not None and (self._watcher is None or self._watcher.done()):
+            self._watcher = self._loop.create_task(self._watch_data_version())
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+    
+    async def _watch_data_version(self):
+        """
+        Publish an aggregates event when the data version changes, while anyone listens
+        """
+        loop = asyncio.get_running_loop()
+        last = None
+        while self._subscribers:
+            try:
+                etag = await loop.run_in_executor(None, self.version_reader)
+            except Exception as e:
+                print(f"Data version check failed: {e}")
+            else:
+                if last is not None and etag != last:
+                    self.publish("aggregates", {"etag": etag})
+                last = etag
+            await asyncio.sleep(EVENTS_VERSION_POLL_SECONDS)
+    
+    async def stream(self, queue: asyncio.Queue, keepalive: float = EVENTS_KEEPALIVE_SECONDS) -> AsyncIterator[str]:
+        """
+        SSE body for a subscribed queue; unsubscribes when the client goes away
+        """
+        delivered = 0
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            while True:
+                try:
+                    sequence, message = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+                    continue
+                if message is None:
+                    return
+                # An event published while this client subscribed can be both replayed and fanned out
+                if sequence <= delivered and message is not RESYNC:
+                    continue
+                delivered = max(delivered, sequence)
+                yield message
+        finally:
+            self.unsubscribe(queue)
+    
+    def close(self):
+        """
+        End every open stream (on shutdown)
+        """
+        for queue in list(self._subscribers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait((0, None))
+
+broker = EventBroker()
+
+def read_data_version() -> str:
+    """
+    Current data version ETag, the version_reader used by the app
+    """
+    with ReadSessionLocal() as db:
+        return format_etag(db.execute(data_version_query()).first())
+
+def insight_event(insight: Insight) -> Dict:
+    """
+    Payload of an insight event: the fields the feedback table shows
+    """
+    return {
+        "feedback_id": insight.feedback_id,
+        "sentiment_score": insight.sentiment_score,
+        "sentiment_label": insight.sentiment_label,
+        "priority_score": insight.priority_score,
+        "priority_level": insight.priority_level,
+        "themes": decode_json_list(insight.themes),
+        "recommendations": decode_json_list(insight.recommendations),
+        "insight_processed_at": insight.processed_at.isoformat() if insight.processed_at else None,
+    }
+
+@event.listens_for(Session, "after_flush")
+def _collect_insight_events(session, flush_context):
+    """
+    Build events for flushed insights; they are published only if the transaction commits
+    """
+    new_insights = [obj for obj in session.new if isinstance(obj, Insight)]
+    if new_insights:
+        session.info.setdefault(_PENDING_EVENTS, []).extend(insight_event(insight) for insight in new_insights)
+
+@event.listens_for(Session, "after_commit")
+def _publish_insight_events(session):
+    for data in session.info.pop(_PENDING_EVENTS, ()):
+        broker.publish("insight", data)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_insight_events(session):
+    session.info.pop(_PENDING_EVENTS, None)
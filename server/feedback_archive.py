@@ -0,0 +1,733 @@
+"""
+Cold storage for old feedback
+
+Almost every read touches recent feedback, yet feedback is kept for years,
+and one ever-growing database makes VACUUM, backups and index maintenance
+slower and slower. `python -m feedback_archive run` moves whole calendar
+months of feedback (by created_at) that ended more than ARCHIVE_AFTER_DAYS
+ago out of the database into immutable segments in ARCHIVE_DIR:
+
+- feedback-YYYY-MM.sqlite.gz: a gzip-compressed SQLite database holding
+  the month's feedback, insights and insight_themes rows, with the same
+  schema and indexes as the main database
+- feedback-YYYY-MM.json: its manifest, with row counts, the created_at
+  and id ranges, the SHA-256 of the compressed file and precomputed
+  aggregates (label and level counts, theme and recommendation counts,
+  the top positive and negative feedback)
+
+Both files are written first. Then, in one transaction, the month's rows
+are checked to be unchanged and deleted, and the manifest is recorded in
+archive_segments. A reader therefore sees every row exactly once, either
+in the hot tables or in a registered segment. Months with feedback still waiting for analysis are
+skipped. The feedback and insights tables use AUTOINCREMENT, so ids of
+archived rows are never handed out again, even after the newest month was
+archived.
+
+Reads stay transparent. GET /api/feedback runs its page query on the hot
+tables and on each registered segment that can hold rows of the page,
+then merges the results. Segments outside the date filters or past the
+cursor are skipped, and so are segments that cannot beat a page that is
+already full: archive_segments records each segment's created_at range and
+the ranges of its sentiment and priority scores, whichever the page is
+sorted by. The export merges the same way. /api/insights and its
+trends read aggregate and rollup tables, which keep counting archived
+insights; their rebuild commands add archived months back from the
+manifests and segments. Cluster representatives that were archived are
+looked up in their segment. Search covers hot feedback only.
+Near-duplicate signatures stay in the main database, so new copies of
+archived messages still join their clusters.
+
+archive_segments records each segment's absolute path, so it is found
+whatever ARCHIVE_DIR (or `run --dir`) the archiver used and whatever the
+reader's working directory. The first query of a segment in a process
+decompresses it into a temporary directory, checks it against its checksum
+and opens it read-only. The ARCHIVE_OPEN_SEGMENTS most recently used
+segments stay open. A segment that cannot be read raises ArchiveError,
+which the API answers with 503.
+
+Configuration comes from the environment:
+
+- ARCHIVE_DIR: where segments and manifests are written (default ./archive)
+- ARCHIVE_AFTER_DAYS: age after which whole months are archived (default 180)
+- ARCHIVE_OPEN_SEGMENTS: decompressed segments kept open per process (default 8)
+"""
+import argparse
+import gzip
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import zlib
+from collections import Counter, OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import MetaData, and_, create_engine, delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from database import ArchiveSegment, Feedback, Insight, InsightJob, InsightRecommendation, InsightTheme
+from feedback_query import decode_cursor
+from insight_aggregates import TOP_SENTIMENT_SIZE
+from insight_jobs import DEFERRED, PENDING, RUNNING
+from theme_index import decode_json_list
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_OPEN_SEGMENTS = int(os.getenv("ARCHIVE_OPEN_SEGMENTS", 8))
+
+# Version of the segment layout, recorded in every manifest
+SEGMENT_FORMAT = 1
+
+# Feedback rows copied or deleted per statement
+COPY_CHUNK_SIZE = 1000
+
+# Tables stored in a segment, with the main database's columns and indexes
+SEGMENT_METADATA = MetaData()
+for _table in (Feedback.__table__, Insight.__table__, InsightTheme.__table__):
+    _table.to_metadata(SEGMENT_METADATA)
+
+# Registry columns readers need to find and open a segment
+SEGMENT_COLUMNS = (
+    ArchiveSegment.name,
+    ArchiveSegment.month,
+    ArchiveSegment.file_name,
+    ArchiveSegment.checksum,
+    ArchiveSegment.created_from,
+    ArchiveSegment.created_to,
+    ArchiveSegment.min_id,
+    ArchiveSegment.max_id,
+    ArchiveSegment.sentiment_min,
+    ArchiveSegment.sentiment_max,
+    ArchiveSegment.priority_min,
+    ArchiveSegment.priority_max,
+)
+
+# Registry columns bounding each feedback list sort column within a segment
+SEGMENT_SORT_RANGES = {
+    "created_at": (ArchiveSegment.created_from, ArchiveSegment.created_to),
+    "sentiment_score": (ArchiveSegment.sentiment_min, ArchiveSegment.sentiment_max),
+    "priority_score": (ArchiveSegment.priority_min, ArchiveSegment.priority_max),
+}
+
+ArchivedCluster = namedtuple("ArchivedCluster", ["id", "size", "last_seen_at", "message"])
+
+class ArchiveError(RuntimeError):
+    """Raised when a month cannot be archived or a segment cannot be read"""
+
+def month_bounds(month: str):
+    """
+    First instant of a YYYY-MM month and of the month after it
+    """
+    start = datetime.strptime(month, "%Y-%m")
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+def _chunks(values: List, size: int = COPY_CHUNK_SIZE):
+    for index in range(0, len(values), size):
+        yield values[index:index + size]
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+def _file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _write_atomically(path: str, write):
+    """
+    Write a file through a temporary name, so readers never see a partial file
+    """
+    partial = path + ".partial"
+    with open(partial, "wb") as target:
+        write(target)
+        target.flush()
+        os.fsync(target.fileno())
+    os.replace(partial, path)
+
+def _copy_rows(source, segment, feedback_ids: List[int]):
+    """
+    Copy feedback rows with their insights and theme index rows into a segment
+    """
+    tables = SEGMENT_METADATA.tables
+    feedback = source.execute(select(Feedback.__table__).where(Feedback.id.in_(feedback_ids))).mappings().all()
+    segment.execute(insert(tables["feedback"]), [dict(row) for row in feedback])
+    
+    insights = source.execute(select(Insight.__table__).where(Insight.feedback_id.in_(feedback_ids))).mappings().all()
+    if not insights:
+        return
+    segment.execute(insert(tables["insights"]), [dict(row) for row in insights])
+    themes = source.execute(
+        select(InsightTheme.__table__).where(InsightTheme.insight_id.in_([row["id"] for row in insights]))
+    ).mappings().all()
+    if themes:
+        segment.execute(insert(tables["insight_themes"]), [dict(row) for row in themes])
+
+def _top_feedback(segment, polarity: str) -> List[Dict]:
+    feedback, insights = SEGMENT_METADATA.tables["feedback"], SEGMENT_METADATA.tables["insights"]
+    if polarity == "positive":
+        condition, score_order = insights.c.sentiment_score > 0, insights.c.sentiment_score.desc()
+    else:
+        condition, score_order = insights.c.sentiment_score < 0, insights.c.sentiment_score.asc()
+    rows = segment.execute(
+        select(insights.c.id, insights.c.feedback_id, insights.c.sentiment_score, feedback.c.message, feedback.c.timestamp)
+        .join(feedback, feedback.c.id == insights.c.feedback_id)
+        .where(condition)
+        .order_by(score_order, insights.c.id)
+        .limit(TOP_SENTIMENT_SIZE)
+    )
+    return [
+        {"insight_id": row.id, "feedback_id": row.feedback_id, "sentiment_score": row.sentiment_score,
+         "message": row.message, "timestamp": _iso(row.timestamp)}
+        for row in rows
+    ]
+
+def _score_ranges_query():
+    """
+    Select statement for the sentiment and priority score ranges of a segment's insights
+    """
+    insights = SEGMENT_METADATA.tables["insights"]
+    return select(
+        func.min(insights.c.sentiment_score).label("sentiment_min"),
+        func.max(insights.c.sentiment_score).label("sentiment_max"),
+        func.min(insights.c.priority_score).label("priority_min"),
+        func.max(insights.c.priority_score).label("priority_max"),
+    )
+
+def summarize_segment(segment) -> Dict:
+    """
+    Row counts, ranges and aggregates of a segment's rows, for its manifest
+    """
+    tables = SEGMENT_METADATA.tables
+    feedback, insights, themes = tables["feedback"], tables["insights"], tables["insight_themes"]
+    
+    bounds = segment.execute(select(
+        func.count(), func.min(feedback.c.id), func.max(feedback.c.id),
+        func.min(feedback.c.created_at), func.max(feedback.c.created_at),
+    )).one()
+    totals = segment.execute(select(
+        func.count(), func.coalesce(func.sum(insights.c.sentiment_score), 0.0), func.count(insights.c.sentiment_score),
+        func.max(insights.c.id),
+    )).one()
+    score_ranges = segment.execute(_score_ranges_query()).one()
+    
+    # Unique non-empty recommendations per insight, as the recommendation index counts them
+    recommendations = Counter()
+    for (value,) in segment.execute(select(insights.c.recommendations)):
+        recommendations.update({text for text in decode_json_list(value) if isinstance(text, str) and text})
+    
+    return {
+        "feedback_count": bounds[0],
+        "insight_count": totals[0],
+        "min_id": bounds[1],
+        "max_id": bounds[2],
+        "max_insight_id": totals[3],
+        **score_ranges._asdict(),
+        "created_from": _iso(bounds[3]),
+        "created_to": _iso(bounds[4]),
+        "aggregates": {
+            "sentiment_total": totals[1],
+            "sentiment_count": totals[2],
+            "sentiment_labels": dict(segment.execute(
+                select(insights.c.sentiment_label, func.count())
+                .where(insights.c.sentiment_label.is_not(None))
+                .group_by(insights.c.sentiment_label)
+            ).all()),
+            "priority_levels": dict(segment.execute(
+                select(insights.c.priority_level, func.count())
+                .where(insights.c.priority_level.is_not(None))
+                .group_by(insights.c.priority_level)
+            ).all()),
+            "themes": dict(segment.execute(select(themes.c.theme, func.count()).group_by(themes.c.theme)).all()),
+            "recommendations": dict(recommendations),
+            "top_positive": _top_feedback(segment, "positive"),
+            "top_negative": _top_feedback(segment, "negative"),
+        },
+    }
+
+def write_segment(connection, feedback_ids: List[int], path: str) -> Dict:
+    """
+    Write the rows of feedback_ids to a compressed segment at path
+    Returns: the manifest fields describing the segment
+    """
+    with tempfile.TemporaryDirectory(prefix="feedback-segment-") as scratch:
+        database_path = os.path.join(scratch, "segment.sqlite")
+        segment_engine = create_engine(f"sqlite:///{database_path}")
+        try:
+            SEGMENT_METADATA.create_all(segment_engine)
+            with segment_engine.begin() as segment:
+                for chunk in _chunks(feedback_ids):
+                    _copy_rows(connection, segment, chunk)
+                manifest = summarize_segment(segment)
+            with segment_engine.connect() as segment:
+                segment.exec_driver_sql("VACUUM")
+        finally:
+            segment_engine.dispose()
+        
+        def compress(target):
+            # mtime=0 keeps the output identical for identical rows
+            with open(database_path, "rb") as source, gzip.GzipFile(fileobj=target, mode="wb", mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed, 1 << 20)
+        
+        _write_atomically(path, compress)
+        manifest["uncompressed_bytes"] = os.path.getsize(database_path)
+    
+    manifest["compressed_bytes"] = os.path.getsize(path)
+    manifest["checksum"] = _file_checksum(path)
+    return manifest
+
+def _delete_hot_rows(connection, feedback_ids: List[int]):
+    """
+    Remove archived feedback and everything derived from it that is stored per row
+    """
+    for chunk in _chunks(feedback_ids):
+        insight_ids = select(Insight.id).where(Insight.feedback_id.in_(chunk))
+        connection.execute(delete(InsightTheme).where(InsightTheme.insight_id.in_(insight_ids)))
+        connection.execute(delete(InsightRecommendation).where(InsightRecommendation.insight_id.in_(insight_ids)))
+        connection.execute(delete(Insight).where(Insight.feedback_id.in_(chunk)))
+        connection.execute(delete(InsightJob).where(InsightJob.feedback_id.in_(chunk)))
+        # The search index follows through its delete trigger
+        connection.execute(delete(Feedback).where(Feedback.id.in_(chunk)))
+
+def _segment_name(connection, month: str) -> str:
+    """
+    Name for a new segment of a month; a month archived again (e.g. after a late import) gets a numbered one
+    """
+    taken = set(connection.scalars(select(ArchiveSegment.name).where(ArchiveSegment.month == month)))
+    name, number = f"feedback-{month}", 2
+    while name in taken:
+        name, number = f"feedback-{month}-{number}", number + 1
+    return name
+
+def archivable_months(db: Session, now: Optional[datetime] = None, after_days: int = ARCHIVE_AFTER_DAYS) -> List[str]:
+    """
+    Months (YYYY-MM) of hot feedback that ended more than after_days ago, oldest first
+    """
+    cutoff = ((now or datetime.utcnow()) - timedelta(days=after_days)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = func.strftime("%Y-%m", Feedback.created_at)
+    return list(db.scalars(select(month).where(Feedback.created_at < cutoff).distinct().order_by(month)))
+
+def _month_state(connection, in_month, feedback_ids: Optional[List[int]] = None):
+    """
+    (feedback waiting for analysis, feedback rows, insight rows) of a month, or of some of its feedback
+    """
+    if feedback_ids is not None:
+        in_month = and_(in_month, Feedback.id.in_(feedback_ids))
+    waiting = connection.execute(
+        select(func.count())
+        .select_from(InsightJob)
+        .join(Feedback, Feedback.id == InsightJob.feedback_id)
+        .where(in_month, InsightJob.state.in_((PENDING, RUNNING, DEFERRED)))
+    ).scalar_one()
+    feedback = connection.execute(select(func.count()).select_from(Feedback).where(in_month)).scalar_one()
+    insights = connection.execute(
+        select(func.count()).select_from(Insight).join(Feedback, Feedback.id == Insight.feedback_id).where(in_month)
+    ).scalar_one()
+    return waiting, feedback, insights
+
+def archive_month(db: Session, month: str, archive_dir: Optional[str] = None) -> Optional[Dict]:
+    """
+    Move one month of hot feedback into a new segment and commit
+    
+    The segment is written from a read transaction. The rows are deleted in
+    a separate write transaction, after checking that they did not change in
+    between, so writers are not blocked while the segment is compressed.
+    Returns: the segment's manifest, or None if the month has no hot feedback
+    """
+    from data_version import bump_data_version
+    
+    # The registry keeps the segment's absolute path, so readers find it
+    # whatever their ARCHIVE_DIR or working directory
+    archive_dir = os.path.abspath(archive_dir or ARCHIVE_DIR)
+    start, end = month_bounds(month)
+    in_month = and_(Feedback.created_at >= start, Feedback.created_at < end)
+    connection = db.connection()
+    
+    waiting, _, _ = _month_state(connection, in_month)
+    if waiting:
+        db.rollback()
+        raise ArchiveError(f"{month} has {waiting} feedback waiting for analysis")
+    
+    feedback_ids = list(connection.scalars(select(Feedback.id).where(in_month).order_by(Feedback.id)))
+    if not feedback_ids:
+        db.rollback()
+        return None
+    
+    name = _segment_name(connection, month)
+    file_name = f"{name}.sqlite.gz"
+    paths = [os.path.join(archive_dir, file_name), os.path.join(archive_dir, f"{name}.json")]
+    os.makedirs(archive_dir, exist_ok=True)
+    try:
+        manifest = {"name": name, "month": month, "format": SEGMENT_FORMAT, "file_name": file_name,
+                    **write_segment(connection, feedback_ids, paths[0])}
+        _write_atomically(paths[1], lambda target: target.write(json.dumps(manifest, indent=2).encode("utf-8")))
+        db.rollback()
+        
+        connection = db.connection()
+        if _month_state(connection, in_month, feedback_ids) != (0, manifest["feedback_count"], manifest["insight_count"]):
+            raise ArchiveError(f"{month} changed while it was being archived; run the archiver again")
+        _delete_hot_rows(connection, feedback_ids)
+        connection.execute(insert(ArchiveSegment).values(
+            name=name,
+            month=month,
+            file_name=paths[0],
+            checksum=manifest["checksum"],
+            feedback_count=manifest["feedback_count"],
+            insight_count=manifest["insight_count"],
+            created_from=datetime.fromisoformat(manifest["created_from"]),
+            created_to=datetime.fromisoformat(manifest["created_to"]),
+            min_id=manifest["min_id"],
+            max_id=manifest["max_id"],
+            sentiment_min=manifest["sentiment_min"],
+            sentiment_max=manifest["sentiment_max"],
+            priority_min=manifest["priority_min"],
+            priority_max=manifest["priority_max"],
+            manifest=json.dumps(manifest),
+            archived_at=datetime.utcnow(),
+        ))
+        bump_data_version(connection)
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Unregistered files are never read; remove them so a retry starts clean
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return manifest
+
+def run_archiver(db: Session, now: Optional[datetime] = None, after_days: int = ARCHIVE_AFTER_DAYS,
+                 archive_dir: Optional[str] = None) -> List[Dict]:
+    """
+    Archive every month that is old enough, skipping months still being analyzed
+    Returns: manifests of the segments written
+    """
+    manifests = []
+    for month in archivable_months(db, now, after_days):
+        try:
+            manifest = archive_month(db, month, archive_dir)
+        except ArchiveError as e:
+            print(f"Skipping {month}: {str(e)}")
+            continue
+        if manifest is not None:
+            manifests.append(manifest)
+    return manifests
+
+class SegmentStore:
+    """
+    Decompressed, read-only segments of this process, least recently used first
+    """
+    
+    def __init__(self, archive_dir: Optional[str] = None, max_open: int = ARCHIVE_OPEN_SEGMENTS):
+        self.archive_dir = archive_dir
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._engines: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_dir: Optional[str] = None
+    
+    def path(self, segment) -> str:
+        """
+        Location of a segment's compressed file
+        
+        Segments registered before the registry kept absolute paths hold a
+        file name relative to the archive directory.
+        """
+        return os.path.join(self.archive_dir or ARCHIVE_DIR, segment.file_name)
+    
+    def check(self, segments: Sequence):
+        """
+        Raise ArchiveError unless every segment's file is present, before a response starts streaming
+        """
+        for segment in segments:
+            if not os.path.isfile(self.path(segment)):
+                raise ArchiveError(f"Cannot read segment {segment.name}: {self.path(segment)} is missing")
+    
+    def _hydrate(self, segment) -> str:
+        """
+        Decompress a segment into the cache directory, verifying its checksum on the way
+        """
+        if self._cache_dir is None:
+            self._cache_dir = tempfile.mkdtemp(prefix="feedback-archive-")
+        source = self.path(segment)
+        target = os.path.join(self._cache_dir, f"{segment.name}.sqlite")
+        
+        digest = hashlib.sha256()
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            with open(source, "rb") as compressed, open(target, "wb") as database:
+                for block in iter(lambda: compressed.read(1 << 20), b""):
+                    digest.update(block)
+                    database.write(decompressor.decompress(block))
+                database.write(decompressor.flush())
+        except (OSError, zlib.error) as e:
+            if os.path.exists(target):
+                os.remove(target)
+            raise ArchiveError(f"Cannot read segment {segment.name}: {str(e)}") from e
+        if digest.hexdigest() != segment.checksum:
+            os.remove(target)
+            raise ArchiveError(f"Segment {segment.name} does not match its checksum")
+        return target
+    
+    def engine(self, segment):
+        """
+        Read-only engine for a registered segment, decompressing it on first use
+        """
+        key = (segment.name, segment.checksum)
+        with self._lock:
+            entry = self._engines.get(key)
+            if entry is not None:
+                self._engines.move_to_end(key)
+                return entry[0]
+            
+            path = self._hydrate(segment)
+            engine = create_engine(f"sqlite:///file:{path}?mode=ro&immutable=1&uri=true",
+                                   connect_args={"check_same_thread": False})
+            self._engines[key] = (engine, path)
+            while len(self._engines) > self.max_open:
+                _, (evicted, evicted_path) = self._engines.popitem(last=False)
+                evicted.dispose()
+                # Connections still reading keep the unlinked file open
+                os.remove(evicted_path)
+            return engine
+    
+    def execute(self, segment, query) -> List:
+        with self.engine(segment).connect() as connection:
+            return connection.execute(query).all()
+    
+    def stream(self, segment, query, batch_size: int = COPY_CHUNK_SIZE) -> Iterator:
+        with self.engine(segment).connect() as connection:
+            yield from connection.execute(query.execution_options(yield_per=batch_size))
+    
+    def close(self):
+        with self._lock:
+            for engine, _ in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+            if self._cache_dir is not None:
+                shutil.rmtree(self._cache_dir, ignore_errors=True)
+                self._cache_dir = None
+
+store = SegmentStore()
+
+def check_segments(segments: Sequence):
+    """
+    Raise ArchiveError unless every segment's file is present (see SegmentStore.check)
+    """
+    store.check(segments)
+
+def close_segments():
+    """
+    Close this process's open segments and remove their decompressed copies
+    """
+    store.close()
+
+def feedback_segments_query(sort: str = "created_at", order: str = "asc", cursor: Optional[str] = None,
+                            date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """
+    Registered segments that can hold rows of a feedback list page or export, oldest first
+    """
+    query = select(*SEGMENT_COLUMNS)
+    if date_from:
+        query = query.where(ArchiveSegment.created_to >= date_from)
+    if date_to:
+        query = query.where(ArchiveSegment.created_from <= date_to)
+    if sort != "created_at":
+        # Score sorts only return analyzed feedback
+        query = query.where(ArchiveSegment.insight_count > 0)
+    if cursor:
+        value, _ = decode_cursor(cursor, sort, order)
+        low, high = SEGMENT_SORT_RANGES[sort]
+        # Segments without a recorded range may hold any value
+        query = query.where(or_(low.is_(None), low <= value if order == "desc" else high >= value))
+    return query.order_by(ArchiveSegment.created_from, ArchiveSegment.name)
+
+def merge_feedback_page(rows: List, segments: Sequence, query, sort: str, order: str, limit: int) -> List:
+    """
+    Add the rows of a page query found in segments to the hot rows, keeping the first limit + 1 in page order
+    
+    rows come from running query on the hot tables; the result is ready for
+    feedback_query.paginate.
+    """
+    descending = order == "desc"
+    
+    def key(row):
+        return getattr(row, sort), row.id
+    
+    low_column, high_column = SEGMENT_SORT_RANGES[sort]
+    
+    def bounds(segment):
+        return getattr(segment, low_column.key), getattr(segment, high_column.key)
+    
+    # Visit segments in page order of their best value, so once the page is full the
+    # remaining ones can be skipped; segments without a recorded range are always read
+    unknown = [segment for segment in segments if bounds(segment)[0] is None]
+    known = sorted((segment for segment in segments if bounds(segment)[0] is not None),
+                   key=lambda segment: bounds(segment)[1 if descending else 0], reverse=descending)
+    
+    candidates = list(rows)
+    for segment in unknown + known:
+        low, high = bounds(segment)
+        if low is not None and len(candidates) > limit:
+            candidates.sort(key=key, reverse=descending)
+            del candidates[limit + 1:]
+            boundary = getattr(candidates[-1], sort)
+            if (high < boundary) if descending else (low > boundary):
+                continue
+        candidates.extend(store.execute(segment, query))
+    
+    candidates.sort(key=key, reverse=descending)
+    return candidates[:limit + 1]
+
+def merge_export_rows(rows: Iterable, segments: Sequence, query, descending: bool = False) -> Iterator:
+    """
+    Rows of an export query from the hot tables and segments, in created_at order
+    
+    Months do not overlap, so only the segments of one month are open at a time.
+    """
+    def key(row):
+        return row.created_at, row.id
+    
+    months = [
+        list(group)
+        for _, group in itertools.groupby(sorted(segments, key=lambda segment: segment.month, reverse=descending),
+                                          key=lambda segment: segment.month)
+    ]
+    archived = itertools.chain.from_iterable(
+        heapq.merge(*(store.stream(segment, query) for segment in month), key=key, reverse=descending)
+        for month in months
+    )
+    return heapq.merge(rows, archived, key=key, reverse=descending)
+
+def representative_segments_query(clusters: Sequence):
+    """
+    Segments holding archived cluster representatives, or None if every representative is still hot
+    """
+    missing = [row.id for row in clusters if row.message is None]
+    if not missing:
+        return None
+    return select(*SEGMENT_COLUMNS).where(
+        or_(*[and_(ArchiveSegment.min_id <= feedback_id, ArchiveSegment.max_id >= feedback_id) for feedback_id in missing])
+    )
+
+def fill_representatives(clusters: Sequence, segments: Sequence) -> List:
+    """
+    Cluster rows with archived representatives' messages read from their segments
+    
+    Clusters whose representative is in neither the hot tables nor a segment are dropped.
+    """
+    missing = {row.id for row in clusters if row.message is None}
+    messages = {}
+    for segment in segments:
+        ids = [feedback_id for feedback_id in missing
+               if segment.min_id <= feedback_id <= segment.max_id and feedback_id not in messages]
+        if ids:
+            messages.update(store.execute(segment, select(Feedback.id, Feedback.message).where(Feedback.id.in_(ids))))
+    
+    return [
+        row if row.message is not None else ArchivedCluster(row.id, row.size, row.last_seen_at, messages[row.id])
+        for row in clusters
+        if row.message is not None or row.id in messages
+    ]
+
+def archived_manifests(connection) -> List[Dict]:
+    """
+    Manifests of all registered segments, oldest first
+    """
+    return [
+        json.loads(manifest)
+        for manifest in connection.scalars(select(ArchiveSegment.manifest).order_by(ArchiveSegment.created_from))
+    ]
+
+def backfill_score_ranges(connection) -> int:
+    """
+    Record the score ranges of segments registered before the registry kept them
+    Returns: number of segments updated
+    """
+    segments = connection.execute(
+        select(*SEGMENT_COLUMNS).where(ArchiveSegment.sentiment_min.is_(None), ArchiveSegment.insight_count > 0)
+    ).all()
+    updated = 0
+    for segment in segments:
+        try:
+            ranges = store.execute(segment, _score_ranges_query())[0]
+        except ArchiveError as e:
+            # Left unknown: the segment is then read for every score-sorted page
+            print(f"Cannot record score ranges of {segment.name}: {str(e)}")
+            continue
+        connection.execute(update(ArchiveSegment).where(ArchiveSegment.name == segment.name).values(**ranges._asdict()))
+        updated += 1
+    return updated
+
+def archived_max_ids(connection) -> Tuple[int, int]:
+    """
+    Highest feedback and insight ids in any registered segment, 0 without segments
+    """
+    max_feedback_id = max_insight_id = 0
+    for segment in connection.execute(select(*SEGMENT_COLUMNS, ArchiveSegment.manifest)):
+        manifest = json.loads(segment.manifest)
+        max_feedback_id = max(max_feedback_id, segment.max_id)
+        insight_id = manifest.get("max_insight_id")
+        if insight_id is None and manifest["insight_count"]:
+            # Manifests written before the insight id range was recorded
+            insight_id = store.execute(segment, select(func.max(SEGMENT_METADATA.tables["insights"].c.id)))[0][0]
+        max_insight_id = max(max_insight_id, insight_id or 0)
+    return max_feedback_id, max_insight_id
+
+def archived_aggregates(connection) -> Dict:
+    """
+    Aggregates of all registered segments, combined from their manifests
+    Returns: {"insight_count", "themes", "recommendations", "top_positive", "top_negative"},
+    with top rows ready for the sentiment_extremes table
+    """
+    combined = {"insight_count": 0, "themes": Counter(), "recommendations": Counter(),
+                "top_positive": [], "top_negative": []}
+    for manifest in archived_manifests(connection):
+        aggregates = manifest["aggregates"]
+        combined["insight_count"] += manifest["insight_count"]
+        combined["themes"].update(aggregates["themes"])
+        combined["recommendations"].update(aggregates["recommendations"])
+        for polarity in ("positive", "negative"):
+            combined[f"top_{polarity}"].extend(
+                {**entry, "polarity": polarity,
+                 "timestamp": datetime.fromisoformat(entry["timestamp"]) if entry["timestamp"] else None}
+                for entry in aggregates[f"top_{polarity}"]
+            )
+    return combined
+
+def main(argv: List[str]) -> int:
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(prog="python -m feedback_archive",
+                                     description="Move old feedback into compressed monthly segments")
+    parser.add_argument("command", choices=["run", "list"])
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="archive whole months that ended more than this many days ago")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="directory for segments and manifests")
+    args = parser.parse_args(argv)
+    
+    from database import SessionLocal, create_tables
+    
+    create_tables()
+    db = SessionLocal()
+    try:
+        if args.command == "run":
+            for manifest in run_archiver(db, after_days=args.older_than_days, archive_dir=args.dir):
+                print(f"Archived {manifest['feedback_count']} feedback of {manifest['month']} to {manifest['file_name']} "
+                      f"({manifest['compressed_bytes']} bytes)")
+        else:
+            for manifest in archived_manifests(db.connection()):
+                print(f"{manifest['name']}: {manifest['feedback_count']} feedback, {manifest['insight_count']} insights, "
+                      f"{manifest['created_from']} to {manifest['created_to']}")
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,113 @@
+"""
+Streaming feedback export
+
+Rows are read with a server-side cursor (yield_per) and encoded as NDJSON
+or CSV a batch at a time, so memory use stays flat however many rows are
+exported. Output is collected into chunks of about EXPORT_CHUNK_BYTES
+before being handed to the response, which keeps the number of
+thread-pool hops per export small. Optional gzip compression is applied
+incrementally to the same chunks. Archived months are streamed from their
+segments and merged in created_at order.
+"""
+import csv
+import io
+import itertools
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+from sqlalchemy.orm import Session
+
+from feedback_archive import merge_export_rows
+from feedback_query import row_to_feedback
+
+# Rows fetched from the database per batch
+EXPORT_BATCH_SIZE = 1000
+
+# Approximate size of each chunk written to the response
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+# Column order of CSV exports, matching the FeedbackWithInsights fields
+CSV_COLUMNS = [
+    "id", "message", "timestamp", "created_at", "sentiment_score", "sentiment_label",
+    "themes", "recommendations", "priority_score", "priority_level", "insight_processed_at",
+]
+
+def _iso(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _ndjson_lines(records: Iterable[Dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps({key: _iso(value) for key, value in record.items()}, ensure_ascii=False) + "\n"
+
+def _csv_lines(records: Iterable[Dict], header: bool) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for record in records:
+        writer.writerow([
+            "; ".join(value) if isinstance(value, list) else _iso(value)
+            for value in (record[column] for column in CSV_COLUMNS)
+        ])
+    yield buffer.getvalue()
+
+def _batches(rows: Iterable, size: int) -> Iterator[List]:
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def iter_export(db: Session, query, format: str = "ndjson", segments: Sequence = (),
+                descending: bool = False) -> Iterator[bytes]:
+    """
+    Encode the rows of an export query, yielding chunks of roughly EXPORT_CHUNK_BYTES
+    segments: archive segments whose rows are merged in by created_at (see feedback_archive)
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+    
+    result = db.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    partitions = result.partitions()
+    if segments:
+        partitions = _batches(merge_export_rows(result, segments, query, descending), EXPORT_BATCH_SIZE)
+    pending: List[str] = []
+    pending_size = 0
+    first = True
+    
+    for partition in partitions:
+        records = [row_to_feedback(row) for row in partition]
+        lines = _ndjson_lines(records) if format == "ndjson" else _csv_lines(records, header=first)
+        first = False
+        for line in lines:
+            pending.append(line)
+            pending_size += len(line)
+        if pending_size >= EXPORT_CHUNK_BYTES:
+            yield "".join(pending).encode("utf-8")
+            pending = []
+            pending_size = 0
+    
+    # A CSV export of zero rows still carries its header
+    if first and format == "csv":
+        pending.extend(_csv_lines([], header=True))
+    if pending:
+        yield "".join(pending).encode("utf-8")
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Compress a chunk stream into a single gzip member as it is produced
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,76 @@
+"""
+Fast JSON bodies for feedback list responses
+
+GET /api/feedback and /api/feedback/search used to turn every row into a
+dict and then a FeedbackWithInsights model, which FastAPI validated again
+against response_model before serializing it. On large pages that object
+churn cost more than the query. These routes now return the bytes built
+here directly from the FEEDBACK_COLUMNS row tuples. Each row becomes one
+dict with its JSON list columns decoded, and the whole page is encoded in
+one call. The body is byte-for-byte what FastAPI produced from the models:
+same keys and key order, same datetime and float formats, and compact
+UTF-8. response_model stays on the routes and still documents the schema.
+
+orjson is used when it is installed. Otherwise the standard library
+encoder is used, with the same formatting.
+"""
+import json
+from datetime import datetime
+from typing import Iterable, Optional
+
+from fastapi import Response
+
+from feedback_query import FEEDBACK_COLUMNS
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without the optional dependency
+    orjson = None
+
+# FeedbackWithInsights field names, in FEEDBACK_COLUMNS order; extra columns (search rank) are dropped by zip
+FEEDBACK_KEYS = tuple(column.key for column in FEEDBACK_COLUMNS)
+_LIST_KEYS = ("themes", "recommendations")
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+else:  # pragma: no cover - exercised only without the optional dependency
+    _loads = json.loads
+    
+    def _dumps(value) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+def _decode_list(value: Optional[str]):
+    """
+    Decode a JSON array column like feedback_query does; malformed values become an empty list
+    """
+    if not value:
+        return None
+    try:
+        return _loads(value)
+    except ValueError:
+        return []
+
+def encode_feedback_rows(rows: Iterable) -> bytes:
+    """
+    JSON array of FeedbackWithInsights objects for FEEDBACK_COLUMNS rows
+    """
+    records = []
+    for row in rows:
+        record = dict(zip(FEEDBACK_KEYS, row))
+        for key in _LIST_KEYS:
+            record[key] = _decode_list(record[key])
+        records.append(record)
+    return _dumps(records)
+
+def feedback_json_response(rows: Iterable, response: Response) -> Response:
+    """
+    Response for a page of feedback rows, keeping headers already set on the route's response (ETag, X-Next-Cursor)
+    """
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content=encode_feedback_rows(rows), media_type="application/json", headers=headers)
@@ -1,22 +1,46 @@
-import asyncio
+import functools
 import json
 import re
+import time
 from typing import Dict, List, Tuple
-from textblob import TextBlob
-import nltk
 from collections import Counter
 from datetime import datetime
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.tag import pos_tag
 
+from keyword_rules import get_keyword_rules
+from metrics import ANALYSIS_FAILURES, PIPELINE_STAGE_SECONDS
+from model_registry import get_model_registry
+
+# Bump whenever analyze_feedback can return a different result for the same
+# message, so cached analyses from the previous version are not reused
+PIPELINE_VERSION = "1"
+
+FAILED_ANALYSIS_RECOMMENDATION = "Error processing feedback - manual review required"
+
+def timed_stage(stage: str):
+    """
+    Record each call's duration in the pipeline stage latency histogram
+    """
+    observe = PIPELINE_STAGE_SECONDS.observe
+    perf_counter = time.perf_counter
+    
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(perf_counter() - started, stage)
+        return wrapper
+    return decorator
+
+@timed_stage("analyze_sentiment")
 def analyze_sentiment(message: str) -> Tuple[float, str]:
     """
     Analyze sentiment using TextBlob
     Returns: (sentiment_score, sentiment_label)
     """
-    blob = TextBlob(message)
-    polarity = blob.sentiment.polarity  # Range: -1 (negative) to 1 (positive)
+    polarity = get_model_registry().polarity(message)  # Range: -1 (negative) to 1 (positive)
     
     # Classify sentiment
     if polarity > 0.1:
@@ -28,29 +52,44 @@ def analyze_sentiment(message: str) -> Tuple[float, str]:
     
     return polarity, label
 
-def extract_themes(message: str) -> List[str]:
+@timed_stage("tokenize")
+def _theme_candidates(message: str, stop_words) -> List[str]:
     """
-    Extract key themes and topics from feedback using NLTK
+    Tokenize a message and drop stopwords and very short tokens
     """
-    # Clean and tokenize text
     text = message.lower()
     text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
-    tokens = word_tokenize(text)
-    
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    filtered_tokens = [word for word in tokens if word not in stop_words and len(word) > 2]
-    
-    # Get part-of-speech tags and extract nouns and adjectives
-    pos_tags = pos_tag(filtered_tokens)
+    tokens = get_model_registry().tokenize(text)
+    return [word for word in tokens if word not in stop_words and len(word) > 2]
+
+@timed_stage("pos_tag")
+def _pos_tag(tokens: List[str]) -> List[Tuple[str, str]]:
+    """
+    Part-of-speech tag a token list with the shared tagger
+    """
+    return get_model_registry().tag(tokens)
+
+def _top_themes(pos_tags: List[Tuple[str, str]]) -> List[str]:
+    """
+    Keep nouns and adjectives and return the five most frequent
+    """
     themes = [word for word, pos in pos_tags if pos.startswith('NN') or pos.startswith('JJ')]
-    
-    # Count frequency and return top themes
     theme_counts = Counter(themes)
-    top_themes = [theme for theme, count in theme_counts.most_common(5)]
+    return [theme for theme, count in theme_counts.most_common(5)]
+
+@timed_stage("extract_themes")
+def extract_themes(message: str) -> List[str]:
+    """
+    Extract key themes and topics from feedback using NLTK
+    """
+    # Clean, tokenize and remove stopwords
+    filtered_tokens = _theme_candidates(message, get_model_registry().stop_words)
     
-    return top_themes
+    # Get part-of-speech tags and extract nouns and adjectives
+    pos_tags = _pos_tag(filtered_tokens)
+    return _top_themes(pos_tags)
 
+@timed_stage("generate_recommendations")
 def generate_recommendations(message: str, sentiment_score: float, themes: List[str]) -> List[str]:
     """
     Generate actionable recommendations based on feedback analysis
@@ -68,14 +107,7 @@ def generate_recommendations(message: str, sentiment_score: float, themes: List[
         recommendations.append("Follow up with user to gather more specific feedback")
     
     # Theme-based recommendations
-    common_improvement_themes = ['bug', 'error', 'slow', 'difficult', 'confusing', 'problem']
-    common_feature_themes = ['feature', 'functionality', 'option', 'tool', 'capability']
-    
-    if any(theme in themes for theme in common_improvement_themes):
-        recommendations.append("Prioritize technical improvements and bug fixes")
-    
-    if any(theme in themes for theme in common_feature_themes):
-        recommendations.append("Consider feature enhancement or new feature development")
+    recommendations.extend(get_keyword_rules().theme_recommendations(themes))
     
     # Length-based recommendations
     if len(message.split()) > 50:
@@ -83,6 +115,7 @@ def generate_recommendations(message: str, sentiment_score: float, themes: List[
     
     return recommendations[:3]  # Return top 3 recommendations
 
+@timed_stage("calculate_priority_score")
 def calculate_priority_score(message: str, sentiment_score: float) -> int:
     """
     Calculate priority score based on sentiment and content signals
@@ -95,7 +128,6 @@ def calculate_priority_score(message: str, sentiment_score: float) -> int:
     5. First-Time User Risk (+5 points)
     """
     priority_score = 0
-    message_lower = message.lower()
     
     # Rule 1: Sentiment-based scoring
     if sentiment_score <= -0.6:
@@ -107,26 +139,8 @@ def calculate_priority_score(message: str, sentiment_score: float) -> int:
     else:
         priority_score += 0
     
-    # Rule 2: Revenue/Critical Flow Impact
-    revenue_keywords = ["payment", "checkout", "purchase", "billing", "invoice", "transaction"]
-    if any(keyword in message_lower for keyword in revenue_keywords):
-        priority_score += 25
-    
-    # Rule 3: Blocker/Failure Signals
-    blocker_keywords = ["can't", "cannot", "unable", "fails", "failed", "broken", "error", "not working"]
-    if any(keyword in message_lower for keyword in blocker_keywords):
-        priority_score += 20
-    
-    # Rule 4: Usability/Friction Signals
-    usability_keywords = ["hard", "confusing", "too many", "difficult", "pain", "painful", "slow",
-                         "bad","user experience", "terrible", "sucks", "not good"]
-    if any(keyword in message_lower for keyword in usability_keywords):
-        priority_score += 10
-    
-    # Rule 5: First-Time User Risk
-    first_time_keywords = ["first time", "new user", "getting started"]
-    if any(keyword in message_lower for keyword in first_time_keywords):
-        priority_score += 5
+    # Rules 2-5: keyword rules, matched in a single pass over the message
+    priority_score += get_keyword_rules().priority_points(message)
     
     return priority_score
 
@@ -145,6 +159,49 @@ def classify_priority_level(priority_score: int) -> str:
     else:
         return "LOW"
 
+def _build_analysis(message: str, sentiment_score: float, sentiment_label: str, themes: List[str]) -> Dict:
+    """
+    Apply the rule-based stages to an already scored and tagged message
+    """
+    # Generate recommendations
+    recommendations = generate_recommendations(message, sentiment_score, themes)
+    
+    # Calculate priority
+    priority_score = calculate_priority_score(message, sentiment_score)
+    priority_level = classify_priority_level(priority_score)
+    
+    return {
+        "sentiment_score": sentiment_score,
+        "sentiment_label": sentiment_label,
+        "themes": themes,
+        "recommendations": recommendations,
+        "priority_score": priority_score,
+        "priority_level": priority_level,
+        "processed_at": datetime.utcnow().isoformat()
+    }
+
+def _failed_analysis() -> Dict:
+    """
+    Fallback result used when a message cannot be analyzed
+    """
+    ANALYSIS_FAILURES.inc()
+    return {
+        "sentiment_score": 0.0,
+        "sentiment_label": "neutral",
+        "themes": [],
+        "recommendations": [FAILED_ANALYSIS_RECOMMENDATION],
+        "priority_score": 0,
+        "priority_level": "LOW",
+        "processed_at": datetime.utcnow().isoformat()
+    }
+
+def is_failed_analysis(analysis: Dict) -> bool:
+    """
+    Whether an analysis is the fallback result of a failed analysis
+    """
+    return analysis.get("recommendations") == [FAILED_ANALYSIS_RECOMMENDATION]
+
+@timed_stage("analyze_feedback")
 def analyze_feedback(message: str) -> Dict:
     """
     Complete feedback analysis pipeline
@@ -160,62 +217,81 @@ def analyze_feedback(message: str) -> Dict:
         # Extract themes
         themes = extract_themes(message)
         
-        # Generate recommendations
-        recommendations = generate_recommendations(message, sentiment_score, themes)
-        
-        # Calculate priority
-        priority_score = calculate_priority_score(message, sentiment_score)
-        priority_level = classify_priority_level(priority_score)
-        
-        return {
-            "sentiment_score": sentiment_score,
-            "sentiment_label": sentiment_label,
-            "themes": themes,
-            "recommendations": recommendations,
-            "priority_score": priority_score,
-            "priority_level": priority_level,
-            "processed_at": datetime.utcnow().isoformat()
-        }
+        return _build_analysis(message, sentiment_score, sentiment_label, themes)
     
     except Exception as e:
         print(f"Error analyzing feedback: {str(e)}")
-        return {
-            "sentiment_score": 0.0,
-            "sentiment_label": "neutral",
-            "themes": [],
-            "recommendations": ["Error processing feedback - manual review required"],
-            "priority_score": 0,
-            "priority_level": "LOW",
-            "processed_at": datetime.utcnow().isoformat()
-        }
+        return _failed_analysis()
 
-async def process_feedback_async(feedback_id: int, message: str, db_session):
+def analyze_feedback_batch(messages: List[str]) -> List[Dict]:
     """
-    Asynchronous feedback processing function
+    Batched feedback analysis pipeline
+    Input: list of feedback messages
+    Output: list of analysis dicts, in the same order as the input
+    
+    Each stage runs over the whole batch before the next one starts, using
+    the models shared through the model registry. If a batch stage fails,
+    each message falls back to analyze_feedback so one bad message cannot
+    fail the whole batch.
     """
-    from database import Insight
+    if not messages:
+        return []
     
     try:
-        # Analyze feedback
-        analysis = analyze_feedback(message)
-        
-        # Create insight record
-        insight = Insight(
-            feedback_id=feedback_id,
-            sentiment_score=analysis["sentiment_score"],
-            sentiment_label=analysis["sentiment_label"],
-            themes=json.dumps(analysis["themes"]),
-            recommendations=json.dumps(analysis["recommendations"]),
-            priority_score=analysis["priority_score"],
-            priority_level=analysis["priority_level"]
-        )
-        
-        # Save to database
-        db_session.add(insight)
-        db_session.commit()
+        # Analyze sentiment
+        sentiments = [analyze_sentiment(message) for message in messages]
         
-        print(f"Insight processing completed for feedback {feedback_id}")
+        # Tokenize each message, then tag the whole batch in one call to the shared tagger
+        registry = get_model_registry()
+        started = time.perf_counter()
+        candidate_lists = [_theme_candidates(message, registry.stop_words) for message in messages]
+        tagging_started = time.perf_counter()
+        tagged_batch = registry.tag_sents(candidate_lists)
+        finished = time.perf_counter()
         
+        # The batch stages were timed once; record each message's share, comparable to analyze_feedback
+        tagging_share = (finished - tagging_started) / len(messages)
+        theme_share = (finished - started) / len(messages)
+        for _ in messages:
+            PIPELINE_STAGE_SECONDS.observe(tagging_share, "pos_tag")
+    
     except Exception as e:
-        print(f"Error in async processing for feedback {feedback_id}: {str(e)}")
-        db_session.rollback()
+        print(f"Error in batch analysis, falling back to per-message analysis: {str(e)}")
+        return [analyze_feedback(message) for message in messages]
+    
+    results = []
+    for message, (sentiment_score, sentiment_label), pos_tags in zip(messages, sentiments, tagged_batch):
+        try:
+            started = time.perf_counter()
+            themes = _top_themes(pos_tags)
+            PIPELINE_STAGE_SECONDS.observe(theme_share + time.perf_counter() - started, "extract_themes")
+            results.append(_build_analysis(message, sentiment_score, sentiment_label, themes))
+        except Exception as e:
+            print(f"Error analyzing feedback: {str(e)}")
+            results.append(_failed_analysis())
+    
+    return results
+
+
+def warm_models():
+    """
+    Load the stopword list, POS tagger and sentiment lexicon up front
+    so the first analysis in a process does not pay for it
+    """
+    get_model_registry().load()
+
+def build_insight(feedback_id: int, analysis: Dict):
+    """
+    Create an Insight record from an analyze_feedback result
+    """
+    from database import Insight
+    
+    return Insight(
+        feedback_id=feedback_id,
+        sentiment_score=analysis["sentiment_score"],
+        sentiment_label=analysis["sentiment_label"],
+        themes=json.dumps(analysis["themes"]),
+        recommendations=json.dumps(analysis["recommendations"]),
+        priority_score=analysis["priority_score"],
+        priority_level=analysis["priority_level"]
+    )
@@ -0,0 +1,202 @@
+"""
+Keyset-paginated feedback queries
+
+Pages are addressed by an opaque cursor holding the sort value and id of the
+last row returned, so fetching page N costs the same as fetching page 1.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+
+from database import Feedback, Insight
+from theme_index import theme_insight_ids
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Columns returned for every feedback row, in FeedbackWithInsights order
+FEEDBACK_COLUMNS = (
+    Feedback.id,
+    Feedback.message,
+    Feedback.timestamp,
+    Feedback.created_at,
+    Insight.sentiment_score,
+    Insight.sentiment_label,
+    Insight.themes,
+    Insight.recommendations,
+    Insight.priority_score,
+    Insight.priority_level,
+    Insight.processed_at.label("insight_processed_at"),
+)
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or does not match the query"""
+
+def encode_cursor(sort: str, order: str, value: Any, last_id: int) -> str:
+    """
+    Encode the position after a row as an opaque URL-safe string
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, order, value, last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple[Any, int]:
+    """
+    Decode a cursor produced by encode_cursor for the same sort and order
+    Returns: (sort value, id) of the last row of the previous page
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_order, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+    
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise InvalidCursor("Cursor does not match the requested sort order")
+    if not isinstance(last_id, int):
+        raise InvalidCursor("Malformed cursor")
+    
+    if sort == "created_at":
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError) as e:
+            raise InvalidCursor("Malformed cursor") from e
+    elif not isinstance(value, (int, float)):
+        raise InvalidCursor("Malformed cursor")
+    
+    return value, last_id
+
+def _sort_columns(sort: str):
+    """
+    Sort column and tie-breaking id column for a sort field
+    """
+    if sort == "created_at":
+        return Feedback.created_at, Feedback.id
+    return getattr(Insight, sort), Insight.feedback_id
+
+def apply_feedback_filters(
+    query,
+    sentiment_label: Optional[str] = None,
+    priority_level: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """
+    Add the feedback list filters to a select over FEEDBACK_COLUMNS
+    """
+    if sentiment_label:
+        query = query.where(Insight.sentiment_label == sentiment_label.lower())
+    if priority_level:
+        query = query.where(Insight.priority_level == priority_level.upper())
+    if theme:
+        query = query.where(Insight.id.in_(theme_insight_ids(theme)))
+    if date_from:
+        query = query.where(Feedback.created_at >= date_from)
+    if date_to:
+        query = query.where(Feedback.created_at <= date_to)
+    return query
+
+def build_feedback_page_query(
+    sort: str = "created_at",
+    order: str = "desc",
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    sentiment_label: Optional[str] = None,
+    priority_level: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """
+    Build the select statement for one page of feedback with insights
+    
+    Sorting by created_at walks the feedback index and includes feedback
+    that has not been analyzed yet. Sorting by a score walks the matching
+    insights index, so only analyzed feedback is returned. One extra row is
+    fetched so the caller can tell whether another page exists.
+    """
+    sort_column, id_column = _sort_columns(sort)
+    descending = order == "desc"
+    
+    if sort == "created_at":
+        query = select(*FEEDBACK_COLUMNS).outerjoin(Insight, Feedback.id == Insight.feedback_id)
+    else:
+        query = (
+            select(*FEEDBACK_COLUMNS)
+            .select_from(Insight)
+            .join(Feedback, Feedback.id == Insight.feedback_id)
+            .where(sort_column.isnot(None))
+        )
+    
+    query = apply_feedback_filters(query, sentiment_label, priority_level, theme, date_from, date_to)
+    
+    # Keyset condition: strictly after the last row of the previous page
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort, order)
+        if descending:
+            query = query.where(or_(sort_column < value, and_(sort_column == value, id_column < last_id)))
+        else:
+            query = query.where(or_(sort_column > value, and_(sort_column == value, id_column > last_id)))
+    
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    
+    return query.limit(limit + 1)
+
+def build_feedback_export_query(
+    order: str = "asc",
+    sentiment_label: Optional[str] = None,
+    priority_level: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """
+    Build the select statement for a full, unpaginated export in created_at order
+    
+    Includes feedback that has not been analyzed yet, like the created_at
+    sorted list.
+    """
+    query = select(*FEEDBACK_COLUMNS).outerjoin(Insight, Feedback.id == Insight.feedback_id)
+    query = apply_feedback_filters(query, sentiment_label, priority_level, theme, date_from, date_to)
+    if order == "desc":
+        return query.order_by(Feedback.created_at.desc(), Feedback.id.desc())
+    return query.order_by(Feedback.created_at.asc(), Feedback.id.asc())
+
+def _decode_list(value: Optional[str]) -> Optional[List[str]]:
+    """
+    Decode a JSON array column; malformed values become an empty list
+    """
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return []
+
+def row_to_feedback(row) -> Dict[str, Any]:
+    """
+    Convert a FEEDBACK_COLUMNS row to a FeedbackWithInsights dict
+    """
+    data = dict(row._mapping)
+    data["themes"] = _decode_list(data["themes"])
+    data["recommendations"] = _decode_list(data["recommendations"])
+    return data
+
+def paginate(rows: List, sort: str, order: str, limit: int) -> Tuple[List, Optional[str]]:
+    """
+    Split the limit + 1 rows of a page query into the page and the next cursor
+    """
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, order, getattr(last, sort), last.id)
@@ -0,0 +1,161 @@
+"""
+Full-text search over feedback messages (SQLite FTS5)
+
+feedback_fts is an external-content FTS5 index over feedback.message: it
+stores only the index, reads message text from the feedback table, and is
+kept in sync by triggers on feedback, so every write path (ORM, bulk
+import, manual SQL) updates it in the same transaction. Creating the
+feedback table creates the index and triggers; existing databases get them
+from the 0004 migration.
+
+Search terms are matched as whole words (with porter stemming, so "crash"
+matches "crashes"); "quoted text" matches a phrase and a trailing * a
+prefix. All terms must match. Results are ranked by bm25 and paginated with
+the same opaque cursors as the feedback list.
+
+Run `python -m feedback_search rebuild` to rebuild the index from the
+feedback table, e.g. after restoring a backup made without it.
+"""
+import re
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import DDL, Column, Float, Integer, MetaData, Table, Text, and_, event, or_, select, text
+
+from database import Feedback, Insight
+from feedback_query import DEFAULT_PAGE_SIZE, FEEDBACK_COLUMNS, apply_feedback_filters, decode_cursor
+
+# Upper bound on terms in one search, to keep match queries cheap
+MAX_SEARCH_TERMS = 32
+
+# Statements creating the index and the triggers that keep it in sync
+SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5("
+    "message, content='feedback', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS feedback_fts_insert AFTER INSERT ON feedback BEGIN "
+    "INSERT INTO feedback_fts(rowid, message) VALUES (new.id, new.message); END",
+    "CREATE TRIGGER IF NOT EXISTS feedback_fts_delete AFTER DELETE ON feedback BEGIN "
+    "INSERT INTO feedback_fts(feedback_fts, rowid, message) VALUES ('delete', old.id, old.message); END",
+    "CREATE TRIGGER IF NOT EXISTS feedback_fts_update AFTER UPDATE OF message ON feedback BEGIN "
+    "INSERT INTO feedback_fts(feedback_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+    "INSERT INTO feedback_fts(rowid, message) VALUES (new.id, new.message); END",
+]
+
+# Query-side view of the virtual table; kept out of Base.metadata so create_all never creates it
+feedback_fts = Table(
+    "feedback_fts",
+    MetaData(),
+    Column("rowid", Integer),
+    Column("message", Text),
+    Column("feedback_fts", Text),  # Hidden column named after the table, the target of MATCH
+    Column("rank", Float),  # Hidden bm25 rank; lower is a better match
+)
+
+for statement in SEARCH_INDEX_DDL:
+    event.listen(Feedback.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Feedback.__table__, "before_drop", DDL("DROP TABLE IF EXISTS feedback_fts").execute_if(dialect="sqlite"))
+
+_TERM_PATTERN = re.compile(r'"([^"]*)"|(\w+\*?)', re.UNICODE)
+
+class InvalidSearchQuery(ValueError):
+    """Raised when a search query has no searchable terms"""
+
+def to_match_query(q: str) -> str:
+    """
+    Translate a user search string into an FTS5 MATCH expression
+    
+    Every term and phrase is quoted, so FTS5 operators and punctuation in the
+    input are searched for as text instead of causing syntax errors.
+    """
+    terms = []
+    for phrase, word in _TERM_PATTERN.findall(q or ""):
+        if not word:
+            words = re.findall(r"\w+", phrase, re.UNICODE)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+        elif word.endswith("*"):
+            terms.append(f'"{word[:-1]}"*')
+        else:
+            terms.append(f'"{word}"')
+    
+    if not terms:
+        raise InvalidSearchQuery("Search query must contain at least one word")
+    if len(terms) > MAX_SEARCH_TERMS:
+        raise InvalidSearchQuery(f"Search query cannot contain more than {MAX_SEARCH_TERMS} terms")
+    return " ".join(terms)
+
+def build_feedback_search_query(
+    q: str,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    sentiment_label: Optional[str] = None,
+    priority_level: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """
+    Build the select statement for one page of feedback matching a search
+    
+    Rows are FEEDBACK_COLUMNS plus rank, best match first; use
+    paginate(rows, "rank", "asc", limit) for the page and next cursor.
+    """
+    query = (
+        select(*FEEDBACK_COLUMNS, feedback_fts.c.rank)
+        .select_from(feedback_fts)
+        .join(Feedback, Feedback.id == feedback_fts.c.rowid)
+        .outerjoin(Insight, Feedback.id == Insight.feedback_id)
+        .where(feedback_fts.c.feedback_fts.match(to_match_query(q)))
+    )
+    query = apply_feedback_filters(query, sentiment_label, priority_level, theme, date_from, date_to)
+    
+    if cursor:
+        value, last_id = decode_cursor(cursor, "rank", "asc")
+        query = query.where(or_(
+            feedback_fts.c.rank > value,
+            and_(feedback_fts.c.rank == value, Feedback.id > last_id),
+        ))
+    
+    return query.order_by(feedback_fts.c.rank, Feedback.id).limit(limit + 1)
+
+def install_search_index(connection):
+    """
+    Create the index and triggers if missing (SQLite only)
+    Returns: True if the database supports the index
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+    return True
+
+def rebuild_search_index(connection) -> int:
+    """
+    Rebuild the index from the feedback table and merge its segments
+    Returns: number of feedback rows indexed
+    """
+    if not install_search_index(connection):
+        return 0
+    connection.execute(text("INSERT INTO feedback_fts(feedback_fts) VALUES ('rebuild')"))
+    connection.execute(text("INSERT INTO feedback_fts(feedback_fts) VALUES ('optimize')"))
+    return connection.execute(text("SELECT count(*) FROM feedback")).scalar_one()
+
+def main(argv: List[str]) -> int:
+    """
+    Command line entry point
+    """
+    if argv != ["rebuild"]:
+        print("Usage: python -m feedback_search rebuild")
+        return 2
+    
+    from database import create_tables, engine
+    
+    create_tables()
+    with engine.begin() as connection:
+        total = rebuild_search_index(connection)
+    print(f"Rebuilt the feedback search index over {total} messages")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""
+Feedback submission shared by the sync and async handlers
+
+clean_message and clean_batch validate submitted messages, and
+store_feedback adds them with their insight jobs to the caller's
+transaction. store_feedback takes a sync Session; async handlers run it
+through AsyncSession.run_sync, so the ORM after_flush hooks run the same
+way in both modes.
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database import Feedback
+from insight_jobs import DEFERRED, PENDING, enqueue_jobs
+
+# Upper bound on messages accepted by a single batch submission
+MAX_BATCH_SIZE = 5000
+
+class InvalidFeedback(ValueError):
+    """Raised when submitted feedback fails validation"""
+
+def clean_message(message: Optional[str]) -> str:
+    """
+    Strip a submitted message, rejecting empty ones
+    """
+    if not message or not message.strip():
+        raise InvalidFeedback("Feedback message cannot be empty")
+    return message.strip()
+
+def clean_batch(messages: List[Optional[str]]) -> List[str]:
+    """
+    Strip a submitted batch, rejecting empty and oversized batches and empty messages
+    """
+    if not messages:
+        raise InvalidFeedback("Feedback batch cannot be empty")
+    if len(messages) > MAX_BATCH_SIZE:
+        raise InvalidFeedback(f"Feedback batch cannot contain more than {MAX_BATCH_SIZE} messages")
+
+    cleaned = [message.strip() if message else "" for message in messages]
+    for index, message in enumerate(cleaned):
+        if not message:
+            raise InvalidFeedback(f"Feedback message at index {index} cannot be empty")
+    return cleaned
+
+def store_feedback(db: Session, messages: List[str], deferred: bool = False) -> List[Dict]:
+    """
+    Add feedback rows and their insight jobs; the caller commits
+    deferred stores the jobs as deferred while admission control holds them back
+    Returns: the created feedback as FeedbackResponse dicts, in submission order
+    """
+    db_feedback = [Feedback(message=message) for message in messages]
+    db.add_all(db_feedback)
+    db.flush()
+
+    # Capture the generated fields before commit expires the objects,
+    # so the response does not reload every row
+    created = [
+        {"id": item.id, "message": item.message, "timestamp": item.timestamp, "created_at": item.created_at}
+        for item in db_feedback
+    ]
+    enqueue_jobs(db, [item["id"] for item in created], DEFERRED if deferred else PENDING)
+    return created
@@ -0,0 +1,299 @@
+"""
+Incrementally maintained insight aggregates
+
+Every flush that writes new Insight rows also updates the theme counts,
+recommendation counts and the bounded top positive/negative tables in the
+same transaction, so GET /api/insights only reads a handful of rows.
+
+Run `python -m insight_aggregates rebuild` to recompute everything from the
+insights table.
+"""
+import heapq
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import (
+    Feedback,
+    Insight,
+    InsightRecommendation,
+    InsightTheme,
+    RecommendationAggregate,
+    RecommendationText,
+    SentimentExtreme,
+    ThemeAggregate,
+)
+from near_duplicates import largest_clusters_query
+from theme_index import insight_recommendations, insight_themes
+
+# Number of top positive and top negative feedback kept for analytics
+TOP_SENTIMENT_SIZE = 5
+
+def _upsert_counts(connection, model, key_column: str, counts: Counter):
+    """
+    Add counts to an aggregate table, creating missing keys
+    """
+    if not counts:
+        return
+    
+    statement = sqlite_insert(model)
+    statement = statement.on_conflict_do_update(
+        index_elements=[key_column],
+        set_={"count": model.count + statement.excluded["count"]},
+    )
+    connection.execute(statement, [{key_column: key, "count": count} for key, count in counts.items()])
+
+def _trim_extremes(connection, polarity: str, descending: bool):
+    """
+    Keep only the best TOP_SENTIMENT_SIZE rows for a polarity
+    """
+    score_order = SentimentExtreme.sentiment_score.desc() if descending else SentimentExtreme.sentiment_score.asc()
+    keep = (
+        select(SentimentExtreme.id)
+        .where(SentimentExtreme.polarity == polarity)
+        .order_by(score_order, SentimentExtreme.insight_id.asc())
+        .limit(TOP_SENTIMENT_SIZE)
+    )
+    connection.execute(
+        delete(SentimentExtreme).where(
+            SentimentExtreme.polarity == polarity,
+            SentimentExtreme.id.not_in(keep.scalar_subquery()),
+        )
+    )
+
+def apply_insights(connection, insights: Iterable[Insight]):
+    """
+    Fold newly written insights into the aggregate tables
+    
+    Only the best TOP_SENTIMENT_SIZE candidates of each polarity in the batch
+    are considered for the top tables, so the cost is bounded by the batch
+    size and not by the size of the insights table.
+    """
+    theme_counts = Counter()
+    recommendation_counts = Counter()
+    positive = []
+    negative = []
+    
+    for insight in insights:
+        # Each theme and recommendation counts once per insight, as in rebuild_aggregates
+        theme_counts.update(insight_themes(insight))
+        recommendation_counts.update(insight_recommendations(insight))
+        
+        if insight.sentiment_score is not None:
+            if insight.sentiment_score > 0:
+                positive.append(insight)
+            elif insight.sentiment_score < 0:
+                negative.append(insight)
+    
+    _upsert_counts(connection, ThemeAggregate, "theme", theme_counts)
+    _upsert_counts(connection, RecommendationAggregate, "recommendation", recommendation_counts)
+    
+    candidates = {
+        "positive": heapq.nsmallest(TOP_SENTIMENT_SIZE, positive, key=lambda i: (-i.sentiment_score, i.id)),
+        "negative": heapq.nsmallest(TOP_SENTIMENT_SIZE, negative, key=lambda i: (i.sentiment_score, i.id)),
+    }
+    feedback_ids = {insight.feedback_id for group in candidates.values() for insight in group}
+    if not feedback_ids:
+        return
+    
+    feedback_rows = {
+        row.id: row
+        for row in connection.execute(
+            select(Feedback.id, Feedback.message, Feedback.timestamp).where(Feedback.id.in_(feedback_ids))
+        )
+    }
+    
+    for polarity, group in candidates.items():
+        rows = [
+            {
+                "polarity": polarity,
+                "insight_id": insight.id,
+                "feedback_id": insight.feedback_id,
+                "sentiment_score": insight.sentiment_score,
+                "message": feedback_rows[insight.feedback_id].message,
+                "timestamp": feedback_rows[insight.feedback_id].timestamp,
+            }
+            for insight in group
+            if insight.feedback_id in feedback_rows
+        ]
+        if rows:
+            connection.execute(SentimentExtreme.__table__.insert(), rows)
+            _trim_extremes(connection, polarity, descending=(polarity == "positive"))
+
+@event.listens_for(Session, "after_flush")
+def _update_aggregates_after_flush(session, flush_context):
+    """
+    Update aggregates in the same transaction as the insight write
+    """
+    new_insights = [obj for obj in session.new if isinstance(obj, Insight)]
+    if new_insights:
+        apply_insights(session.connection(), new_insights)
+
+def _rebuild_extremes(connection, polarity: str):
+    """
+    Select the top TOP_SENTIMENT_SIZE insights of a polarity from the score index
+    """
+    if polarity == "positive":
+        condition = Insight.sentiment_score > 0
+        score_order = Insight.sentiment_score.desc()
+    else:
+        condition = Insight.sentiment_score < 0
+        score_order = Insight.sentiment_score.asc()
+    
+    top = connection.execute(
+        select(Insight.id, Insight.feedback_id, Insight.sentiment_score, Feedback.message, Feedback.timestamp)
+        .join(Feedback, Feedback.id == Insight.feedback_id)
+        .where(condition)
+        .order_by(score_order, Insight.id)
+        .limit(TOP_SENTIMENT_SIZE)
+    )
+    rows = [
+        {
+            "polarity": polarity,
+            "insight_id": row.id,
+            "feedback_id": row.feedback_id,
+            "sentiment_score": row.sentiment_score,
+            "message": row.message,
+            "timestamp": row.timestamp,
+        }
+        for row in top
+    ]
+    if rows:
+        connection.execute(SentimentExtreme.__table__.insert(), rows)
+
+def rebuild_aggregates(db: Session) -> int:
+    """
+    Recompute all aggregate tables from scratch
+    
+    Counts are computed in SQL from the normalized theme and recommendation
+    tables (see theme_index.py), so no JSON column is decoded. Archived months
+    are added from their segment manifests (see feedback_archive).
+    Returns: number of insights covered
+    """
+    from feedback_archive import archived_aggregates
+    
+    connection = db.connection()
+    connection.execute(delete(ThemeAggregate))
+    connection.execute(delete(RecommendationAggregate))
+    connection.execute(delete(SentimentExtreme))
+    
+    connection.execute(
+        insert(ThemeAggregate).from_select(
+            ["theme", "count"],
+            select(InsightTheme.theme, func.count()).group_by(InsightTheme.theme)
+        )
+    )
+    connection.execute(
+        insert(RecommendationAggregate).from_select(
+            ["recommendation", "count"],
+            select(RecommendationText.text, func.count())
+            .join(InsightRecommendation, InsightRecommendation.recommendation_id == RecommendationText.id)
+            .group_by(RecommendationText.id)
+        )
+    )
+    _rebuild_extremes(connection, "positive")
+    _rebuild_extremes(connection, "negative")
+    
+    archived = archived_aggregates(connection)
+    _upsert_counts(connection, ThemeAggregate, "theme", archived["themes"])
+    _upsert_counts(connection, RecommendationAggregate, "recommendation", archived["recommendations"])
+    for polarity in ("positive", "negative"):
+        if archived[f"top_{polarity}"]:
+            connection.execute(SentimentExtreme.__table__.insert(), archived[f"top_{polarity}"])
+            _trim_extremes(connection, polarity, descending=(polarity == "positive"))
+    
+    total = connection.execute(select(func.count()).select_from(Insight)).scalar_one() + archived["insight_count"]
+    db.commit()
+    return total
+
+def analytics_queries(limit: int = 10) -> Dict:
+    """
+    Select statements for GET /api/insights, all served by the aggregate tables
+    Returns: {"top_positive", "top_negative", "themes", "recommendations", "clusters"}
+    """
+    extreme_columns = (SentimentExtreme.message, SentimentExtreme.sentiment_score, SentimentExtreme.timestamp)
+    return {
+        "top_positive": (
+            select(*extreme_columns)
+            .where(SentimentExtreme.polarity == "positive")
+            .order_by(SentimentExtreme.sentiment_score.desc(), SentimentExtreme.insight_id)
+            .limit(TOP_SENTIMENT_SIZE)
+        ),
+        "top_negative": (
+            select(*extreme_columns)
+            .where(SentimentExtreme.polarity == "negative")
+            .order_by(SentimentExtreme.sentiment_score, SentimentExtreme.insight_id)
+            .limit(TOP_SENTIMENT_SIZE)
+        ),
+        "themes": (
+            select(ThemeAggregate.theme, ThemeAggregate.count)
+            .order_by(ThemeAggregate.count.desc(), ThemeAggregate.theme)
+            .limit(limit)
+        ),
+        "recommendations": (
+            select(RecommendationAggregate.recommendation)
+            .order_by(RecommendationAggregate.count.desc(), RecommendationAggregate.recommendation)
+            .limit(limit)
+        ),
+        "clusters": largest_clusters_query(limit),
+    }
+
+def build_insights_analytics(rows: Dict[str, List], theme_sketch: Optional[Dict] = None):
+    """
+    InsightsAnalytics response from the rows of the analytics_queries statements
+    
+    With approximate themes, rows["themes"] holds theme_sketch estimates and
+    theme_sketch their error bound.
+    """
+    from models import DuplicateCluster, InsightsAnalytics, Recommendation, ThemeCount, ThemeSketchInfo, TopSentimentFeedback
+    
+    def top(name):
+        return [
+            TopSentimentFeedback(feedback=row.message, sentiment_score=row.sentiment_score, timestamp=row.timestamp)
+            for row in rows[name]
+        ]
+    
+    return InsightsAnalytics(
+        top_positive=top("top_positive"),
+        top_negative=top("top_negative"),
+        themes=[ThemeCount(theme=row.theme, count=row.count) for row in rows["themes"]],
+        # Most frequent unique recommendations with priority
+        recommendations=[
+            Recommendation(
+                recommendation=row.recommendation,
+                priority="high" if "urgent" in row.recommendation.lower() or "critical" in row.recommendation.lower() else "medium"
+            )
+            for row in rows["recommendations"]
+        ],
+        clusters=[
+            DuplicateCluster(cluster_id=row.id, size=row.size, representative=row.message, last_seen_at=row.last_seen_at)
+            for row in rows["clusters"]
+        ],
+        theme_sketch=ThemeSketchInfo(**theme_sketch) if theme_sketch else None,
+    )
+
+def main(argv: List[str]) -> int:
+    """
+    Command line entry point
+    """
+    if argv != ["rebuild"]:
+        print("Usage: python -m insight_aggregates rebuild")
+        return 2
+    
+    from database import SessionLocal, create_tables
+    
+    create_tables()
+    db = SessionLocal()
+    try:
+        total = rebuild_aggregates(db)
+        print(f"Rebuilt insight aggregates from {total} insights")
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
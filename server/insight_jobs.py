@@ -0,0 +1,386 @@
+"""
+Durable insight job queue
+
+Every feedback row gets an insight_jobs row in the same transaction, so a
+restart between the feedback commit and the end of analysis no longer loses
+work. Worker threads claim jobs in batches with a single UPDATE ... RETURNING
+statement, which SQLite runs atomically, and hold them under a lease. A job
+whose lease expires (its worker died or hung) becomes claimable again; the
+reclaim counts as an attempt, so a job that keeps killing its worker is
+marked failed after INSIGHT_JOB_MAX_ATTEMPTS like any other failure. A worker
+only completes jobs it still owns, so concurrent workers in one or several
+processes never both store an insight for the same job. Jobs admitted
+while the queue is saturated are stored as deferred and are not claimed
+until admission control releases them (see admission).
+
+Configuration comes from the environment:
+
+- INSIGHT_WORKERS: worker threads started with the app (default 1)
+- INSIGHT_JOB_BATCH_SIZE: jobs claimed per batch (default 32)
+- INSIGHT_JOB_LEASE_SECONDS: lease duration for a claimed batch (default 300)
+- INSIGHT_JOB_MAX_ATTEMPTS: attempts before a job is marked failed (default 3)
+- INSIGHT_JOB_POLL_SECONDS: idle poll interval (default 2)
+"""
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Sequence
+
+from sqlalchemy import and_, exists, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from database import Feedback, Insight, InsightJob
+from feedback_pipeline import is_failed_analysis
+from metrics import (
+    INSIGHT_BACKLOG_OLDEST_SECONDS,
+    INSIGHT_ANALYSES_REUSED,
+    INSIGHT_BATCH_SECONDS,
+    INSIGHT_JOB_FAILURES,
+    INSIGHT_JOBS,
+    INSIGHT_PROCESSING_LAG_SECONDS,
+)
+from near_duplicates import NEAR_DUPLICATE_REUSE, reusable_analyses
+
+INSIGHT_WORKERS = int(os.getenv("INSIGHT_WORKERS", 1))
+INSIGHT_JOB_BATCH_SIZE = int(os.getenv("INSIGHT_JOB_BATCH_SIZE", 32))
+INSIGHT_JOB_LEASE_SECONDS = int(os.getenv("INSIGHT_JOB_LEASE_SECONDS", 300))
+INSIGHT_JOB_MAX_ATTEMPTS = int(os.getenv("INSIGHT_JOB_MAX_ATTEMPTS", 3))
+INSIGHT_JOB_POLL_SECONDS = float(os.getenv("INSIGHT_JOB_POLL_SECONDS", 2))
+
+# Delay before a failed job is retried, multiplied by its attempt count
+RETRY_BACKOFF_SECONDS = 30
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# Stored while the queue is saturated; not claimed until released to pending (see admission)
+DEFERRED = "deferred"
+
+def enqueue_jobs(db: Session, feedback_ids: Sequence[int], state: str = PENDING):
+    """
+    Add pending (or deferred) jobs for feedback rows; committed with the caller's transaction
+    """
+    if feedback_ids:
+        db.execute(insert(InsightJob), [{"feedback_id": feedback_id, "state": state} for feedback_id in feedback_ids])
+
+def claim_jobs(db: Session, worker_id: str, limit: int = INSIGHT_JOB_BATCH_SIZE,
+               lease_seconds: int = INSIGHT_JOB_LEASE_SECONDS, max_attempts: int = INSIGHT_JOB_MAX_ATTEMPTS) -> List:
+    """
+    Atomically lease up to limit claimable jobs for a worker
+    
+    Every claim counts as an attempt, including reclaiming a job whose lease
+    expired. A message that crashes or hangs its worker is therefore marked
+    failed once its expired lease used up the last attempt, instead of
+    being claimed forever.
+    Returns: rows of (job id, feedback id, message, attempts)
+    """
+    now = datetime.utcnow()
+    expired = and_(InsightJob.state == RUNNING, InsightJob.leased_until < now)
+    abandoned = db.execute(
+        update(InsightJob)
+        .where(expired, InsightJob.attempts >= max_attempts)
+        .values(state=FAILED, lease_owner=None, leased_until=None, updated_at=now,
+                last_error="Lease expired on the last attempt")
+        .returning(InsightJob.id, InsightJob.feedback_id, InsightJob.attempts)
+    ).all()
+    for row in abandoned:
+        INSIGHT_JOB_FAILURES.inc("failed")
+        print(f"Insight job {row.id} for feedback {row.feedback_id} failed: lease expired on attempt {row.attempts}")
+    
+    claimable = (
+        select(InsightJob.id)
+        .where(or_(
+            and_(InsightJob.state == PENDING, or_(InsightJob.leased_until.is_(None), InsightJob.leased_until <= now)),
+            expired,
+        ))
+        .order_by(InsightJob.id)
+        .limit(limit)
+    )
+    claimed = db.execute(
+        update(InsightJob)
+        .where(InsightJob.id.in_(claimable.scalar_subquery()))
+        .values(
+            state=RUNNING,
+            lease_owner=worker_id,
+            leased_until=now + timedelta(seconds=lease_seconds),
+            attempts=InsightJob.attempts + 1,
+            updated_at=now,
+        )
+        .returning(InsightJob.id, InsightJob.feedback_id, InsightJob.attempts)
+    ).all()
+    db.commit()
+    
+    if not claimed:
+        return []
+    
+    messages = dict(db.execute(
+        select(Feedback.id, Feedback.message).where(Feedback.id.in_([row.feedback_id for row in claimed]))
+    ).all())
+    return [
+        (row.id, row.feedback_id, messages.get(row.feedback_id), row.attempts)
+        for row in sorted(claimed, key=lambda row: row.id)
+    ]
+
+def complete_jobs(db: Session, worker_id: str, jobs: List, analyses: List[dict]) -> int:
+    """
+    Store insights and mark jobs done for the jobs the worker still owns
+    Returns: number of jobs completed
+    """
+    from feedback_pipeline import build_insight
+    
+    owned = set(db.scalars(
+        update(InsightJob)
+        .where(
+            InsightJob.id.in_([job_id for job_id, _, _, _ in jobs]),
+            InsightJob.state == RUNNING,
+            InsightJob.lease_owner == worker_id,
+        )
+        .values(state=DONE, leased_until=None, last_error=None, updated_at=datetime.utcnow())
+        .returning(InsightJob.id)
+    ))
+    
+    insights = [
+        build_insight(feedback_id, analysis)
+        for (job_id, feedback_id, _, _), analysis in zip(jobs, analyses)
+        if job_id in owned
+    ]
+    db.add_all(insights)
+    db.flush()
+    observe_processing_lag(db, insights)
+    db.commit()
+    return len(owned)
+
+def observe_processing_lag(db: Session, insights: List[Insight]):
+    """
+    Record insight processed_at minus feedback created_at for flushed insights
+    """
+    if not insights:
+        return
+    created = dict(db.execute(
+        select(Feedback.id, Feedback.created_at).where(Feedback.id.in_([insight.feedback_id for insight in insights]))
+    ).all())
+    for insight in insights:
+        created_at = created.get(insight.feedback_id)
+        if created_at is not None and insight.processed_at is not None:
+            INSIGHT_PROCESSING_LAG_SECONDS.observe(max(0.0, (insight.processed_at - created_at).total_seconds()))
+
+def fail_jobs(db: Session, worker_id: str, jobs: List, error: str,
+              max_attempts: int = INSIGHT_JOB_MAX_ATTEMPTS):
+    """
+    Release jobs after a failed attempt: retry later, or mark failed when out of attempts
+    """
+    now = datetime.utcnow()
+    for job_id, feedback_id, _, attempts in jobs:
+        if attempts >= max_attempts:
+            values = {"state": FAILED, "leased_until": None}
+        else:
+            values = {"state": PENDING, "leased_until": now + timedelta(seconds=RETRY_BACKOFF_SECONDS * attempts)}
+        INSIGHT_JOB_FAILURES.inc("failed" if values["state"] == FAILED else "retry")
+        db.execute(
+            update(InsightJob)
+            .where(InsightJob.id == job_id, InsightJob.lease_owner == worker_id, InsightJob.state == RUNNING)
+            .values(lease_owner=None, last_error=error[:2000], updated_at=now, **values)
+        )
+        print(f"Insight job {job_id} for feedback {feedback_id} failed (attempt {attempts}): {error.splitlines()[-1] if error else ''}")
+    db.commit()
+
+def requeue_missing_insights(db: Session) -> int:
+    """
+    Startup sweep: queue every feedback row that has neither an insight nor a job
+    Returns: number of jobs created
+    """
+    missing = (
+        select(Feedback.id, literal(PENDING))
+        .where(~exists().where(Insight.feedback_id == Feedback.id))
+        .where(~exists().where(InsightJob.feedback_id == Feedback.id))
+    )
+    result = db.execute(insert(InsightJob).from_select(["feedback_id", "state"], missing))
+    db.commit()
+    return result.rowcount or 0
+
+def queue_depth_query():
+    """
+    Select statement counting the jobs waiting for or undergoing analysis (deferred jobs excluded)
+    """
+    return select(func.count()).select_from(InsightJob).where(InsightJob.state.in_([PENDING, RUNNING]))
+
+def queue_depth(db: Session) -> int:
+    """
+    Number of jobs waiting for or undergoing analysis
+    """
+    return db.execute(queue_depth_query()).scalar_one()
+
+def collect_queue_metrics(db: Session):
+    """
+    Refresh the job queue gauges: jobs per state and age of the oldest backlog job
+    """
+    counts = dict(db.execute(select(InsightJob.state, func.count()).group_by(InsightJob.state)).all())
+    for state in (PENDING, RUNNING, DEFERRED, DONE, FAILED):
+        INSIGHT_JOBS.set(counts.get(state, 0), state)
+    
+    oldest = db.execute(
+        select(func.min(InsightJob.created_at)).where(InsightJob.state.in_([PENDING, RUNNING, DEFERRED]))
+    ).scalar_one()
+    INSIGHT_BACKLOG_OLDEST_SECONDS.set(
+        max(0.0, (datetime.utcnow() - oldest).total_seconds()) if oldest is not None else 0
+    )
+
+def analyze_jobs(db: Session, jobs: List, analyze_batch: Callable[[List[str]], List[dict]]) -> List[dict]:
+    """
+    Analyses for claimed jobs, in job order
+    
+    Near-duplicates copy the analysis of their cluster representative when
+    it is stored or analyzed in the same batch (see near_duplicates.py), so
+    a bug storm is analyzed once. A failed analysis is never copied.
+    """
+    feedback_ids = [feedback_id for _, feedback_id, _, _ in jobs]
+    in_batch = set(feedback_ids)
+    reused = {}
+    if NEAR_DUPLICATE_REUSE:
+        representatives, stored = reusable_analyses(db, feedback_ids)
+        reused = {
+            feedback_id: representative for feedback_id, representative in representatives.items()
+            if representative in stored or representative in in_batch
+        }
+    
+    to_analyze = [(feedback_id, message) for _, feedback_id, message, _ in jobs if feedback_id not in reused]
+    analyses = dict(zip(
+        [feedback_id for feedback_id, _ in to_analyze],
+        analyze_batch([message for _, message in to_analyze]) if to_analyze else [],
+    ))
+    
+    # A representative whose analysis failed in this batch passes nothing on; analyze its duplicates
+    retry = [
+        feedback_id for feedback_id, representative in reused.items()
+        if representative not in stored and is_failed_analysis(analyses[representative])
+    ]
+    if retry:
+        messages = {feedback_id: message for _, feedback_id, message, _ in jobs}
+        analyses.update(zip(retry, analyze_batch([messages[feedback_id] for feedback_id in retry])))
+        for feedback_id in retry:
+            del reused[feedback_id]
+    
+    if reused:
+        INSIGHT_ANALYSES_REUSED.inc(amount=len(reused))
+        for feedback_id, representative in reused.items():
+            analyses[feedback_id] = stored.get(representative) or analyses[representative]
+    return [analyses[feedback_id] for feedback_id in feedback_ids]
+
+def process_batch(session_factory: Callable[[], Session], worker_id: str,
+                  limit: int = INSIGHT_JOB_BATCH_SIZE) -> int:
+    """
+    Claim one batch of jobs, analyze it and store the insights
+    Returns: number of jobs claimed (0 when the queue is empty)
+    """
+    from admission import release_deferred
+    from analysis_executor import get_analysis_executor
+    
+    db = session_factory()
+    try:
+        with INSIGHT_BATCH_SECONDS.time("claim"):
+            release_deferred(db)
+            jobs = claim_jobs(db, worker_id, limit)
+        if not jobs:
+            return 0
+        
+        # Feedback deleted after its job was queued has nothing to analyze
+        missing = [job for job in jobs if job[2] is None]
+        if missing:
+            fail_jobs(db, worker_id, missing, "Feedback no longer exists", max_attempts=0)
+            jobs = [job for job in jobs if job[2] is not None]
+        
+        try:
+            with INSIGHT_BATCH_SECONDS.time("analyze"):
+                analyses = analyze_jobs(db, jobs, get_analysis_executor().analyze_batch)
+            with INSIGHT_BATCH_SECONDS.time("store"):
+                completed = complete_jobs(db, worker_id, jobs, analyses)
+            print(f"Insight processing completed for {completed} feedback messages")
+        except Exception:
+            db.rollback()
+            fail_jobs(db, worker_id, jobs, traceback.format_exc())
+        
+        return len(jobs) + len(missing)
+    finally:
+        db.close()
+
+class InsightWorker(threading.Thread):
+    """
+    Background thread draining the insight job queue
+    """
+    
+    def __init__(self, session_factory: Callable[[], Session], name: str, wake_event: threading.Event,
+                 batch_size: int = INSIGHT_JOB_BATCH_SIZE, poll_seconds: float = INSIGHT_JOB_POLL_SECONDS):
+        super().__init__(name=name, daemon=True)
+        self.session_factory = session_factory
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{name}"
+        self.wake_event = wake_event
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.stop_event = threading.Event()
+    
+    def run(self):
+        """
+        Claim and process batches until stopped
+        """
+        while not self.stop_event.is_set():
+            # Clear before claiming so a wake-up during the batch is not lost
+            self.wake_event.clear()
+            try:
+                claimed = process_batch(self.session_factory, self.worker_id, self.batch_size)
+            except Exception as e:
+                print(f"Insight worker {self.name} error: {str(e)}")
+                claimed = 0
+            
+            # Keep draining while there is work, otherwise sleep until woken
+            if not claimed:
+                self.wake_event.wait(self.poll_seconds)
+    
+    def stop(self):
+        """
+        Ask the thread to exit after its current batch
+        """
+        self.stop_event.set()
+        self.wake_event.set()
+
+_workers: List[InsightWorker] = []
+_wake_event = threading.Event()
+
+def wake_workers():
+    """
+    Signal idle workers that new jobs were queued
+    """
+    _wake_event.set()
+
+def start_workers(session_factory: Optional[Callable[[], Session]] = None, count: int = INSIGHT_WORKERS):
+    """
+    Re-queue feedback without insights and start the worker threads
+    """
+    if session_factory is None:
+        from database import SessionLocal
+        session_factory = SessionLocal
+    
+    db = session_factory()
+    try:
+        requeued = requeue_missing_insights(db)
+        if requeued:
+            print(f"Re-queued {requeued} feedback messages without insights")
+    finally:
+        db.close()
+    
+    for index in range(count):
+        worker = InsightWorker(session_factory, f"insight-worker-{index}", _wake_event)
+        worker.start()
+        _workers.append(worker)
+
+def stop_workers(timeout: float = 10):
+    """
+    Stop the worker threads; jobs they hold are re-claimed after their lease expires
+    """
+    for worker in _workers:
+        worker.stop()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
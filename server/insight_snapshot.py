@@ -0,0 +1,347 @@
+"""
+Columnar snapshot of the insights table for distribution analytics
+
+GET /api/insights/distribution reports sentiment histograms, percentiles
+and per-label priority breakdowns. Computing them row by row, or with one
+SQL query per statistic, gets slower as the table grows. This module keeps
+the insight columns the endpoint needs as NumPy arrays, and the endpoint
+works on whole arrays:
+
+- sentiment_score: float64, NaN when missing
+- priority_score: int16, -1 when missing
+- label: int8 index into LABELS, -1 for other or missing labels
+- timestamp: datetime64[us] of the feedback's timestamp, NaT when missing
+
+Insights are only ever inserted (archived ones keep being counted, as in
+the aggregate tables), so the snapshot is refreshed incrementally. Before
+each read it compares the data version (see data_version) with the one it
+last saw. If the version changed, it loads only the insights with an id
+above the highest one it holds. SQLite has one writer at a time, so ids
+are committed in increasing order. New rows go to a small in-memory tail.
+The tail is merged into the base arrays once it grows past
+INSIGHT_SNAPSHOT_TAIL_ROWS or an eighth of the base. A different data
+version epoch means a different database, so the snapshot is rebuilt,
+including the archived months (see feedback_archive).
+
+When INSIGHT_SNAPSHOT_PATH is set, the base arrays are written to that
+file and memory-mapped read-only, so all worker processes on the host
+share one copy through the page cache. A process that finds a newer file
+than its own base switches to it. Files are replaced atomically. The file
+holds a JSON header followed by each column's raw array, 64-byte aligned.
+
+Configuration comes from the environment:
+
+- INSIGHT_SNAPSHOT_PATH: shared snapshot file (default: none, per-process arrays)
+- INSIGHT_SNAPSHOT_TAIL_ROWS: new rows kept outside the base before a merge (default 10000)
+"""
+import json
+import os
+import struct
+import threading
+from collections import namedtuple
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+
+from data_version import data_version_query
+from database import Feedback, Insight
+
+INSIGHT_SNAPSHOT_PATH = os.getenv("INSIGHT_SNAPSHOT_PATH", "")
+INSIGHT_SNAPSHOT_TAIL_ROWS = int(os.getenv("INSIGHT_SNAPSHOT_TAIL_ROWS", 10000))
+
+# Label codes, in the order of the trend rollups
+LABELS = ("positive", "negative", "neutral")
+LABEL_CODES = {label: code for code, label in enumerate(LABELS)}
+
+# Width of the priority score histogram bins
+PRIORITY_BIN_WIDTH = 10
+
+# Reported percentiles
+PERCENTILES = (5, 50, 95)
+
+InsightColumns = namedtuple("InsightColumns", ["sentiment_score", "priority_score", "label", "timestamp"])
+
+COLUMN_DTYPES = InsightColumns(
+    sentiment_score=np.dtype("<f8"),
+    priority_score=np.dtype("<i2"),
+    label=np.dtype("i1"),
+    timestamp=np.dtype("<M8[us]"),
+)
+
+_FILE_MAGIC = b"INSNAP1\n"
+_ALIGNMENT = 64
+
+def empty_columns() -> InsightColumns:
+    return InsightColumns(*(np.empty(0, dtype=dtype) for dtype in COLUMN_DTYPES))
+
+def concat_columns(parts: Sequence[InsightColumns]) -> InsightColumns:
+    return InsightColumns(*(
+        np.concatenate([getattr(part, name) for part in parts]).astype(dtype, copy=False)
+        for name, dtype in zip(InsightColumns._fields, COLUMN_DTYPES)
+    ))
+
+def snapshot_query(after_id: int = 0):
+    """
+    Select statement for the snapshot rows of insights with an id above after_id
+    
+    The timestamp is read as stored text, which NumPy parses in one call.
+    """
+    return (
+        select(
+            Insight.id,
+            Insight.sentiment_score,
+            Insight.priority_score,
+            Insight.sentiment_label,
+            type_coerce(Feedback.timestamp, String),
+        )
+        .join(Feedback, Feedback.id == Insight.feedback_id)
+        .where(Insight.id > after_id)
+        .order_by(Insight.id)
+    )
+
+def rows_to_columns(rows: Sequence) -> Tuple[InsightColumns, int]:
+    """
+    Columns for snapshot_query rows
+    Returns: (columns, highest insight id, 0 without rows)
+    """
+    if not rows:
+        return empty_columns(), 0
+    ids, scores, priorities, labels, timestamps = zip(*rows)
+    # None becomes NaN in a float array
+    priorities = np.array(priorities, dtype=np.float64)
+    columns = InsightColumns(
+        sentiment_score=np.array(scores, dtype=COLUMN_DTYPES.sentiment_score),
+        priority_score=np.where(np.isnan(priorities), -1, priorities).astype(COLUMN_DTYPES.priority_score),
+        label=np.array([LABEL_CODES.get(label, -1) for label in labels], dtype=COLUMN_DTYPES.label),
+        timestamp=np.array(timestamps, dtype=COLUMN_DTYPES.timestamp),
+    )
+    return columns, max(ids)
+
+def write_snapshot_file(path: str, columns: InsightColumns, epoch: Optional[str], last_insight_id: int):
+    """
+    Write columns to a snapshot file, replacing it atomically
+    """
+    count = len(columns.sentiment_score)
+    layout, offset = {}, 0
+    for name, dtype in zip(InsightColumns._fields, COLUMN_DTYPES):
+        layout[name] = {"dtype": dtype.str, "offset": offset}
+        offset += -(-count * dtype.itemsize // _ALIGNMENT) * _ALIGNMENT
+    header = json.dumps({"epoch": epoch, "last_insight_id": last_insight_id, "count": count, "columns": layout}).encode()
+    data_start = -(-(len(_FILE_MAGIC) + 8 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+    
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    partial = f"{path}.partial-{os.getpid()}-{threading.get_ident()}"
+    with open(partial, "wb") as target:
+        target.write(_FILE_MAGIC + struct.pack("<Q", len(header)) + header)
+        for name in InsightColumns._fields:
+            target.seek(data_start + layout[name]["offset"])
+            target.write(np.ascontiguousarray(getattr(columns, name)).tobytes())
+        target.truncate(data_start + offset)
+        target.flush()
+        os.fsync(target.fileno())
+    os.replace(partial, path)
+
+def read_snapshot_file(path: str) -> Tuple[Dict, InsightColumns]:
+    """
+    Header and read-only memory-mapped columns of a snapshot file
+    """
+    with open(path, "rb") as source:
+        if source.read(len(_FILE_MAGIC)) != _FILE_MAGIC:
+            raise ValueError(f"{path} is not an insight snapshot")
+        (length,) = struct.unpack("<Q", source.read(8))
+        header = json.loads(source.read(length))
+    data_start = -(-(len(_FILE_MAGIC) + 8 + length) // _ALIGNMENT) * _ALIGNMENT
+    
+    count = header["count"]
+    if count == 0:
+        return header, empty_columns()
+    columns = InsightColumns(*(
+        np.memmap(path, dtype=np.dtype(header["columns"][name]["dtype"]), mode="r",
+                  offset=data_start + header["columns"][name]["offset"], shape=(count,))
+        for name in InsightColumns._fields
+    ))
+    return header, columns
+
+class InsightSnapshot:
+    """
+    Base and tail columns of the insights table, refreshed from the database on read
+    """
+    
+    def __init__(self, path: Optional[str] = None, tail_rows: int = INSIGHT_SNAPSHOT_TAIL_ROWS):
+        self.path = path or None
+        self.tail_rows = tail_rows
+        self._lock = threading.Lock()
+        self._file_stamp = None
+        self._reset(None)
+    
+    def _reset(self, epoch: Optional[str]):
+        self._epoch = epoch
+        self._version = None
+        self._base = empty_columns()
+        self._tail = empty_columns()
+        self._last_id = 0
+    
+    @property
+    def last_insight_id(self) -> int:
+        return self._last_id
+    
+    def refresh(self, connection) -> List[InsightColumns]:
+        """
+        Bring the snapshot up to date with the data version read on connection
+        Returns: the column parts to compute on; they are never modified afterwards
+        """
+        row = connection.execute(data_version_query()).first()
+        epoch, version = (row.epoch, row.version) if row is not None else (None, 0)
+        with self._lock:
+            if (epoch, version) != (self._epoch, self._version):
+                self._update(connection, epoch)
+                self._version = version
+            return [self._base, self._tail]
+    
+    def _update(self, connection, epoch: Optional[str]):
+        from feedback_archive import feedback_segments_query, store
+        
+        current = epoch == self._epoch and self._version is not None
+        if self.path and self._adopt_file(epoch):
+            current = True
+        
+        if not current:
+            # First use or another database: build from every archived month, then the hot tables
+            self._reset(epoch)
+            parts, last_ids = [], []
+            segments = connection.execute(feedback_segments_query()).all()
+            for rows in [store.execute(segment, snapshot_query()) for segment in segments] + [
+                connection.execute(snapshot_query()).all()
+            ]:
+                columns, last_id = rows_to_columns(rows)
+                parts.append(columns)
+                last_ids.append(last_id)
+            self._base, self._last_id = concat_columns(parts), max(last_ids)
+            self._write_base()
+            return
+        
+        columns, last_id = rows_to_columns(connection.execute(snapshot_query(self._last_id)).all())
+        if not last_id:
+            return
+        self._tail = concat_columns([self._tail, columns])
+        self._last_id = last_id
+        if len(self._tail.label) > max(self.tail_rows, len(self._base.label) // 8):
+            self._base, self._tail = concat_columns([self._base, self._tail]), empty_columns()
+            self._write_base()
+    
+    def _adopt_file(self, epoch: Optional[str]) -> bool:
+        """
+        Switch to the shared file if another process wrote a newer base for this database
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._file_stamp:
+            return False
+        self._file_stamp = stamp
+        
+        header, columns = read_snapshot_file(self.path)
+        if header["epoch"] != epoch:
+            return False
+        if epoch == self._epoch and self._version is not None and header["last_insight_id"] <= self._last_id:
+            return False
+        self._epoch = epoch
+        self._base, self._tail, self._last_id = columns, empty_columns(), header["last_insight_id"]
+        return True
+    
+    def _write_base(self):
+        """
+        Share the base through the snapshot file and map it back from there
+        """
+        if not self.path:
+            return
+        write_snapshot_file(self.path, self._base, self._epoch, self._last_id)
+        stat = os.stat(self.path)
+        self._file_stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        _, self._base = read_snapshot_file(self.path)
+
+snapshot = InsightSnapshot(INSIGHT_SNAPSHOT_PATH)
+
+def refresh_snapshot(session) -> List[InsightColumns]:
+    """
+    Up-to-date column parts of the shared snapshot, read through a session's connection
+    """
+    return snapshot.refresh(session.connection())
+
+def _select(parts: Sequence[InsightColumns], start: Optional[datetime], end: Optional[datetime]) -> InsightColumns:
+    """
+    Columns of the insights whose feedback timestamp is within [start, end]
+    """
+    if start is None and end is None:
+        nonempty = [part for part in parts if part.label.size]
+        # A single part is used as is, so a mapped base is not copied
+        return nonempty[0] if len(nonempty) == 1 else concat_columns(parts)
+    selected = []
+    for part in parts:
+        mask = np.ones(len(part.label), dtype=bool)
+        if start is not None:
+            mask &= part.timestamp >= np.datetime64(start, "us")
+        if end is not None:
+            mask &= part.timestamp <= np.datetime64(end, "us")
+        selected.append(InsightColumns(*(column[mask] for column in part)))
+    return concat_columns(selected)
+
+def _summary(values: np.ndarray, counts: np.ndarray, edges: np.ndarray) -> Dict:
+    """
+    Count, mean, percentiles and histogram of a score array
+    """
+    if values.size:
+        mean = float(values.mean())
+        percentiles = [float(value) for value in np.percentile(values, PERCENTILES)]
+    else:
+        mean, percentiles = None, [None] * len(PERCENTILES)
+    return {
+        "count": int(values.size),
+        "mean": mean,
+        **{f"p{percentile}": value for percentile, value in zip(PERCENTILES, percentiles)},
+        "histogram": [
+            {"start": float(start), "end": float(end), "count": int(count)}
+            for start, end, count in zip(edges[:-1], edges[1:], counts)
+        ],
+    }
+
+def insight_distribution(parts: Sequence[InsightColumns], start: Optional[datetime] = None,
+                         end: Optional[datetime] = None, bins: int = 20) -> Dict:
+    """
+    Sentiment and priority distributions of the insights in a feedback timestamp range
+    
+    Sentiment scores are binned into `bins` equal bins over [-1, 1]; priority
+    scores into PRIORITY_BIN_WIDTH wide bins from 0, the same bins for the
+    overall and the per-label breakdowns.
+    """
+    columns = _select(parts, start, end)
+    
+    sentiment = columns.sentiment_score[~np.isnan(columns.sentiment_score)]
+    sentiment_counts, sentiment_edges = np.histogram(np.clip(sentiment, -1.0, 1.0), bins=bins, range=(-1.0, 1.0))
+    
+    scored = columns.priority_score >= 0
+    priority_bins = int(columns.priority_score.max(initial=0)) // PRIORITY_BIN_WIDTH + 1
+    priority_edges = np.arange(priority_bins + 1) * PRIORITY_BIN_WIDTH
+    
+    def priority_summary(mask: np.ndarray) -> Dict:
+        values = columns.priority_score[mask]
+        return _summary(values, np.bincount(values // PRIORITY_BIN_WIDTH, minlength=priority_bins), priority_edges)
+    
+    return {
+        "count": int(columns.label.size),
+        "sentiment": _summary(sentiment, sentiment_counts, sentiment_edges),
+        "priority": priority_summary(scored),
+        "labels": [
+            {
+                "label": label,
+                "count": int(np.count_nonzero(columns.label == code)),
+                "priority": priority_summary(scored & (columns.label == code)),
+            }
+            for code, label in enumerate(LABELS)
+        ],
+    }
@@ -0,0 +1,309 @@
+"""
+Hourly and daily insight trend rollups
+
+Every flush that writes new insights adds them to one hour bucket and one
+day bucket (by feedback timestamp) in trend_buckets, which keeps the
+insight count, the sentiment sum for the average, and counts by sentiment
+label and priority level, and to the matching trend_themes rows. GET
+/api/insights/trends reads only these tables, so a year of daily buckets is
+a few hundred rows no matter how many insights there are.
+
+Run `python -m insight_trends rebuild [--from DATE] [--to DATE]` to
+recompute the rollups of whole days from the insights table, e.g. after
+insights were corrected or deleted.
+"""
+import argparse
+import sys
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, delete, event, func, insert, literal, select, true
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import Feedback, Insight, InsightTheme, TrendBucket, TrendTheme
+from theme_index import insight_themes
+
+GRANULARITIES = ("hour", "day")
+
+# Bucket start as stored in a DateTime column, computed by SQLite on rebuild
+_SQL_BUCKET_FORMATS = {
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "day": "%Y-%m-%d 00:00:00.000000",
+}
+
+_LABEL_COLUMNS = {"positive": "positive_count", "negative": "negative_count", "neutral": "neutral_count"}
+_PRIORITY_COLUMNS = {"HIGH": "high_count", "MEDIUM": "medium_count", "LOW": "low_count"}
+_COUNT_COLUMNS = ["count", "sentiment_total", "sentiment_count", *_LABEL_COLUMNS.values(), *_PRIORITY_COLUMNS.values()]
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """
+    Start of the hour or day bucket containing a timestamp
+    """
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Feedback timestamps are stored as naive UTC; convert aware query values to match
+    """
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _add_buckets(connection, rows: List[Dict]):
+    """
+    Add bucket counts to the rollup, creating missing buckets
+    """
+    if not rows:
+        return
+    statement = sqlite_insert(TrendBucket)
+    statement = statement.on_conflict_do_update(
+        index_elements=["granularity", "bucket_start"],
+        set_={column: getattr(TrendBucket, column) + statement.excluded[column] for column in _COUNT_COLUMNS},
+    )
+    connection.execute(statement, rows)
+
+def _add_themes(connection, rows: List[Dict]):
+    """
+    Add theme counts to the rollup, creating missing bucket themes
+    """
+    if not rows:
+        return
+    statement = sqlite_insert(TrendTheme)
+    statement = statement.on_conflict_do_update(
+        index_elements=["granularity", "bucket_start", "theme"],
+        set_={"count": TrendTheme.count + statement.excluded["count"]},
+    )
+    connection.execute(statement, rows)
+
+def apply_trends(connection, insights: Iterable[Insight]):
+    """
+    Add newly written insights to their hour and day buckets
+    """
+    insights = list(insights)
+    feedback_ids = {insight.feedback_id for insight in insights}
+    if not feedback_ids:
+        return
+    
+    timestamps = dict(
+        connection.execute(select(Feedback.id, Feedback.timestamp).where(Feedback.id.in_(feedback_ids))).all()
+    )
+    buckets: Dict[tuple, Counter] = defaultdict(Counter)
+    themes = Counter()
+    
+    for insight in insights:
+        timestamp = timestamps.get(insight.feedback_id)
+        if timestamp is None:
+            continue
+        
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(timestamp, granularity))
+            counts = buckets[key]
+            counts["count"] += 1
+            if insight.sentiment_score is not None:
+                counts["sentiment_total"] += insight.sentiment_score
+                counts["sentiment_count"] += 1
+            if insight.sentiment_label in _LABEL_COLUMNS:
+                counts[_LABEL_COLUMNS[insight.sentiment_label]] += 1
+            if insight.priority_level in _PRIORITY_COLUMNS:
+                counts[_PRIORITY_COLUMNS[insight.priority_level]] += 1
+            for theme in insight_themes(insight):
+                themes[key + (theme,)] += 1
+    
+    _add_buckets(connection, [
+        {"granularity": granularity, "bucket_start": start, **{column: counts[column] for column in _COUNT_COLUMNS}}
+        for (granularity, start), counts in buckets.items()
+    ])
+    _add_themes(connection, [
+        {"granularity": granularity, "bucket_start": start, "theme": theme, "count": count}
+        for (granularity, start, theme), count in themes.items()
+    ])
+
+@event.listens_for(Session, "after_flush")
+def _update_trends_after_flush(session, flush_context):
+    """
+    Update the trend rollups in the same transaction as the insight write
+    """
+    new_insights = [obj for obj in session.new if isinstance(obj, Insight)]
+    if new_insights:
+        apply_trends(session.connection(), new_insights)
+
+def rebuild_trends(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """
+    Recompute the rollups of every day from start up to (excluding) end
+    
+    The range is widened to whole days so hour and day buckets stay
+    consistent; without bounds everything is rebuilt. Counts are computed in
+    SQL, themes from the theme index, so no JSON column is decoded.
+    Returns: number of insights covered
+    """
+    from feedback_archive import feedback_segments_query, store
+    
+    start = bucket_start(to_naive_utc(start), "day") if start else None
+    if end:
+        end = to_naive_utc(end)
+        end = end if end == bucket_start(end, "day") else bucket_start(end, "day") + timedelta(days=1)
+    
+    def in_range(column):
+        conditions = []
+        if start:
+            conditions.append(column >= start)
+        if end:
+            conditions.append(column < end)
+        return and_(true(), *conditions)
+    
+    connection = db.connection()
+    connection.execute(delete(TrendBucket).where(in_range(TrendBucket.bucket_start)))
+    connection.execute(delete(TrendTheme).where(in_range(TrendTheme.bucket_start)))
+    
+    timestamp_in_range = and_(Feedback.timestamp.is_not(None), in_range(Feedback.timestamp))
+    queries = {}
+    for granularity, bucket_format in _SQL_BUCKET_FORMATS.items():
+        bucket = func.strftime(bucket_format, Feedback.timestamp)
+        queries[granularity] = (
+            select(
+                literal(granularity),
+                bucket,
+                func.count(),
+                func.coalesce(func.sum(Insight.sentiment_score), 0.0),
+                func.count(Insight.sentiment_score),
+                *[func.sum(case((Insight.sentiment_label == label, 1), else_=0)) for label in _LABEL_COLUMNS],
+                *[func.sum(case((Insight.priority_level == level, 1), else_=0)) for level in _PRIORITY_COLUMNS],
+            )
+            .join(Feedback, Feedback.id == Insight.feedback_id)
+            .where(timestamp_in_range)
+            .group_by(bucket),
+            select(literal(granularity), bucket, InsightTheme.theme, func.count())
+            .join(Insight, Insight.id == InsightTheme.insight_id)
+            .join(Feedback, Feedback.id == Insight.feedback_id)
+            .where(timestamp_in_range)
+            .group_by(bucket, InsightTheme.theme),
+        )
+        bucket_query, theme_query = queries[granularity]
+        connection.execute(insert(TrendBucket).from_select(["granularity", "bucket_start", *_COUNT_COLUMNS], bucket_query))
+        connection.execute(insert(TrendTheme).from_select(["granularity", "bucket_start", "theme", "count"], theme_query))
+    
+    count_query = (
+        select(func.count())
+        .select_from(Insight)
+        .join(Feedback, Feedback.id == Insight.feedback_id)
+        .where(timestamp_in_range)
+    )
+    total = connection.execute(count_query).scalar_one()
+    
+    # Archived months hold the same tables; their feedback timestamps need not
+    # follow created_at, so every segment is read (see feedback_archive)
+    for segment in connection.execute(feedback_segments_query()).all():
+        for bucket_query, theme_query in queries.values():
+            _add_buckets(connection, [
+                {"granularity": row[0], "bucket_start": datetime.fromisoformat(row[1]),
+                 **dict(zip(_COUNT_COLUMNS, row[2:]))}
+                for row in store.execute(segment, bucket_query)
+            ])
+            _add_themes(connection, [
+                {"granularity": row[0], "bucket_start": datetime.fromisoformat(row[1]), "theme": row[2], "count": row[3]}
+                for row in store.execute(segment, theme_query)
+            ])
+        total += store.execute(segment, count_query)[0][0]
+    
+    db.commit()
+    return total
+
+def trend_queries(granularity: str = "day", start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  themes: int = 3) -> Dict:
+    """
+    Select statements for GET /api/insights/trends, served by the rollup tables
+    
+    Selects the buckets overlapping [start, end] in time order and the top
+    `themes` themes of each of them.
+    Returns: {"buckets", "themes"}
+    """
+    def in_range(model):
+        conditions = [model.granularity == granularity]
+        if start:
+            conditions.append(model.bucket_start >= bucket_start(to_naive_utc(start), granularity))
+        if end:
+            conditions.append(model.bucket_start <= to_naive_utc(end))
+        return conditions
+    
+    ranked = (
+        select(
+            TrendTheme.bucket_start,
+            TrendTheme.theme,
+            TrendTheme.count,
+            func.row_number().over(
+                partition_by=TrendTheme.bucket_start,
+                order_by=(TrendTheme.count.desc(), TrendTheme.theme),
+            ).label("rank"),
+        )
+        .where(*in_range(TrendTheme))
+        .subquery()
+    )
+    return {
+        "buckets": (
+            select(TrendBucket.bucket_start, *[getattr(TrendBucket, column) for column in _COUNT_COLUMNS])
+            .where(*in_range(TrendBucket))
+            .order_by(TrendBucket.bucket_start)
+        ),
+        "themes": (
+            select(ranked.c.bucket_start, ranked.c.theme, ranked.c.count)
+            .where(ranked.c.rank <= themes)
+            .order_by(ranked.c.bucket_start, ranked.c.rank)
+        ),
+    }
+
+def build_insight_trends(granularity: str, rows: Dict[str, List]) -> Dict:
+    """
+    InsightTrends response from the rows of the trend_queries statements
+    
+    Built as plain dicts: the route's response model validates them once,
+    which matters for a year of hourly buckets.
+    """
+    themes = defaultdict(list)
+    for row in rows["themes"]:
+        themes[row.bucket_start].append({"theme": row.theme, "count": row.count})
+    
+    return {
+        "bucket": granularity,
+        "buckets": [
+            {
+                "bucket_start": row.bucket_start,
+                "count": row.count,
+                "average_sentiment": round(row.sentiment_total / row.sentiment_count, 4) if row.sentiment_count else None,
+                "sentiment_labels": {label: getattr(row, column) for label, column in _LABEL_COLUMNS.items()},
+                "priority_levels": {level: getattr(row, column) for level, column in _PRIORITY_COLUMNS.items()},
+                "top_themes": themes[row.bucket_start],
+            }
+            for row in rows["buckets"]
+        ],
+    }
+
+def main(argv: List[str]) -> int:
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(prog="python -m insight_trends",
+                                     description="Recompute the hourly and daily insight trend rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat,
+                        help="first day to rebuild (ISO 8601, default: all)")
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat,
+                        help="rebuild up to this time, rounded up to a whole day (default: all)")
+    args = parser.parse_args(argv)
+    
+    from database import SessionLocal, create_tables
+    
+    create_tables()
+    db = SessionLocal()
+    try:
+        total = rebuild_trends(db, args.start, args.end)
+        print(f"Rebuilt insight trends from {total} insights")
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,222 @@
+"""
+Keyword rule table for priority scoring and recommendations
+
+The keyword lists used by calculate_priority_score and the theme lists used
+by generate_recommendations live in keyword_rules.json (or the file named by
+KEYWORD_RULES_PATH) and are compiled once into a single matcher. A message
+is scanned in one pass that reports every rule with at least one keyword in
+it, instead of one substring scan per keyword.
+
+Matching keeps the original semantics: a rule fires when any of its
+keywords occurs anywhere in the lowercased message, including inside a
+longer word. The matcher uses an Aho-Corasick automaton when pyahocorasick
+is installed and otherwise a regex compiled from a keyword trie.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - exercised only without the optional dependency
+    ahocorasick = None
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "keyword_rules.json")
+KEYWORD_RULES_PATH = os.getenv("KEYWORD_RULES_PATH", DEFAULT_RULES_PATH)
+
+class PriorityRule(NamedTuple):
+    name: str
+    points: int
+    keywords: tuple
+    description: str = ""
+
+class ThemeRule(NamedTuple):
+    name: str
+    recommendation: str
+    themes: frozenset
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """
+    Build a regex alternation shaped like a trie of the keywords, so the
+    engine never re-reads a shared prefix; the longest keyword wins
+    """
+    trie: Dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # A keyword ends here; a longer one may continue
+            return "(?:" + body + ")?" if len(branches) == 1 else body + "?"
+        return body
+    
+    return build(trie)
+
+class KeywordMatcher:
+    """
+    Single-pass multi-keyword matcher reporting which groups occur in a text
+    """
+    
+    def __init__(self, groups: Dict[str, Sequence[str]], backend: Optional[str] = None):
+        if backend is None:
+            backend = "aho-corasick" if ahocorasick is not None else "regex"
+        if backend not in ("aho-corasick", "regex") or (backend == "aho-corasick" and ahocorasick is None):
+            raise ValueError(f"Unavailable keyword matcher backend: {backend}")
+        
+        self.group_names = list(groups)
+        self.backend = backend
+        
+        # Keyword -> indexes of the groups that contain it
+        owners: Dict[str, Set[int]] = {}
+        for index, keywords in enumerate(groups.values()):
+            for keyword in keywords:
+                if keyword:
+                    owners.setdefault(keyword.lower(), set()).add(index)
+        self._owners = {keyword: tuple(sorted(indexes)) for keyword, indexes in owners.items()}
+        
+        if not self._owners:
+            self._automaton = None
+            self._pattern = None
+        elif backend == "aho-corasick":
+            self._automaton = ahocorasick.Automaton()
+            for keyword, indexes in self._owners.items():
+                self._automaton.add_word(keyword, indexes)
+            self._automaton.make_automaton()
+        else:
+            self._pattern = re.compile(_trie_pattern(self._owners))
+            # A match is the longest keyword at its position; shorter keywords
+            # starting at the same position are its prefixes and hit too
+            self._prefix_owners = {
+                keyword: tuple(sorted({
+                    index
+                    for length in range(1, len(keyword) + 1)
+                    for index in self._owners.get(keyword[:length], ())
+                }))
+                for keyword in self._owners
+            }
+    
+    def matching_groups(self, text: str) -> Set[str]:
+        """
+        Names of the groups with at least one keyword in text (case-insensitive)
+        """
+        if not self._owners or not text:
+            return set()
+        
+        text = text.lower()
+        total = len(self.group_names)
+        hits: Set[int] = set()
+        
+        if self.backend == "aho-corasick":
+            for _, indexes in self._automaton.iter(text):
+                hits.update(indexes)
+                if len(hits) == total:
+                    break
+        else:
+            search = self._pattern.search
+            match = search(text)
+            while match is not None:
+                hits.update(self._prefix_owners[match.group()])
+                if len(hits) == total:
+                    break
+                # Resume one character later so overlapping keywords are found
+                match = search(text, match.start() + 1)
+        
+        return {self.group_names[index] for index in hits}
+
+class KeywordRules:
+    """
+    Compiled rule table loaded from a keyword rules file
+    """
+    
+    def __init__(self, priority_rules: List[PriorityRule], theme_rules: List[ThemeRule], fingerprint: str = ""):
+        self.priority_rules = priority_rules
+        self.theme_rules = theme_rules
+        self.fingerprint = fingerprint
+        self.matcher = KeywordMatcher({rule.name: rule.keywords for rule in priority_rules})
+    
+    @classmethod
+    def from_dict(cls, config: Dict) -> "KeywordRules":
+        """
+        Build the rule table from a parsed rules file
+        """
+        try:
+            priority_rules = [
+                PriorityRule(
+                    name=rule["name"],
+                    points=int(rule["points"]),
+                    keywords=tuple(rule["keywords"]),
+                    description=rule.get("description", ""),
+                )
+                for rule in config.get("priority_rules", [])
+            ]
+            theme_rules = [
+                ThemeRule(
+                    name=rule["name"],
+                    recommendation=rule["recommendation"],
+                    themes=frozenset(rule["themes"]),
+                )
+                for rule in config.get("theme_recommendation_rules", [])
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid keyword rules: {str(e)}") from e
+        
+        names = [rule.name for rule in priority_rules]
+        if len(names) != len(set(names)):
+            raise ValueError("Invalid keyword rules: duplicate priority rule names")
+        
+        canonical = json.dumps(config, sort_keys=True, separators=(",", ":"))
+        return cls(priority_rules, theme_rules, hashlib.sha256(canonical.encode()).hexdigest()[:16])
+    
+    @classmethod
+    def load(cls, path: str = KEYWORD_RULES_PATH) -> "KeywordRules":
+        """
+        Load and compile a keyword rules JSON file
+        """
+        with open(path, encoding="utf-8") as rules_file:
+            return cls.from_dict(json.load(rules_file))
+    
+    def priority_points(self, message: str) -> int:
+        """
+        Sum of the points of every priority rule with a keyword in the message
+        """
+        hits = self.matcher.matching_groups(message)
+        return sum(rule.points for rule in self.priority_rules if rule.name in hits)
+    
+    def theme_recommendations(self, themes: Iterable[str]) -> List[str]:
+        """
+        Recommendations of the theme rules matching any of the themes, in rule order
+        """
+        themes = set(themes)
+        return [rule.recommendation for rule in self.theme_rules if not rule.themes.isdisjoint(themes)]
+
+_rules: Optional[KeywordRules] = None
+_rules_lock = threading.Lock()
+
+def get_keyword_rules() -> KeywordRules:
+    """
+    Return the shared rule table, loading it on first use
+    """
+    global _rules
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                _rules = KeywordRules.load(KEYWORD_RULES_PATH)
+    return _rules
+
+def set_keyword_rules(rules: Optional[KeywordRules]):
+    """
+    Replace the shared rule table; None reloads it from the rules file on next use
+    """
+    global _rules
+    with _rules_lock:
+        _rules = rules
@@ -0,0 +1,344 @@
+"""
+Prometheus metrics
+
+A small, dependency-free implementation of counters, gauges and histograms
+rendered in the Prometheus text exposition format by GET /metrics.
+Recording a sample is a bisect and two additions under a lock, cheap
+enough to leave on for every request and pipeline stage.
+
+Pipeline stages run in the analysis worker processes. Each task drains the
+samples recorded in its worker (drain_samples) and ships them back with its
+result, and the API process merges them (merge_samples), so /metrics shows
+every process's work without shared memory.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond rule stages up to multi-second requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Processing lag spans seconds (live traffic) to hours (backlog after an outage)
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 21600.0, 86400.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Counter:
+    """
+    Monotonic counter with optional labels
+    """
+    
+    type = "counter"
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+    
+    def drain(self) -> Dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+    
+    def merge(self, values: Dict):
+        with self._lock:
+            for labels, amount in values.items():
+                self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in items]
+
+class Gauge:
+    """
+    Gauge set by the application, or read from a callback at scrape time
+    The callback returns {label values tuple: value}
+    """
+    
+    type = "gauge"
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+    
+    def value(self, *labels: str) -> float:
+        values = self.callback() if self.callback is not None else self._values
+        return values.get(labels, 0)
+    
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            values = self.callback()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in sorted(values.items())
+        ]
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+    
+    def __init__(self, histogram: "Histogram", labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+class Histogram:
+    """
+    Histogram with fixed buckets and optional labels
+    """
+    
+    type = "histogram"
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def time(self, *labels: str) -> _Timer:
+        """
+        Context manager observing the duration of its block
+        """
+        return _Timer(self, labels)
+    
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+    
+    def drain(self) -> Dict:
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+    
+    def merge(self, series: Dict):
+        with self._lock:
+            for labels, (bucket_counts, total, count) in series.items():
+                current = self._series.get(labels)
+                if current is None:
+                    self._series[labels] = [list(bucket_counts), total, count]
+                    continue
+                current[0] = [a + b for a, b in zip(current[0], bucket_counts)]
+                current[1] += total
+                current[2] += count
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        
+        lines = []
+        for labels, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Registry:
+    """
+    Ordered collection of metrics rendered together
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+    
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def unregister(self, name: str):
+        self._metrics.pop(name, None)
+    
+    def metrics(self) -> Iterable:
+        return list(self._metrics.values())
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            try:
+                samples = metric.render()
+            except Exception as e:
+                # One broken collector must not take down the whole scrape
+                print(f"Metric {metric.name} could not be collected: {str(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+PIPELINE_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "feedback_pipeline_stage_seconds",
+    "Time spent in each feedback analysis stage, per message",
+    ["stage"],
+))
+ANALYSIS_FAILURES = REGISTRY.register(Counter(
+    "feedback_analysis_failures_total",
+    "Messages whose analysis failed and fell back to the manual review result",
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "API request latency by route template",
+    ["method", "route", "status"],
+))
+INSIGHT_PROCESSING_LAG_SECONDS = REGISTRY.register(Histogram(
+    "insight_processing_lag_seconds",
+    "Time from feedback creation to its insight being stored",
+    buckets=LAG_BUCKETS,
+))
+INSIGHT_JOB_FAILURES = REGISTRY.register(Counter(
+    "insight_job_failures_total",
+    "Insight job attempts that failed, by outcome (retry or failed)",
+    ["outcome"],
+))
+INSIGHT_BATCH_SECONDS = REGISTRY.register(Histogram(
+    "insight_job_batch_seconds",
+    "Time per insight job batch step: claim, analyze (incl. cache) and store (DB write)",
+    ["step"],
+))
+INSIGHT_JOBS = REGISTRY.register(Gauge(
+    "insight_jobs",
+    "Insight jobs by state; pending plus running is the background backlog",
+    ["state"],
+))
+INSIGHT_BACKLOG_OLDEST_SECONDS = REGISTRY.register(Gauge(
+    "insight_backlog_oldest_seconds",
+    "Age of the oldest pending, running or deferred insight job",
+))
+INSIGHT_ANALYSES_REUSED = REGISTRY.register(Counter(
+    "insight_analyses_reused_total",
+    "Insights copied from the representative of their near-duplicate cluster instead of analyzed",
+))
+ANALYSIS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "analysis_executor_in_flight",
+    "Analysis tasks submitted to the executor and not finished",
+))
+FEEDBACK_ADMISSIONS = REGISTRY.register(Counter(
+    "feedback_admissions_total",
+    "Feedback submissions by admission decision (accepted, deferred or rejected)",
+    ["decision"],
+))
+ADMISSION_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "feedback_admission_queue_depth",
+    "Pending and running insight jobs as last seen by admission control",
+))
+ADMISSION_SATURATED = REGISTRY.register(Gauge(
+    "feedback_admission_saturated",
+    "1 from the queue reaching the high watermark until it drains to the low watermark",
+))
+INSIGHT_JOBS_RELEASED = REGISTRY.register(Counter(
+    "insight_jobs_released_total",
+    "Deferred insight jobs moved back to the pending queue",
+))
+
+# Metrics recorded inside analysis worker processes and shipped back with results
+_WORKER_METRICS = (PIPELINE_STAGE_SECONDS, ANALYSIS_FAILURES)
+
+def drain_samples() -> Dict[str, Dict]:
+    """
+    Take the worker-side samples recorded since the last drain
+    """
+    return {metric.name: metric.drain() for metric in _WORKER_METRICS}
+
+def merge_samples(samples: Optional[Dict[str, Dict]]):
+    """
+    Add samples drained in a worker process to this process's metrics
+    """
+    if not samples:
+        return
+    for metric in _WORKER_METRICS:
+        if samples.get(metric.name):
+            metric.merge(samples[metric.name])
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency by route template
+    """
+    
+    def __init__(self, app, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        
+        status = {"code": 500}
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+        
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            # Label by template, not raw path, so ids and query strings do not explode cardinality
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], template, str(status["code"]))
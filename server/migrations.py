@@ -0,0 +1,148 @@
+"""
+Data migrations applied on startup
+
+create_all only creates missing tables, so anything that has to backfill
+existing rows is registered here and recorded in schema_migrations once it
+has run.
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, String, inspect, select
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.orm import Session
+
+from database import Base
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    
+    name = Column(String(100), primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+def _build_insight_aggregates(db: Session):
+    from insight_aggregates import rebuild_aggregates
+    
+    rebuild_aggregates(db)
+
+def _backfill_theme_index(db: Session):
+    from insight_aggregates import rebuild_aggregates
+    from theme_index import backfill_theme_index
+    
+    backfill_theme_index(db)
+    # Aggregates are rebuilt from the theme index, so refresh them now that it is filled
+    rebuild_aggregates(db)
+
+def _build_insight_trends(db: Session):
+    from insight_trends import rebuild_trends
+    
+    rebuild_trends(db)
+
+def _build_feedback_search_index(db: Session):
+    from feedback_search import rebuild_search_index
+    
+    rebuild_search_index(db.connection())
+
+def _start_data_version(db: Session):
+    from data_version import bump_data_version
+    
+    # Give existing data an epoch, so its ETag differs from any other database's
+    bump_data_version(db.connection())
+
+def _cluster_near_duplicates(db: Session):
+    from near_duplicates import rebuild_clusters
+    
+    rebuild_clusters(db)
+
+def _autoincrement_ids(db: Session):
+    from database import Feedback, Insight
+    from feedback_archive import archived_max_ids
+    from feedback_search import SEARCH_INDEX_DDL
+    
+    connection = db.connection()
+    if connection.dialect.name != "sqlite":
+        return
+    
+    # Tables created before AUTOINCREMENT reused the highest ids once those rows were archived;
+    # SQLite cannot alter that, so copy them into a new table with it
+    for table in (Feedback.__table__, Insight.__table__):
+        sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar_one()
+        if "AUTOINCREMENT" in sql.upper():
+            continue
+        rebuilt = f"{table.name}_rebuilt"
+        columns = ", ".join(column.name for column in table.columns)
+        ddl = str(CreateTable(table).compile(dialect=connection.dialect)).strip()
+        connection.exec_driver_sql(ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {rebuilt} ", 1))
+        connection.exec_driver_sql(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table.name}")
+        connection.exec_driver_sql(f"DROP TABLE {table.name}")
+        connection.exec_driver_sql(f"ALTER TABLE {rebuilt} RENAME TO {table.name}")
+        for index in table.indexes:
+            index.create(bind=connection)
+    
+    # Dropping the old feedback table dropped the search index triggers with it
+    for statement in SEARCH_INDEX_DDL:
+        connection.exec_driver_sql(statement)
+    
+    # Start new ids above every archived id, including rows archived before this migration
+    for table, archived_id in zip((Feedback.__table__, Insight.__table__), archived_max_ids(connection)):
+        if not connection.exec_driver_sql(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (archived_id, table.name)
+        ).rowcount:
+            connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, archived_id))
+
+def _archive_score_ranges(db: Session):
+    from database import ArchiveSegment
+    from feedback_archive import backfill_score_ranges
+    
+    # create_all does not add columns to an existing table
+    connection = db.connection()
+    existing = {column["name"] for column in inspect(connection).get_columns(ArchiveSegment.__tablename__)}
+    for column in (ArchiveSegment.sentiment_min, ArchiveSegment.sentiment_max,
+                   ArchiveSegment.priority_min, ArchiveSegment.priority_max):
+        if column.key not in existing:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {ArchiveSegment.__tablename__} ADD COLUMN {column.key} {column.type.compile(connection.dialect)}"
+            )
+    backfill_score_ranges(connection)
+
+# Ordered list of (name, migration); never rename or reorder applied entries
+MIGRATIONS: List[Tuple[str, Callable[[Session], None]]] = [
+    ("0001_insight_aggregates", _build_insight_aggregates),
+    ("0002_insight_theme_index", _backfill_theme_index),
+    ("0003_insight_trends", _build_insight_trends),
+    ("0004_feedback_search_index", _build_feedback_search_index),
+    ("0005_data_version", _start_data_version),
+    ("0006_near_duplicate_clusters", _cluster_near_duplicates),
+    ("0007_autoincrement_ids", _autoincrement_ids),
+    ("0008_archive_score_ranges", _archive_score_ranges),
+]
+
+def run_migrations(bind) -> List[str]:
+    """
+    Apply every migration that has not been recorded yet
+    Returns: names of the migrations applied by this call
+    """
+    SchemaMigration.__table__.create(bind=bind, checkfirst=True)
+    
+    db = Session(bind=bind)
+    applied = []
+    try:
+        done = set(db.scalars(select(SchemaMigration.name)))
+        for name, migration in MIGRATIONS:
+            if name in done:
+                continue
+            
+            print(f"Applying migration {name}...")
+            migration(db)
+            db.add(SchemaMigration(name=name))
+            db.commit()
+            applied.append(name)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    
+    return applied
@@ -0,0 +1,142 @@
+"""
+NLP model registry
+
+Holds the stopword set, tokenizer, POS tagger and sentiment lexicon used by
+the feedback pipeline. Each resource is imported and loaded on first use
+and then reused for the life of the process, so importing the API does not
+pull in NLTK or TextBlob and no call pays for loading a model twice.
+
+load() loads everything up front; the app runs it in a background thread
+at startup (see start_warmup) and /ready reports when it has finished.
+Configuration comes from the environment:
+
+- MODEL_WARMUP: load the models when the app starts (default 1); with 0
+  they are loaded by the first analysis instead
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1").lower() not in ("0", "false", "no")
+
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+class ModelRegistry:
+    """
+    Lazily loaded, process-wide NLP resources
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._stop_words: Optional[FrozenSet[str]] = None
+        self._tokenize: Optional[Callable[[str], List[str]]] = None
+        self._tagger = None
+        self._sentiment = None
+        self.state = NOT_LOADED
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+    
+    @property
+    def stop_words(self) -> FrozenSet[str]:
+        """English stopwords"""
+        if self._stop_words is None:
+            with self._lock:
+                if self._stop_words is None:
+                    from nltk.corpus import stopwords
+                    
+                    self._stop_words = frozenset(stopwords.words('english'))
+        return self._stop_words
+    
+    def tokenize(self, text: str) -> List[str]:
+        """
+        Split text into word tokens
+        """
+        if self._tokenize is None:
+            with self._lock:
+                if self._tokenize is None:
+                    from nltk.tokenize import word_tokenize
+                    
+                    self._tokenize = word_tokenize
+        return self._tokenize(text)
+    
+    @property
+    def tagger(self):
+        """Averaged perceptron POS tagger, loaded once"""
+        if self._tagger is None:
+            with self._lock:
+                if self._tagger is None:
+                    from nltk.tag.perceptron import PerceptronTagger
+                    
+                    self._tagger = PerceptronTagger()
+        return self._tagger
+    
+    def tag(self, tokens: Sequence[str]) -> List[Tuple[str, str]]:
+        """
+        POS-tag one token list
+        """
+        return self.tagger.tag(list(tokens)) if tokens else []
+    
+    def tag_sents(self, token_lists: Sequence[Sequence[str]]) -> List[List[Tuple[str, str]]]:
+        """
+        POS-tag several token lists, e.g. a whole analysis batch, with one tagger lookup
+        """
+        tagger = self.tagger
+        return [tagger.tag(list(tokens)) if tokens else [] for tokens in token_lists]
+    
+    def polarity(self, text: str) -> float:
+        """
+        TextBlob (pattern) sentiment polarity, from -1 (negative) to 1 (positive)
+        """
+        if self._sentiment is None:
+            with self._lock:
+                if self._sentiment is None:
+                    # The scorer behind TextBlob(text).sentiment, without building
+                    # a blob and a result type on every call
+                    from textblob.en import sentiment
+                    
+                    self._sentiment = sentiment
+        return self._sentiment(text)[0]
+    
+    def load(self):
+        """
+        Load every resource now; raises if one cannot be loaded
+        """
+        with self._lock:
+            if self.state == READY:
+                return
+            self.state = LOADING
+            self.error = None
+        
+        started = time.perf_counter()
+        try:
+            self.stop_words
+            self.tokenize("warm up")
+            self.tag(["warm", "up"])
+            self.polarity("warm up")
+        except Exception as e:
+            with self._lock:
+                self.state = FAILED
+                self.error = str(e)
+            raise
+        
+        with self._lock:
+            self.state = READY
+            self.load_seconds = round(time.perf_counter() - started, 3)
+    
+    def status(self) -> Dict:
+        """
+        Load state of the registry
+        """
+        return {"state": self.state, "error": self.error, "load_seconds": self.load_seconds}
+
+_registry = ModelRegistry()
+
+def get_model_registry() -> ModelRegistry:
+    """
+    Return the process-wide model registry
+    """
+    return _registry
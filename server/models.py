@@ -1,11 +1,14 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # Request Models
 class FeedbackCreate(BaseModel):
     message: str
 
+class FeedbackBatchCreate(BaseModel):
+    messages: List[str]
+
 # Response Models
 class FeedbackResponse(BaseModel):
     id: int
@@ -59,8 +62,60 @@ class Recommendation(BaseModel):
     recommendation: str
     priority: str
 
+class DuplicateCluster(BaseModel):
+    cluster_id: int  # Feedback id of the representative
+    size: int
+    representative: str
+    last_seen_at: Optional[datetime] = None
+
+class ThemeSketchInfo(BaseModel):
+    window: str  # 24h/7d
+    total: int  # Theme occurrences in the window
+    error_bound: int  # Counts exceed the true count by at most this much...
+    confidence: float  # ...with this probability
+
 class InsightsAnalytics(BaseModel):
     top_positive: List[TopSentimentFeedback]
     top_negative: List[TopSentimentFeedback]
     themes: List[ThemeCount]
-    recommendations: List[Recommendation]
\ No newline at end of file
+    recommendations: List[Recommendation]
+    clusters: List[DuplicateCluster] = []  # Largest near-duplicate clusters
+    theme_sketch: Optional[ThemeSketchInfo] = None  # Set when themes are approximate
+
+# Trends Response Models
+class TrendPoint(BaseModel):
+    bucket_start: datetime
+    count: int
+    average_sentiment: Optional[float]
+    sentiment_labels: Dict[str, int]  # positive/negative/neutral
+    priority_levels: Dict[str, int]  # HIGH/MEDIUM/LOW
+    top_themes: List[ThemeCount]
+
+class InsightTrends(BaseModel):
+    bucket: str  # hour/day
+    buckets: List[TrendPoint]
+
+# Distribution Response Models
+class HistogramBin(BaseModel):
+    start: float
+    end: float
+    count: int
+
+class ScoreDistribution(BaseModel):
+    count: int  # Insights with a score
+    mean: Optional[float]
+    p5: Optional[float]
+    p50: Optional[float]
+    p95: Optional[float]
+    histogram: List[HistogramBin]
+
+class LabelDistribution(BaseModel):
+    label: str  # positive/negative/neutral
+    count: int
+    priority: ScoreDistribution
+
+class InsightDistribution(BaseModel):
+    count: int  # Insights in the range
+    sentiment: ScoreDistribution
+    priority: ScoreDistribution
+    labels: List[LabelDistribution]
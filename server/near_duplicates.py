@@ -0,0 +1,314 @@
+"""
+Near-duplicate detection at ingest (MinHash + LSH)
+
+Every new feedback message gets a MinHash signature of its character
+5-gram shingles, stored in feedback_signatures, and is linked to a
+near-duplicate cluster: that of the most similar cluster representative
+whose estimated Jaccard similarity is at least NEAR_DUPLICATE_THRESHOLD,
+or else a new cluster it represents itself. Candidate representatives come
+from an LSH banding index (lsh_buckets): signatures are cut into LSH_BANDS
+bands and two messages are candidates when any whole band matches, so the
+lookup is a few indexed reads however much feedback exists. Only
+representatives are indexed, so a bug storm of thousands of copies adds one
+cluster and its bands, not thousands of index entries.
+
+Signatures use one-permutation hashing: each shingle is hashed once and
+kept as the minimum of one of SIGNATURE_SIZE bins, and empty bins borrow
+from the next filled one (rotation densification). That is one CRC-32 per
+shingle instead of one hash per shingle and signature value.
+
+Clusters are assigned in the transaction that inserts the feedback, by an
+after_flush hook for ORM writes and by bulk_import for its Core inserts.
+feedback_clusters keeps every cluster's size; GET /api/insights lists the
+largest. Insight workers copy the representative's analysis to its
+duplicates instead of analyzing them (see insight_jobs.process_batch).
+
+Configuration comes from the environment:
+
+- NEAR_DUPLICATE_THRESHOLD: estimated Jaccard similarity needed to join a
+  cluster (default 0.8)
+- NEAR_DUPLICATE_REUSE: copy the representative's analysis to duplicates
+  (default 1)
+
+Run `python -m near_duplicates rebuild` to recompute signatures and
+clusters for all feedback, e.g. after changing the threshold.
+"""
+import operator
+import os
+import re
+import struct
+import sys
+import zlib
+from collections import Counter, defaultdict
+from datetime import datetime
+from hashlib import blake2b
+from typing import Dict, List, Sequence, Set, Tuple
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import Feedback, FeedbackCluster, FeedbackSignature, Insight, LshBucket
+from feedback_pipeline import is_failed_analysis
+from theme_index import decode_json_list
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.8))
+NEAR_DUPLICATE_REUSE = os.getenv("NEAR_DUPLICATE_REUSE", "1").lower() not in ("0", "false", "no")
+
+SHINGLE_SIZE = 5
+SIGNATURE_SIZE = 64
+# 16 bands of 4 values: pairs above ~0.5 similarity are likely candidates,
+# pairs at 0.8 are missed with probability below 0.1%
+LSH_BANDS = 16
+
+# Candidates compared per message, those sharing the most bands first; in
+# templated text a message can share a band with many unrelated ones
+MAX_CANDIDATES = 16
+
+# Bind parameters per IN (...) lookup, well below SQLite's variable limit
+LOOKUP_CHUNK_SIZE = 500
+
+_ROWS_PER_BAND = SIGNATURE_SIZE // LSH_BANDS
+_SIGNATURE = struct.Struct(f"<{SIGNATURE_SIZE}I")
+_BAND = struct.Struct(f"<H{_ROWS_PER_BAND}I")
+_MASK64 = (1 << 64) - 1
+_FIBONACCI = 0x9E3779B97F4A7C15
+_VALUE_BITS = 64 - (SIGNATURE_SIZE.bit_length() - 1)  # Bits left after the bin number
+_VALUE_MASK = (1 << _VALUE_BITS) - 1
+_EMPTY = 1 << 64
+# Added per bin when an empty bin borrows a value, so borrowed values differ from the original
+_ROTATION = 0x9E3779B1
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+def shingles(message: str) -> Set[bytes]:
+    """
+    Byte shingles of a message's UTF-8 text, ignoring case, punctuation and spacing
+    """
+    text = " ".join(_WORD.findall(message.lower())).encode()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def minhash(message: str) -> Tuple[int, ...]:
+    """
+    One-permutation MinHash signature of a message's shingles
+    """
+    # CRC-32 of each shingle spread over 64 bits by Fibonacci hashing: the
+    # top bits pick the bin, the rest is the value whose minimum the bin keeps
+    bins = [_EMPTY] * SIGNATURE_SIZE
+    for checksum in {zlib.crc32(shingle) for shingle in shingles(message)}:
+        hashed = (checksum * _FIBONACCI) & _MASK64
+        index, value = hashed >> _VALUE_BITS, hashed & _VALUE_MASK
+        if value < bins[index]:
+            bins[index] = value
+    
+    # Walk right to left twice so every empty bin finds the next filled bin, wrapping around
+    signature = [0] * SIGNATURE_SIZE
+    borrowed, distance = None, 0
+    for step in range(2 * SIGNATURE_SIZE - 1, -1, -1):
+        index = step % SIGNATURE_SIZE
+        if bins[index] != _EMPTY:
+            borrowed, distance = bins[index] >> (_VALUE_BITS - 32), 0
+        else:
+            distance += 1
+        if step < SIGNATURE_SIZE:
+            signature[index] = (borrowed + distance * _ROTATION) & 0xFFFFFFFF
+    return tuple(signature)
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """
+    Estimated Jaccard similarity of two signatures
+    """
+    return sum(map(operator.eq, a, b)) / SIGNATURE_SIZE
+
+def band_buckets(signature: Sequence[int]) -> List[int]:
+    """
+    LSH bucket of each band: a signed 64-bit hash of the band number and its values
+    """
+    return [
+        int.from_bytes(blake2b(
+            _BAND.pack(band, *signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND]),
+            digest_size=8,
+        ).digest(), "little", signed=True)
+        for band in range(LSH_BANDS)
+    ]
+
+def pack_signature(signature: Sequence[int]) -> bytes:
+    return _SIGNATURE.pack(*signature)
+
+def unpack_signature(packed: bytes) -> Tuple[int, ...]:
+    return _SIGNATURE.unpack(packed)
+
+def _chunks(values: List, size: int = LOOKUP_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def assign_clusters(connection, rows: Sequence[Tuple[int, str]],
+                    threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Dict[int, int]:
+    """
+    Store signatures for new feedback and link each message to a cluster
+    
+    rows are (feedback id, message) in id order. Messages in the same call
+    can cluster with each other. Runs in the caller's transaction.
+    Returns: {feedback id: cluster id}
+    """
+    if not rows:
+        return {}
+    
+    signatures = {feedback_id: minhash(message) for feedback_id, message in rows}
+    buckets = {feedback_id: band_buckets(signature) for feedback_id, signature in signatures.items()}
+    
+    # Indexed representatives sharing a band with any new message, and their signatures
+    index = defaultdict(set)
+    for chunk in _chunks(list({bucket for values in buckets.values() for bucket in values})):
+        for bucket, cluster_id in connection.execute(
+            select(LshBucket.bucket, LshBucket.cluster_id).where(LshBucket.bucket.in_(chunk))
+        ):
+            index[bucket].add(cluster_id)
+    representatives = {}
+    for chunk in _chunks(list(set().union(*index.values()))):
+        for feedback_id, packed in connection.execute(
+            select(FeedbackSignature.feedback_id, FeedbackSignature.signature)
+            .where(FeedbackSignature.feedback_id.in_(chunk))
+        ):
+            representatives[feedback_id] = unpack_signature(packed)
+    
+    assigned = {}
+    new_buckets = []
+    for feedback_id, _ in rows:
+        signature = signatures[feedback_id]
+        shared = Counter(cluster_id for bucket in buckets[feedback_id] for cluster_id in index.get(bucket, ()))
+        best, best_similarity = None, 0.0
+        for cluster_id, _ in sorted(shared.items(), key=lambda item: (-item[1], item[0]))[:MAX_CANDIDATES]:
+            score = similarity(signature, representatives[cluster_id]) if cluster_id in representatives else 0.0
+            # Closest representative wins; ties go to the earlier candidate (more shared bands, then older)
+            if score >= threshold and score > best_similarity:
+                best, best_similarity = cluster_id, score
+        
+        if best is None:
+            # No close representative: this message starts a cluster and joins the index
+            best = feedback_id
+            representatives[feedback_id] = signature
+            for bucket in buckets[feedback_id]:
+                index[bucket].add(feedback_id)
+                new_buckets.append({"bucket": bucket, "cluster_id": feedback_id})
+        assigned[feedback_id] = best
+    
+    connection.execute(insert(FeedbackSignature), [
+        {"feedback_id": feedback_id, "signature": pack_signature(signatures[feedback_id]), "cluster_id": cluster_id}
+        for feedback_id, cluster_id in assigned.items()
+    ])
+    if new_buckets:
+        connection.execute(sqlite_insert(LshBucket).on_conflict_do_nothing(), new_buckets)
+    
+    now = datetime.utcnow()
+    statement = sqlite_insert(FeedbackCluster)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"size": FeedbackCluster.size + statement.excluded.size, "last_seen_at": statement.excluded.last_seen_at},
+        ),
+        [{"id": cluster_id, "size": size, "last_seen_at": now} for cluster_id, size in Counter(assigned.values()).items()],
+    )
+    return assigned
+
+@event.listens_for(Session, "after_flush")
+def _assign_clusters_after_flush(session, flush_context):
+    """
+    Cluster new feedback in the same transaction as its insert
+    """
+    new_feedback = [obj for obj in session.new if isinstance(obj, Feedback)]
+    if new_feedback:
+        assign_clusters(session.connection(), sorted((feedback.id, feedback.message) for feedback in new_feedback))
+
+def reusable_analyses(db: Session, feedback_ids: Sequence[int]) -> Tuple[Dict[int, int], Dict[int, Dict]]:
+    """
+    Representatives of the duplicates among feedback_ids, and the analyses stored for them
+    
+    Failed analyses (the manual review fallback) are left out, so their
+    duplicates are analyzed instead of inheriting the failure.
+    Returns: ({duplicate feedback id: representative id}, {representative id: analysis})
+    """
+    representatives = dict(db.execute(
+        select(FeedbackSignature.feedback_id, FeedbackSignature.cluster_id)
+        .where(FeedbackSignature.feedback_id.in_(feedback_ids), FeedbackSignature.cluster_id != FeedbackSignature.feedback_id)
+    ).all())
+    if not representatives:
+        return {}, {}
+    
+    rows = db.execute(
+        select(Insight.feedback_id, Insight.sentiment_score, Insight.sentiment_label, Insight.themes,
+               Insight.recommendations, Insight.priority_score, Insight.priority_level)
+        .where(Insight.feedback_id.in_(set(representatives.values())))
+    ).all()
+    analyses = {
+        row.feedback_id: {
+            "sentiment_score": row.sentiment_score,
+            "sentiment_label": row.sentiment_label,
+            "themes": decode_json_list(row.themes),
+            "recommendations": decode_json_list(row.recommendations),
+            "priority_score": row.priority_score,
+            "priority_level": row.priority_level,
+        }
+        for row in rows
+    }
+    return representatives, {
+        feedback_id: analysis for feedback_id, analysis in analyses.items() if not is_failed_analysis(analysis)
+    }
+
+def largest_clusters_query(limit: int = 10):
+    """
+    Select statement for the largest clusters with more than one message, with the representative's text
+    
+    message is None when the representative was archived (see feedback_archive.fill_representatives).
+    """
+    return (
+        select(FeedbackCluster.id, FeedbackCluster.size, FeedbackCluster.last_seen_at, Feedback.message)
+        .outerjoin(Feedback, Feedback.id == FeedbackCluster.id)
+        .where(FeedbackCluster.size > 1)
+        .order_by(FeedbackCluster.size.desc(), FeedbackCluster.id.desc())
+        .limit(limit)
+    )
+
+def rebuild_clusters(db: Session, chunk_size: int = 1000) -> int:
+    """
+    Recompute signatures, clusters and the LSH index for all feedback, in id order
+    Returns: number of feedback rows clustered
+    """
+    connection = db.connection()
+    for table in (FeedbackSignature, FeedbackCluster, LshBucket):
+        connection.execute(delete(table))
+    
+    total, last_id = 0, 0
+    while True:
+        rows = connection.execute(
+            select(Feedback.id, Feedback.message).where(Feedback.id > last_id).order_by(Feedback.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            return total
+        assign_clusters(connection, [(row.id, row.message) for row in rows])
+        total += len(rows)
+        last_id = rows[-1].id
+
+def main(argv: List[str]) -> int:
+    """
+    Command line entry point
+    """
+    if argv != ["rebuild"]:
+        print("Usage: python -m near_duplicates rebuild")
+        return 2
+    
+    from database import SessionLocal, create_tables
+    
+    create_tables()
+    db = SessionLocal()
+    try:
+        total = rebuild_clusters(db)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Clustered {total} feedback messages")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
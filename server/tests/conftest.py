@@ -1,8 +1,17 @@
+import os
+
+# Analyze in the calling thread so tests do not start worker processes,
+# drive the insight job queue explicitly instead of from worker threads,
+# and load the NLP models on first use rather than at startup
+os.environ.setdefault("ANALYSIS_EXECUTOR", "inline")
+os.environ.setdefault("INSIGHT_WORKERS", "0")
+os.environ.setdefault("MODEL_WARMUP", "0")
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from database import Base, get_db
+from database import Base, get_db, get_read_db
 from app import app
 
 # Test database URL (in-memory SQLite)
@@ -40,6 +49,7 @@ def client(test_db):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     
     with TestClient(app) as test_client:
         yield test_client
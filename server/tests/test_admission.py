@@ -0,0 +1,165 @@
+import pytest
+import admission
+from admission import AdmissionController, QueueSaturated
+from database import Feedback, InsightJob
+from insight_jobs import enqueue_jobs, process_batch, queue_depth
+from metrics import ADMISSION_SATURATED, FEEDBACK_ADMISSIONS, INSIGHT_JOBS_RELEASED
+from tests.conftest import TestSessionLocal
+
+
+def add_jobs(db, count, state="pending"):
+    """Create feedback rows with insight jobs in the given state"""
+    feedback = [Feedback(message=f"Feedback message {i}") for i in range(count)]
+    db.add_all(feedback)
+    db.flush()
+    enqueue_jobs(db, [item.id for item in feedback], state)
+    db.commit()
+    return [item.id for item in feedback]
+
+
+def job_states(db):
+    return sorted(state for (state,) in db.query(InsightJob.state))
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    """Install a small defer-mode controller that reads the queue depth on every decision"""
+    controller = AdmissionController(mode="defer", high_watermark=4, low_watermark=2, depth_ttl=0)
+    monkeypatch.setattr(admission, "controller", controller)
+    return controller
+
+
+class TestAdmissionController:
+    """Test cases for watermark-based admission decisions"""
+    
+    def test_watermarks_are_validated(self):
+        """Test an unknown mode or inverted watermarks are refused"""
+        with pytest.raises(ValueError):
+            AdmissionController(mode="drop")
+        with pytest.raises(ValueError):
+            AdmissionController(high_watermark=5, low_watermark=6)
+    
+    def test_hysteresis(self, test_db):
+        """Test saturation starts at the high watermark and ends at the low watermark"""
+        controller = AdmissionController(mode="defer", high_watermark=4, low_watermark=2, depth_ttl=0)
+        ids = add_jobs(test_db, 3)
+        assert controller.admit(test_db) is True
+        
+        add_jobs(test_db, 1)
+        assert controller.admit(test_db) is False
+        assert controller.saturated
+        
+        # Below the high watermark but above the low one: still saturated
+        test_db.query(InsightJob).filter(InsightJob.feedback_id == ids[0]).update({"state": "done"})
+        test_db.commit()
+        assert controller.admit(test_db) is False
+        
+        test_db.query(InsightJob).filter(InsightJob.feedback_id == ids[1]).update({"state": "done"})
+        test_db.commit()
+        assert controller.admit(test_db) is True
+        assert not controller.saturated
+    
+    def test_cached_depth_counts_admitted_jobs(self, test_db):
+        """Test jobs admitted between depth reads count toward the high watermark"""
+        controller = AdmissionController(mode="defer", high_watermark=4, low_watermark=2, depth_ttl=60)
+        
+        assert controller.admit(test_db, 3) is True
+        assert controller.admit(test_db, 1) is True
+        assert controller.admit(test_db, 1) is False
+        assert queue_depth(test_db) == 0
+    
+    def test_reject_mode_raises(self, test_db):
+        """Test a saturated queue raises QueueSaturated with the configured retry delay"""
+        controller = AdmissionController(mode="reject", high_watermark=1, low_watermark=0, retry_after=7, depth_ttl=0)
+        add_jobs(test_db, 1)
+        rejected = FEEDBACK_ADMISSIONS.value("rejected")
+        
+        with pytest.raises(QueueSaturated) as error:
+            controller.admit(test_db)
+        
+        assert error.value.retry_after == 7
+        assert FEEDBACK_ADMISSIONS.value("rejected") == rejected + 1
+        assert ADMISSION_SATURATED.value() == 1
+    
+    def test_release_deferred_after_drain(self, test_db):
+        """Test deferred jobs are released oldest first, up to the high watermark, once drained"""
+        controller = AdmissionController(mode="defer", high_watermark=4, low_watermark=2, depth_ttl=0)
+        pending = add_jobs(test_db, 3)
+        deferred = add_jobs(test_db, 5, state="deferred")
+        released = INSIGHT_JOBS_RELEASED.value()
+        
+        assert controller.release_deferred(test_db) == 0
+        
+        test_db.query(InsightJob).filter(InsightJob.feedback_id == pending[0]).update({"state": "done"})
+        test_db.commit()
+        assert controller.release_deferred(test_db) == 2
+        
+        pending_ids = {job.feedback_id for job in test_db.query(InsightJob).filter_by(state="pending")}
+        assert pending_ids == set(pending[1:] + deferred[:2])
+        assert INSIGHT_JOBS_RELEASED.value() == released + 2
+    
+    def test_worker_releases_and_analyzes_deferred_jobs(self, test_db, controller):
+        """Test workers skip deferred jobs until the queue has room for them"""
+        add_jobs(test_db, 3, state="deferred")
+        
+        assert process_batch(TestSessionLocal, "worker-a", limit=10) == 3
+        
+        assert job_states(test_db) == ["done"] * 3
+
+
+class TestAdmissionAPI:
+    """Test cases for admission control on the submission endpoints"""
+    
+    def test_defer_mode_stores_deferred_jobs(self, client, test_db, controller):
+        """Test a saturated queue in defer mode stores the feedback with deferred jobs"""
+        add_jobs(test_db, 4)
+        
+        response = client.post("/api/feedback/batch", json={"messages": ["Slow checkout", "Great support"]})
+        
+        assert response.status_code == 201
+        assert len(response.json()) == 2
+        assert job_states(test_db) == ["deferred"] * 2 + ["pending"] * 4
+    
+    def test_reject_mode_returns_429(self, client, test_db, controller):
+        """Test a saturated queue in reject mode answers 429 with Retry-After and stores nothing"""
+        controller.mode = "reject"
+        controller.retry_after = 12
+        add_jobs(test_db, 4)
+        
+        response = client.post("/api/feedback", json={"message": "Please add dark mode"})
+        
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "12"
+        assert test_db.query(Feedback).count() == 4
+    
+    def test_invalid_feedback_is_not_counted(self, client, controller):
+        """Test validation runs before admission, so bad requests are not counted as decisions"""
+        accepted = FEEDBACK_ADMISSIONS.value("accepted")
+        
+        assert client.post("/api/feedback", json={"message": "   "}).status_code == 400
+        
+        assert FEEDBACK_ADMISSIONS.value("accepted") == accepted
+    
+    def test_status(self, client, test_db, controller):
+        """Test GET /api/admission reports the mode, watermarks and queue"""
+        add_jobs(test_db, 2)
+        add_jobs(test_db, 1, state="deferred")
+        
+        data = client.get("/api/admission").json()
+        
+        assert data["mode"] == "defer"
+        assert (data["high_watermark"], data["low_watermark"]) == (4, 2)
+        assert data["queue_depth"] == 2
+        assert data["deferred"] == 1
+        assert set(data["decisions"]) == {"accepted", "deferred", "rejected"}
+    
+    def test_metrics(self, client, test_db, controller):
+        """Test admission decisions and deferred jobs appear on /metrics"""
+        add_jobs(test_db, 4)
+        client.post("/api/feedback", json={"message": "Search is slow"})
+        
+        text = client.get("/metrics").text
+        
+        assert 'feedback_admissions_total{decision="deferred"}' in text
+        assert "feedback_admission_queue_depth 4" in text
+        assert 'insight_jobs{state="deferred"} 1' in text
@@ -0,0 +1,140 @@
+import pytest
+import time
+import analysis_executor
+from analysis_cache import AnalysisCache, cache_key
+from analysis_executor import AnalysisExecutor
+from feedback_pipeline import FAILED_ANALYSIS_RECOMMENDATION
+
+
+def make_analysis(label="positive"):
+    """Minimal analysis dict as returned by analyze_feedback"""
+    return {
+        "sentiment_score": 0.5,
+        "sentiment_label": label,
+        "themes": ["checkout"],
+        "recommendations": ["Follow up with user to gather more specific feedback"],
+        "priority_score": 25,
+        "priority_level": "LOW",
+        "processed_at": "2024-01-01T00:00:00",
+    }
+
+
+class TestAnalysisCache:
+    """Test cases for the content-addressed analysis cache"""
+    
+    def test_key_is_exact_message(self):
+        """Test keys are computed from the exact message, since keyword rules can match across spaces"""
+        assert cache_key("payment not working", "v1") == cache_key("payment not working", "v1")
+        assert cache_key("payment not  working", "v1") != cache_key("payment not working", "v1")
+        assert cache_key("app crashes", "v1") != cache_key("App crashes", "v1")
+        assert cache_key("app crashes", "v1") != cache_key("app crashes", "v2")
+    
+    def test_hit_and_miss_counters(self):
+        """Test lookups are counted and hits return a fresh timestamp"""
+        cache = AnalysisCache(max_entries=10, version="v1")
+        
+        assert cache.get("app crashes on checkout") is None
+        cache.put("app crashes on checkout", make_analysis())
+        hit = cache.get("app crashes on checkout")
+        
+        assert hit["sentiment_label"] == "positive"
+        assert hit["processed_at"] != "2024-01-01T00:00:00"
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["memory_hits"] == 1
+        assert stats["hit_ratio"] == 0.5
+    
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted past the size limit"""
+        cache = AnalysisCache(max_entries=2, version="v1")
+        cache.put("a", make_analysis())
+        cache.put("b", make_analysis())
+        cache.get("a")
+        cache.put("c", make_analysis())
+        
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.stats()["evictions"] == 1
+    
+    def test_ttl_expiry(self):
+        """Test entries are not returned after their TTL"""
+        cache = AnalysisCache(max_entries=10, ttl_seconds=0.05, version="v1")
+        cache.put("a", make_analysis())
+        
+        time.sleep(0.1)
+        
+        assert cache.get("a") is None
+    
+    def test_failed_analysis_not_cached(self):
+        """Test the failure fallback is never stored"""
+        cache = AnalysisCache(max_entries=10, version="v1")
+        failed = dict(make_analysis(), recommendations=[FAILED_ANALYSIS_RECOMMENDATION])
+        
+        cache.put("a", failed)
+        
+        assert cache.get("a") is None
+        assert cache.stats()["stores"] == 0
+    
+    def test_persistent_tier_shared_between_instances(self, tmp_path):
+        """Test a second cache on the same file is served from the persistent tier"""
+        path = str(tmp_path / "analysis_cache.db")
+        writer = AnalysisCache(max_entries=10, db_path=path, version="v1")
+        reader = AnalysisCache(max_entries=10, db_path=path, version="v1")
+        
+        writer.put("app crashes on checkout", make_analysis("negative"))
+        first = reader.get("app crashes on checkout")
+        second = reader.get("app crashes on checkout")
+        
+        assert first["sentiment_label"] == "negative"
+        assert second["sentiment_label"] == "negative"
+        assert reader.stats()["persistent_hits"] == 1
+        assert reader.stats()["memory_hits"] == 1
+        writer.close()
+        reader.close()
+    
+    def test_purge_expired_persistent_entries(self, tmp_path):
+        """Test expired rows are removed from the persistent tier"""
+        cache = AnalysisCache(max_entries=10, ttl_seconds=0.05, db_path=str(tmp_path / "cache.db"), version="v1")
+        cache.put("a", make_analysis())
+        
+        time.sleep(0.1)
+        
+        assert cache.purge_expired() == 1
+        assert cache.stats()["memory_entries"] == 0
+        cache.close()
+
+
+class TestExecutorCache:
+    """Test cases for the cache in front of the analysis executor"""
+    
+    def test_batch_analyzes_each_distinct_message_once(self, monkeypatch):
+        """Test duplicates and cached messages are not sent for analysis again"""
+        analyzed = []
+        
+        def fake_batch(messages):
+            analyzed.extend(messages)
+            return [make_analysis(message) for message in messages]
+        
+        monkeypatch.setattr(analysis_executor, "analyze_feedback_batch", fake_batch)
+        executor = AnalysisExecutor(mode="inline", cache=AnalysisCache(max_entries=10, version="v1"))
+        
+        first = executor.analyze_batch(["crash", "crash", "slow"])
+        second = executor.analyze_batch(["slow", "new"])
+        
+        assert analyzed == ["crash", "slow", "new"]
+        assert [result["sentiment_label"] for result in first] == ["crash", "crash", "slow"]
+        assert [result["sentiment_label"] for result in second] == ["slow", "new"]
+
+
+class TestAnalysisCacheAPI:
+    """Test cases for the cache statistics endpoint"""
+    
+    def test_cache_stats_endpoint(self, client):
+        """Test the counters are exposed"""
+        response = client.get("/api/analysis/cache")
+        
+        assert response.status_code == 200
+        data = response.json()
+        for field in ("hits", "misses", "memory_hits", "persistent_hits", "hit_ratio", "memory_entries"):
+            assert field in data
@@ -0,0 +1,57 @@
+import pytest
+import threading
+from analysis_executor import AnalysisExecutor
+from feedback_pipeline import analyze_feedback
+
+
+def without_timestamp(result):
+    """Drop the processing timestamp so results can be compared"""
+    return {key: value for key, value in result.items() if key != "processed_at"}
+
+
+class TestAnalysisExecutor:
+    """Test cases for the analysis executor"""
+    
+    def test_inline_analyze_batch_preserves_order(self):
+        """Test batch analysis keeps input order across chunks"""
+        executor = AnalysisExecutor(mode="inline", batch_chunk_size=2)
+        messages = ["I love it", "I hate it", "It is a product", "Amazing work", "Terrible bug"]
+        
+        results = executor.analyze_batch(messages)
+        
+        assert [without_timestamp(result) for result in results] == [
+            without_timestamp(analyze_feedback(message)) for message in messages
+        ]
+    
+    def test_unknown_mode(self):
+        """Test an unknown executor mode is rejected"""
+        with pytest.raises(ValueError):
+            AnalysisExecutor(mode="threads")
+    
+    def test_max_in_flight_blocks_submissions(self):
+        """Test submissions wait once the in-flight limit is reached"""
+        executor = AnalysisExecutor(mode="inline", max_in_flight=1)
+        executor._acquire()
+        
+        submitted = threading.Event()
+        worker = threading.Thread(target=lambda: (executor.analyze_batch(["Test feedback"]), submitted.set()))
+        worker.start()
+        
+        assert not submitted.wait(0.2)
+        executor._release()
+        assert submitted.wait(5)
+        worker.join()
+    
+    def test_process_pool_analyze(self):
+        """Test analysis runs in a worker process"""
+        executor = AnalysisExecutor(mode="process", pool_size=1, max_in_flight=2, batch_chunk_size=1)
+        try:
+            batch = executor.analyze_batch(["I love it", "I hate it"])
+        finally:
+            executor.shutdown()
+        
+        assert [without_timestamp(result) for result in batch] == [
+            without_timestamp(analyze_feedback("I love it")),
+            without_timestamp(analyze_feedback("I hate it"))
+        ]
+        assert executor.in_flight == 0
@@ -0,0 +1,229 @@
+import pytest
+import json
+from datetime import datetime, timedelta
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from async_api import use_async_routes
+from async_database import get_async_db, get_async_read_db, to_async_url
+from database import Base, Feedback, Insight, InsightJob, ThemeAggregate
+
+
+@pytest.fixture
+def databases(tmp_path):
+    """Sync session factory and async engine on the same database file"""
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    sync_engine = create_engine(url, poolclass=NullPool)
+    Base.metadata.create_all(sync_engine)
+    # A new event loop may run each test client, so do not keep connections between requests
+    async_engine = create_async_engine(to_async_url(url), poolclass=NullPool)
+    yield sessionmaker(bind=sync_engine), async_engine
+    sync_engine.dispose()
+
+
+@pytest.fixture
+def async_client(databases):
+    """Test client for an app serving only the async routes"""
+    _, async_engine = databases
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+    
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+    
+    app = FastAPI()
+    use_async_routes(app)
+    app.dependency_overrides[get_async_db] = override_get_db
+    app.dependency_overrides[get_async_read_db] = override_get_db
+    
+    with TestClient(app) as client:
+        yield client
+
+
+class TestAsyncAPI:
+    """Test cases for the async feedback and insights handlers"""
+    
+    def test_to_async_url(self):
+        """Test SQLite URLs are switched to the aiosqlite driver"""
+        assert to_async_url("sqlite:///./feedback.db") == "sqlite+aiosqlite:///./feedback.db"
+        assert to_async_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+    
+    def test_submit_feedback_queues_job(self, async_client, databases):
+        """Test POST /api/feedback stores the feedback and its insight job"""
+        session_factory, _ = databases
+        
+        response = async_client.post("/api/feedback", json={"message": "  Checkout is slow  "})
+        
+        assert response.status_code == 201
+        assert response.json()["message"] == "Checkout is slow"
+        with session_factory() as db:
+            assert db.scalars(select(InsightJob.feedback_id)).all() == [response.json()["id"]]
+    
+    def test_submit_feedback_validation(self, async_client):
+        """Test empty messages and batches are rejected like the sync handlers do"""
+        assert async_client.post("/api/feedback", json={"message": "  "}).status_code == 400
+        assert async_client.post("/api/feedback/batch", json={"messages": []}).status_code == 400
+        response = async_client.post("/api/feedback/batch", json={"messages": ["ok", ""]})
+        assert response.json()["detail"] == "Feedback message at index 1 cannot be empty"
+    
+    def test_submit_batch_and_page(self, async_client):
+        """Test a submitted batch can be paged through with the cursor"""
+        created = async_client.post("/api/feedback/batch", json={"messages": [f"Message {i}" for i in range(5)]})
+        assert [item["message"] for item in created.json()] == [f"Message {i}" for i in range(5)]
+        
+        first = async_client.get("/api/feedback", params={"limit": 3})
+        second = async_client.get("/api/feedback", params={"limit": 3, "cursor": first.headers["X-Next-Cursor"]})
+        
+        assert [item["message"] for item in first.json() + second.json()] == [f"Message {i}" for i in reversed(range(5))]
+        assert "X-Next-Cursor" not in second.headers
+    
+    def test_search(self, async_client):
+        """Test GET /api/feedback/search finds submitted feedback through the index triggers"""
+        async_client.post("/api/feedback/batch", json={"messages": ["Checkout is slow", "Search is fast"]})
+        
+        response = async_client.get("/api/feedback/search", params={"q": "checkout"})
+        
+        assert [item["message"] for item in response.json()] == ["Checkout is slow"]
+    
+    def test_conditional_get(self, async_client):
+        """Test the async routes answer If-None-Match with 304 until the data changes"""
+        etag = async_client.get("/api/insights").headers["ETag"]
+        
+        assert async_client.get("/api/insights", headers={"If-None-Match": etag}).status_code == 304
+        async_client.post("/api/feedback", json={"message": "Changed"})
+        assert async_client.get("/api/insights", headers={"If-None-Match": etag}).status_code == 200
+    
+    def test_invalid_cursor(self, async_client):
+        """Test a malformed cursor is rejected"""
+        assert async_client.get("/api/feedback", params={"cursor": "not-a-cursor"}).status_code == 400
+    
+    def test_insights_from_aggregates(self, async_client, databases):
+        """Test GET /api/insights reads the aggregates maintained by the flush hooks"""
+        session_factory, _ = databases
+        with session_factory() as db:
+            feedback = Feedback(message="Checkout is broken")
+            db.add(feedback)
+            db.flush()
+            db.add(Insight(
+                feedback_id=feedback.id,
+                sentiment_score=-0.6,
+                sentiment_label="negative",
+                themes=json.dumps(["checkout"]),
+                recommendations=json.dumps(["Prioritize technical improvements and bug fixes"]),
+                priority_score=30,
+                priority_level="HIGH"
+            ))
+            db.commit()
+            assert db.scalar(select(ThemeAggregate.count)) == 1
+        
+        data = async_client.get("/api/insights").json()
+        
+        assert data["top_negative"][0]["feedback"] == "Checkout is broken"
+        assert data["themes"] == [{"theme": "checkout", "count": 1}]
+    
+    def test_use_async_routes_replaces_matching_routes(self):
+        """Test only routes with an async counterpart are replaced"""
+        app = FastAPI()
+        
+        @app.get("/api/feedback")
+        def sync_feedback():
+            return []
+        
+        @app.get("/api/feedback/export")
+        def sync_export():
+            return []
+        
+        use_async_routes(app)
+        
+        endpoints = {(route.path, method): route.endpoint for route in app.router.routes
+                     if hasattr(route, "methods") for method in route.methods}
+        assert endpoints[("/api/feedback", "GET")].__module__ == "async_api"
+        assert endpoints[("/api/feedback/export", "GET")] is sync_export
+    
+    def test_insight_trends(self, async_client, databases):
+        """Test GET /api/insights/trends reads the trend rollups"""
+        session_factory, _ = databases
+        with session_factory() as db:
+            feedback = Feedback(message="Checkout is broken", timestamp=datetime(2024, 1, 1, 10, 30))
+            db.add(feedback)
+            db.flush()
+            db.add(Insight(feedback_id=feedback.id, sentiment_score=-0.6, sentiment_label="negative",
+                           themes=json.dumps(["checkout"]), priority_level="HIGH"))
+            db.commit()
+        
+        data = async_client.get("/api/insights/trends", params={"bucket": "hour"}).json()
+        
+        assert [bucket["bucket_start"] for bucket in data["buckets"]] == ["2024-01-01T10:00:00"]
+        assert data["buckets"][0]["top_themes"] == [{"theme": "checkout", "count": 1}]
+    
+    def test_archived_feedback(self, async_client, databases, tmp_path, monkeypatch):
+        """Test the list and insights handlers read archived months like the sync ones"""
+        import feedback_archive
+        from feedback_archive import SegmentStore, archive_month
+        
+        store = SegmentStore(archive_dir=str(tmp_path / "archive"))
+        monkeypatch.setattr(feedback_archive, "store", store)
+        session_factory, _ = databases
+        message = "The checkout page keeps crashing whenever I try to pay with a card"
+        with session_factory() as db:
+            for day in (3, 20, 40):
+                feedback = Feedback(message=message, created_at=datetime(2024, 1, 1) + timedelta(days=day))
+                db.add(feedback)
+                db.flush()
+                db.add(Insight(feedback_id=feedback.id, sentiment_score=-0.5, sentiment_label="negative",
+                               themes=json.dumps(["checkout"]), priority_level="HIGH"))
+            db.commit()
+        before = (async_client.get("/api/feedback", params={"limit": 2}).json(),
+                  async_client.get("/api/insights").json()["clusters"])
+        assert len(before[1]) == 1
+        
+        try:
+            with session_factory() as db:
+                archive_month(db, "2024-01", store.archive_dir)
+            
+            assert async_client.get("/api/feedback", params={"limit": 2}).json() == before[0]
+            assert async_client.get("/api/insights").json()["clusters"] == before[1]
+        finally:
+            store.close()
+    
+    def test_insight_distribution(self, async_client, databases):
+        """Test GET /api/insights/distribution reads the columnar snapshot"""
+        session_factory, _ = databases
+        with session_factory() as db:
+            for score, priority in [(-0.6, 40), (0.4, 0), (0.2, 10)]:
+                feedback = Feedback(message="Checkout", timestamp=datetime(2024, 1, 1, 10, 30))
+                db.add(feedback)
+                db.flush()
+                db.add(Insight(feedback_id=feedback.id, sentiment_score=score, priority_score=priority,
+                               sentiment_label="negative" if score < 0 else "positive", themes=json.dumps([])))
+            db.commit()
+        
+        data = async_client.get("/api/insights/distribution", params={"bins": 2}).json()
+        
+        assert data["count"] == 3
+        assert [bin["count"] for bin in data["sentiment"]["histogram"]] == [1, 2]
+        assert {entry["label"]: entry["priority"]["mean"] for entry in data["labels"]} == {
+            "positive": 5.0, "negative": 40.0, "neutral": None}
+    
+    def test_admission(self, async_client, databases, monkeypatch):
+        """Test a saturated queue defers new jobs, or answers 429 in reject mode"""
+        import admission
+        
+        controller = admission.AdmissionController(mode="defer", high_watermark=1, low_watermark=0, depth_ttl=0)
+        monkeypatch.setattr(admission, "controller", controller)
+        session_factory, _ = databases
+        
+        assert async_client.post("/api/feedback", json={"message": "Checkout is slow"}).status_code == 201
+        assert async_client.post("/api/feedback/batch", json={"messages": ["Search", "Export"]}).status_code == 201
+        with session_factory() as db:
+            assert db.scalars(select(InsightJob.state).order_by(InsightJob.id)).all() == ["pending", "deferred", "deferred"]
+        
+        controller.mode = "reject"
+        response = async_client.post("/api/feedback", json={"message": "Dark mode please"})
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == str(controller.retry_after)
+        with session_factory() as db:
+            assert db.query(Feedback).count() == 3
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import func, select
+from benchmarks.corpus import build_database, generate_feedback
+from benchmarks.harness import compare, load_results, measure, save_results
+from database import Feedback, Insight, ThemeAggregate
+
+
+class TestBenchmarkCorpus:
+    """Test cases for the synthetic benchmark corpus"""
+    
+    def test_generator_is_deterministic(self):
+        """Test the same seed always yields the same messages"""
+        first = [record["message"] for record in generate_feedback(300, seed=7)]
+        second = [record["message"] for record in generate_feedback(300, seed=7)]
+        other = [record["message"] for record in generate_feedback(300, seed=8)]
+        
+        assert first == second
+        assert first != other
+    
+    def test_generator_mix(self):
+        """Test the corpus mixes sentiments, lengths, keywords and duplicates"""
+        records = list(generate_feedback(2000))
+        lengths = [len(record["message"].split()) for record in records]
+        
+        assert {record["sentiment_label"] for record in records} == {"positive", "negative", "neutral"}
+        assert min(lengths) < 10 and max(lengths) > 100
+        assert any("checkout" in record["message"].lower() for record in records)
+        assert len({record["message"] for record in records}) < len(records)
+        assert [record["created_at"] for record in records] == sorted(record["created_at"] for record in records)
+    
+    def test_build_database(self, tmp_path):
+        """Test a built database has feedback, insights and filled aggregates"""
+        engine = build_database(str(tmp_path / "bench.db"), 200, verbose=False)
+        
+        with engine.connect() as connection:
+            assert connection.execute(select(func.count()).select_from(Feedback)).scalar_one() == 200
+            assert connection.execute(select(func.count()).select_from(Insight)).scalar_one() == 200
+            assert connection.execute(select(func.sum(ThemeAggregate.count))).scalar_one() > 0
+        engine.dispose()
+
+
+class TestBenchmarkHarness:
+    """Test cases for benchmark timing and baseline comparison"""
+    
+    def test_measure_reports_per_item_times(self):
+        """Test timings are summarized per item"""
+        result = measure(lambda: sum(range(1000)), repeat=5, per=10)
+        
+        assert result["samples"] == 5
+        assert 0 < result["min_ms"] <= result["median_ms"] <= result["p95_ms"]
+    
+    def test_compare_flags_regressions(self):
+        """Test slowdowns beyond the threshold are flagged"""
+        baseline = {"a": {"median_ms": 10.0}, "b": {"median_ms": 10.0}, "c": {"median_ms": 10.0}, "d": {"median_ms": 1.0}}
+        current = {"a": {"median_ms": 11.0}, "b": {"median_ms": 14.0}, "c": {"median_ms": 5.0}, "e": {"median_ms": 1.0}}
+        
+        statuses = {name: status for name, _, _, status in compare(current, baseline, threshold=0.25)}
+        
+        assert statuses == {"a": "ok", "b": "regression", "c": "improved", "d": "skipped", "e": "new"}
+    
+    def test_results_round_trip(self, tmp_path):
+        """Test saved results load back with the same timings"""
+        path = str(tmp_path / "results" / "run.json")
+        save_results(path, {"a": {"median_ms": 1.5}})
+        
+        assert load_results(path) == {"a": {"median_ms": 1.5}}
+        assert load_results(str(tmp_path / "missing.json")) is None
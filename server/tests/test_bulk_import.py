@@ -0,0 +1,183 @@
+import pytest
+import csv
+import gzip
+import json
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from bulk_import import ImportCheckpoint, bulk_load_engine, detect_format, import_file, parse_timestamp, prepare_database
+from database import Feedback, FeedbackCluster, FeedbackSignature, Insight, InsightTheme, ThemeAggregate, TrendBucket
+
+
+def fake_analyze(messages):
+    """Deterministic stand-in for AnalysisExecutor.analyze_batch"""
+    return [
+        {
+            "sentiment_score": -0.5 if "broken" in message else 0.5,
+            "sentiment_label": "negative" if "broken" in message else "positive",
+            "themes": ["checkout"] if "checkout" in message else ["design"],
+            "recommendations": ["Follow up with user to gather more specific feedback"],
+            "priority_score": 10,
+            "priority_level": "LOW",
+        }
+        for message in messages
+    ]
+
+
+def write_jsonl(path, records):
+    """Write records as JSON Lines"""
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Empty migrated database for one import"""
+    engine = bulk_load_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    prepare_database(engine)
+    yield engine
+    engine.dispose()
+
+
+def count(engine, model):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+class TestBulkImportParsing:
+    """Test cases for reading import sources"""
+    
+    def test_parse_timestamp(self):
+        """Test ISO 8601 and Unix timestamps are parsed into naive UTC"""
+        assert parse_timestamp("2021-03-04T05:06:07") == datetime(2021, 3, 4, 5, 6, 7)
+        assert parse_timestamp("2021-03-04T05:06:07Z") == datetime(2021, 3, 4, 5, 6, 7)
+        assert parse_timestamp("2021-03-04T07:06:07+02:00") == datetime(2021, 3, 4, 5, 6, 7)
+        assert parse_timestamp(0) == datetime(1970, 1, 1)
+        assert parse_timestamp("86400") == datetime(1970, 1, 2)
+        assert parse_timestamp("") is None
+        with pytest.raises(ValueError):
+            parse_timestamp("yesterday")
+    
+    def test_detect_format(self):
+        """Test the format is taken from the extension, ignoring .gz"""
+        assert detect_format("archive.csv") == "csv"
+        assert detect_format("archive.jsonl.gz") == "jsonl"
+        with pytest.raises(ValueError):
+            detect_format("archive.txt")
+
+
+class TestBulkImport:
+    """Test cases for the offline bulk import"""
+    
+    def test_jsonl_import_keeps_source_timestamps(self, engine, tmp_path):
+        """Test rows, insights and original timestamps are stored"""
+        path = write_jsonl(tmp_path / "feedback.jsonl", [
+            {"message": "Checkout is broken", "timestamp": "2019-05-01T10:00:00Z"},
+            {"message": "Love the new design", "timestamp": "2019-05-02T10:00:00Z"},
+        ])
+        
+        summary = import_file(engine, path, fake_analyze, batch_size=1, report=None)
+        
+        assert summary["imported"] == 2
+        with Session(bind=engine) as db:
+            rows = db.execute(select(Feedback.message, Feedback.timestamp, Feedback.created_at).order_by(Feedback.id)).all()
+            assert rows[0] == ("Checkout is broken", datetime(2019, 5, 1, 10), datetime(2019, 5, 1, 10))
+            assert db.scalars(select(Insight.sentiment_label).order_by(Insight.id)).all() == ["negative", "positive"]
+    
+    def test_import_maintains_theme_index_and_aggregates(self, engine, tmp_path):
+        """Test imported insights reach the derived tables the ORM hooks would fill"""
+        path = write_jsonl(tmp_path / "feedback.jsonl", [{"message": f"checkout note {i}"} for i in range(7)])
+        
+        import_file(engine, path, fake_analyze, batch_size=3, report=None)
+        
+        assert count(engine, InsightTheme) == 7
+        with engine.connect() as connection:
+            assert connection.execute(select(ThemeAggregate.count).where(ThemeAggregate.theme == "checkout")).scalar_one() == 7
+            assert connection.execute(select(func.sum(TrendBucket.count)).where(TrendBucket.granularity == "day")).scalar_one() == 7
+    
+    def test_import_clusters_near_duplicates(self, engine, tmp_path):
+        """Test imported feedback gets signatures and clusters across batches"""
+        path = write_jsonl(tmp_path / "feedback.jsonl", [
+            {"message": "Checkout is broken again on mobile"},
+            {"message": "Love the new design"},
+            {"message": "checkout is broken again on mobile!"},
+        ])
+        
+        import_file(engine, path, fake_analyze, batch_size=2, report=None)
+        
+        assert count(engine, FeedbackSignature) == 3
+        with engine.connect() as connection:
+            assert connection.execute(select(FeedbackCluster.size).order_by(FeedbackCluster.id)).scalars().all() == [2, 1]
+    
+    def test_csv_import_skips_unusable_records(self, engine, tmp_path):
+        """Test CSV rows without a message or with a bad timestamp are skipped and counted"""
+        path = tmp_path / "feedback.csv.gz"
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as source:
+            writer = csv.writer(source)
+            writer.writerow(["message", "timestamp"])
+            writer.writerow(["Multi-line,\nquoted message", "2020-01-01 00:00:00"])
+            writer.writerow(["", "2020-01-01 00:00:00"])
+            writer.writerow(["Bad timestamp", "not a date"])
+        
+        summary = import_file(engine, str(path), fake_analyze, report=None)
+        
+        assert (summary["imported"], summary["skipped"], summary["records_read"]) == (1, 2, 3)
+        with engine.connect() as connection:
+            assert connection.execute(select(Feedback.message)).scalar_one() == "Multi-line,\nquoted message"
+    
+    def test_interrupted_import_resumes_from_checkpoint(self, engine, tmp_path):
+        """Test a failed batch leaves committed batches in place and a rerun imports only the rest"""
+        path = write_jsonl(tmp_path / "feedback.jsonl", [{"message": f"Message {i}"} for i in range(10)])
+        calls = []
+        
+        def failing_analyze(messages):
+            calls.append(messages)
+            if len(calls) == 3:
+                raise RuntimeError("worker died")
+            return fake_analyze(messages)
+        
+        with pytest.raises(RuntimeError):
+            import_file(engine, path, failing_analyze, batch_size=3, report=None)
+        
+        assert count(engine, Feedback) == 6
+        with Session(bind=engine) as db:
+            checkpoint = db.get(ImportCheckpoint, str(tmp_path / "feedback.jsonl"))
+            assert (checkpoint.records_read, checkpoint.completed_at) == (6, None)
+        
+        summary = import_file(engine, path, fake_analyze, batch_size=3, report=None)
+        
+        assert (summary["resumed_from"], summary["imported"]) == (6, 4)
+        with engine.connect() as connection:
+            messages = connection.execute(select(Feedback.message).order_by(Feedback.id)).scalars().all()
+        assert messages == [f"Message {i}" for i in range(10)]
+    
+    def test_completed_import_is_not_repeated(self, engine, tmp_path):
+        """Test rerunning a finished import is a no-op unless restarted"""
+        path = write_jsonl(tmp_path / "feedback.jsonl", [{"message": "Only once"}])
+        import_file(engine, path, fake_analyze, report=None)
+        
+        assert import_file(engine, path, fake_analyze, report=None)["imported"] == 0
+        assert count(engine, Feedback) == 1
+        
+        assert import_file(engine, path, fake_analyze, restart=True, report=None)["imported"] == 1
+        assert count(engine, Feedback) == 2
+    
+    def test_import_after_archive_does_not_reuse_ids(self, engine, tmp_path):
+        """Test ids of an archived newest month are not handed out again by a later import"""
+        from feedback_archive import archive_month
+        
+        archived = write_jsonl(tmp_path / "january.jsonl",
+                               [{"message": f"January note {i}", "timestamp": f"2020-01-0{i + 1}T10:00:00"} for i in range(3)])
+        import_file(engine, archived, fake_analyze, report=None)
+        with Session(bind=engine) as db:
+            manifest = archive_month(db, "2020-01", archive_dir=str(tmp_path / "archive"))
+        assert count(engine, Feedback) == 0
+        
+        path = write_jsonl(tmp_path / "february.jsonl",
+                           [{"message": f"February note {i}", "timestamp": "2020-02-01T10:00:00"} for i in range(2)])
+        summary = import_file(engine, path, fake_analyze, report=None)
+        
+        assert summary["imported"] == 2
+        with engine.connect() as connection:
+            assert min(connection.execute(select(Feedback.id)).scalars()) > manifest["max_id"]
+            assert min(connection.execute(select(Insight.id)).scalars()) > manifest["max_insight_id"]
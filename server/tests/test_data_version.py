@@ -0,0 +1,79 @@
+import pytest
+import json
+from database import DataVersion, Feedback, Insight
+from data_version import etag_matches
+
+
+def current_version(db):
+    """Current feedback data version, 0 before the first write"""
+    row = db.get(DataVersion, "feedback")
+    return row.version if row else 0
+
+
+class TestDataVersion:
+    """Test cases for the feedback data version"""
+    
+    def test_etag_matches(self):
+        """Test If-None-Match lists, weak tags and * are understood"""
+        assert etag_matches('"a-1"', '"a-1"')
+        assert etag_matches('"a-0", W/"a-1"', '"a-1"')
+        assert etag_matches("*", '"a-1"')
+        assert not etag_matches('"a-2"', '"a-1"')
+        assert not etag_matches(None, '"a-1"')
+    
+    def test_writes_bump_version(self, test_db):
+        """Test feedback inserts, insight writes and deletes each bump the version once per flush"""
+        feedback = Feedback(message="First")
+        test_db.add(feedback)
+        test_db.commit()
+        assert current_version(test_db) == 1
+        
+        test_db.add(Insight(feedback_id=feedback.id, sentiment_score=0.5, sentiment_label="positive",
+                            themes=json.dumps([]), recommendations=json.dumps([])))
+        test_db.add(Feedback(message="Second"))
+        test_db.commit()
+        assert current_version(test_db) == 2
+        
+        test_db.delete(feedback.insights[0])
+        test_db.commit()
+        assert current_version(test_db) == 3
+
+
+class TestConditionalGet:
+    """Test cases for ETag / If-None-Match on the read endpoints"""
+    
+    @pytest.mark.parametrize("path", ["/api/feedback", "/api/insights", "/api/insights/trends"])
+    def test_unchanged_data_is_not_modified(self, client, path):
+        """Test a repeated request with the ETag gets 304 without a body"""
+        client.post("/api/feedback", json={"message": "Checkout is slow"})
+        first = client.get(path)
+        
+        second = client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+        
+        assert first.status_code == 200
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["ETag"] == first.headers["ETag"]
+    
+    def test_new_feedback_changes_etag(self, client):
+        """Test a write invalidates the previous ETag"""
+        first = client.get("/api/feedback")
+        client.post("/api/feedback", json={"message": "New message"})
+        
+        second = client.get("/api/feedback", headers={"If-None-Match": first.headers["ETag"]})
+        
+        assert second.status_code == 200
+        assert second.headers["ETag"] != first.headers["ETag"]
+        assert [item["message"] for item in second.json()] == ["New message"]
+    
+    def test_not_modified_skips_queries(self, client, monkeypatch):
+        """Test a 304 is answered before the endpoint builds its queries"""
+        import app as app_module
+        
+        etag = client.get("/api/insights").headers["ETag"]
+        
+        def fail():
+            raise AssertionError("insights queries should not run")
+        
+        monkeypatch.setattr(app_module, "analytics_queries", fail)
+        assert client.get("/api/insights", headers={"If-None-Match": etag}).status_code == 304
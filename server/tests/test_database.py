@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from database import DB_BUSY_TIMEOUT_MS, create_database_engine
+
+
+class TestDatabaseEngines:
+    """Test cases for the tuned read and write engines"""
+    
+    def test_write_engine_uses_wal_and_busy_timeout(self, tmp_path):
+        """Test write connections switch the database to WAL and wait for locks"""
+        engine = create_database_engine(f"sqlite:///{tmp_path / 'wal.db'}", pool_size=2)
+        try:
+            with engine.connect() as connection:
+                assert connection.execute(text("PRAGMA journal_mode")).scalar_one() == "wal"
+                assert connection.execute(text("PRAGMA busy_timeout")).scalar_one() == DB_BUSY_TIMEOUT_MS
+                assert connection.execute(text("PRAGMA synchronous")).scalar_one() == 1  # NORMAL
+            assert engine.pool.size() == 2
+        finally:
+            engine.dispose()
+    
+    def test_read_engine_rejects_writes(self, tmp_path):
+        """Test read-only connections can read committed data but not write"""
+        url = f"sqlite:///{tmp_path / 'read.db'}"
+        write_engine = create_database_engine(url)
+        read_engine = create_database_engine(url, read_only=True)
+        try:
+            with write_engine.begin() as connection:
+                connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+                connection.execute(text("INSERT INTO items VALUES (1)"))
+            
+            with read_engine.connect() as connection:
+                assert connection.execute(text("SELECT count(*) FROM items")).scalar_one() == 1
+                with pytest.raises(OperationalError):
+                    connection.execute(text("INSERT INTO items VALUES (2)"))
+        finally:
+            write_engine.dispose()
+            read_engine.dispose()
+    
+    def test_reads_are_not_blocked_by_open_write_transaction(self, tmp_path):
+        """Test a reader sees the last committed data while a write transaction is open"""
+        url = f"sqlite:///{tmp_path / 'concurrent.db'}"
+        write_engine = create_database_engine(url)
+        read_engine = create_database_engine(url, read_only=True)
+        try:
+            with write_engine.begin() as connection:
+                connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+                connection.execute(text("INSERT INTO items VALUES (1)"))
+            
+            with write_engine.connect() as writer:
+                writer.execute(text("INSERT INTO items VALUES (2)"))
+                with read_engine.connect() as reader:
+                    assert reader.execute(text("SELECT count(*) FROM items")).scalar_one() == 1
+                writer.commit()
+        finally:
+            write_engine.dispose()
+            read_engine.dispose()
+    
+    def test_memory_database_has_no_pool_settings(self):
+        """Test an in-memory URL is accepted without file pool settings"""
+        engine = create_database_engine("sqlite://")
+        try:
+            with engine.connect() as connection:
+                assert connection.execute(text("SELECT 1")).scalar_one() == 1
+        finally:
+            engine.dispose()
@@ -0,0 +1,192 @@
+import pytest
+import asyncio
+import json
+from database import Feedback, Insight
+from event_stream import EventBroker, RESYNC, TooManySubscribers, broker
+
+
+def parse_event(message):
+    """Fields of one SSE message"""
+    fields = dict(line.split(": ", 1) for line in message.strip().split("\n"))
+    if "data" in fields:
+        fields["data"] = json.loads(fields["data"])
+    return fields
+
+
+async def drain(queue):
+    """Messages waiting in a subscriber queue, after pending fan-outs have run"""
+    await asyncio.sleep(0)
+    messages = []
+    while not queue.empty():
+        messages.append(queue.get_nowait()[1])
+    return messages
+
+
+class TestEventBroker:
+    """Test cases for in-process event fan-out"""
+    
+    def test_fan_out_serializes_once(self):
+        """Test every subscriber gets the same message object"""
+        async def scenario():
+            events = EventBroker()
+            queues = [events.subscribe() for _ in range(3)]
+            events.publish("insight", {"feedback_id": 1})
+            return [await drain(queue) for queue in queues]
+        
+        received = asyncio.run(scenario())
+        
+        assert all(len(messages) == 1 for messages in received)
+        assert all(messages[0] is received[0][0] for messages in received)
+        event = parse_event(received[0][0])
+        assert event["event"] == "insight"
+        assert event["data"] == {"feedback_id": 1}
+    
+    def test_full_queue_gets_resync(self):
+        """Test a subscriber that falls behind is told to resync instead of blocking publishers"""
+        async def scenario():
+            events = EventBroker(queue_size=2)
+            queue = events.subscribe()
+            for i in range(5):
+                events.publish("insight", {"feedback_id": i})
+            return await drain(queue)
+        
+        messages = asyncio.run(scenario())
+        
+        assert RESYNC in messages
+        assert len(messages) <= 2
+    
+    def test_last_event_id_replays_missed_events(self):
+        """Test a reconnecting client gets the events after its last id"""
+        async def scenario():
+            events = EventBroker()
+            events.publish("insight", {"feedback_id": 1})
+            events.publish("insight", {"feedback_id": 2})
+            events.publish("insight", {"feedback_id": 3})
+            return await drain(events.subscribe(f"{events.epoch}:1"))
+        
+        messages = asyncio.run(scenario())
+        
+        assert [parse_event(m)["data"]["feedback_id"] for m in messages] == [2, 3]
+    
+    @pytest.mark.parametrize("last_event_id", ["restarted:1", "garbage", "{epoch}:1"])
+    def test_unreplayable_gap_resyncs(self, last_event_id):
+        """Test an id from another process or older than the replay buffer gets a resync"""
+        async def scenario():
+            events = EventBroker(replay_size=2)
+            for i in range(5):
+                events.publish("insight", {"feedback_id": i})
+            return await drain(events.subscribe(last_event_id.format(epoch=events.epoch)))
+        
+        assert asyncio.run(scenario()) == [RESYNC]
+    
+    def test_subscriber_limit(self):
+        """Test subscribing beyond the limit is refused"""
+        async def scenario():
+            events = EventBroker(max_subscribers=1)
+            events.subscribe()
+            events.subscribe()
+        
+        with pytest.raises(TooManySubscribers):
+            asyncio.run(scenario())
+    
+    def test_stream_delivers_and_unsubscribes(self):
+        """Test the SSE body sends retry, events and keepalives, and unsubscribes on close"""
+        async def scenario():
+            events = EventBroker()
+            queue = events.subscribe()
+            body = events.stream(queue, keepalive=0.01)
+            chunks = [await body.__anext__()]
+            events.publish("aggregates", {"etag": '"a-1"'})
+            chunks.append(await body.__anext__())
+            chunks.append(await body.__anext__())
+            await body.aclose()
+            return chunks, events.subscriber_count
+        
+        chunks, subscribers = asyncio.run(scenario())
+        
+        assert chunks[0] == "retry: 3000\n\n"
+        assert parse_event(chunks[1])["event"] == "aggregates"
+        assert chunks[2] == ": keepalive\n\n"
+        assert subscribers == 0
+    
+    def test_data_version_change_publishes_aggregates(self, monkeypatch):
+        """Test one watcher per broker turns data version changes into aggregates events"""
+        monkeypatch.setattr("event_stream.EVENTS_VERSION_POLL_SECONDS", 0.01)
+        versions = iter(['"a-1"', '"a-1"', '"a-2"'] + ['"a-2"'] * 100)
+        
+        async def scenario():
+            events = EventBroker()
+            events.version_reader = lambda: next(versions)
+            queues = [events.subscribe() for _ in range(2)]
+            await asyncio.sleep(0.1)
+            messages = [await drain(queue) for queue in queues]
+            for queue in queues:
+                events.unsubscribe(queue)
+            await asyncio.sleep(0.05)
+            return messages
+        
+        messages = asyncio.run(scenario())
+        
+        for received in messages:
+            assert [parse_event(m)["data"] for m in received] == [{"etag": '"a-2"'}]
+
+
+class TestInsightEvents:
+    """Test cases for publishing stored insights"""
+    
+    def add_insight(self, db):
+        feedback = Feedback(message="Checkout keeps crashing")
+        db.add(feedback)
+        db.flush()
+        db.add(Insight(feedback_id=feedback.id, sentiment_score=-0.8, sentiment_label="negative",
+                       priority_score=9, priority_level="high",
+                       themes=json.dumps(["checkout"]), recommendations=json.dumps(["Fix checkout"])))
+        return feedback
+    
+    def published(self, monkeypatch):
+        events = []
+        monkeypatch.setattr(broker, "publish", lambda event_type, data: events.append((event_type, data)))
+        return events
+    
+    def test_commit_publishes_insight(self, test_db, monkeypatch):
+        """Test a committed insight is published with the fields the feedback table shows"""
+        events = self.published(monkeypatch)
+        
+        feedback = self.add_insight(test_db)
+        test_db.flush()
+        assert events == []
+        test_db.commit()
+        
+        assert len(events) == 1
+        event_type, data = events[0]
+        assert event_type == "insight"
+        assert data["feedback_id"] == feedback.id
+        assert data["sentiment_label"] == "negative"
+        assert data["priority_level"] == "high"
+        assert data["themes"] == ["checkout"]
+        assert data["insight_processed_at"] is not None
+    
+    def test_rollback_publishes_nothing(self, test_db, monkeypatch):
+        """Test an insight rolled back is never announced"""
+        events = self.published(monkeypatch)
+        
+        self.add_insight(test_db)
+        test_db.flush()
+        test_db.rollback()
+        test_db.add(Feedback(message="Unrelated"))
+        test_db.commit()
+        
+        assert events == []
+
+
+class TestEventsEndpoint:
+    """Test cases for GET /api/events"""
+    
+    def test_subscriber_limit_is_503(self, client, monkeypatch):
+        """Test streams beyond EVENTS_MAX_SUBSCRIBERS are refused with Retry-After"""
+        monkeypatch.setattr(broker, "max_subscribers", 0)
+        
+        response = client.get("/api/events")
+        
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
@@ -30,6 +30,16 @@ class TestFeedbackAPI:
         
         assert response.status_code == 400
     
+    def test_post_feedback_queues_insight_job(self, client, test_db, sample_feedback_data):
+        """Test POST /api/feedback queues an insight job with the feedback"""
+        from database import InsightJob
+        
+        response = client.post("/api/feedback", json=sample_feedback_data)
+        
+        job = test_db.query(InsightJob).one()
+        assert job.feedback_id == response.json()["id"]
+        assert job.state == "pending"
+    
     def test_post_feedback_missing_message(self, client):
         """Test POST /api/feedback with missing message field"""
         response = client.post("/api/feedback", json={})
@@ -128,3 +138,388 @@ class TestFeedbackAPI:
         # Most recent should be first
         assert data[0]["message"] == "Second message"
         assert data[1]["message"] == "First message"
+
+
+class TestFeedbackBatchAPI:
+    """Test cases for the batch feedback submission endpoint"""
+    
+    def test_post_feedback_batch_valid_input(self, client, test_db):
+        """Test POST /api/feedback/batch stores every message"""
+        messages = ["First batch message", "Second batch message", "Third batch message"]
+        response = client.post("/api/feedback/batch", json={"messages": messages})
+        
+        assert response.status_code == 201
+        data = response.json()
+        assert [item["message"] for item in data] == messages
+        assert len({item["id"] for item in data}) == 3
+        assert test_db.query(Feedback).count() == 3
+    
+    def test_post_feedback_batch_strips_messages(self, client):
+        """Test POST /api/feedback/batch strips surrounding whitespace"""
+        response = client.post("/api/feedback/batch", json={"messages": ["  padded message  "]})
+        
+        assert response.status_code == 201
+        assert response.json()[0]["message"] == "padded message"
+    
+    def test_post_feedback_batch_empty_list(self, client):
+        """Test POST /api/feedback/batch rejects an empty batch"""
+        response = client.post("/api/feedback/batch", json={"messages": []})
+        
+        assert response.status_code == 400
+        assert "empty" in response.json()["detail"].lower()
+    
+    def test_post_feedback_batch_rejects_empty_message(self, client, test_db):
+        """Test POST /api/feedback/batch rejects the whole batch if one message is empty"""
+        response = client.post("/api/feedback/batch", json={"messages": ["Valid message", "   "]})
+        
+        assert response.status_code == 400
+        assert "index 1" in response.json()["detail"]
+        assert test_db.query(Feedback).count() == 0
+    
+    def test_post_feedback_batch_too_large(self, client):
+        """Test POST /api/feedback/batch enforces the batch size limit"""
+        from feedback_store import MAX_BATCH_SIZE
+        
+        response = client.post("/api/feedback/batch", json={"messages": ["message"] * (MAX_BATCH_SIZE + 1)})
+        
+        assert response.status_code == 400
+    
+    def test_post_feedback_batch_queues_insight_jobs(self, client, test_db):
+        """Test POST /api/feedback/batch queues one insight job per message"""
+        from database import InsightJob
+        
+        response = client.post("/api/feedback/batch", json={"messages": ["One", "Two"]})
+        
+        ids = sorted(item["id"] for item in response.json())
+        jobs = test_db.query(InsightJob).order_by(InsightJob.feedback_id).all()
+        assert [job.feedback_id for job in jobs] == ids
+        assert all(job.state == "pending" for job in jobs)
+
+
+class TestFeedbackPagination:
+    """Test cases for keyset pagination, sorting and filtering of GET /api/feedback"""
+    
+    def create_feedback(self, db, count):
+        """Create feedback rows with insights and distinct scores"""
+        from datetime import datetime, timedelta
+        
+        base = datetime(2024, 1, 1)
+        for i in range(count):
+            feedback = Feedback(message=f"Message {i}", timestamp=base + timedelta(hours=i), created_at=base + timedelta(hours=i))
+            db.add(feedback)
+            db.flush()
+            db.add(Insight(
+                feedback_id=feedback.id,
+                sentiment_score=round(-0.9 + i * 0.2, 2),
+                sentiment_label="negative" if i < 5 else "positive",
+                themes=json.dumps(["checkout"] if i % 2 == 0 else ["design"]),
+                recommendations=json.dumps([]),
+                priority_score=(i * 7) % 50,
+                priority_level="HIGH" if i % 3 == 0 else "LOW"
+            ))
+        db.commit()
+    
+    def fetch_all_pages(self, client, **params):
+        """Follow X-Next-Cursor until the last page"""
+        pages = []
+        cursor = None
+        while True:
+            query = dict(params, **({"cursor": cursor} if cursor else {}))
+            response = client.get("/api/feedback", params=query)
+            assert response.status_code == 200
+            pages.append(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return pages
+    
+    def test_pages_cover_all_rows_once(self, client, test_db):
+        """Test following the cursor returns every row exactly once in order"""
+        self.create_feedback(test_db, 10)
+        
+        pages = self.fetch_all_pages(client, limit=3)
+        
+        assert [len(page) for page in pages] == [3, 3, 3, 1]
+        messages = [item["message"] for page in pages for item in page]
+        assert messages == [f"Message {i}" for i in reversed(range(10))]
+    
+    def test_last_page_has_no_cursor(self, client, test_db):
+        """Test no cursor is returned when all rows fit in one page"""
+        self.create_feedback(test_db, 3)
+        
+        response = client.get("/api/feedback", params={"limit": 3})
+        
+        assert len(response.json()) == 3
+        assert "X-Next-Cursor" not in response.headers
+    
+    def test_sort_by_sentiment_score(self, client, test_db):
+        """Test sorting by sentiment score across pages"""
+        self.create_feedback(test_db, 10)
+        
+        pages = self.fetch_all_pages(client, limit=4, sort="sentiment_score", order="asc")
+        scores = [item["sentiment_score"] for page in pages for item in page]
+        
+        assert scores == sorted(scores)
+        assert len(scores) == 10
+    
+    def test_sort_by_priority_score_with_ties(self, client, test_db):
+        """Test sorting by priority score pages through ties without gaps"""
+        self.create_feedback(test_db, 10)
+        test_db.query(Insight).update({Insight.priority_score: 10})
+        test_db.commit()
+        
+        pages = self.fetch_all_pages(client, limit=3, sort="priority_score", order="desc")
+        ids = [item["id"] for page in pages for item in page]
+        
+        assert len(ids) == 10
+        assert len(set(ids)) == 10
+    
+    def test_filter_by_sentiment_and_priority(self, client, test_db):
+        """Test filtering by sentiment label and priority level"""
+        self.create_feedback(test_db, 10)
+        
+        response = client.get("/api/feedback", params={"sentiment_label": "positive", "priority_level": "high"})
+        
+        data = response.json()
+        assert {item["message"] for item in data} == {"Message 6", "Message 9"}
+    
+    def test_filter_by_theme(self, client, test_db):
+        """Test filtering by theme"""
+        self.create_feedback(test_db, 6)
+        
+        response = client.get("/api/feedback", params={"theme": "Checkout"})
+        
+        data = response.json()
+        assert len(data) == 3
+        assert all(item["themes"] == ["checkout"] for item in data)
+    
+    def test_filter_by_date_range(self, client, test_db):
+        """Test filtering by created_at date range"""
+        self.create_feedback(test_db, 10)
+        
+        response = client.get("/api/feedback", params={
+            "date_from": "2024-01-01T02:00:00",
+            "date_to": "2024-01-01T04:00:00"
+        })
+        
+        assert [item["message"] for item in response.json()] == ["Message 4", "Message 3", "Message 2"]
+    
+    def test_invalid_cursor(self, client):
+        """Test a malformed cursor is rejected"""
+        response = client.get("/api/feedback", params={"cursor": "not-a-cursor"})
+        
+        assert response.status_code == 400
+    
+    def test_cursor_from_other_sort_is_rejected(self, client, test_db):
+        """Test a cursor cannot be reused with a different sort order"""
+        self.create_feedback(test_db, 5)
+        cursor = client.get("/api/feedback", params={"limit": 2}).headers["X-Next-Cursor"]
+        
+        response = client.get("/api/feedback", params={"limit": 2, "cursor": cursor, "order": "asc"})
+        
+        assert response.status_code == 400
+    
+    def test_invalid_sort_field(self, client):
+        """Test an unknown sort field is a validation error"""
+        response = client.get("/api/feedback", params={"sort": "message"})
+        
+        assert response.status_code == 422
+    
+    def test_page_query_uses_indexes(self, test_db):
+        """Test page queries are served by an index instead of a sort"""
+        from sqlalchemy.dialects import sqlite
+        from feedback_query import build_feedback_page_query
+        
+        for sort in ["created_at", "sentiment_score", "priority_score"]:
+            statement = build_feedback_page_query(sort=sort, limit=10).compile(
+                dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}
+            )
+            plan = " ".join(row[-1] for row in test_db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}"))
+            assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+
+
+class TestFeedbackExport:
+    """Test cases for streaming exports from GET /api/feedback/export"""
+    
+    create_feedback = TestFeedbackPagination.create_feedback
+    
+    def test_ndjson_export_streams_all_rows_oldest_first(self, client, test_db):
+        """Test the NDJSON export has one record per line in created_at order"""
+        self.create_feedback(test_db, 10)
+        
+        response = client.get("/api/feedback/export")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert 'filename="feedback-export.ndjson"' in response.headers["content-disposition"]
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert [record["message"] for record in records] == [f"Message {i}" for i in range(10)]
+        assert records[0]["themes"] == ["checkout"]
+        assert records[0]["created_at"] == "2024-01-01T00:00:00"
+    
+    def test_ndjson_export_includes_feedback_without_insights(self, client, test_db):
+        """Test feedback that has not been analyzed yet is exported with null insight fields"""
+        test_db.add(Feedback(message="Not analyzed yet"))
+        test_db.commit()
+        
+        record = json.loads(client.get("/api/feedback/export").text)
+        
+        assert record["message"] == "Not analyzed yet"
+        assert record["sentiment_label"] is None
+    
+    def test_csv_export(self, client, test_db):
+        """Test the CSV export has a header row and joins list fields"""
+        import csv
+        import io
+        from feedback_export import CSV_COLUMNS
+        
+        self.create_feedback(test_db, 3)
+        
+        response = client.get("/api/feedback/export", params={"format": "csv", "order": "desc"})
+        
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.reader(io.StringIO(response.text)))
+        assert rows[0] == CSV_COLUMNS
+        assert [row[1] for row in rows[1:]] == ["Message 2", "Message 1", "Message 0"]
+        assert rows[1][CSV_COLUMNS.index("themes")] == "checkout"
+    
+    def test_empty_csv_export_has_header(self, client):
+        """Test a CSV export of no rows still carries its header"""
+        from feedback_export import CSV_COLUMNS
+        
+        response = client.get("/api/feedback/export", params={"format": "csv"})
+        
+        assert response.text.strip() == ",".join(CSV_COLUMNS)
+    
+    def test_export_applies_filters(self, client, test_db):
+        """Test the export accepts the same filters as GET /api/feedback"""
+        self.create_feedback(test_db, 10)
+        
+        response = client.get("/api/feedback/export", params={
+            "priority_level": "high",
+            "date_from": "2024-01-01T02:00:00",
+            "date_to": "2024-01-01T08:00:00"
+        })
+        
+        messages = [json.loads(line)["message"] for line in response.text.splitlines()]
+        assert messages == ["Message 3", "Message 6"]
+    
+    def test_gzip_export(self, client, test_db):
+        """Test a gzip export decompresses to the plain export"""
+        import gzip
+        
+        self.create_feedback(test_db, 5)
+        plain = client.get("/api/feedback/export", params={"format": "csv"})
+        
+        response = client.get("/api/feedback/export", params={"format": "csv", "gzip": True})
+        
+        assert response.headers["content-type"] == "application/gzip"
+        assert 'filename="feedback-export.csv.gz"' in response.headers["content-disposition"]
+        assert gzip.decompress(response.content) == plain.content
+    
+    def test_export_is_chunked(self, test_db, monkeypatch):
+        """Test large exports are yielded in several chunks rather than all at once"""
+        import feedback_export
+        from feedback_query import build_feedback_export_query
+        
+        self.create_feedback(test_db, 10)
+        monkeypatch.setattr(feedback_export, "EXPORT_BATCH_SIZE", 2)
+        monkeypatch.setattr(feedback_export, "EXPORT_CHUNK_BYTES", 1)
+        
+        chunks = list(feedback_export.iter_export(test_db, build_feedback_export_query()))
+        
+        assert len(chunks) == 5
+        assert sum(chunk.count(b"\n") for chunk in chunks) == 10
+    
+    def test_invalid_export_format(self, client):
+        """Test an unknown export format is a validation error"""
+        response = client.get("/api/feedback/export", params={"format": "xml"})
+        
+        assert response.status_code == 422
+
+
+class TestFeedbackSearch:
+    """Test cases for GET /api/feedback/search"""
+    
+    def create_feedback(self, test_db, messages):
+        """Create feedback rows, with a HIGH priority negative insight when the message mentions crashes"""
+        for message in messages:
+            feedback = Feedback(message=message)
+            test_db.add(feedback)
+            test_db.flush()
+            negative = "crash" in message.lower()
+            test_db.add(Insight(
+                feedback_id=feedback.id,
+                sentiment_score=-0.5 if negative else 0.5,
+                sentiment_label="negative" if negative else "positive",
+                themes=json.dumps([]),
+                recommendations=json.dumps([]),
+                priority_level="HIGH" if negative else "LOW"
+            ))
+        test_db.commit()
+    
+    def test_search_ranks_matches(self, client, test_db):
+        """Test matching feedback is returned best match first, including stemmed forms"""
+        self.create_feedback(test_db, [
+            "The checkout page is slow",
+            "App crashes when I open settings",
+            "Crash, crash, crash: the app crashed again",
+            "Love the new design",
+        ])
+        
+        response = client.get("/api/feedback/search", params={"q": "crash"})
+        
+        assert response.status_code == 200
+        messages = [item["message"] for item in response.json()]
+        assert messages == ["Crash, crash, crash: the app crashed again", "App crashes when I open settings"]
+        assert response.json()[0]["sentiment_label"] == "negative"
+    
+    def test_search_phrase_and_filters(self, client, test_db):
+        """Test phrase search and the list filters can be combined"""
+        self.create_feedback(test_db, [
+            "Crash on the checkout page",
+            "The checkout page looks great",
+            "Page for checkout is missing",
+        ])
+        
+        phrase = client.get("/api/feedback/search", params={"q": '"checkout page"'})
+        filtered = client.get("/api/feedback/search", params={"q": "checkout", "priority_level": "low"})
+        
+        assert {item["message"] for item in phrase.json()} == {"Crash on the checkout page", "The checkout page looks great"}
+        assert {item["message"] for item in filtered.json()} == {"The checkout page looks great", "Page for checkout is missing"}
+    
+    def test_search_pagination(self, client, test_db):
+        """Test search results can be paged through with the cursor without repeats"""
+        self.create_feedback(test_db, [f"Login problem number {i}" for i in range(7)])
+        
+        seen = []
+        cursor = None
+        while True:
+            response = client.get("/api/feedback/search", params={"q": "login", "limit": 3, **({"cursor": cursor} if cursor else {})})
+            assert response.status_code == 200
+            seen.extend(item["id"] for item in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        
+        assert sorted(seen) == list(range(1, 8))
+    
+    def test_search_sees_new_and_edited_feedback(self, client, test_db):
+        """Test the index follows inserts, updates and deletes on the feedback table"""
+        self.create_feedback(test_db, ["Dark mode please"])
+        feedback = test_db.query(Feedback).one()
+        
+        assert len(client.get("/api/feedback/search", params={"q": "dark mode"}).json()) == 1
+        
+        feedback.message = "Light theme please"
+        test_db.commit()
+        assert client.get("/api/feedback/search", params={"q": "dark"}).json() == []
+        assert len(client.get("/api/feedback/search", params={"q": "light"}).json()) == 1
+    
+    def test_search_input_is_not_fts_syntax(self, client, test_db):
+        """Test FTS operators and stray quotes in the query do not cause errors"""
+        self.create_feedback(test_db, ["Export NEAR the top is broken"])
+        
+        for q in ['export NEAR(', 'broken"', 'col:umn', '*']:
+            assert client.get("/api/feedback/search", params={"q": q}).status_code in (200, 400)
+        assert client.get("/api/feedback/search", params={"q": "!!!"}).status_code == 400
+        assert client.get("/api/feedback/search", params={"q": "broken", "cursor": "bad"}).status_code == 400
@@ -0,0 +1,362 @@
+import pytest
+import gzip
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+import feedback_archive
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+from database import ArchiveSegment, Base, Feedback, Insight, InsightJob, SentimentExtreme, TrendBucket, TrendTheme
+from feedback_archive import ArchiveError, SegmentStore, archivable_months, archive_month, backfill_score_ranges, run_archiver
+from insight_aggregates import rebuild_aggregates
+from insight_jobs import PENDING
+from insight_trends import rebuild_trends
+from migrations import run_migrations
+from near_duplicates import largest_clusters_query
+
+
+@pytest.fixture
+def segment_store(tmp_path, monkeypatch):
+    """A segment store of its own, reading segments from a temporary archive directory"""
+    archive_dir = str(tmp_path / "archive")
+    store = SegmentStore(archive_dir=archive_dir)
+    monkeypatch.setattr(feedback_archive, "store", store)
+    monkeypatch.setattr(feedback_archive, "ARCHIVE_DIR", archive_dir)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def history(test_db):
+    """Feedback over three months, most of it analyzed, some of it duplicated"""
+    themes = ["checkout", "search", "speed", "design"]
+    for index in range(36):
+        created_at = datetime(2024, 1, 1, 9) + timedelta(days=index * 2.5, minutes=index)
+        feedback = Feedback(message=f"Feedback {index} about {themes[index % 4]}", created_at=created_at,
+                            timestamp=created_at)
+        if index % 9 == 0:
+            # Same text as earlier feedback, so the two land in one near-duplicate cluster
+            feedback.message = "The checkout page keeps crashing whenever I try to pay with a card"
+        test_db.add(feedback)
+        test_db.flush()
+        if index % 7 == 6:
+            continue
+        score = round((index % 11 - 5) / 5, 2)
+        test_db.add(Insight(
+            feedback_id=feedback.id,
+            sentiment_score=score,
+            sentiment_label="positive" if score > 0 else "negative" if score < 0 else "neutral",
+            themes=json.dumps([themes[index % 4], themes[(index + 1) % 4]]),
+            recommendations=json.dumps([f"Improve {themes[index % 4]}"]),
+            priority_score=index % 10,
+            priority_level=["LOW", "MEDIUM", "HIGH"][index % 3],
+            processed_at=created_at,
+        ))
+    test_db.commit()
+    return test_db
+
+
+def page_through(client, **params):
+    """Every item of a list query, following X-Next-Cursor"""
+    items, cursor = [], None
+    while True:
+        response = client.get("/api/feedback", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        items.extend(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return items
+
+
+def insights_snapshot(client):
+    data = client.get("/api/insights").json()
+    data.pop("theme_sketch", None)
+    return data
+
+
+def rollups(db):
+    buckets = {
+        (row.granularity, row.bucket_start): (row.count, round(row.sentiment_total, 6), row.sentiment_count,
+                                              row.positive_count, row.negative_count, row.high_count)
+        for row in db.query(TrendBucket)
+    }
+    themes = {(row.granularity, row.bucket_start, row.theme): row.count for row in db.query(TrendTheme)}
+    return buckets, themes
+
+
+class TestArchiveMonth:
+    """Test cases for moving months of feedback into segments"""
+    
+    def test_moves_rows_into_segment(self, history, segment_store):
+        """Test the month leaves the hot tables and its segment and manifest are written"""
+        january = history.query(Feedback).filter(Feedback.created_at < datetime(2024, 2, 1)).count()
+        
+        manifest = archive_month(history, "2024-01")
+        
+        assert manifest["name"] == "feedback-2024-01"
+        assert manifest["feedback_count"] == january
+        assert history.query(Feedback).filter(Feedback.created_at < datetime(2024, 2, 1)).count() == 0
+        segment = history.query(ArchiveSegment).one()
+        assert segment.checksum == manifest["checksum"]
+        assert segment.created_from >= datetime(2024, 1, 1) and segment.created_to < datetime(2024, 2, 1)
+        
+        archive_dir = segment_store.archive_dir
+        with open(os.path.join(archive_dir, "feedback-2024-01.json")) as source:
+            assert json.load(source)["aggregates"] == manifest["aggregates"]
+        with gzip.open(os.path.join(archive_dir, manifest["file_name"])) as source:
+            assert source.read(16) == b"SQLite format 3\x00"
+    
+    def test_segment_has_no_search_index(self, history, segment_store, tmp_path):
+        """Test only the feedback, insight and theme index tables are stored"""
+        manifest = archive_month(history, "2024-01")
+        database_path = str(tmp_path / "segment.sqlite")
+        with gzip.open(os.path.join(segment_store.archive_dir, manifest["file_name"])) as source, \
+                open(database_path, "wb") as target:
+            target.write(source.read())
+        
+        connection = sqlite3.connect(database_path)
+        try:
+            tables = {name for (name,) in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")}
+        finally:
+            connection.close()
+        assert tables == {"feedback", "insights", "insight_themes"}
+    
+    def test_waiting_analysis_blocks_month(self, history, segment_store):
+        """Test a month with queued jobs is left hot and the archiver moves on"""
+        feedback_id = history.query(Feedback.id).filter(Feedback.created_at < datetime(2024, 2, 1)).first()[0]
+        history.add(InsightJob(feedback_id=feedback_id, state=PENDING))
+        history.commit()
+        
+        with pytest.raises(ArchiveError):
+            archive_month(history, "2024-01")
+        
+        assert archivable_months(history, now=datetime(2024, 4, 15), after_days=30) == ["2024-01", "2024-02"]
+        manifests = run_archiver(history, now=datetime(2024, 4, 15), after_days=30)
+        assert [manifest["month"] for manifest in manifests] == ["2024-02"]
+        assert not os.path.exists(os.path.join(segment_store.archive_dir, "feedback-2024-01.sqlite.gz"))
+    
+    def test_rearchived_month_gets_new_segment(self, history, segment_store):
+        """Test feedback backdated into an archived month goes to a second segment"""
+        archive_month(history, "2024-01")
+        history.add(Feedback(message="Backdated", created_at=datetime(2024, 1, 20)))
+        history.commit()
+        
+        assert archive_month(history, "2024-01")["name"] == "feedback-2024-01-2"
+        assert archive_month(history, "2024-01") is None
+    
+    def test_corrupt_segment_is_rejected(self, history, segment_store, client):
+        """Test a segment that does not match its checksum is not read"""
+        manifest = archive_month(history, "2024-01")
+        with open(os.path.join(segment_store.archive_dir, manifest["file_name"]), "r+b") as target:
+            target.seek(-12, os.SEEK_END)
+            target.write(b"\x00" * 4)
+        
+        response = client.get("/api/feedback", params={"order": "asc"})
+        
+        assert response.status_code == 503
+        assert "does not match its checksum" in response.json()["detail"]
+    
+    def test_segment_outside_archive_dir_is_found(self, history, segment_store, client, tmp_path):
+        """Test a segment written to another directory is read from the path in the registry"""
+        expected = page_through(client, order="asc")
+        archive_month(history, "2024-01", archive_dir=str(tmp_path / "elsewhere"))
+        
+        segment = history.query(ArchiveSegment).one()
+        assert segment.file_name == str(tmp_path / "elsewhere" / "feedback-2024-01.sqlite.gz")
+        assert page_through(client, order="asc") == expected
+    
+    def test_missing_segment_returns_503(self, history, segment_store, client):
+        """Test reads that need a missing segment answer 503 instead of failing with 500"""
+        manifest = archive_month(history, "2024-01")
+        os.remove(os.path.join(segment_store.archive_dir, manifest["file_name"]))
+        
+        response = client.get("/api/feedback", params={"order": "asc"})
+        export = client.get("/api/feedback/export")
+        
+        assert response.status_code == 503
+        assert export.status_code == 503
+        assert "feedback-2024-01" in export.json()["detail"]
+
+
+class TestArchivedIds:
+    """Test cases for ids staying unique across hot rows and segments"""
+    
+    def test_newest_month_ids_are_not_reused(self, history, segment_store, client):
+        """Test feedback submitted after the newest month was archived gets new ids"""
+        manifests = run_archiver(history, now=datetime(2025, 1, 1), after_days=30)
+        assert history.query(Feedback).count() == 0
+        
+        response = client.post("/api/feedback", json={"message": "Checkout works again"})
+        insight = Insight(feedback_id=response.json()["id"], themes=json.dumps([]))
+        history.add(insight)
+        history.commit()
+        
+        assert response.status_code == 201
+        assert response.json()["id"] > max(manifest["max_id"] for manifest in manifests)
+        assert insight.id > max(manifest["max_insight_id"] for manifest in manifests)
+    
+    def test_migration_rebuilds_tables_without_autoincrement(self, tmp_path, segment_store):
+        """Test tables created before AUTOINCREMENT are rebuilt and continue above archived ids"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        tables = (Feedback.__table__, Insight.__table__)
+        try:
+            for table in tables:
+                table.dialect_options["sqlite"]["autoincrement"] = False
+            Base.metadata.create_all(engine)
+        finally:
+            for table in tables:
+                table.dialect_options["sqlite"]["autoincrement"] = True
+        
+        with Session(engine) as db:
+            for day in (1, 2):
+                feedback = Feedback(message=f"Slow checkout on day {day}", created_at=datetime(2024, 1, day))
+                db.add(feedback)
+                db.flush()
+                db.add(Insight(feedback_id=feedback.id, themes=json.dumps(["checkout"])))
+            db.commit()
+            manifest = archive_month(db, "2024-01")
+            
+            assert "0007_autoincrement_ids" in run_migrations(engine)
+            feedback = Feedback(message="Checkout works again")
+            db.add(feedback)
+            db.flush()
+            insight = Insight(feedback_id=feedback.id, themes=json.dumps([]))
+            db.add(insight)
+            db.commit()
+            
+            assert feedback.id > manifest["max_id"]
+            assert insight.id > manifest["max_insight_id"]
+            schema = dict(db.execute(text("SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'trigger')")).all())
+            assert "AUTOINCREMENT" in schema["feedback"] and "AUTOINCREMENT" in schema["insights"]
+            assert "feedback_fts_insert" in schema
+            indexes = {index["name"] for name in ("feedback", "insights") for index in inspect(engine).get_indexes(name)}
+            assert {"ix_feedback_created_at_id", "ix_insights_feedback_id"} <= indexes
+        engine.dispose()
+
+
+class TestArchivedReads:
+    """Test cases for reading across the hot tables and segments"""
+    
+    @pytest.mark.parametrize("params", [
+        {"limit": 4},
+        {"limit": 5, "order": "asc"},
+        {"limit": 3, "sort": "priority_score", "order": "asc"},
+        {"limit": 4, "sort": "sentiment_score"},
+        {"limit": 2, "theme": "speed"},
+        {"limit": 3, "date_from": "2024-01-20T00:00:00", "date_to": "2024-02-20T00:00:00"},
+    ])
+    def test_list_pages_unchanged(self, client, history, segment_store, params):
+        """Test every page of a list query is the same before and after archiving"""
+        before = page_through(client, **params)
+        archive_month(history, "2024-01")
+        archive_month(history, "2024-02")
+        
+        assert page_through(client, **params) == before
+    
+    def test_segments_outside_range_are_skipped(self, client, history, segment_store, monkeypatch):
+        """Test only segments overlapping the requested dates or the next page are read"""
+        archive_month(history, "2024-01")
+        archive_month(history, "2024-02")
+        reads = []
+        execute = segment_store.execute
+        monkeypatch.setattr(segment_store, "execute", lambda segment, query: reads.append(segment.name) or
+                            execute(segment, query))
+        
+        client.get("/api/feedback", params={"date_from": "2024-02-03T00:00:00", "date_to": "2024-02-10T00:00:00"})
+        assert reads == ["feedback-2024-02"]
+        
+        reads.clear()
+        client.get("/api/feedback", params={"limit": 3})
+        assert reads == []
+        
+        reads.clear()
+        client.get("/api/feedback", params={"limit": 3, "order": "asc"})
+        assert reads == ["feedback-2024-01"]
+    
+    def test_segments_outside_score_range_are_skipped(self, client, test_db, segment_store, monkeypatch):
+        """Test score-sorted pages skip segments whose score range cannot reach the page"""
+        for month, scores in ((1, [-0.9, -0.7, -0.5]), (2, [0.5, 0.7, 0.9]), (3, [0.1, 0.2, 0.3])):
+            for day, score in enumerate(scores, start=1):
+                feedback = Feedback(message=f"Feedback {month}-{day}", created_at=datetime(2024, month, day))
+                test_db.add(feedback)
+                test_db.flush()
+                test_db.add(Insight(feedback_id=feedback.id, sentiment_score=score, priority_score=month * 10 + day,
+                                    themes=json.dumps([])))
+        test_db.commit()
+        before = page_through(client, limit=2, sort="sentiment_score")
+        archive_month(test_db, "2024-01")
+        archive_month(test_db, "2024-02")
+        assert test_db.get(ArchiveSegment, "feedback-2024-02").sentiment_max == 0.9
+        reads = []
+        execute = segment_store.execute
+        monkeypatch.setattr(segment_store, "execute", lambda segment, query: reads.append(segment.name) or
+                            execute(segment, query))
+        
+        first = client.get("/api/feedback", params={"limit": 2, "sort": "sentiment_score"})
+        assert reads == ["feedback-2024-02"]
+        assert [item["sentiment_score"] for item in first.json()] == [0.9, 0.7]
+        
+        reads.clear()
+        client.get("/api/feedback", params={"limit": 2, "sort": "priority_score", "order": "asc"})
+        assert reads == ["feedback-2024-01"]
+        
+        reads.clear()
+        client.get("/api/feedback", params={"limit": 2, "sort": "sentiment_score",
+                                            "cursor": first.headers["x-next-cursor"]})
+        assert reads == ["feedback-2024-02"]
+        
+        reads.clear()
+        assert page_through(client, limit=2, sort="sentiment_score") == before
+    
+    def test_score_ranges_backfilled(self, history, segment_store):
+        """Test segments registered without score ranges get them from their files"""
+        archive_month(history, "2024-01")
+        segment = history.query(ArchiveSegment).one()
+        expected = (segment.sentiment_min, segment.sentiment_max, segment.priority_min, segment.priority_max)
+        assert None not in expected
+        history.query(ArchiveSegment).update({"sentiment_min": None, "sentiment_max": None,
+                                              "priority_min": None, "priority_max": None})
+        history.commit()
+        
+        assert backfill_score_ranges(history.connection()) == 1
+        history.commit()
+        
+        history.refresh(segment)
+        assert (segment.sentiment_min, segment.sentiment_max, segment.priority_min, segment.priority_max) == expected
+    
+    @pytest.mark.parametrize("params", [{}, {"order": "desc", "format": "csv"}, {"theme": "design"}])
+    def test_export_unchanged(self, client, history, segment_store, params):
+        """Test exports stream the same rows in the same order after archiving"""
+        before = client.get("/api/feedback/export", params=params).content
+        archive_month(history, "2024-01")
+        archive_month(history, "2024-02")
+        
+        assert client.get("/api/feedback/export", params=params).content == before
+    
+    def test_insights_unchanged(self, client, history, segment_store):
+        """Test analytics and duplicate clusters still cover archived feedback"""
+        before = insights_snapshot(client)
+        assert before["clusters"]
+        archive_month(history, "2024-01")
+        archive_month(history, "2024-02")
+        
+        assert history.execute(largest_clusters_query()).first().message is None
+        assert insights_snapshot(client) == before
+    
+    def test_rebuilds_include_segments(self, client, history, segment_store):
+        """Test rebuilding aggregates and trends after archiving reproduces them"""
+        insights = insights_snapshot(client)
+        trends = rollups(history)
+        total = history.query(Insight).count()
+        archive_month(history, "2024-01")
+        archive_month(history, "2024-02")
+        
+        history.query(SentimentExtreme).delete()
+        history.commit()
+        assert rebuild_aggregates(history) == total
+        assert rebuild_trends(history) == total
+        
+        assert insights_snapshot(client) == insights
+        assert rollups(history) == trends
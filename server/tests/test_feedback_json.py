@@ -0,0 +1,72 @@
+import pytest
+from datetime import datetime
+from typing import List
+from pydantic import TypeAdapter
+from database import Feedback, Insight
+from feedback_json import encode_feedback_rows
+from feedback_query import build_feedback_page_query, row_to_feedback
+from feedback_search import build_feedback_search_query
+from models import FeedbackWithInsights
+
+
+def model_json(rows):
+    """The body FastAPI builds from FeedbackWithInsights models and the response_model"""
+    adapter = TypeAdapter(List[FeedbackWithInsights])
+    return adapter.dump_json(adapter.validate_python([FeedbackWithInsights(**row_to_feedback(row)) for row in rows]))
+
+
+@pytest.fixture
+def feedback_rows(test_db):
+    """Feedback covering unicode, unanalyzed rows, malformed JSON and odd floats"""
+    analyzed = Feedback(message="Checkout crashes — café \U0001f600 \"quoted\"\n",
+                        created_at=datetime(2024, 3, 1, 12, 0, 0, 123456))
+    pending = Feedback(message="Not analyzed yet", created_at=datetime(2024, 3, 2, 8, 30))
+    malformed = Feedback(message="Checkout is fine", created_at=datetime(2024, 3, 3))
+    test_db.add_all([analyzed, pending, malformed])
+    test_db.commit()
+    test_db.add_all([
+        Insight(feedback_id=analyzed.id, sentiment_score=-0.1234567890123, sentiment_label="negative",
+                themes='["checkout", "caf\\u00e9"]', recommendations='["Fix checkout"]',
+                priority_score=8, priority_level="HIGH", processed_at=datetime(2024, 3, 1, 12, 5)),
+        Insight(feedback_id=malformed.id, sentiment_score=1e-07, sentiment_label="neutral",
+                themes="not json", recommendations="", priority_score=0, priority_level="LOW"),
+    ])
+    test_db.commit()
+    return test_db
+
+
+class TestFeedbackJSON:
+    """Test cases for the direct feedback list encoding"""
+    
+    def test_matches_model_serialization(self, feedback_rows):
+        """Test the bytes equal what the response_model path produced"""
+        rows = feedback_rows.execute(build_feedback_page_query(limit=10)).all()
+        
+        assert len(rows) == 3
+        assert encode_feedback_rows(rows) == model_json(rows)
+    
+    def test_search_rank_is_dropped(self, feedback_rows):
+        """Test extra columns after FEEDBACK_COLUMNS do not reach the body"""
+        rows = feedback_rows.execute(build_feedback_search_query("checkout", limit=10)).all()
+        
+        assert len(rows) == 2
+        assert encode_feedback_rows(rows) == model_json(rows)
+        assert b"rank" not in encode_feedback_rows(rows)
+    
+    def test_empty_page(self):
+        """Test an empty page is an empty array"""
+        assert encode_feedback_rows([]) == b"[]"
+
+
+class TestFeedbackListResponse:
+    """Test cases for headers on the directly encoded routes"""
+    
+    def test_headers_kept(self, client, feedback_rows):
+        """Test the ETag and next cursor set before encoding are sent"""
+        response = client.get("/api/feedback", params={"limit": 2})
+        
+        assert response.headers["content-type"] == "application/json"
+        assert response.headers["etag"]
+        assert response.headers["x-next-cursor"]
+        assert int(response.headers["content-length"]) == len(response.content)
+        assert [item["message"] for item in response.json()] == ["Checkout is fine", "Not analyzed yet"]
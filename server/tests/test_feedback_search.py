@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import text
+from database import Feedback
+from feedback_search import InvalidSearchQuery, rebuild_search_index, to_match_query
+
+
+def search_ids(db, match):
+    """Feedback ids matching an FTS5 expression"""
+    return sorted(db.execute(text("SELECT rowid FROM feedback_fts WHERE feedback_fts MATCH :q"), {"q": match}).scalars())
+
+
+class TestFeedbackSearchIndex:
+    """Test cases for the feedback full-text index"""
+    
+    def test_to_match_query(self):
+        """Test words, phrases and prefixes are quoted and operators are not passed through"""
+        assert to_match_query("slow checkout") == '"slow" "checkout"'
+        assert to_match_query('"checkout page" log*') == '"checkout page" "log"*'
+        assert to_match_query("NEAR(a, b)") == '"NEAR" "a" "b"'
+        with pytest.raises(InvalidSearchQuery):
+            to_match_query(' "" !? ')
+    
+    def test_rebuild_restores_dropped_index(self, test_db):
+        """Test the rebuild command recreates the index and triggers for existing rows"""
+        test_db.add_all([Feedback(message="Slow checkout"), Feedback(message="Fast search")])
+        test_db.commit()
+        test_db.execute(text("DROP TABLE feedback_fts"))
+        test_db.commit()
+        
+        assert rebuild_search_index(test_db.connection()) == 2
+        test_db.add(Feedback(message="Checkout fails"))
+        test_db.commit()
+        
+        assert search_ids(test_db, to_match_query("checkout")) == [1, 3]
+    
+    def test_deleted_feedback_leaves_the_index(self, test_db):
+        """Test the delete trigger removes rows from the index"""
+        test_db.add_all([Feedback(message="Broken login"), Feedback(message="Broken logout")])
+        test_db.commit()
+        
+        test_db.delete(test_db.get(Feedback, 1))
+        test_db.commit()
+        
+        assert search_ids(test_db, to_match_query("broken")) == [2]
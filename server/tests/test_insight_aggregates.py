@@ -0,0 +1,100 @@
+import pytest
+import json
+from database import Feedback, Insight, ThemeAggregate, RecommendationAggregate, SentimentExtreme
+from insight_aggregates import rebuild_aggregates, TOP_SENTIMENT_SIZE
+
+
+def add_insight(db, message, sentiment_score, themes, recommendations):
+    """Create a feedback row with an insight"""
+    feedback = Feedback(message=message)
+    db.add(feedback)
+    db.flush()
+    db.add(Insight(
+        feedback_id=feedback.id,
+        sentiment_score=sentiment_score,
+        sentiment_label="positive" if sentiment_score > 0 else "negative",
+        themes=json.dumps(themes),
+        recommendations=json.dumps(recommendations)
+    ))
+    db.commit()
+
+
+def snapshot(db):
+    """Read the aggregate tables in a comparable form"""
+    return (
+        {row.theme: row.count for row in db.query(ThemeAggregate)},
+        {row.recommendation: row.count for row in db.query(RecommendationAggregate)},
+        sorted((row.polarity, row.feedback_id, row.sentiment_score) for row in db.query(SentimentExtreme)),
+    )
+
+
+class TestInsightAggregates:
+    """Test cases for incrementally maintained insight aggregates"""
+    
+    def test_insight_write_updates_counts(self, test_db):
+        """Test theme and recommendation counts are updated on insight write"""
+        add_insight(test_db, "First", 0.5, ["speed", "design"], ["Keep it up"])
+        add_insight(test_db, "Second", -0.5, ["speed"], ["Keep it up", "Fix bugs"])
+        
+        themes, recommendations, _ = snapshot(test_db)
+        assert themes == {"speed": 2, "design": 1}
+        assert recommendations == {"Keep it up": 2, "Fix bugs": 1}
+    
+    def test_top_sentiment_tables_are_bounded(self, test_db):
+        """Test only the top positive and negative feedback are kept"""
+        for i in range(TOP_SENTIMENT_SIZE + 3):
+            add_insight(test_db, f"Positive {i}", 0.1 + i * 0.1, [], [])
+            add_insight(test_db, f"Negative {i}", -0.1 - i * 0.1, [], [])
+        
+        positive = test_db.query(SentimentExtreme).filter_by(polarity="positive").all()
+        negative = test_db.query(SentimentExtreme).filter_by(polarity="negative").all()
+        assert len(positive) == TOP_SENTIMENT_SIZE
+        assert len(negative) == TOP_SENTIMENT_SIZE
+        assert min(row.sentiment_score for row in positive) == pytest.approx(0.4)
+        assert max(row.sentiment_score for row in negative) == pytest.approx(-0.4)
+    
+    def test_neutral_scores_are_not_ranked(self, test_db):
+        """Test zero sentiment is neither positive nor negative"""
+        add_insight(test_db, "Neutral", 0.0, ["plain"], [])
+        
+        assert test_db.query(SentimentExtreme).count() == 0
+    
+    def test_rebuild_matches_incremental_aggregates(self, test_db):
+        """Test rebuilding from scratch reproduces the incremental state"""
+        add_insight(test_db, "One", 0.7, ["speed", "design"], ["Keep it up"])
+        add_insight(test_db, "Two", -0.6, ["bugs"], ["Fix bugs"])
+        add_insight(test_db, "Three", 0.2, ["speed"], ["Keep it up"])
+        incremental = snapshot(test_db)
+        
+        test_db.query(ThemeAggregate).delete()
+        test_db.query(SentimentExtreme).delete()
+        test_db.commit()
+        
+        assert rebuild_aggregates(test_db) == 3
+        assert snapshot(test_db) == incremental
+    
+    def test_repeated_entries_count_once_per_insight(self, test_db):
+        """Test duplicate themes and recommendations in one insight count once, as after a rebuild"""
+        add_insight(test_db, "One", 0.7, ["ui", "ui", "speed"], ["Keep it up", "Keep it up"])
+        incremental = snapshot(test_db)
+        
+        test_db.query(ThemeAggregate).delete()
+        test_db.query(RecommendationAggregate).delete()
+        test_db.commit()
+        rebuild_aggregates(test_db)
+        
+        assert incremental[:2] == ({"ui": 1, "speed": 1}, {"Keep it up": 1})
+        assert snapshot(test_db) == incremental
+    
+    def test_run_migrations_backfills_once(self, test_db):
+        """Test the aggregate migration backfills existing insights only once"""
+        from migrations import run_migrations
+        
+        add_insight(test_db, "Existing", 0.5, ["legacy"], [])
+        test_db.query(ThemeAggregate).delete()
+        test_db.commit()
+        
+        bind = test_db.get_bind()
+        assert "0001_insight_aggregates" in run_migrations(bind)
+        assert run_migrations(bind) == []
+        assert snapshot(test_db)[0] == {"legacy": 1}
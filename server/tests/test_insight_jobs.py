@@ -0,0 +1,170 @@
+import pytest
+import threading
+from datetime import datetime, timedelta
+from database import Feedback, Insight, InsightJob
+from insight_jobs import (
+    enqueue_jobs, claim_jobs, complete_jobs, fail_jobs, process_batch,
+    requeue_missing_insights, queue_depth
+)
+from metrics import INSIGHT_JOB_FAILURES
+from tests.conftest import TestSessionLocal
+
+
+def add_feedback(db, count):
+    """Create feedback rows with queued insight jobs"""
+    feedback = [Feedback(message=f"Feedback message {i}") for i in range(count)]
+    db.add_all(feedback)
+    db.flush()
+    enqueue_jobs(db, [item.id for item in feedback])
+    db.commit()
+    return [item.id for item in feedback]
+
+
+class TestInsightJobQueue:
+    """Test cases for the durable insight job queue"""
+    
+    def test_claim_leases_jobs_in_order(self, test_db):
+        """Test claiming marks jobs running under the worker's lease"""
+        ids = add_feedback(test_db, 3)
+        
+        jobs = claim_jobs(test_db, "worker-a", limit=2)
+        
+        assert [job[1] for job in jobs] == ids[:2]
+        assert jobs[0][2] == "Feedback message 0"
+        rows = test_db.query(InsightJob).filter_by(state="running").all()
+        assert {row.lease_owner for row in rows} == {"worker-a"}
+        assert all(row.attempts == 1 for row in rows)
+    
+    def test_claimed_jobs_are_not_claimed_again(self, test_db):
+        """Test a leased job is not handed to a second worker"""
+        add_feedback(test_db, 2)
+        
+        first = claim_jobs(test_db, "worker-a", limit=1)
+        second = claim_jobs(test_db, "worker-b", limit=5)
+        
+        assert len(first) == 1
+        assert len(second) == 1
+        assert first[0][0] != second[0][0]
+        assert claim_jobs(test_db, "worker-c") == []
+    
+    def test_expired_lease_is_reclaimed(self, test_db):
+        """Test a job whose worker died is claimed again after its lease expires"""
+        add_feedback(test_db, 1)
+        claim_jobs(test_db, "worker-a", lease_seconds=-1)
+        
+        jobs = claim_jobs(test_db, "worker-b")
+        
+        assert len(jobs) == 1
+        assert jobs[0][3] == 2  # Second attempt
+    
+    def test_expired_lease_on_last_attempt_fails_job(self, test_db):
+        """Test a job that keeps outliving its lease is failed instead of reclaimed forever"""
+        add_feedback(test_db, 1)
+        failures = INSIGHT_JOB_FAILURES.value("failed")
+        claim_jobs(test_db, "worker-a", lease_seconds=-1, max_attempts=2)
+        claim_jobs(test_db, "worker-b", lease_seconds=-1, max_attempts=2)
+        
+        assert claim_jobs(test_db, "worker-c", max_attempts=2) == []
+        job = test_db.query(InsightJob).one()
+        assert (job.state, job.attempts, job.lease_owner) == ("failed", 2, None)
+        assert "Lease expired" in job.last_error
+        assert INSIGHT_JOB_FAILURES.value("failed") == failures + 1
+    
+    def test_stale_worker_cannot_complete_reclaimed_job(self, test_db):
+        """Test only the current lease owner stores the insight"""
+        add_feedback(test_db, 1)
+        stale = claim_jobs(test_db, "worker-a", lease_seconds=-1)
+        current = claim_jobs(test_db, "worker-b")
+        analysis = {
+            "sentiment_score": 0.0, "sentiment_label": "neutral", "themes": [],
+            "recommendations": [], "priority_score": 0, "priority_level": "LOW"
+        }
+        
+        assert complete_jobs(test_db, "worker-a", stale, [analysis]) == 0
+        assert complete_jobs(test_db, "worker-b", current, [analysis]) == 1
+        assert test_db.query(Insight).count() == 1
+        assert test_db.query(InsightJob).one().state == "done"
+    
+    def test_failed_job_is_retried_then_marked_failed(self, test_db):
+        """Test failures back off and give up after the maximum attempts"""
+        add_feedback(test_db, 1)
+        
+        jobs = claim_jobs(test_db, "worker-a")
+        fail_jobs(test_db, "worker-a", jobs, "boom", max_attempts=2)
+        job = test_db.query(InsightJob).one()
+        assert job.state == "pending"
+        assert job.last_error == "boom"
+        assert claim_jobs(test_db, "worker-a") == []  # Still backing off
+        
+        job.leased_until = datetime.utcnow() - timedelta(seconds=1)
+        test_db.commit()
+        jobs = claim_jobs(test_db, "worker-a")
+        fail_jobs(test_db, "worker-a", jobs, "boom again", max_attempts=2)
+        
+        test_db.refresh(job)
+        assert job.state == "failed"
+        assert job.attempts == 2
+    
+    def test_process_batch_stores_insights(self, test_db):
+        """Test a worker batch analyzes jobs and stores their insights"""
+        ids = add_feedback(test_db, 3)
+        
+        assert process_batch(TestSessionLocal, "worker-a", limit=10) == 3
+        
+        assert sorted(insight.feedback_id for insight in test_db.query(Insight)) == ids
+        assert {job.state for job in test_db.query(InsightJob)} == {"done"}
+        assert queue_depth(test_db) == 0
+        assert process_batch(TestSessionLocal, "worker-a") == 0
+    
+    def test_process_batch_records_analysis_failure(self, test_db, monkeypatch):
+        """Test an analysis error is recorded on the job instead of being lost"""
+        import analysis_executor
+        
+        class BrokenExecutor:
+            def analyze_batch(self, messages):
+                raise RuntimeError("analysis crashed")
+        
+        monkeypatch.setattr(analysis_executor, "get_analysis_executor", lambda: BrokenExecutor())
+        add_feedback(test_db, 1)
+        
+        process_batch(TestSessionLocal, "worker-a")
+        
+        job = test_db.query(InsightJob).one()
+        assert job.state == "pending"
+        assert "analysis crashed" in job.last_error
+        assert test_db.query(Insight).count() == 0
+    
+    def test_concurrent_workers_do_not_double_process(self, test_db):
+        """Test several workers draining the queue store each insight once"""
+        ids = add_feedback(test_db, 40)
+        errors = []
+        
+        def drain(worker_id):
+            try:
+                while process_batch(TestSessionLocal, worker_id, limit=3):
+                    pass
+            except Exception as e:
+                errors.append(e)
+        
+        workers = [threading.Thread(target=drain, args=(f"worker-{i}",)) for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        
+        assert errors == []
+        assert sorted(insight.feedback_id for insight in test_db.query(Insight)) == ids
+    
+    def test_requeue_missing_insights(self, test_db):
+        """Test the startup sweep queues feedback that has no insight and no job"""
+        orphan = Feedback(message="Lost in a restart")
+        analyzed = Feedback(message="Already analyzed")
+        test_db.add_all([orphan, analyzed])
+        test_db.flush()
+        test_db.add(Insight(feedback_id=analyzed.id, sentiment_score=0.0))
+        test_db.commit()
+        queued = add_feedback(test_db, 1)
+        
+        assert requeue_missing_insights(test_db) == 1
+        assert requeue_missing_insights(test_db) == 0
+        assert sorted(job.feedback_id for job in test_db.query(InsightJob)) == sorted([orphan.id] + queued)
@@ -1,5 +1,7 @@
 import pytest
-from feedback_pipeline import analyze_feedback
+import feedback_pipeline
+from feedback_pipeline import analyze_feedback, analyze_feedback_batch
+from model_registry import ModelRegistry
 
 
 class TestInsightProcessingPipeline:
@@ -136,3 +138,60 @@ class TestInsightProcessingPipeline:
             result = analyze_feedback(text)
             # Sentiment score should be between -1 and 1
             assert -1 <= result["sentiment_score"] <= 1
+
+
+class TestBatchInsightProcessingPipeline:
+    """Test cases for the batched insight processing pipeline"""
+    
+    def test_batch_empty_input(self):
+        """Test batch analysis of an empty list"""
+        assert analyze_feedback_batch([]) == []
+    
+    def test_batch_preserves_order_and_length(self):
+        """Test batch analysis returns one result per message in input order"""
+        texts = [
+            "This is amazing! I love it so much. Great work!",
+            "This is terrible. I hate it. Very disappointing and frustrating.",
+            "This is a product. It has features.",
+        ]
+        results = analyze_feedback_batch(texts)
+        
+        assert len(results) == len(texts)
+        assert results[0]["sentiment_score"] > results[1]["sentiment_score"]
+    
+    def test_batch_matches_single_message_analysis(self):
+        """Test batch analysis produces the same result as analyze_feedback"""
+        texts = [
+            "The checkout page is broken and payment fails every time",
+            "The user interface is intuitive and the performance is fast",
+            "",
+            "Great app!!! 😊 #awesome @developer",
+        ]
+        batch_results = analyze_feedback_batch(texts)
+        
+        for text, batch_result in zip(texts, batch_results):
+            single_result = analyze_feedback(text)
+            batch_result.pop("processed_at")
+            single_result.pop("processed_at")
+            assert batch_result == single_result
+    
+    def test_batch_tags_in_one_call(self, monkeypatch):
+        """Test the batch path hands every message's tokens to the tagger in a single tag_sents call"""
+        class NounTagger:
+            def tag(self, tokens):
+                return [(token, "NN") for token in tokens]
+        
+        registry = ModelRegistry()
+        registry._stop_words = frozenset({"the", "and"})
+        registry._tokenize = str.split
+        registry._tagger = NounTagger()
+        monkeypatch.setattr(registry, "polarity", lambda text: 0.0)
+        calls = []
+        tag_sents = registry.tag_sents
+        monkeypatch.setattr(registry, "tag_sents", lambda token_lists: calls.append(token_lists) or tag_sents(token_lists))
+        monkeypatch.setattr(feedback_pipeline, "get_model_registry", lambda: registry)
+        
+        results = analyze_feedback_batch(["The checkout and the search", "", "Slow export"])
+        
+        assert calls == [[["checkout", "search"], [], ["slow", "export"]]]
+        assert [result["themes"] for result in results] == [["checkout", "search"], [], ["slow", "export"]]
@@ -0,0 +1,183 @@
+import pytest
+import json
+import statistics
+from datetime import datetime, timedelta
+import numpy as np
+import feedback_archive
+from database import Feedback, Insight
+from feedback_archive import SegmentStore, archive_month
+from insight_snapshot import InsightSnapshot, insight_distribution, read_snapshot_file, write_snapshot_file
+
+
+def add_insights(db, scores, start=datetime(2024, 1, 1), labels=None):
+    """Feedback an hour apart with insights of the given (sentiment, priority) scores"""
+    for index, (sentiment_score, priority_score) in enumerate(scores):
+        timestamp = start + timedelta(hours=index)
+        feedback = Feedback(message=f"Feedback {index}", timestamp=timestamp, created_at=timestamp)
+        db.add(feedback)
+        db.flush()
+        label = labels[index] if labels else (
+            None if sentiment_score is None else
+            "positive" if sentiment_score > 0 else "negative" if sentiment_score < 0 else "neutral"
+        )
+        db.add(Insight(feedback_id=feedback.id, sentiment_score=sentiment_score, sentiment_label=label,
+                       themes=json.dumps([]), priority_score=priority_score))
+    db.commit()
+
+
+def distribution(snapshot, db, **kwargs):
+    return insight_distribution(snapshot.refresh(db.connection()), **kwargs)
+
+
+SCORES = [(-0.9, 55), (-0.4, 25), (0.0, 0), (0.3, 5), (0.8, 12), (None, None), (-0.05, 15), (0.55, 0)]
+
+
+class TestInsightSnapshot:
+    """Test cases for the columnar insight snapshot"""
+    
+    def test_distribution_matches_rows(self, test_db):
+        """Test the vectorized statistics equal ones computed from the rows"""
+        add_insights(test_db, SCORES)
+        
+        data = distribution(InsightSnapshot(), test_db, bins=4)
+        
+        sentiment = [score for score, _ in SCORES if score is not None]
+        assert data["count"] == len(SCORES)
+        assert data["sentiment"]["count"] == len(sentiment)
+        assert data["sentiment"]["mean"] == pytest.approx(statistics.mean(sentiment))
+        assert data["sentiment"]["p50"] == pytest.approx(statistics.median(sentiment))
+        assert data["sentiment"]["p5"] == pytest.approx(float(np.percentile(sentiment, 5)))
+        assert [(b["start"], b["end"], b["count"]) for b in data["sentiment"]["histogram"]] == [
+            (-1.0, -0.5, 1), (-0.5, 0.0, 2), (0.0, 0.5, 2), (0.5, 1.0, 2),
+        ]
+        assert data["priority"]["count"] == 7
+        assert [b["count"] for b in data["priority"]["histogram"]] == [3, 2, 1, 0, 0, 1]
+        
+        labels = {entry["label"]: entry for entry in data["labels"]}
+        assert [entry["label"] for entry in data["labels"]] == ["positive", "negative", "neutral"]
+        assert labels["negative"]["count"] == 3
+        assert labels["negative"]["priority"]["p50"] == 25
+        assert labels["positive"]["priority"]["mean"] == pytest.approx(17 / 3)
+        assert [b["count"] for b in labels["neutral"]["priority"]["histogram"]] == [1, 0, 0, 0, 0, 0]
+    
+    def test_range_filters_by_feedback_timestamp(self, test_db):
+        """Test from/to keep the insights whose feedback timestamp is within the range"""
+        add_insights(test_db, SCORES)
+        
+        data = distribution(InsightSnapshot(), test_db, start=datetime(2024, 1, 1, 1), end=datetime(2024, 1, 1, 3))
+        
+        assert data["count"] == 3
+        assert data["sentiment"]["mean"] == pytest.approx(-0.1 / 3)
+    
+    def test_empty(self, test_db):
+        """Test an empty table reports zero counts and no percentiles"""
+        data = distribution(InsightSnapshot(), test_db)
+        
+        assert data["count"] == 0
+        assert data["sentiment"]["p95"] is None
+        assert sum(b["count"] for b in data["sentiment"]["histogram"]) == 0
+    
+    def test_incremental_refresh(self, test_db):
+        """Test new insights are appended to the tail and merged into the base"""
+        snapshot = InsightSnapshot(tail_rows=3)
+        add_insights(test_db, SCORES[:4])
+        base = snapshot.refresh(test_db.connection())[0]
+        test_db.commit()
+        
+        add_insights(test_db, SCORES[4:6], start=datetime(2024, 2, 1))
+        parts = snapshot.refresh(test_db.connection())
+        test_db.commit()
+        assert parts[0] is base
+        assert [len(part.label) for part in parts] == [4, 2]
+        
+        add_insights(test_db, SCORES[6:], start=datetime(2024, 3, 1))
+        parts = snapshot.refresh(test_db.connection())
+        assert [len(part.label) for part in parts] == [8, 0]
+        assert insight_distribution(parts) == distribution(InsightSnapshot(), test_db)
+    
+    def test_unchanged_version_skips_queries(self, test_db):
+        """Test a refresh with the same data version reads nothing but the version"""
+        snapshot = InsightSnapshot()
+        add_insights(test_db, SCORES)
+        parts = snapshot.refresh(test_db.connection())
+        
+        statements = []
+        connection = test_db.connection()
+        execute = connection.execute
+        connection.execute = lambda statement, *args, **kwargs: statements.append(statement) or execute(
+            statement, *args, **kwargs)
+        try:
+            assert snapshot.refresh(connection) == parts
+        finally:
+            del connection.execute
+        assert len(statements) == 1
+    
+    def test_shared_file(self, test_db, tmp_path):
+        """Test a second process maps the base another one wrote"""
+        path = str(tmp_path / "insights.snapshot")
+        add_insights(test_db, SCORES)
+        writer = InsightSnapshot(path)
+        expected = distribution(writer, test_db)
+        test_db.commit()
+        
+        reader = InsightSnapshot(path)
+        parts = reader.refresh(test_db.connection())
+        
+        header, columns = read_snapshot_file(path)
+        assert header["count"] == len(SCORES)
+        assert isinstance(parts[0].sentiment_score, np.memmap)
+        assert insight_distribution(parts) == expected
+        np.testing.assert_array_equal(columns.timestamp, parts[0].timestamp)
+    
+    def test_other_database_file_is_replaced(self, test_db, tmp_path):
+        """Test a snapshot file written for another database is rebuilt, not used"""
+        path = str(tmp_path / "insights.snapshot")
+        add_insights(test_db, SCORES)
+        other = InsightSnapshot()
+        write_snapshot_file(path, other.refresh(test_db.connection())[0], "another-epoch", 100)
+        test_db.commit()
+        add_insights(test_db, SCORES[:2], start=datetime(2024, 2, 1))
+        
+        assert distribution(InsightSnapshot(path), test_db)["count"] == len(SCORES) + 2
+        header, _ = read_snapshot_file(path)
+        assert header["epoch"] != "another-epoch"
+        assert header["count"] == len(SCORES) + 2
+    
+    def test_archived_insights_included(self, test_db, tmp_path, monkeypatch):
+        """Test a rebuilt snapshot still counts insights moved to archive segments"""
+        store = SegmentStore(archive_dir=str(tmp_path / "archive"))
+        monkeypatch.setattr(feedback_archive, "store", store)
+        add_insights(test_db, SCORES[:4])
+        add_insights(test_db, SCORES[4:], start=datetime(2024, 2, 1))
+        expected = distribution(InsightSnapshot(), test_db)
+        test_db.commit()
+        
+        try:
+            archive_month(test_db, "2024-01", store.archive_dir)
+            assert distribution(InsightSnapshot(), test_db) == expected
+        finally:
+            store.close()
+
+
+class TestInsightDistributionAPI:
+    """Test cases for the insight distribution endpoint"""
+    
+    def test_distribution(self, client, test_db):
+        """Test GET /api/insights/distribution reports the current insights"""
+        add_insights(test_db, SCORES[:4])
+        assert client.get("/api/insights/distribution").json()["count"] == 4
+        
+        add_insights(test_db, SCORES[4:], start=datetime(2024, 2, 1))
+        response = client.get("/api/insights/distribution", params={"bins": 2, "from": "2024-02-01T00:00:00Z"})
+        
+        assert response.status_code == 200
+        assert response.headers["etag"]
+        data = response.json()
+        assert data["count"] == 4
+        assert [b["count"] for b in data["sentiment"]["histogram"]] == [1, 2]
+    
+    def test_distribution_validation(self, client):
+        """Test bin counts and ranges are validated"""
+        assert client.get("/api/insights/distribution", params={"bins": 0}).status_code == 422
+        response = client.get("/api/insights/distribution", params={"from": "2024-02-01", "to": "2024-01-01"})
+        assert response.status_code == 400
@@ -0,0 +1,96 @@
+import pytest
+import json
+from datetime import datetime
+from database import Feedback, Insight, TrendBucket, TrendTheme
+from insight_trends import bucket_start, rebuild_trends
+
+
+def add_insight(db, timestamp, sentiment_score, themes, priority_level="LOW"):
+    """Create a feedback row submitted at timestamp with an insight"""
+    feedback = Feedback(message=f"Feedback at {timestamp}", timestamp=timestamp)
+    db.add(feedback)
+    db.flush()
+    db.add(Insight(
+        feedback_id=feedback.id,
+        sentiment_score=sentiment_score,
+        sentiment_label="positive" if sentiment_score > 0 else "negative" if sentiment_score < 0 else "neutral",
+        themes=json.dumps(themes),
+        recommendations=json.dumps([]),
+        priority_level=priority_level
+    ))
+    db.commit()
+
+
+def snapshot(db):
+    """Read the rollup tables in a comparable form"""
+    buckets = {
+        (row.granularity, row.bucket_start): (
+            row.count, round(row.sentiment_total, 6), row.sentiment_count,
+            row.positive_count, row.negative_count, row.neutral_count,
+            row.high_count, row.medium_count, row.low_count,
+        )
+        for row in db.query(TrendBucket)
+    }
+    themes = {(row.granularity, row.bucket_start, row.theme): row.count for row in db.query(TrendTheme)}
+    return buckets, themes
+
+
+class TestInsightTrends:
+    """Test cases for the hourly and daily trend rollups"""
+    
+    def test_bucket_start(self):
+        """Test timestamps are truncated to the start of their hour or day"""
+        timestamp = datetime(2024, 3, 5, 14, 37, 12, 500)
+        assert bucket_start(timestamp, "hour") == datetime(2024, 3, 5, 14)
+        assert bucket_start(timestamp, "day") == datetime(2024, 3, 5)
+    
+    def test_insight_write_updates_hour_and_day_buckets(self, test_db):
+        """Test each insight is counted in its hour and day bucket"""
+        add_insight(test_db, datetime(2024, 3, 5, 14, 10), 0.6, ["speed", "speed", "design"], "HIGH")
+        add_insight(test_db, datetime(2024, 3, 5, 14, 50), -0.2, ["speed"])
+        add_insight(test_db, datetime(2024, 3, 5, 16, 0), 0.0, [])
+        
+        buckets, themes = snapshot(test_db)
+        assert buckets[("hour", datetime(2024, 3, 5, 14))] == (2, 0.4, 2, 1, 1, 0, 1, 0, 1)
+        assert buckets[("hour", datetime(2024, 3, 5, 16))][0] == 1
+        assert buckets[("day", datetime(2024, 3, 5))] == (3, 0.4, 3, 1, 1, 1, 1, 0, 2)
+        assert themes[("day", datetime(2024, 3, 5), "speed")] == 2
+        assert themes[("hour", datetime(2024, 3, 5, 14), "design")] == 1
+    
+    def test_rebuild_matches_incremental_rollups(self, test_db):
+        """Test rebuilding from scratch reproduces the incremental state"""
+        add_insight(test_db, datetime(2024, 3, 5, 14, 10), 0.6, ["speed", "design"], "HIGH")
+        add_insight(test_db, datetime(2024, 3, 6, 9, 30), -0.5, ["bugs"], "MEDIUM")
+        add_insight(test_db, datetime(2024, 3, 6, 9, 45), 0.25, ["speed"])
+        incremental = snapshot(test_db)
+        
+        test_db.query(TrendBucket).delete()
+        test_db.query(TrendTheme).delete()
+        test_db.commit()
+        
+        assert rebuild_trends(test_db) == 3
+        assert snapshot(test_db) == incremental
+    
+    def test_rebuild_range_only_touches_whole_days_in_range(self, test_db):
+        """Test a range rebuild recomputes the days it covers and keeps the others"""
+        add_insight(test_db, datetime(2024, 3, 5, 14, 10), 0.6, ["speed"])
+        add_insight(test_db, datetime(2024, 3, 6, 9, 30), -0.5, ["bugs"])
+        test_db.query(Insight).filter(Insight.sentiment_score < 0).delete()
+        test_db.commit()
+        
+        assert rebuild_trends(test_db, datetime(2024, 3, 6, 12), datetime(2024, 3, 6, 13)) == 0
+        
+        buckets, themes = snapshot(test_db)
+        assert set(buckets) == {("hour", datetime(2024, 3, 5, 14)), ("day", datetime(2024, 3, 5))}
+        assert all(theme == "speed" for _, _, theme in themes)
+    
+    def test_run_migrations_builds_trends(self, test_db):
+        """Test the trends migration fills the rollups for existing insights"""
+        from migrations import run_migrations
+        
+        add_insight(test_db, datetime(2024, 3, 5, 14, 10), 0.6, ["legacy"])
+        test_db.query(TrendBucket).delete()
+        test_db.commit()
+        
+        assert "0003_insight_trends" in run_migrations(test_db.get_bind())
+        assert snapshot(test_db)[0][("day", datetime(2024, 3, 5))][0] == 1
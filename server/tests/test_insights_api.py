@@ -1,5 +1,6 @@
 import pytest
 import json
+from datetime import datetime
 from database import Feedback, Insight
 
 
@@ -196,3 +197,59 @@ class TestInsightsAPI:
         data = response.json()
         assert isinstance(data["themes"], list)
         assert isinstance(data["recommendations"], list)
+
+
+class TestInsightTrendsAPI:
+    """Test cases for the insight trends endpoint"""
+    
+    def add_insight(self, db, timestamp, sentiment_score, themes):
+        feedback = Feedback(message="Trend feedback", timestamp=timestamp)
+        db.add(feedback)
+        db.flush()
+        db.add(Insight(
+            feedback_id=feedback.id,
+            sentiment_score=sentiment_score,
+            sentiment_label="positive" if sentiment_score > 0 else "negative",
+            themes=json.dumps(themes),
+            recommendations=json.dumps([]),
+            priority_level="HIGH" if sentiment_score < 0 else "LOW"
+        ))
+        db.commit()
+    
+    def test_daily_trends(self, client, test_db):
+        """Test GET /api/insights/trends returns daily buckets in time order"""
+        self.add_insight(test_db, datetime(2024, 1, 2, 10), -0.5, ["bugs", "speed"])
+        self.add_insight(test_db, datetime(2024, 1, 1, 9), 0.4, ["speed"])
+        self.add_insight(test_db, datetime(2024, 1, 1, 18), 0.2, ["design"])
+        
+        response = client.get("/api/insights/trends", params={"themes": 1})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["bucket"] == "day"
+        first, second = data["buckets"]
+        assert first["bucket_start"] == "2024-01-01T00:00:00"
+        assert first["count"] == 2
+        assert first["average_sentiment"] == pytest.approx(0.3)
+        assert first["sentiment_labels"] == {"positive": 2, "negative": 0, "neutral": 0}
+        assert first["top_themes"] == [{"theme": "design", "count": 1}]
+        assert second["priority_levels"] == {"HIGH": 1, "MEDIUM": 0, "LOW": 0}
+    
+    def test_hourly_trends_in_range(self, client, test_db):
+        """Test from/to select the hour buckets overlapping the range"""
+        for hour in range(6):
+            self.add_insight(test_db, datetime(2024, 1, 1, hour, 30), 0.5, ["speed"])
+        
+        response = client.get("/api/insights/trends", params={
+            "bucket": "hour", "from": "2024-01-01T02:15:00", "to": "2024-01-01T04:00:00Z"
+        })
+        
+        assert response.status_code == 200
+        starts = [bucket["bucket_start"] for bucket in response.json()["buckets"]]
+        assert starts == ["2024-01-01T02:00:00", "2024-01-01T03:00:00", "2024-01-01T04:00:00"]
+    
+    def test_trends_validation(self, client):
+        """Test unknown bucket sizes and inverted ranges are rejected"""
+        assert client.get("/api/insights/trends", params={"bucket": "week"}).status_code == 422
+        response = client.get("/api/insights/trends", params={"from": "2024-02-01", "to": "2024-01-01"})
+        assert response.status_code == 400
@@ -0,0 +1,128 @@
+import pytest
+import json
+import random
+from feedback_pipeline import calculate_priority_score, generate_recommendations
+from keyword_rules import KeywordMatcher, KeywordRules, ahocorasick
+
+BACKENDS = ["regex"] + (["aho-corasick"] if ahocorasick is not None else [])
+
+LEGACY_PRIORITY_KEYWORDS = [
+    (25, ["payment", "checkout", "purchase", "billing", "invoice", "transaction"]),
+    (20, ["can't", "cannot", "unable", "fails", "failed", "broken", "error", "not working"]),
+    (10, ["hard", "confusing", "too many", "difficult", "pain", "painful", "slow",
+          "bad", "user experience", "terrible", "sucks", "not good"]),
+    (5, ["first time", "new user", "getting started"]),
+]
+
+
+def legacy_keyword_points(message):
+    """Keyword part of the priority score as originally implemented"""
+    message_lower = message.lower()
+    return sum(
+        points for points, keywords in LEGACY_PRIORITY_KEYWORDS
+        if any(keyword in message_lower for keyword in keywords)
+    )
+
+
+class TestKeywordMatcher:
+    """Test cases for the single-pass keyword matcher"""
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_reports_every_matching_group(self, backend):
+        """Test all groups with a keyword in the text are reported"""
+        matcher = KeywordMatcher({"a": ["checkout"], "b": ["broken"], "c": ["unused"]}, backend=backend)
+        
+        assert matcher.matching_groups("Checkout is BROKEN") == {"a", "b"}
+        assert matcher.matching_groups("all good") == set()
+        assert matcher.matching_groups("") == set()
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_substring_and_overlapping_keywords(self, backend):
+        """Test keywords match inside words, as prefixes of other keywords and overlapping"""
+        matcher = KeywordMatcher({
+            "short": ["pain"],
+            "long": ["painful"],
+            "inner": ["ain"],
+            "suffix": ["fully"],
+        }, backend=backend)
+        
+        assert matcher.matching_groups("painfully") == {"short", "long", "inner", "suffix"}
+        assert matcher.matching_groups("Spain") == {"short", "inner"}
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_keyword_shared_by_groups(self, backend):
+        """Test a keyword listed in several groups hits all of them"""
+        matcher = KeywordMatcher({"a": ["slow"], "b": ["slow", "lag"]}, backend=backend)
+        
+        assert matcher.matching_groups("so slow") == {"a", "b"}
+    
+    def test_unknown_backend(self):
+        """Test an unknown backend is rejected"""
+        with pytest.raises(ValueError):
+            KeywordMatcher({"a": ["x"]}, backend="grep")
+
+
+class TestKeywordRules:
+    """Test cases for the keyword rule table and its config file"""
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_matches_legacy_priority_rules(self, backend):
+        """Test the compiled rules score exactly like the original keyword scans"""
+        rules = KeywordRules.load()
+        rules.matcher = KeywordMatcher({rule.name: rule.keywords for rule in rules.priority_rules}, backend=backend)
+        
+        vocabulary = [keyword for _, keywords in LEGACY_PRIORITY_KEYWORDS for keyword in keywords]
+        vocabulary += ["the", "app", "is", "nice", "PAY", "ment", "not", "good", "user", "first", "time"]
+        rng = random.Random(3)
+        for _ in range(500):
+            message = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 12)))
+            message = message.replace(" ", rng.choice([" ", ""]), rng.randint(0, 2))
+            assert rules.priority_points(message) == legacy_keyword_points(message), message
+    
+    def test_priority_score_unchanged(self):
+        """Test calculate_priority_score keeps its documented scoring"""
+        assert calculate_priority_score("Checkout is broken and slow, my first time here", -0.7) == 100
+        assert calculate_priority_score("Nice update", 0.5) == 0
+        assert calculate_priority_score("The PAYMENT page", 0.0) == 25
+    
+    def test_theme_recommendations_unchanged(self):
+        """Test theme rules fire on exact theme matches in rule order"""
+        recommendations = generate_recommendations("short", 0.0, ["tool", "bug"])
+        
+        assert recommendations == [
+            "Follow up with user to gather more specific feedback",
+            "Prioritize technical improvements and bug fixes",
+            "Consider feature enhancement or new feature development",
+        ]
+        assert generate_recommendations("short", 0.0, ["bugs"]) == [
+            "Follow up with user to gather more specific feedback",
+        ]
+    
+    def test_load_custom_rules_file(self, tmp_path):
+        """Test rules are loaded from a config file and fingerprinted by content"""
+        config = {
+            "priority_rules": [{"name": "refund", "points": 30, "keywords": ["refund"]}],
+            "theme_recommendation_rules": [
+                {"name": "docs", "recommendation": "Improve documentation", "themes": ["docs"]}
+            ],
+        }
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps(config))
+        
+        rules = KeywordRules.load(str(path))
+        
+        assert rules.priority_points("I want a REFUND") == 30
+        assert rules.priority_points("payment failed") == 0
+        assert rules.theme_recommendations(["docs", "speed"]) == ["Improve documentation"]
+        assert rules.fingerprint != KeywordRules.load().fingerprint
+        assert rules.fingerprint == KeywordRules.from_dict(config).fingerprint
+    
+    def test_invalid_rules_file(self):
+        """Test malformed rules are rejected with a ValueError"""
+        with pytest.raises(ValueError):
+            KeywordRules.from_dict({"priority_rules": [{"name": "x", "keywords": ["a"]}]})
+        with pytest.raises(ValueError):
+            KeywordRules.from_dict({"priority_rules": [
+                {"name": "x", "points": 1, "keywords": ["a"]},
+                {"name": "x", "points": 2, "keywords": ["b"]},
+            ]})
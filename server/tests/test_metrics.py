@@ -0,0 +1,111 @@
+import pytest
+from datetime import datetime, timedelta
+from analysis_executor import AnalysisExecutor
+from database import Feedback
+from insight_jobs import complete_jobs, claim_jobs, enqueue_jobs
+from metrics import (
+    Counter, Histogram, Registry, PIPELINE_STAGE_SECONDS, INSIGHT_PROCESSING_LAG_SECONDS
+)
+
+
+class TestMetricTypes:
+    """Test cases for the Prometheus metric primitives"""
+    
+    def test_histogram_renders_cumulative_buckets(self):
+        """Test buckets are cumulative and end with +Inf, sum and count"""
+        histogram = Histogram("stage_seconds", "Stage latency", ["stage"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, "tag")
+        histogram.observe(0.5, "tag")
+        histogram.observe(3, "tag")
+        
+        assert histogram.render() == [
+            'stage_seconds_bucket{stage="tag",le="0.1"} 1',
+            'stage_seconds_bucket{stage="tag",le="1"} 2',
+            'stage_seconds_bucket{stage="tag",le="+Inf"} 3',
+            'stage_seconds_sum{stage="tag"} 3.55',
+            'stage_seconds_count{stage="tag"} 3',
+        ]
+    
+    def test_registry_renders_help_and_type(self):
+        """Test the exposition format headers and label escaping"""
+        registry = Registry()
+        counter = registry.register(Counter("failures_total", "Failures", ["reason"]))
+        counter.inc('bad "quote"')
+        
+        text = registry.render()
+        
+        assert "# HELP failures_total Failures\n# TYPE failures_total counter\n" in text
+        assert 'failures_total{reason="bad \\"quote\\""} 1' in text
+        with pytest.raises(ValueError):
+            registry.register(Counter("failures_total", "Again"))
+    
+    def test_drain_and_merge(self):
+        """Test samples drained in one process can be merged into another"""
+        worker = Histogram("h", "h", ["stage"], buckets=(1.0,))
+        parent = Histogram("h", "h", ["stage"], buckets=(1.0,))
+        parent.observe(0.5, "a")
+        worker.observe(2.0, "a")
+        worker.observe(0.1, "b")
+        
+        parent.merge(worker.drain())
+        
+        assert parent.count("a") == 2
+        assert parent.count("b") == 1
+        assert worker.count("a") == 0
+    
+    def test_process_pool_samples_reach_parent(self):
+        """Test stage timings recorded in worker processes are merged back"""
+        before = PIPELINE_STAGE_SECONDS.count("analyze_sentiment")
+        executor = AnalysisExecutor(mode="process", pool_size=1)
+        try:
+            executor.analyze_batch(["Checkout is broken"])
+        finally:
+            executor.shutdown()
+        
+        assert PIPELINE_STAGE_SECONDS.count("analyze_sentiment") > before
+
+
+class TestMetricsEndpoint:
+    """Test cases for GET /metrics"""
+    
+    def test_metrics_exposition(self, client):
+        """Test route latency, stage latency, backlog and failure series are exported"""
+        client.post("/api/feedback", json={"message": "Checkout is broken"})
+        
+        response = client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = response.text
+        assert 'http_request_duration_seconds_count{method="POST",route="/api/feedback",status="201"}' in text
+        assert 'insight_jobs{state="pending"} 1' in text
+        assert "insight_backlog_oldest_seconds " in text
+        assert "# TYPE feedback_pipeline_stage_seconds histogram" in text
+        assert "# TYPE feedback_analysis_failures_total counter" in text
+    
+    def test_route_label_uses_template(self, client):
+        """Test unmatched paths share one label instead of one per URL"""
+        client.get("/no/such/path/123")
+        
+        text = client.get("/metrics").text
+        
+        assert 'route="unmatched",status="404"' in text
+        assert "/no/such/path/123" not in text
+    
+    def test_processing_lag_recorded(self, test_db):
+        """Test storing an insight records created_at to processed_at lag"""
+        feedback = Feedback(message="Slow dashboard", created_at=datetime.utcnow() - timedelta(seconds=30))
+        test_db.add(feedback)
+        test_db.flush()
+        enqueue_jobs(test_db, [feedback.id])
+        test_db.commit()
+        before = INSIGHT_PROCESSING_LAG_SECONDS.count()
+        
+        jobs = claim_jobs(test_db, "worker-a")
+        complete_jobs(test_db, "worker-a", jobs, [{
+            "sentiment_score": -0.5, "sentiment_label": "negative", "themes": ["dashboard"],
+            "recommendations": [], "priority_score": 35, "priority_level": "MEDIUM",
+        }])
+        
+        assert INSIGHT_PROCESSING_LAG_SECONDS.count() == before + 1
+        assert INSIGHT_PROCESSING_LAG_SECONDS._series[()][1] >= 30
@@ -0,0 +1,127 @@
+import pytest
+import subprocess
+import sys
+import analysis_executor
+from analysis_executor import AnalysisExecutor
+from model_registry import ModelRegistry, FAILED, READY
+
+
+class FakeTagger:
+    """Tagger stand-in that counts calls"""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def tag(self, tokens):
+        self.calls += 1
+        return [(token, "NN") for token in tokens]
+
+
+class TestModelRegistry:
+    """Test cases for the NLP model registry"""
+    
+    def test_app_import_does_not_load_nlp_libraries(self):
+        """Test importing the API defers the NLTK and TextBlob imports"""
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys, app; print('nltk' in sys.modules, 'textblob' in sys.modules)"],
+            capture_output=True, text=True, check=True
+        )
+        
+        assert result.stdout.strip().splitlines()[-1] == "False False"
+    
+    def test_tagger_is_reused(self):
+        """Test every tagging call goes through the same tagger instance"""
+        registry = ModelRegistry()
+        tagger = FakeTagger()
+        registry._tagger = tagger
+        
+        assert registry.tag(["slow", "checkout"]) == [("slow", "NN"), ("checkout", "NN")]
+        assert registry.tag_sents([["a"], [], ["b"]]) == [[("a", "NN")], [], [("b", "NN")]]
+        assert tagger.calls == 3
+    
+    def test_load_failure_is_reported(self, monkeypatch):
+        """Test a failing resource leaves the registry in the failed state"""
+        registry = ModelRegistry()
+        registry._stop_words = frozenset()
+        registry._tokenize = str.split
+        registry._tagger = FakeTagger()
+        
+        def missing_lexicon(text):
+            raise LookupError("missing lexicon")
+        
+        monkeypatch.setattr(registry, "polarity", missing_lexicon)
+        
+        with pytest.raises(LookupError):
+            registry.load()
+        
+        assert registry.status()["state"] == FAILED
+        assert "missing lexicon" in registry.status()["error"]
+    
+    def test_load_success(self):
+        """Test loading records the ready state and load time"""
+        registry = ModelRegistry()
+        registry._stop_words = frozenset()
+        registry._tokenize = str.split
+        registry._tagger = FakeTagger()
+        registry._sentiment = lambda text: (0.0, 0.0)
+        
+        registry.load()
+        
+        assert registry.status()["state"] == READY
+        assert registry.status()["load_seconds"] is not None
+
+
+class TestReadiness:
+    """Test cases for the startup warmup and readiness probe"""
+    
+    def test_ready_when_warmup_disabled(self, client):
+        """Test models loaded on first use do not block readiness"""
+        response = client.get("/ready")
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "lazy"
+    
+    def test_not_ready_until_warmup_finishes(self, client, monkeypatch):
+        """Test the probe returns 503 while loading and 200 once warm"""
+        monkeypatch.setattr(analysis_executor, "_warmup_status", {"state": "loading", "error": None, "seconds": None})
+        assert client.get("/ready").status_code == 503
+        
+        class WarmExecutor:
+            def warm_up(self):
+                return [{"state": READY}]
+        
+        monkeypatch.setattr(analysis_executor, "get_analysis_executor", lambda: WarmExecutor())
+        analysis_executor.start_warmup().join(5)
+        
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+    
+    def test_failed_warmup_not_ready(self, client, monkeypatch):
+        """Test a failed warmup keeps the probe at 503 with the error"""
+        monkeypatch.setattr(analysis_executor, "_warmup_status", {"state": "not_loaded", "error": None, "seconds": None})
+        
+        class BrokenExecutor:
+            def warm_up(self):
+                raise LookupError("Resource stopwords not found")
+        
+        monkeypatch.setattr(analysis_executor, "get_analysis_executor", lambda: BrokenExecutor())
+        analysis_executor.start_warmup().join(5)
+        
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "failed"
+        assert "stopwords" in response.json()["error"]
+    
+    def test_inline_executor_warms_local_registry(self, monkeypatch):
+        """Test inline mode loads the models in the calling process"""
+        registry = ModelRegistry()
+        registry._stop_words = frozenset()
+        registry._tokenize = str.split
+        registry._tagger = FakeTagger()
+        registry._sentiment = lambda text: (0.0, 0.0)
+        monkeypatch.setattr(analysis_executor, "get_model_registry", lambda: registry)
+        
+        statuses = AnalysisExecutor(mode="inline").warm_up()
+        
+        assert [status["state"] for status in statuses] == [READY]
@@ -0,0 +1,179 @@
+import pytest
+import json
+from database import Feedback, FeedbackCluster, FeedbackSignature, Insight, LshBucket
+from feedback_pipeline import _failed_analysis, build_insight, is_failed_analysis
+from insight_jobs import analyze_jobs
+from near_duplicates import assign_clusters, minhash, rebuild_clusters, similarity
+
+CRASH = "The checkout page crashes every time I try to pay with my credit card"
+CRASH_AGAIN = "the checkout page crashes every time I try to pay with my credit card!!"
+CRASH_SHORTER = "Checkout page crashes every time I try to pay with my credit card"
+PRAISE = "I love the new dashboard design, great work"
+
+
+def add_feedback(db, messages):
+    """Insert feedback through the ORM and return the ids"""
+    feedback = [Feedback(message=message) for message in messages]
+    db.add_all(feedback)
+    db.commit()
+    return [item.id for item in feedback]
+
+
+def clusters_of(db, ids):
+    """Cluster id per feedback id"""
+    return [db.get(FeedbackSignature, feedback_id).cluster_id for feedback_id in ids]
+
+
+def counting_analyze(calls):
+    """analyze_batch stand-in recording the messages it was asked to analyze"""
+    def analyze(messages):
+        calls.extend(messages)
+        return [
+            {"sentiment_score": -0.6, "sentiment_label": "negative", "themes": ["checkout"],
+             "recommendations": ["Fix checkout"], "priority_score": 8, "priority_level": "HIGH"}
+            for _ in messages
+        ]
+    return analyze
+
+
+class TestMinHash:
+    """Test cases for MinHash signatures"""
+    
+    def test_similarity_tracks_overlap(self):
+        """Test near-identical messages score high and unrelated ones low"""
+        assert similarity(minhash(CRASH), minhash(CRASH_AGAIN)) == 1.0
+        assert similarity(minhash(CRASH), minhash(CRASH_SHORTER)) >= 0.85
+        assert similarity(minhash(CRASH), minhash(PRAISE)) < 0.2
+    
+    def test_signature_is_stable(self):
+        """Test signatures do not depend on the process (they are stored)"""
+        assert minhash("ok") == minhash("OK!")
+        assert len(minhash(CRASH)) == 64
+
+
+class TestClusterAssignment:
+    """Test cases for ingest-time clustering"""
+    
+    def test_near_duplicates_join_first_cluster(self, test_db):
+        """Test duplicates link to the first message's cluster and unrelated feedback starts its own"""
+        first, again, praise = add_feedback(test_db, [CRASH, CRASH_AGAIN, PRAISE])
+        later, = add_feedback(test_db, [CRASH_SHORTER])
+        
+        assert clusters_of(test_db, [first, again, praise, later]) == [first, first, praise, first]
+        assert test_db.get(FeedbackCluster, first).size == 3
+        assert test_db.get(FeedbackCluster, praise).size == 1
+    
+    def test_only_representatives_are_indexed(self, test_db):
+        """Test a storm of copies adds no LSH rows beyond its representative's bands"""
+        add_feedback(test_db, [CRASH])
+        buckets = test_db.query(LshBucket).count()
+        
+        add_feedback(test_db, [CRASH_AGAIN] * 50)
+        
+        assert test_db.query(LshBucket).count() == buckets
+    
+    def test_threshold(self, test_db):
+        """Test a stricter threshold keeps similar but different messages apart"""
+        connection = test_db.connection()
+        
+        assigned = assign_clusters(connection, [(1, CRASH), (2, CRASH_SHORTER)], threshold=0.99)
+        
+        assert assigned == {1: 1, 2: 2}
+    
+    def test_rebuild_matches_ingest(self, test_db):
+        """Test rebuilding from the feedback table reproduces the ingest-time clusters"""
+        ids = add_feedback(test_db, [CRASH, PRAISE, CRASH_AGAIN])
+        before = clusters_of(test_db, ids)
+        
+        assert rebuild_clusters(test_db) == 3
+        test_db.commit()
+        
+        assert clusters_of(test_db, ids) == before
+        assert test_db.get(FeedbackCluster, ids[0]).size == 2
+
+
+class TestAnalysisReuse:
+    """Test cases for copying the representative's analysis"""
+    
+    def jobs(self, db, ids):
+        return [(index, feedback_id, db.get(Feedback, feedback_id).message, 1) for index, feedback_id in enumerate(ids)]
+    
+    def test_duplicates_reuse_stored_analysis(self, test_db):
+        """Test duplicates of an analyzed representative are not analyzed again"""
+        first, = add_feedback(test_db, [CRASH])
+        test_db.add(Insight(feedback_id=first, sentiment_score=-0.9, sentiment_label="negative",
+                            themes=json.dumps(["payments"]), recommendations=json.dumps([]),
+                            priority_score=9, priority_level="HIGH"))
+        test_db.commit()
+        ids = add_feedback(test_db, [CRASH_AGAIN, PRAISE])
+        calls = []
+        
+        analyses = analyze_jobs(test_db, self.jobs(test_db, ids), counting_analyze(calls))
+        
+        assert calls == [PRAISE]
+        assert analyses[0]["sentiment_score"] == -0.9
+        assert analyses[0]["themes"] == ["payments"]
+    
+    def test_duplicates_reuse_analysis_from_same_batch(self, test_db):
+        """Test a batch holding a representative and its copies analyzes the representative once"""
+        ids = add_feedback(test_db, [CRASH, CRASH_AGAIN, CRASH_AGAIN])
+        calls = []
+        
+        analyses = analyze_jobs(test_db, self.jobs(test_db, ids), counting_analyze(calls))
+        
+        assert calls == [CRASH]
+        assert len(analyses) == 3
+        assert analyses[1] == analyses[0]
+    
+    def test_failed_stored_analysis_is_not_reused(self, test_db):
+        """Test duplicates of a representative whose analysis failed are analyzed themselves"""
+        first, = add_feedback(test_db, [CRASH])
+        test_db.add(build_insight(first, _failed_analysis()))
+        test_db.commit()
+        ids = add_feedback(test_db, [CRASH_AGAIN, CRASH_SHORTER])
+        calls = []
+        
+        analyses = analyze_jobs(test_db, self.jobs(test_db, ids), counting_analyze(calls))
+        
+        assert calls == [CRASH_AGAIN, CRASH_SHORTER]
+        assert not any(is_failed_analysis(analysis) for analysis in analyses)
+    
+    def test_failed_analysis_in_same_batch_is_not_reused(self, test_db):
+        """Test a representative whose analysis fails in the batch does not pass the failure on"""
+        ids = add_feedback(test_db, [CRASH, CRASH_AGAIN])
+        calls = []
+        analyze = counting_analyze(calls)
+        
+        def failing_first(messages):
+            return [_failed_analysis() if message == CRASH else analysis
+                    for message, analysis in zip(messages, analyze(messages))]
+        
+        analyses = analyze_jobs(test_db, self.jobs(test_db, ids), failing_first)
+        
+        assert calls == [CRASH, CRASH_AGAIN]
+        assert is_failed_analysis(analyses[0])
+        assert not is_failed_analysis(analyses[1])
+    
+    def test_reuse_can_be_disabled(self, test_db, monkeypatch):
+        """Test NEAR_DUPLICATE_REUSE=0 analyzes every message"""
+        monkeypatch.setattr("insight_jobs.NEAR_DUPLICATE_REUSE", False)
+        ids = add_feedback(test_db, [CRASH, CRASH_AGAIN])
+        calls = []
+        
+        analyze_jobs(test_db, self.jobs(test_db, ids), counting_analyze(calls))
+        
+        assert calls == [CRASH, CRASH_AGAIN]
+
+
+class TestClustersInInsights:
+    """Test cases for cluster sizes in GET /api/insights"""
+    
+    def test_largest_clusters_listed(self, client):
+        """Test clusters with duplicates are listed largest first with the representative's text"""
+        client.post("/api/feedback/batch", json={"messages": [CRASH, CRASH_AGAIN, CRASH_SHORTER, PRAISE]})
+        
+        clusters = client.get("/api/insights").json()["clusters"]
+        
+        assert len(clusters) == 1
+        assert clusters[0]["size"] == 3
+        assert clusters[0]["representative"] == CRASH
@@ -0,0 +1,66 @@
+import pytest
+import json
+from database import Feedback, Insight, InsightTheme, InsightRecommendation, RecommendationText
+from theme_index import backfill_theme_index
+
+
+def add_insight(db, themes, recommendations):
+    """Create a feedback row with an insight and return the feedback id"""
+    feedback = Feedback(message="Message")
+    db.add(feedback)
+    db.flush()
+    db.add(Insight(
+        feedback_id=feedback.id,
+        sentiment_score=0.5,
+        sentiment_label="positive",
+        themes=json.dumps(themes) if isinstance(themes, list) else themes,
+        recommendations=json.dumps(recommendations)
+    ))
+    db.commit()
+    return feedback.id
+
+
+class TestThemeIndex:
+    """Test cases for the normalized theme and recommendation tables"""
+    
+    def test_insight_write_populates_theme_rows(self, test_db):
+        """Test each theme gets a row with its position"""
+        add_insight(test_db, ["speed", "design"], [])
+        
+        rows = test_db.query(InsightTheme).order_by(InsightTheme.position).all()
+        assert [(row.theme, row.position) for row in rows] == [("speed", 0), ("design", 1)]
+    
+    def test_recommendations_are_deduplicated(self, test_db):
+        """Test identical recommendation texts share one dictionary entry"""
+        add_insight(test_db, [], ["Fix bugs", "Keep it up"])
+        add_insight(test_db, [], ["Fix bugs"])
+        
+        assert test_db.query(RecommendationText).count() == 2
+        assert test_db.query(InsightRecommendation).count() == 3
+    
+    def test_invalid_json_is_skipped(self, test_db):
+        """Test malformed theme JSON does not fail the write"""
+        add_insight(test_db, "invalid json", [])
+        
+        assert test_db.query(InsightTheme).count() == 0
+    
+    def test_backfill_rebuilds_from_json(self, test_db):
+        """Test the backfill recreates the normalized rows from the JSON columns"""
+        add_insight(test_db, ["performance", "quality"], ["Fix bugs"])
+        test_db.query(InsightTheme).delete()
+        test_db.query(InsightRecommendation).delete()
+        test_db.commit()
+        
+        assert backfill_theme_index(test_db) == 1
+        assert sorted((row.theme, row.position) for row in test_db.query(InsightTheme)) == [("performance", 0), ("quality", 1)]
+        assert [text for (text,) in test_db.query(RecommendationText.text)
+                .join(InsightRecommendation, InsightRecommendation.recommendation_id == RecommendationText.id)] == ["Fix bugs"]
+    
+    def test_theme_lookup_uses_index(self, test_db):
+        """Test theme lookups search the theme index instead of scanning"""
+        plan = " ".join(
+            row[-1] for row in test_db.connection().exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT insight_id FROM insight_themes WHERE theme = 'x'"
+            )
+        )
+        assert "SEARCH" in plan
@@ -0,0 +1,163 @@
+import pytest
+import json
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+import theme_sketch
+from database import Feedback, Insight, ThemeSketchPane
+from theme_sketch import CountMinSketch, SpaceSaving, ThemePane, ThemeSketchTracker
+
+NOW = datetime(2024, 3, 10, 12, 30)
+
+
+def zipf_stream(count, vocabulary, seed=7):
+    """Skewed theme stream: a few heavy hitters and a long tail"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    return rng.choices([f"theme-{rank}" for rank in range(vocabulary)], weights=weights, k=count)
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    """Fresh tracker, so pending counts from other tests do not leak in"""
+    fresh = ThemeSketchTracker()
+    monkeypatch.setattr(theme_sketch, "tracker", fresh)
+    return fresh
+
+
+class TestSketches:
+    """Test cases for the Count-Min Sketch and Space-Saving summary"""
+    
+    def test_count_min_error_bound(self):
+        """Test estimates never undercount and stay within epsilon * N"""
+        stream = zipf_stream(20000, 5000)
+        sketch = CountMinSketch.for_error(0.001, 0.01)
+        for theme in stream:
+            sketch.add(theme)
+        
+        exact = Counter(stream)
+        errors = [sketch.estimate(theme) - count for theme, count in exact.items()]
+        assert min(errors) >= 0
+        assert sum(error > 0.001 * len(stream) for error in errors) <= 0.01 * len(exact)
+    
+    def test_fixed_size(self):
+        """Test memory does not grow with the vocabulary"""
+        pane = ThemePane(CountMinSketch(272, 5), SpaceSaving(20))
+        size = len(pane.sketch.counters)
+        
+        pane.add(f"typo-{i}" for i in range(10000))
+        
+        assert len(pane.sketch.counters) == size
+        assert len(pane.summary.entries) == 20
+        assert pane.total == 10000
+    
+    def test_space_saving_keeps_heavy_hitters_across_merges(self):
+        """Test themes above N / k survive summarizing and merging"""
+        stream = zipf_stream(20000, 5000)
+        halves = [SpaceSaving(50), SpaceSaving(50)]
+        for index, theme in enumerate(stream):
+            halves[index % 2].add(theme)
+        halves[0].merge(halves[1])
+        
+        exact = Counter(stream)
+        top = dict(halves[0].top(50))
+        for theme, count in exact.items():
+            if count > len(stream) / 50:
+                assert theme in top
+                assert top[theme] >= count
+
+
+class TestThemeSketchTracker:
+    """Test cases for pending panes, flushing and sliding windows"""
+    
+    def test_windows(self, test_db, tracker):
+        """Test the 24h window leaves out older panes that the 7d window includes"""
+        tracker.record([(NOW, ["checkout", "login"]), (NOW - timedelta(minutes=20), ["checkout"])])
+        tracker.record([(NOW - timedelta(days=2), ["login"])] * 5)
+        tracker.flush(test_db.connection(), NOW)
+        test_db.commit()
+        
+        day, day_info = tracker.top_themes(test_db, "24h", now=NOW)
+        week, week_info = tracker.top_themes(test_db, "7d", now=NOW)
+        
+        assert [(estimate.theme, estimate.count) for estimate in day] == [("checkout", 2), ("login", 1)]
+        assert [(estimate.theme, estimate.count) for estimate in week] == [("login", 6), ("checkout", 2)]
+        assert day_info["total"] == 3 and week_info["total"] == 8
+        assert day_info["confidence"] == pytest.approx(0.99)
+    
+    def test_flushes_merge(self, test_db, tracker):
+        """Test repeated flushes into one pane add up and bump the pane version"""
+        for _ in range(2):
+            tracker.record([(NOW, ["checkout"])])
+            tracker.flush(test_db.connection(), NOW)
+            test_db.commit()
+        
+        pane = test_db.query(ThemeSketchPane).one()
+        assert pane.total == 2
+        assert pane.version == 2
+        assert tracker.top_themes(test_db, "24h", now=NOW)[0][0].count == 2
+    
+    def test_old_panes_are_dropped(self, test_db, tracker):
+        """Test panes beyond the longest window are deleted on flush"""
+        tracker.record([(NOW - timedelta(days=3), ["checkout"])])
+        tracker.flush(test_db.connection(), NOW)
+        tracker.record([(NOW, ["login"])])
+        tracker.flush(test_db.connection(), NOW + timedelta(days=5))
+        test_db.commit()
+        
+        assert [pane.pane_start for pane in test_db.query(ThemeSketchPane)] == [datetime(2024, 3, 10, 12)]
+    
+    def test_failed_flush_keeps_pending(self, test_db, tracker):
+        """Test counts survive a failed write and are written by the next flush"""
+        tracker.record([(NOW, ["checkout"])])
+        def locked(*args, **kwargs):
+            raise RuntimeError("database is locked")
+        tracker.write = locked
+        with pytest.raises(RuntimeError):
+            tracker.flush(test_db.connection(), NOW)
+        del tracker.write
+        
+        assert tracker.flush(test_db.connection(), NOW) == 1
+    
+    def test_committed_insights_are_recorded(self, test_db, tracker):
+        """Test themes are counted on commit and not after a rollback"""
+        feedback = Feedback(message="Checkout fails")
+        test_db.add(feedback)
+        test_db.commit()
+        
+        test_db.add(Insight(feedback_id=feedback.id, themes=json.dumps(["payments"]), recommendations="[]"))
+        test_db.flush()
+        test_db.rollback()
+        test_db.add(Insight(feedback_id=feedback.id, themes=json.dumps(["checkout", "checkout"]), recommendations="[]"))
+        test_db.commit()
+        tracker.flush(test_db.connection())
+        test_db.commit()
+        
+        themes, info = tracker.top_themes(test_db, "24h")
+        assert [(estimate.theme, estimate.count) for estimate in themes] == [("checkout", 1)]
+        assert info["total"] == 1
+
+
+class TestApproximateInsights:
+    """Test cases for GET /api/insights?themes=approx"""
+    
+    def test_approx_themes(self, client, test_db, tracker):
+        """Test approximate mode returns sketch counts with their error bound"""
+        tracker.record([(datetime.utcnow(), ["checkout"])] * 3 + [(datetime.utcnow(), ["login"])])
+        tracker.flush(test_db.connection())
+        test_db.commit()
+        
+        exact = client.get("/api/insights").json()
+        approx = client.get("/api/insights", params={"themes": "approx", "window": "7d"}).json()
+        
+        assert exact["themes"] == [] and exact["theme_sketch"] is None
+        assert approx["themes"] == [{"theme": "checkout", "count": 3}, {"theme": "login", "count": 1}]
+        assert approx["theme_sketch"]["window"] == "7d"
+        assert approx["theme_sketch"]["total"] == 4
+        assert approx["theme_sketch"]["error_bound"] == 1
+    
+    def test_invalid_window(self, client):
+        """Test unknown windows are rejected"""
+        response = client.get("/api/insights", params={"themes": "approx", "window": "30d"})
+        
+        assert response.status_code == 422
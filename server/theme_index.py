@@ -0,0 +1,137 @@
+"""
+Normalized, indexed theme and recommendation storage
+
+Insights keep their themes and recommendations as JSON arrays, which is the
+payload returned to clients. Every flush that writes new insights also
+writes one insight_themes row per theme and links each recommendation to a
+de-duplicated recommendation_texts entry, so "which feedback mentions theme
+X" and "how often does each theme occur" are answered from indexes instead
+of decoding every JSON column.
+"""
+import json
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import Insight, InsightRecommendation, InsightTheme, RecommendationText
+
+# Insights processed per chunk when backfilling
+BACKFILL_CHUNK_SIZE = 1000
+
+def decode_json_list(value: Optional[str]) -> List[str]:
+    """
+    Decode a JSON array column, ignoring malformed values
+    """
+    if not value:
+        return []
+    try:
+        decoded = json.loads(value)
+    except json.JSONDecodeError:
+        return []
+    return decoded if isinstance(decoded, list) else []
+
+def _unique(values: List[str]) -> List[str]:
+    """
+    Drop duplicates and blanks while keeping the original order
+    """
+    seen = set()
+    result = []
+    for value in values:
+        if isinstance(value, str) and value and value not in seen:
+            seen.add(value)
+            result.append(value)
+    return result
+
+def insight_themes(insight) -> List[str]:
+    """
+    Unique themes of an insight, as stored in the theme index
+    
+    Aggregates and rollups count these, so incremental updates agree with
+    rebuilds from insight_themes.
+    """
+    themes = []
+    for theme in _unique(decode_json_list(insight.themes)):
+        if theme[:100] not in themes:
+            themes.append(theme[:100])
+    return themes
+
+def insight_recommendations(insight) -> List[str]:
+    """
+    Unique recommendations of an insight, as linked in the theme index
+    """
+    return _unique(decode_json_list(insight.recommendations))
+
+def index_insights(connection, insights: Iterable[Insight]):
+    """
+    Write normalized theme and recommendation rows for new insights
+    """
+    theme_rows = []
+    recommendation_links = []
+    
+    for insight in insights:
+        for position, theme in enumerate(insight_themes(insight)):
+            theme_rows.append({"insight_id": insight.id, "theme": theme, "position": position})
+        for position, text in enumerate(insight_recommendations(insight)):
+            recommendation_links.append((insight.id, text, position))
+    
+    if theme_rows:
+        connection.execute(sqlite_insert(InsightTheme).on_conflict_do_nothing(), theme_rows)
+    
+    if not recommendation_links:
+        return
+    
+    # Add new recommendation texts to the dictionary and look up their ids
+    texts = {text for _, text, _ in recommendation_links}
+    connection.execute(
+        sqlite_insert(RecommendationText).on_conflict_do_nothing(),
+        [{"text": text} for text in texts]
+    )
+    text_ids = dict(
+        connection.execute(
+            select(RecommendationText.text, RecommendationText.id).where(RecommendationText.text.in_(texts))
+        ).all()
+    )
+    connection.execute(
+        sqlite_insert(InsightRecommendation).on_conflict_do_nothing(),
+        [
+            {"insight_id": insight_id, "recommendation_id": text_ids[text], "position": position}
+            for insight_id, text, position in recommendation_links
+        ]
+    )
+
+@event.listens_for(Session, "after_flush")
+def _index_insights_after_flush(session, flush_context):
+    """
+    Keep the normalized tables in the same transaction as the insight write
+    """
+    new_insights = [obj for obj in session.new if isinstance(obj, Insight)]
+    if new_insights:
+        index_insights(session.connection(), new_insights)
+
+def backfill_theme_index(db: Session) -> int:
+    """
+    Rebuild the normalized tables from the insights JSON columns
+    Returns: number of insights indexed
+    """
+    connection = db.connection()
+    connection.execute(delete(InsightTheme))
+    connection.execute(delete(InsightRecommendation))
+    
+    total = 0
+    result = connection.execute(
+        select(Insight.id, Insight.themes, Insight.recommendations).execution_options(yield_per=BACKFILL_CHUNK_SIZE)
+    )
+    for partition in result.partitions():
+        index_insights(connection, partition)
+        total += len(partition)
+    
+    db.commit()
+    return total
+
+def theme_insight_ids(theme: str):
+    """
+    Subquery of the insight ids tagged with a theme, served by the theme index
+    """
+    return select(InsightTheme.insight_id).where(InsightTheme.theme == theme.strip().lower())
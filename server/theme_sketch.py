@@ -0,0 +1,431 @@
+"""
+Approximate heavy-hitter themes in fixed memory
+
+theme_aggregates keeps an exact count for every theme ever extracted, and
+the theme vocabulary is open (typos, product names), so it grows without
+bound. For GET /api/insights?themes=approx this module keeps, per hour of
+insight writes, a Count-Min Sketch of theme occurrences and a Space-Saving
+summary of the THEME_SKETCH_TOP_K most frequent themes. Both have a fixed
+size whatever the vocabulary and both merge by addition, so a sliding
+window (the last 24h or 7d, including the current hour) is the merge of
+its hourly panes.
+
+Guarantees, for a window holding N theme occurrences: a reported count is
+never below the true count, and exceeds it by more than
+THEME_SKETCH_EPSILON * N with probability at most THEME_SKETCH_DELTA
+(Count-Min). A theme occurring more than N / THEME_SKETCH_TOP_K times is
+always among the candidates (Space-Saving). Reported counts are the lower
+of the two summaries' overestimates.
+
+Committed insights are added to in-memory pending panes. A flusher thread
+merges them into theme_sketch_panes every THEME_SKETCH_FLUSH_SECONDS and
+on shutdown (the bulk importer merges with every batch), so several
+processes can share a database; approximate counts therefore lag writes
+by up to one flush interval. Panes older than the longest window are
+dropped. Readers cache decoded panes and reload only the ones whose
+version changed.
+
+Configuration comes from the environment:
+
+- THEME_SKETCH_EPSILON: relative error bound (default 0.001)
+- THEME_SKETCH_DELTA: probability of exceeding the bound (default 0.01)
+- THEME_SKETCH_TOP_K: themes kept per Space-Saving summary (default 100)
+- THEME_SKETCH_FLUSH_SECONDS: interval between merges into the database (default 10)
+"""
+import json
+import math
+import operator
+import os
+import threading
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta
+from hashlib import blake2b
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import Insight, ThemeSketchPane
+from insight_trends import bucket_start
+from theme_index import decode_json_list
+
+THEME_SKETCH_EPSILON = float(os.getenv("THEME_SKETCH_EPSILON", 0.001))
+THEME_SKETCH_DELTA = float(os.getenv("THEME_SKETCH_DELTA", 0.01))
+THEME_SKETCH_TOP_K = int(os.getenv("THEME_SKETCH_TOP_K", 100))
+THEME_SKETCH_FLUSH_SECONDS = float(os.getenv("THEME_SKETCH_FLUSH_SECONDS", 10))
+
+# Sliding windows served by the approximate mode; panes are kept for the longest
+WINDOWS = {"24h": timedelta(hours=24), "7d": timedelta(days=7)}
+RETENTION = max(WINDOWS.values())
+
+# session.info key holding (processed_at, themes) of flushed insights until commit
+_PENDING_THEMES = "pending_sketch_themes"
+
+ThemeEstimate = namedtuple("ThemeEstimate", ["theme", "count"])
+
+class CountMinSketch:
+    """
+    Count-Min Sketch: depth rows of width counters, one counter per row per item
+    """
+    
+    def __init__(self, width: int, depth: int, counters: Optional[array] = None):
+        self.width = width
+        self.depth = depth
+        self.counters = counters if counters is not None else array("q", bytes(8 * width * depth))
+    
+    @classmethod
+    def for_error(cls, epsilon: float, delta: float) -> "CountMinSketch":
+        """
+        Smallest sketch overestimating by at most epsilon * N with probability 1 - delta
+        """
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+    
+    def indexes(self, item: str) -> List[int]:
+        # Double hashing: row i uses h1 + i * h2, as good as depth independent hashes for this bound
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [row * self.width + (first + row * second) % self.width for row in range(self.depth)]
+    
+    def add(self, item: str, count: int = 1):
+        for index in self.indexes(item):
+            self.counters[index] += count
+    
+    def estimate(self, item: str) -> int:
+        return min(self.counters[index] for index in self.indexes(item))
+    
+    def merge(self, other: "CountMinSketch"):
+        self.counters = array("q", map(operator.add, self.counters, other.counters))
+
+class SpaceSaving:
+    """
+    Space-Saving summary: at most capacity items with (count, error), count - error <= true count <= count
+    """
+    
+    def __init__(self, capacity: int, entries: Optional[Dict[str, List[int]]] = None):
+        self.capacity = capacity
+        self.entries = entries if entries is not None else {}
+    
+    def floor(self) -> int:
+        """
+        Upper bound on the count of any item not in the summary
+        """
+        if len(self.entries) < self.capacity:
+            return 0
+        return min(count for count, _ in self.entries.values())
+    
+    def add(self, item: str, count: int = 1):
+        entry = self.entries.get(item)
+        if entry is not None:
+            entry[0] += count
+        elif len(self.entries) < self.capacity:
+            self.entries[item] = [count, 0]
+        else:
+            # Replace the least frequent item; the newcomer inherits its count as error
+            evicted = min(self.entries, key=lambda key: self.entries[key][0])
+            floor = self.entries.pop(evicted)[0]
+            self.entries[item] = [floor + count, floor]
+    
+    def merge(self, other: "SpaceSaving"):
+        """
+        Combine with another summary (mergeable summaries, Agarwal et al. 2012)
+        """
+        own_floor, other_floor = self.floor(), other.floor()
+        combined = {}
+        for item in self.entries.keys() | other.entries.keys():
+            count, error = self.entries.get(item, (own_floor, own_floor))
+            other_count, other_error = other.entries.get(item, (other_floor, other_floor))
+            combined[item] = [count + other_count, error + other_error]
+        kept = sorted(combined.items(), key=lambda entry: (-entry[1][0], entry[0]))[:self.capacity]
+        self.entries = dict(kept)
+    
+    def top(self, limit: int) -> List[Tuple[str, int]]:
+        ranked = sorted(self.entries.items(), key=lambda entry: (-entry[1][0], entry[0]))
+        return [(item, count) for item, (count, _) in ranked[:limit]]
+
+class ThemePane:
+    """
+    Theme occurrences of one hour: total, Count-Min Sketch and Space-Saving summary
+    """
+    
+    def __init__(self, sketch: Optional[CountMinSketch] = None, summary: Optional[SpaceSaving] = None, total: int = 0):
+        self.sketch = sketch or CountMinSketch.for_error(THEME_SKETCH_EPSILON, THEME_SKETCH_DELTA)
+        self.summary = summary or SpaceSaving(THEME_SKETCH_TOP_K)
+        self.total = total
+    
+    def add(self, themes: Iterable[str]):
+        for theme in themes:
+            self.sketch.add(theme)
+            self.summary.add(theme)
+            self.total += 1
+    
+    def merge(self, other: "ThemePane"):
+        self.sketch.merge(other.sketch)
+        self.summary.merge(other.summary)
+        self.total += other.total
+    
+    def compatible(self, other: "ThemePane") -> bool:
+        return (self.sketch.width, self.sketch.depth) == (other.sketch.width, other.sketch.depth)
+    
+    def to_row(self, pane_start: datetime) -> Dict:
+        return {
+            "pane_start": pane_start,
+            "width": self.sketch.width,
+            "depth": self.sketch.depth,
+            "total": self.total,
+            "counters": self.sketch.counters.tobytes(),
+            "top_themes": json.dumps(self.summary.entries),
+        }
+    
+    @classmethod
+    def from_row(cls, row) -> "ThemePane":
+        counters = array("q")
+        counters.frombytes(row.counters)
+        return cls(
+            CountMinSketch(row.width, row.depth, counters),
+            SpaceSaving(THEME_SKETCH_TOP_K, json.loads(row.top_themes)),
+            row.total,
+        )
+
+def sketch_themes(themes: Optional[str]) -> List[str]:
+    """
+    Distinct themes of an insight's JSON themes column, as theme_index stores them
+    """
+    return list(dict.fromkeys(theme[:100] for theme in decode_json_list(themes) if isinstance(theme, str) and theme))
+
+class ThemeSketchTracker:
+    """
+    Pending updates of this process and a cache of the stored panes
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[datetime, ThemePane] = {}
+        self._cache: Dict[datetime, Tuple[int, ThemePane]] = {}
+    
+    def record(self, occurrences: Iterable[Tuple[datetime, List[str]]]):
+        """
+        Count the themes of committed insights, by hour of processed_at
+        """
+        with self._lock:
+            for processed_at, themes in occurrences:
+                if not themes:
+                    continue
+                pane_start = bucket_start(processed_at, "hour")
+                if pane_start not in self._pending:
+                    self._pending[pane_start] = ThemePane()
+                self._pending[pane_start].add(themes)
+    
+    def take_pending(self) -> Dict[datetime, ThemePane]:
+        """
+        Remove and return the pending panes, to be written with write()
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+    
+    def restore(self, pending: Dict[datetime, ThemePane]):
+        """
+        Put back pending panes whose write failed
+        """
+        with self._lock:
+            for pane_start, pane in pending.items():
+                if pane_start in self._pending:
+                    pane.merge(self._pending[pane_start])
+                self._pending[pane_start] = pane
+    
+    def write(self, connection, pending: Dict[datetime, ThemePane], now: Optional[datetime] = None) -> int:
+        """
+        Merge panes into theme_sketch_panes in the caller's transaction
+        Returns: number of panes written
+        """
+        from data_version import bump_data_version
+        
+        if not pending:
+            return 0
+        
+        cutoff = bucket_start(now or datetime.utcnow(), "hour") - RETENTION
+        stored = {
+            row.pane_start: row
+            for row in connection.execute(select(ThemeSketchPane.__table__).where(ThemeSketchPane.pane_start.in_(list(pending))))
+        }
+        written = 0
+        for pane_start, pane in pending.items():
+            if pane_start <= cutoff:
+                continue
+            row = stored.get(pane_start)
+            merged = ThemePane.from_row(row) if row is not None else None
+            if merged is not None and merged.compatible(pane):
+                merged.merge(pane)
+            else:
+                # New pane, or one sized for other settings that cannot be merged
+                merged = pane
+            statement = sqlite_insert(ThemeSketchPane).values(version=1, **merged.to_row(pane_start))
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=["pane_start"],
+                set_={**{key: statement.excluded[key] for key in ("width", "depth", "total", "counters", "top_themes")},
+                      "version": ThemeSketchPane.version + 1},
+            ))
+            written += 1
+        connection.execute(delete(ThemeSketchPane).where(ThemeSketchPane.pane_start <= cutoff))
+        # Approximate theme counts changed, so cached /api/insights responses are stale
+        bump_data_version(connection)
+        return written
+    
+    def flush(self, connection, now: Optional[datetime] = None) -> int:
+        """
+        Write all pending panes in the caller's transaction, keeping them pending if the write fails
+        Returns: number of panes written
+        """
+        pending = self.take_pending()
+        try:
+            return self.write(connection, pending, now)
+        except Exception:
+            self.restore(pending)
+            raise
+    
+    def window_panes(self, db: Session, window: str, now: Optional[datetime] = None) -> List[ThemePane]:
+        """
+        Stored panes of a sliding window, decoding only those changed since last read
+        """
+        start = bucket_start(now or datetime.utcnow(), "hour") - WINDOWS[window]
+        versions = dict(db.execute(
+            select(ThemeSketchPane.pane_start, ThemeSketchPane.version).where(ThemeSketchPane.pane_start > start)
+        ).all())
+        
+        with self._lock:
+            stale = [pane_start for pane_start, version in versions.items()
+                     if self._cache.get(pane_start, (None,))[0] != version]
+        if stale:
+            loaded = {
+                row.pane_start: (row.version, ThemePane.from_row(row))
+                for row in db.execute(select(ThemeSketchPane.__table__).where(ThemeSketchPane.pane_start.in_(stale)))
+            }
+            with self._lock:
+                self._cache.update(loaded)
+                # Forget panes that left the longest window, keeping the cache bounded
+                oldest = start + WINDOWS[window] - RETENTION
+                for pane_start in [key for key in self._cache if key <= oldest]:
+                    del self._cache[pane_start]
+        
+        with self._lock:
+            return [self._cache[pane_start][1] for pane_start in sorted(versions) if pane_start in self._cache]
+    
+    def top_themes(self, db: Session, window: str, limit: int = 10, now: Optional[datetime] = None):
+        """
+        Approximate top themes of a window and the error bound of their counts
+        Returns: ([ThemeEstimate], {"window", "total", "error_bound", "confidence"})
+        """
+        panes = self.window_panes(db, window, now)
+        total = sum(pane.total for pane in panes)
+        
+        summary = SpaceSaving(THEME_SKETCH_TOP_K)
+        for pane in panes:
+            summary.merge(pane.summary)
+        
+        # Space-Saving ranks candidates; Count-Min tightens their counts (both overestimate).
+        # The sum of per-pane estimates is at most the merged sketch's estimate, so its bound holds
+        estimates = []
+        for theme, count in summary.top(limit * 3):
+            indexes = {}
+            sketch_count = 0
+            for pane in panes:
+                shape = (pane.sketch.width, pane.sketch.depth)
+                if shape not in indexes:
+                    indexes[shape] = pane.sketch.indexes(theme)
+                sketch_count += min(pane.sketch.counters[index] for index in indexes[shape])
+            estimates.append(ThemeEstimate(theme, min(count, sketch_count)))
+        estimates.sort(key=lambda estimate: (-estimate.count, estimate.theme))
+        
+        return estimates[:limit], {
+            "window": window,
+            "total": total,
+            "error_bound": math.ceil(THEME_SKETCH_EPSILON * total),
+            "confidence": 1 - THEME_SKETCH_DELTA,
+        }
+
+tracker = ThemeSketchTracker()
+
+def approximate_themes(db: Session, window: str, limit: int = 10):
+    """
+    Approximate top themes of a window from the shared tracker (see ThemeSketchTracker.top_themes)
+    """
+    return tracker.top_themes(db, window, limit)
+
+@event.listens_for(Session, "after_flush")
+def _collect_sketch_themes(session, flush_context):
+    new_insights = [obj for obj in session.new if isinstance(obj, Insight)]
+    if new_insights:
+        session.info.setdefault(_PENDING_THEMES, []).extend(
+            (insight.processed_at or datetime.utcnow(), sketch_themes(insight.themes)) for insight in new_insights
+        )
+
+@event.listens_for(Session, "after_commit")
+def _record_sketch_themes(session):
+    occurrences = session.info.pop(_PENDING_THEMES, None)
+    if occurrences:
+        tracker.record(occurrences)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_sketch_themes(session):
+    session.info.pop(_PENDING_THEMES, None)
+
+class ThemeSketchFlusher(threading.Thread):
+    """
+    Background thread merging pending panes into the database
+    """
+    
+    def __init__(self, session_factory: Callable[[], Session], interval: float = THEME_SKETCH_FLUSH_SECONDS):
+        super().__init__(name="theme-sketch-flusher", daemon=True)
+        self.session_factory = session_factory
+        self.interval = interval
+        self.stop_event = threading.Event()
+    
+    def flush(self):
+        pending = tracker.take_pending()
+        if not pending:
+            return
+        db = self.session_factory()
+        try:
+            tracker.write(db.connection(), pending)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            tracker.restore(pending)
+            print(f"Theme sketch flush failed: {str(e)}")
+        finally:
+            db.close()
+    
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+        # Final flush on shutdown
+        self.flush()
+    
+    def stop(self):
+        self.stop_event.set()
+
+_flusher: Optional[ThemeSketchFlusher] = None
+
+def start_flusher(session_factory: Optional[Callable[[], Session]] = None):
+    """
+    Start merging this process's theme counts into the database periodically
+    """
+    global _flusher
+    if session_factory is None:
+        from database import SessionLocal
+        session_factory = SessionLocal
+    
+    _flusher = ThemeSketchFlusher(session_factory)
+    _flusher.start()
+
+def stop_flusher(timeout: float = 10):
+    """
+    Stop the flusher after a final flush
+    """
+    global _flusher
+    if _flusher is not None:
+        _flusher.stop()
+        _flusher.join(timeout)
+        _flusher = None